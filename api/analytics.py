@@ -0,0 +1,49 @@
+"""
+Analytics for the dashboard: live lead counters (api/utils/lead_stats.py) and
+conversation analytics over the full message history (status funnel, transition
+matrix, objection conversion, reply latency) computed from a columnar snapshot
+(api/utils/transcript_analytics.py).
+"""
+
+from fastapi import APIRouter, Depends, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from api.utils.transcript_analytics import get_transcript_report
+from api.utils.lead_stats import get_lead_stats
+from api.utils.tenant_auth import require_tenant
+
+router = APIRouter()
+
+
+@router.get("/api/stats")
+async def lead_stats(tenant_id: str = Depends(require_tenant)):
+    """
+    The tenant's dashboard counters, served from memory (no lead rows are read).
+    
+    Args:
+        tenant_id: Tenant of the X-API-Key
+        
+    Returns:
+        dict: total, by_status, bookings_today, human_required, synced_at, reconciled_at
+    """
+    return get_lead_stats().snapshot(tenant_id)
+
+
+@router.get("/api/analytics/transcripts")
+async def transcript_analytics(refresh: bool = False, tenant_id: str = Depends(require_tenant)):
+    """
+    The tenant's transcript analytics from the latest snapshot (re-exported when older
+    than ANALYTICS_SNAPSHOT_TTL, or on refresh=true when older than ANALYTICS_REFRESH_MIN_SECONDS).
+    
+    Args:
+        refresh: Export a fresh snapshot first (rate-limited, as the export covers every tenant)
+        tenant_id: Tenant of the X-API-Key
+        
+    Returns:
+        dict: funnel, transitions, objections, latency and snapshot metadata
+    """
+    try:
+        return await run_in_threadpool(get_transcript_report, tenant_id, refresh)
+    except Exception as e:
+        print(f"Error computing transcript analytics: {e}")
+        raise HTTPException(status_code=500, detail="Failed to compute transcript analytics")
@@ -0,0 +1,51 @@
+"""
+Server-sent event stream of live conversation updates for the dashboard.
+Compact message/status deltas for the tenant of the caller's API key (X-API-Key),
+optionally narrowed to one lead, with bounded per-client queues (see
+api/utils/event_stream.py).
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Depends, Request
+from fastapi.responses import StreamingResponse
+
+from api.utils.event_stream import HEARTBEAT_SECONDS, get_event_broker, format_sse
+from api.utils.tenant_auth import require_tenant
+
+router = APIRouter()
+
+
+@router.get("/api/stream")
+async def stream_events(request: Request, lead_id: Optional[str] = None, tenant_id: str = Depends(require_tenant)):
+    """
+    Stream the tenant's message and status deltas as text/event-stream.
+    A 'resync' event means the client fell behind and should refetch /api/leads.
+    
+    Args:
+        lead_id: Only events for this lead (e.g. the open chat window)
+        tenant_id: Tenant of the X-API-Key (events of other tenants are never sent)
+    """
+    subscription = get_event_broker().subscribe(tenant_id=tenant_id, lead_id=lead_id)
+    
+    async def event_source():
+        try:
+            yield "retry: 3000\n\n"
+            while not await request.is_disconnected():
+                event = await subscription.next_event(timeout=HEARTBEAT_SECONDS)
+                # Comment frame keeps proxies from closing an idle stream
+                yield format_sse(event) if event else ": keepalive\n\n"
+        finally:
+            subscription.close()
+    
+    return StreamingResponse(
+        event_source(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+@router.get("/api/stream/stats")
+async def stream_stats():
+    """Subscriber count, published/queued/dropped event totals."""
+    return get_event_broker().stats()
@@ -0,0 +1,167 @@
+"""
+Read endpoints for the dashboard: paginated leads and conversation history,
+authenticated with a tenant API key (X-API-Key) and scoped to that tenant.
+Keyset cursors, column projection via `fields`, and ETag/If-None-Match so an
+unchanged page costs a 304 (responses are gzip-compressed by the app middleware).
+Also the streaming bulk lead import used by external CRMs.
+"""
+
+import hashlib
+import json
+from typing import Optional, Dict, Any
+
+from fastapi import APIRouter, Depends, HTTPException, Query, Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from api.utils.lead_queries import (
+    LEAD_COLUMNS,
+    DEFAULT_LEAD_COLUMNS,
+    MESSAGE_COLUMNS,
+    DEFAULT_MESSAGE_COLUMNS,
+    MAX_PAGE_SIZE,
+    InvalidCursorError,
+    select_columns,
+    list_leads,
+    list_messages,
+)
+from api.utils.lead_import import LeadImport, LineSplitter
+from api.utils.tenant_auth import require_tenant
+
+router = APIRouter()
+
+
+def _etag_response(request: Request, payload: Dict[str, Any]) -> Response:
+    """Serialize payload and answer 304 if the client already has this version."""
+    body = json.dumps(payload, separators=(",", ":"), default=str).encode("utf-8")
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache"}
+
+    if_none_match = request.headers.get("if-none-match", "")
+    if etag in [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]:
+        return Response(status_code=304, headers=headers)
+
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/api/leads")
+async def get_leads(
+    request: Request,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    include_test: bool = False,
+    fields: Optional[str] = None,
+    tenant_id: str = Depends(require_tenant)
+):
+    """
+    List the tenant's leads ordered by status, then priority score and last contact (newest first).
+    
+    Args:
+        limit: Page size
+        cursor: next_cursor from the previous page
+        status: Optional status filter
+        include_test: Include sandbox test leads
+        fields: Comma-separated columns (defaults to the sidebar columns)
+        tenant_id: Tenant of the X-API-Key
+        
+    Returns:
+        dict: leads and next_cursor (null on the last page)
+    """
+    try:
+        columns = select_columns(fields, LEAD_COLUMNS, DEFAULT_LEAD_COLUMNS)
+        leads, next_cursor = await run_in_threadpool(
+            list_leads, columns, limit, cursor, status, tenant_id, include_test
+        )
+    except (ValueError, InvalidCursorError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error listing leads: {e}")
+        raise HTTPException(status_code=500, detail="Failed to list leads")
+    
+    return _etag_response(request, {"leads": leads, "next_cursor": next_cursor})
+
+
+@router.get("/api/leads/{lead_id}/messages")
+async def get_lead_messages(
+    lead_id: str,
+    request: Request,
+    limit: int = Query(50, ge=1, le=MAX_PAGE_SIZE),
+    cursor: Optional[str] = None,
+    order: str = Query("desc", pattern="^(asc|desc)$"),
+    fields: Optional[str] = None,
+    tenant_id: str = Depends(require_tenant)
+):
+    """
+    Page through a lead's messages. order=desc (default) pages back from the latest
+    message; order=asc reads forward from the first. Another tenant's lead reads as empty.
+    
+    Args:
+        lead_id: Lead UUID
+        limit: Page size
+        cursor: next_cursor from the previous page
+        order: 'desc' or 'asc'
+        fields: Comma-separated columns (defaults to id, sender_type, content, timestamp)
+        tenant_id: Tenant of the X-API-Key
+        
+    Returns:
+        dict: messages (in requested order) and next_cursor
+    """
+    try:
+        columns = select_columns(fields, MESSAGE_COLUMNS, DEFAULT_MESSAGE_COLUMNS)
+        messages, next_cursor = await run_in_threadpool(
+            list_messages, lead_id, columns, limit, cursor, newest_first=order == "desc", tenant_id=tenant_id
+        )
+    except (ValueError, InvalidCursorError) as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        print(f"Error listing messages: {e}")
+        raise HTTPException(status_code=500, detail="Failed to list messages")
+    
+    return _etag_response(request, {"messages": messages, "next_cursor": next_cursor})
+
+
+@router.post("/api/leads/bulk")
+async def bulk_import_leads(
+    request: Request,
+    format: Optional[str] = Query(None, pattern="^(ndjson|csv)$"),
+    on_conflict: str = Query("skip", pattern="^(skip|update)$"),
+    tenant_id: str = Depends(require_tenant)
+):
+    """
+    Bulk-import leads from an NDJSON or CSV (header row required) request body.
+    Authenticated with a tenant API key (X-API-Key), as for the CRM inbound webhook.
+    The body is processed as it streams in; rows are inserted in batches.
+    
+    Args:
+        format: 'ndjson' or 'csv' (default: from Content-Type)
+        on_conflict: 'skip' phones that already exist, or 'update' them (same tenant only)
+        tenant_id: Tenant of the X-API-Key
+        
+    Returns:
+        dict: Row counts by outcome and per-line errors
+    """
+    content_type = request.headers.get("content-type", "")
+    fmt = format or ("csv" if "csv" in content_type else "ndjson")
+    job = LeadImport(tenant_id, fmt=fmt, on_conflict=on_conflict)
+    splitter = LineSplitter()
+    
+    try:
+        async for chunk in request.stream():
+            for line in splitter.feed(chunk):
+                job.feed_line(line)
+                if job.ready():
+                    await run_in_threadpool(job.flush)
+        for line in splitter.close():
+            job.feed_line(line)
+        job.finish()
+        await run_in_threadpool(job.flush)
+    except ValueError as e:
+        # Only raised for a malformed CSV header; row errors are collected in the summary
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    summary = job.summary()
+    print(
+        f"📥 Bulk import for tenant {tenant_id}: {summary['inserted']} inserted, {summary['updated']} updated, "
+        f"{summary['existing']} existing, {summary['invalid']} invalid, {summary['failed']} failed"
+    )
+    return summary
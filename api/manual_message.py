@@ -1,39 +1,34 @@
 """
 Manual message sending endpoint for human agent takeover.
-Allows dashboard users to send WhatsApp messages directly to leads.
+Allows dashboard users to send WhatsApp messages directly to leads; messages sent
+during the tenant's quiet hours are held by the outbound queue until they end.
 """
 
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
-from twilio.rest import Client
-import os
-from dotenv import load_dotenv
+from starlette.concurrency import run_in_threadpool
 
-from api.utils.lead_manager import get_lead_by_id, save_message, is_lead_in_manual_mode
-
-load_dotenv()
+from api.utils.lead_manager import get_lead_by_id, lead_lock
+from api.utils.outbound import get_outbound_queue
+from api.utils.twilio_client import TwilioSendError
 
 router = APIRouter()
 
-# Lazy Twilio client initialization
-_twilio_client = None
-TWILIO_PHONE = os.getenv("TWILIO_PHONE_NUMBER")
-
-def get_twilio_client():
-    global _twilio_client
-    if _twilio_client is None:
-        _twilio_client = Client(
-            os.getenv("TWILIO_ACCOUNT_SID"),
-            os.getenv("TWILIO_AUTH_TOKEN")
-        )
-    return _twilio_client
-
 
 class ManualMessageRequest(BaseModel):
     lead_id: str
     message: str
 
 
+def _submit_in_order(lead: dict, message: str) -> dict:
+    """Queue the message under the lead's lock, so it is ordered with the lead's inbound messages."""
+    with lead_lock(lead["phone"]):
+        return get_outbound_queue().submit(
+            lead["phone"], message, tenant_id=lead.get("tenant_id"), lead_id=lead["id"],
+            sender_type="human", kind="manual"
+        )
+
+
 @router.post("/api/manual_message")
 async def send_manual_message(request: ManualMessageRequest):
     """
@@ -48,7 +43,7 @@ async def send_manual_message(request: ManualMessageRequest):
     """
     try:
         # Get lead details
-        lead = get_lead_by_id(request.lead_id)
+        lead = await run_in_threadpool(get_lead_by_id, request.lead_id)
         
         if not lead:
             raise HTTPException(status_code=404, detail="Lead not found")
@@ -62,19 +57,19 @@ async def send_manual_message(request: ManualMessageRequest):
         
         phone = lead["phone"]
         
-        # Send WhatsApp message via Twilio
-        message = get_twilio_client().messages.create(
-            body=request.message,
-            from_=f"whatsapp:{TWILIO_PHONE}",
-            to=f"whatsapp:{phone}"
-        )
-        
-        # Save message to database
-        save_message(phone, "human", request.message)
+        # Send via Twilio now (saved to history on send), or hold until quiet hours end
+        # (transient Twilio errors are retried by the send layer)
+        try:
+            outcome = await run_in_threadpool(_submit_in_order, lead, request.message)
+        except TwilioSendError as e:
+            print(f"Twilio rejected manual message to {phone}: {e}")
+            raise HTTPException(status_code=502, detail=str(e))
         
         return {
             "success": True,
-            "message_sid": message.sid,
+            "message_sid": outcome["sid"],
+            "queued": outcome["status"] == "queued",
+            "send_after": outcome["send_after"].isoformat() if outcome["send_after"] else None,
             "to": phone,
             "content": request.message
         }
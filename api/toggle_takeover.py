@@ -6,7 +6,7 @@ Allows dashboard users to pause AI and take over conversations.
 from fastapi import APIRouter, HTTPException
 from pydantic import BaseModel
 
-from api.utils.lead_manager import set_manual_mode, get_lead_by_id
+from api.utils.lead_manager import set_manual_mode
 
 router = APIRouter()
 
@@ -29,18 +29,14 @@ async def toggle_takeover(request: TakeoverRequest):
         dict: Success status and current takeover state
     """
     try:
-        # Verify lead exists
-        lead = get_lead_by_id(request.lead_id)
+        # Update manual mode (the update's returned row also tells us the lead exists)
+        lead = set_manual_mode(request.lead_id, request.enabled)
         
+        if lead is None:
+            raise HTTPException(status_code=500, detail="Failed to update manual mode")
         if not lead:
             raise HTTPException(status_code=404, detail="Lead not found")
         
-        # Update manual mode
-        success = set_manual_mode(request.lead_id, request.enabled)
-        
-        if not success:
-            raise HTTPException(status_code=500, detail="Failed to update manual mode")
-        
         return {
             "success": True,
             "lead_id": request.lead_id,
@@ -0,0 +1,59 @@
+"""
+Twilio delivery status callbacks.
+Outbound messages are sent with StatusCallback pointing here (see
+api/utils/twilio_client.py); each callback records the message's latest
+delivery state (queued, sent, delivered, read, undelivered, failed).
+"""
+
+from typing import Optional
+
+from fastapi import APIRouter, Form, Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from api.utils.twilio_client import record_message_status, sender_stats
+from api.utils.webhook_guard import get_webhook_guard, request_url
+
+router = APIRouter()
+
+
+@router.post("/api/twilio/status")
+async def twilio_status_callback(
+    request: Request,
+    MessageSid: str = Form(...),
+    MessageStatus: str = Form(...),
+    To: Optional[str] = Form(None),
+    ErrorCode: Optional[str] = Form(None),
+    ErrorMessage: Optional[str] = Form(None)
+):
+    """
+    Record a message status update from Twilio.
+    
+    Args:
+        request: Raw request (for X-Twilio-Signature validation)
+        MessageSid: Twilio message SID
+        MessageStatus: New delivery state
+        To: Recipient (whatsapp:+E.164)
+        ErrorCode: Twilio error code for undelivered / failed messages
+        ErrorMessage: Error description, when Twilio sends one
+        
+    Returns:
+        Response: 204 (403 for a bad signature, 500 if the update could not be stored, so the failure is visible in Twilio's debugger)
+    """
+    form = await request.form()
+    if not get_webhook_guard().verify(request_url(request), form.multi_items(), request.headers.get("x-twilio-signature")):
+        print(f"Rejecting Twilio status callback for {MessageSid}: bad signature")
+        return Response(status_code=403)
+    try:
+        recorded = await run_in_threadpool(record_message_status, MessageSid, MessageStatus, ErrorCode, ErrorMessage, To)
+    except Exception as e:
+        print(f"Error recording Twilio status for {MessageSid}: {e}")
+        return Response(status_code=500)
+    if not recorded:
+        print(f"Ignoring unknown Twilio status '{MessageStatus}' for {MessageSid}")
+    return Response(status_code=204)
+
+
+@router.get("/api/twilio/stats")
+async def twilio_send_stats():
+    """Sends, retries, throttles and failures of this worker's Twilio send layer."""
+    return sender_stats()
@@ -0,0 +1,600 @@
+"""
+Cross-worker coordination for multi-worker deployments (uvicorn --workers N).
+Each worker keeps its own singletons and caches; this module is what keeps them
+correct together:
+- claim(key, ttl): first caller wins, across workers (webhook idempotency by MessageSid).
+- lock(key): FIFO lease lock (one lead's messages are processed one at a time, in
+  arrival order). The grant says whether another worker held the lock last, so the
+  new holder drops what it cached about the lead, and it first applies every event
+  the previous holder published.
+- publish(channel, event) / subscribe(channel, callback): fan-out of small JSON
+  events to every worker (takeover toggles, dashboard deltas).
+
+Backends (COORDINATION_URL):
+- memory://                     one worker (the default): locks and claims are in-process
+- sqlite:////path/coordination.db  several workers on one host, sharing a WAL-mode file
+                                   (the default when WEB_CONCURRENCY > 1)
+- redis://host:6379/0           several hosts; any Redis-compatible server (needs the redis package)
+"""
+
+import json
+import os
+import socket
+import sqlite3
+import tempfile
+import threading
+import time
+import uuid
+from collections import Counter, deque
+from contextlib import contextmanager
+from typing import Optional, Dict, List, Any, Callable, Iterator, Tuple
+
+
+LOCK_LEASE_SECONDS = float(os.getenv("COORDINATION_LOCK_LEASE_SECONDS", "60"))
+LOCK_WAIT_SECONDS = float(os.getenv("COORDINATION_LOCK_WAIT_SECONDS", "30"))
+POLL_SECONDS = float(os.getenv("COORDINATION_POLL_SECONDS", "0.02"))
+EVENT_RETENTION_SECONDS = float(os.getenv("COORDINATION_EVENT_RETENTION_SECONDS", "120"))
+MAX_MEMORY_CLAIMS = 200000
+MAINTENANCE_SECONDS = 10.0
+
+
+def worker_count() -> int:
+    """Worker processes serving the app (WEB_CONCURRENCY, as read by uvicorn --workers)."""
+    try:
+        return max(1, int(os.getenv("WEB_CONCURRENCY", "1")))
+    except ValueError:
+        return 1
+
+
+def default_coordination_url() -> str:
+    if worker_count() > 1:
+        return "sqlite:///" + os.path.join(tempfile.gettempdir(), "salesbot-coordination.db")
+    return "memory://"
+
+
+class CoordinationTimeout(Exception):
+    """A lock could not be acquired within its wait limit."""
+    pass
+
+
+class LockGrant:
+    """What the new holder of a lock needs to know about the previous one."""
+
+    __slots__ = ("key", "previous_owner", "handoff", "waited")
+
+    def __init__(self, key: str, previous_owner: Optional[str], handoff: bool, waited: float):
+        self.key = key
+        self.previous_owner = previous_owner
+        self.handoff = handoff
+        self.waited = waited
+
+
+class Coordinator:
+    """Shared behaviour: subscriber dispatch, the lock context manager and counters."""
+
+    shared = False
+
+    def __init__(self, worker_id: Optional[str] = None):
+        self.worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:6]}"
+        self._subscribers: Dict[str, List[Callable[[Dict[str, Any]], None]]] = {}
+        self._position_lock = threading.Lock()
+        self.published_position: Any = 0
+        self.counters: Counter = Counter()
+
+    def subscribe(self, channel: str, callback: Callable[[Dict[str, Any]], None]) -> None:
+        self._subscribers.setdefault(channel, []).append(callback)
+
+    def _deliver(self, channel: str, event: Dict[str, Any]) -> None:
+        for callback in list(self._subscribers.get(channel, ())):
+            try:
+                callback(event)
+            except Exception as e:
+                print(f"Coordination subscriber error on {channel}: {e}")
+
+    def _reset_subscribers(self) -> None:
+        """Events were missed (pruned before this worker read them): every channel resyncs."""
+        self.counters["resets"] += 1
+        for channel in list(self._subscribers):
+            self._deliver(channel, {"op": "RESET"})
+
+    @contextmanager
+    def lock(self, key: str, lease: float = LOCK_LEASE_SECONDS, wait: float = LOCK_WAIT_SECONDS) -> Iterator[LockGrant]:
+        """
+        Hold a FIFO lock on key.
+
+        Args:
+            key: Lock name (e.g. 'lead:447700900123')
+            lease: Seconds a holder (or waiter) that stops responding keeps its place
+            wait: Seconds to wait before raising CoordinationTimeout
+
+        Yields:
+            LockGrant: handoff is True when another worker held the lock last
+        """
+        token = uuid.uuid4().hex
+        started = time.perf_counter()
+        previous_owner, watermark = self._acquire(key, token, lease, wait)
+        handoff = bool(previous_owner) and previous_owner != self.worker_id
+        self.counters["locks"] += 1
+        if handoff:
+            self.counters["handoffs"] += 1
+            if watermark:
+                self.catch_up(watermark)
+        try:
+            yield LockGrant(key, previous_owner, handoff, time.perf_counter() - started)
+        finally:
+            self._release(key, token)
+
+    def _record_position(self, position: Any, newer: Callable[[Any, Any], bool]) -> None:
+        with self._position_lock:
+            if not self.published_position or newer(position, self.published_position):
+                self.published_position = position
+
+    # Backend interface
+    def claim(self, key: str, ttl: float) -> bool:
+        raise NotImplementedError
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        raise NotImplementedError
+
+    def catch_up(self, position: Any, timeout: float = 2.0) -> None:
+        pass
+
+    def _acquire(self, key: str, token: str, lease: float, wait: float) -> Tuple[Optional[str], Any]:
+        raise NotImplementedError
+
+    def _release(self, key: str, token: str) -> None:
+        raise NotImplementedError
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+    def stats(self) -> Dict[str, Any]:
+        return {"backend": type(self).__name__, "worker_id": self.worker_id, "workers": worker_count(), **self.counters}
+
+
+class MemoryCoordinator(Coordinator):
+    """Single-process coordination: claims in a dict, FIFO locks on a condition variable."""
+
+    def __init__(self, worker_id: Optional[str] = None, max_claims: int = MAX_MEMORY_CLAIMS):
+        super().__init__(worker_id)
+        self.max_claims = max_claims
+        self._claims: Dict[str, float] = {}
+        self._queues: Dict[str, deque] = {}
+        self._condition = threading.Condition()
+
+    def claim(self, key: str, ttl: float) -> bool:
+        now = time.monotonic()
+        with self._condition:
+            expires = self._claims.get(key)
+            if expires is not None and expires > now:
+                self.counters["duplicate_claims"] += 1
+                return False
+            self._claims.pop(key, None)
+            self._claims[key] = now + ttl
+            if len(self._claims) > self.max_claims:
+                # Insertion order is expiry order for a fixed ttl: drop the oldest tenth
+                for stale in list(self._claims)[: self.max_claims // 10]:
+                    del self._claims[stale]
+            return True
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        self._deliver(channel, event)
+
+    def _acquire(self, key: str, token: str, lease: float, wait: float) -> Tuple[Optional[str], Any]:
+        deadline = time.monotonic() + wait
+        with self._condition:
+            queue = self._queues.setdefault(key, deque())
+            queue.append(token)
+            while queue[0] != token:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    queue.remove(token)
+                    self._condition.notify_all()
+                    raise CoordinationTimeout(f"Timed out waiting {wait}s for {key}")
+                self._condition.wait(remaining)
+        return self.worker_id, None
+
+    def _release(self, key: str, token: str) -> None:
+        with self._condition:
+            queue = self._queues.get(key)
+            if queue is not None:
+                queue.remove(token)
+                if not queue:
+                    del self._queues[key]
+            self._condition.notify_all()
+
+
+_SQLITE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS claims (key TEXT PRIMARY KEY, expires_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS lock_queue (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, key TEXT NOT NULL, token TEXT NOT NULL, expires_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS lock_queue_key ON lock_queue (key, id);
+CREATE TABLE IF NOT EXISTS lock_meta (key TEXT PRIMARY KEY, owner TEXT, watermark INTEGER, updated_at REAL NOT NULL);
+CREATE TABLE IF NOT EXISTS events (
+    id INTEGER PRIMARY KEY AUTOINCREMENT, channel TEXT NOT NULL, origin TEXT NOT NULL,
+    payload TEXT NOT NULL, created_at REAL NOT NULL
+);
+"""
+
+
+class SQLiteCoordinator(Coordinator):
+    """
+    Workers on one host sharing a SQLite file (WAL mode; one short write transaction
+    per operation). Events are an append-only table polled every POLL_SECONDS and
+    pruned after EVENT_RETENTION_SECONDS; a worker that falls further behind resyncs.
+    """
+
+    shared = True
+
+    def __init__(self, path: str, worker_id: Optional[str] = None, poll_seconds: float = POLL_SECONDS,
+                 retention_seconds: float = EVENT_RETENTION_SECONDS):
+        """
+        Args:
+            path: Database file (created if missing)
+            worker_id: This worker's identity (default host:pid:random)
+            poll_seconds: Event poll interval (added latency for other workers' events)
+            retention_seconds: How long events are kept for slow pollers
+        """
+        super().__init__(worker_id)
+        self.path = path
+        self.poll_seconds = poll_seconds
+        self.retention_seconds = retention_seconds
+        self._local = threading.local()
+        self._poll_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._held: Dict[str, int] = {}
+        self._conn().executescript(_SQLITE_SCHEMA)
+        # Start after the last id ever assigned (the table itself may have been pruned empty)
+        self._applied = self._conn().execute(
+            "SELECT COALESCE((SELECT seq FROM sqlite_sequence WHERE name = 'events'), 0)"
+        ).fetchone()[0]
+
+    def _conn(self) -> sqlite3.Connection:
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(self.path, timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+
+    @contextmanager
+    def _transaction(self) -> Iterator[sqlite3.Connection]:
+        conn = self._conn()
+        conn.execute("BEGIN IMMEDIATE")
+        try:
+            yield conn
+        except BaseException:
+            conn.execute("ROLLBACK")
+            raise
+        conn.execute("COMMIT")
+
+    def claim(self, key: str, ttl: float) -> bool:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM claims WHERE key = ? AND expires_at < ?", (key, now))
+            claimed = conn.execute("INSERT OR IGNORE INTO claims (key, expires_at) VALUES (?, ?)", (key, now + ttl)).rowcount == 1
+        if not claimed:
+            self.counters["duplicate_claims"] += 1
+        return claimed
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        payload = json.dumps(event, separators=(",", ":"), default=str)
+        position = self._conn().execute(
+            "INSERT INTO events (channel, origin, payload, created_at) VALUES (?, ?, ?, ?)",
+            (channel, self.worker_id, payload, time.time()),
+        ).lastrowid
+        self._record_position(position, lambda a, b: a > b)
+        self.counters["published"] += 1
+        self._deliver(channel, event)
+
+    def _poll(self) -> int:
+        """Apply other workers' new events; returns how many rows were read."""
+        with self._poll_lock:
+            rows = self._conn().execute(
+                "SELECT id, channel, origin, payload FROM events WHERE id > ? ORDER BY id LIMIT 1000", (self._applied,)
+            ).fetchall()
+            if rows and rows[0][0] > self._applied + 1:
+                # Ids are assigned by the single writer in commit order: a gap means events were pruned unread
+                self._reset_subscribers()
+            for position, channel, origin, payload in rows:
+                if origin != self.worker_id:
+                    self._deliver(channel, json.loads(payload))
+                    self.counters["received"] += 1
+                self._applied = position
+            return len(rows)
+
+    def catch_up(self, position: Any, timeout: float = 2.0) -> None:
+        """Apply events up to position (published by the previous lock holder) before continuing."""
+        deadline = time.monotonic() + timeout
+        while self._applied < position and time.monotonic() < deadline:
+            if not self._poll():
+                break
+
+    def _acquire(self, key: str, token: str, lease: float, wait: float) -> Tuple[Optional[str], Any]:
+        deadline = time.monotonic() + wait
+        delay = 0.001
+        entry: Optional[int] = None
+        while True:
+            now = time.time()
+            with self._transaction() as conn:
+                if entry is not None:
+                    conn.execute("DELETE FROM lock_queue WHERE key = ? AND expires_at < ? AND id != ?", (key, now, entry))
+                    if conn.execute("UPDATE lock_queue SET expires_at = ? WHERE id = ?", (now + lease, entry)).rowcount == 0:
+                        entry = None  # Reaped while stalled: rejoin at the back
+                if entry is None:
+                    entry = conn.execute(
+                        "INSERT INTO lock_queue (key, token, expires_at) VALUES (?, ?, ?)", (key, token, now + lease)
+                    ).lastrowid
+                head = conn.execute("SELECT min(id) FROM lock_queue WHERE key = ?", (key,)).fetchone()[0]
+                if head == entry:
+                    row = conn.execute("SELECT owner, watermark FROM lock_meta WHERE key = ?", (key,)).fetchone()
+                    conn.execute(
+                        "INSERT INTO lock_meta (key, owner, watermark, updated_at) VALUES (?, ?, ?, ?) "
+                        "ON CONFLICT (key) DO UPDATE SET owner = excluded.owner, updated_at = excluded.updated_at",
+                        (key, self.worker_id, row[1] if row else 0, now),
+                    )
+                    self._held[token] = entry
+                    return (row[0], row[1]) if row else (None, 0)
+            if time.monotonic() >= deadline:
+                with self._transaction() as conn:
+                    conn.execute("DELETE FROM lock_queue WHERE id = ?", (entry,))
+                raise CoordinationTimeout(f"Timed out waiting {wait}s for {key}")
+            self.counters["lock_polls"] += 1
+            time.sleep(delay)
+            delay = min(delay * 2, self.poll_seconds)
+
+    def _release(self, key: str, token: str) -> None:
+        entry = self._held.pop(token, None)
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM lock_queue WHERE id = ?", (entry,))
+            conn.execute(
+                "UPDATE lock_meta SET watermark = ?, updated_at = ? WHERE key = ? AND owner = ?",
+                (self.published_position or 0, time.time(), key, self.worker_id),
+            )
+
+    def _maintain(self) -> None:
+        now = time.time()
+        with self._transaction() as conn:
+            conn.execute("DELETE FROM claims WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM lock_queue WHERE expires_at < ?", (now,))
+            conn.execute("DELETE FROM lock_meta WHERE updated_at < ?", (now - 86400,))
+            conn.execute("DELETE FROM events WHERE created_at < ?", (now - self.retention_seconds,))
+
+    def _run(self) -> None:
+        next_maintenance = time.monotonic()
+        while not self._stopped.is_set():
+            try:
+                if self._poll() < 1000:
+                    self._stopped.wait(self.poll_seconds)
+                if time.monotonic() >= next_maintenance:
+                    self._maintain()
+                    next_maintenance = time.monotonic() + MAINTENANCE_SECONDS
+            except sqlite3.Error as e:
+                print(f"Coordination poll failed: {e}")
+                self._stopped.wait(1.0)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="coordination-poll", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def stats(self) -> Dict[str, Any]:
+        return {**super().stats(), "path": self.path, "applied_position": self._applied}
+
+
+# KEYS: queue list, token -> expiry hash, lock meta hash.
+# ARGV: token, now, lease, worker id. Joins the queue (or refreshes its lease), drops
+# expired holders at the head, and reports the previous owner once at the head.
+_REDIS_ACQUIRE = """
+local queue, expiries, meta = KEYS[1], KEYS[2], KEYS[3]
+local token, now, lease, worker = ARGV[1], tonumber(ARGV[2]), tonumber(ARGV[3]), ARGV[4]
+if redis.call('HSET', expiries, token, now + lease) == 1 then
+  redis.call('RPUSH', queue, token)
+end
+while true do
+  local head = redis.call('LINDEX', queue, 0)
+  if (not head) or head == token or tonumber(redis.call('HGET', expiries, head) or '0') >= now then
+    break
+  end
+  redis.call('LPOP', queue)
+  redis.call('HDEL', expiries, head)
+end
+local ttl = math.ceil(lease * 2000)
+redis.call('PEXPIRE', queue, ttl)
+redis.call('PEXPIRE', expiries, ttl)
+if redis.call('LINDEX', queue, 0) ~= token then
+  return {0}
+end
+local previous = redis.call('HMGET', meta, 'owner', 'watermark')
+redis.call('HSET', meta, 'owner', worker)
+redis.call('EXPIRE', meta, 86400)
+return {1, previous[1] or '', previous[2] or ''}
+"""
+
+# KEYS: queue, expiries, meta. ARGV: token, worker id, watermark.
+_REDIS_RELEASE = """
+redis.call('LREM', KEYS[1], 1, ARGV[1])
+redis.call('HDEL', KEYS[2], ARGV[1])
+if redis.call('HGET', KEYS[3], 'owner') == ARGV[2] then
+  redis.call('HSET', KEYS[3], 'watermark', ARGV[3])
+end
+"""
+
+
+def _stream_position(entry_id: Any) -> Tuple[int, int]:
+    if isinstance(entry_id, bytes):
+        entry_id = entry_id.decode()
+    millis, _, sequence = str(entry_id or "0-0").partition("-")
+    return int(millis), int(sequence or 0)
+
+
+class RedisCoordinator(Coordinator):
+    """
+    Workers on any number of hosts sharing a Redis-compatible server: SET NX claims,
+    Lua-scripted FIFO locks and one capped stream of events read with blocking XREAD.
+    """
+
+    shared = True
+
+    def __init__(self, url: str, worker_id: Optional[str] = None, prefix: str = "salesbot:coord",
+                 max_events: int = 100000):
+        """
+        Args:
+            url: redis:// or rediss:// URL
+            worker_id: This worker's identity (default host:pid:random)
+            prefix: Key prefix
+            max_events: Approximate stream length kept for slow readers
+        """
+        import redis
+
+        super().__init__(worker_id)
+        self.redis = redis.Redis.from_url(url)
+        self.prefix = prefix
+        self.max_events = max_events
+        self.stream = f"{prefix}:events"
+        self._acquire_script = self.redis.register_script(_REDIS_ACQUIRE)
+        self._release_script = self.redis.register_script(_REDIS_RELEASE)
+        self._poll_lock = threading.Lock()
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        last = self.redis.xrevrange(self.stream, count=1)
+        self._applied = last[0][0].decode() if last else "0-0"
+
+    def _lock_keys(self, key: str) -> List[str]:
+        return [f"{self.prefix}:lock:{key}:queue", f"{self.prefix}:lock:{key}:expiries", f"{self.prefix}:lock:{key}:meta"]
+
+    def claim(self, key: str, ttl: float) -> bool:
+        claimed = bool(self.redis.set(f"{self.prefix}:claim:{key}", 1, nx=True, px=max(1, int(ttl * 1000))))
+        if not claimed:
+            self.counters["duplicate_claims"] += 1
+        return claimed
+
+    def publish(self, channel: str, event: Dict[str, Any]) -> None:
+        payload = json.dumps(event, separators=(",", ":"), default=str)
+        entry_id = self.redis.xadd(
+            self.stream, {"channel": channel, "origin": self.worker_id, "payload": payload},
+            maxlen=self.max_events, approximate=True,
+        ).decode()
+        self._record_position(entry_id, lambda a, b: _stream_position(a) > _stream_position(b))
+        self.counters["published"] += 1
+        self._deliver(channel, event)
+
+    def _poll(self, block_ms: Optional[int] = None) -> int:
+        with self._poll_lock:
+            response = self.redis.xread({self.stream: self._applied}, count=1000, block=block_ms)
+            entries = response[0][1] if response else []
+            for entry_id, fields in entries:
+                if fields[b"origin"].decode() != self.worker_id:
+                    self._deliver(fields[b"channel"].decode(), json.loads(fields[b"payload"]))
+                    self.counters["received"] += 1
+                self._applied = entry_id.decode()
+            return len(entries)
+
+    def catch_up(self, position: Any, timeout: float = 2.0) -> None:
+        deadline = time.monotonic() + timeout
+        while _stream_position(self._applied) < _stream_position(position) and time.monotonic() < deadline:
+            if not self._poll():
+                break
+
+    def _acquire(self, key: str, token: str, lease: float, wait: float) -> Tuple[Optional[str], Any]:
+        deadline = time.monotonic() + wait
+        delay = 0.001
+        keys = self._lock_keys(key)
+        while True:
+            result = self._acquire_script(keys=keys, args=[token, time.time(), lease, self.worker_id])
+            if result[0] == 1:
+                owner = result[1].decode() if result[1] else None
+                watermark = result[2].decode() if result[2] else None
+                return owner, watermark
+            if time.monotonic() >= deadline:
+                self._release_script(keys=keys, args=[token, "", ""])
+                raise CoordinationTimeout(f"Timed out waiting {wait}s for {key}")
+            self.counters["lock_polls"] += 1
+            time.sleep(delay)
+            delay = min(delay * 2, POLL_SECONDS)
+
+    def _release(self, key: str, token: str) -> None:
+        self._release_script(keys=self._lock_keys(key), args=[token, self.worker_id, self.published_position or ""])
+
+    def _run(self) -> None:
+        while not self._stopped.is_set():
+            try:
+                self._poll(block_ms=1000)
+            except Exception as e:
+                print(f"Coordination stream read failed: {e}")
+                self._stopped.wait(1.0)
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="coordination-stream", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+
+def create_coordinator(url: str) -> Coordinator:
+    """
+    Build a backend from a COORDINATION_URL.
+
+    Raises:
+        ValueError: For an unsupported scheme
+    """
+    if url.startswith("memory:"):
+        return MemoryCoordinator()
+    if url.startswith("sqlite:///"):
+        return SQLiteCoordinator(url[len("sqlite:///"):])
+    if url.startswith(("redis://", "rediss://", "unix://")):
+        return RedisCoordinator(url)
+    raise ValueError(f"Unsupported COORDINATION_URL: {url}")
+
+
+class ChangeFeedRelay:
+    """
+    Carries a change feed's events to every worker: publish() goes through the
+    coordinator and arrives at each worker's feed subscribers (see takeover.py).
+    """
+
+    def __init__(self, feed: Any, channel: str, coordinator: Coordinator):
+        self.feed = feed
+        self.channel = channel
+        self.coordinator = coordinator
+        coordinator.subscribe(channel, feed.publish)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        self.coordinator.publish(self.channel, event)
+
+
+# Singleton
+_coordinator: Optional[Coordinator] = None
+_coordinator_lock = threading.Lock()
+
+
+def get_coordinator() -> Coordinator:
+    global _coordinator
+    if _coordinator is None:
+        with _coordinator_lock:
+            if _coordinator is None:
+                url = os.getenv("COORDINATION_URL") or default_coordination_url()
+                _coordinator = create_coordinator(url)
+                _coordinator.start()
+                if worker_count() > 1 and not _coordinator.shared:
+                    print("⚠️ WEB_CONCURRENCY > 1 with COORDINATION_URL=memory://: "
+                          "lead ordering and webhook idempotency only hold within each worker")
+                else:
+                    print(f"🔗 Coordination: {type(_coordinator).__name__} ({worker_count()} workers)")
+    return _coordinator
+
+
+def stop_coordinator() -> None:
+    if _coordinator is not None:
+        _coordinator.stop()
@@ -0,0 +1,220 @@
+"""
+In-process fan-out of compact conversation deltas to dashboard viewers.
+lead_manager publishes message and status deltas as it writes them; each SSE client
+holds a bounded queue filtered by tenant and/or lead. A client that falls behind
+loses its backlog and receives a single 'resync' event (refetch via /api/leads),
+so one slow viewer never grows memory or slows the publisher.
+With a shared coordinator (several workers) deltas go through its dashboard_events
+channel, so a viewer connected to any worker sees every worker's writes.
+"""
+
+import asyncio
+import itertools
+import json
+import os
+import threading
+from collections import deque
+from typing import Optional, Dict, Any
+
+from api.utils.coordination import get_coordinator
+
+
+CLIENT_QUEUE_SIZE = int(os.getenv("EVENT_STREAM_QUEUE_SIZE", "256"))
+HEARTBEAT_SECONDS = float(os.getenv("EVENT_STREAM_HEARTBEAT", "15"))
+DASHBOARD_CHANNEL = "dashboard_events"
+
+
+class Subscription:
+    """One viewer's bounded event queue."""
+
+    def __init__(
+        self,
+        broker: "EventBroker",
+        loop: asyncio.AbstractEventLoop,
+        tenant_id: Optional[str],
+        lead_id: Optional[str],
+        max_queue: int
+    ):
+        self.id = next(broker._ids)
+        self.broker = broker
+        self.loop = loop
+        self.tenant_id = tenant_id
+        self.lead_id = lead_id
+        self.queue: deque = deque(maxlen=max_queue)
+        self.overflowed = False
+        self.dropped = 0
+        self._ready = asyncio.Event()
+
+    def matches(self, event: Dict[str, Any]) -> bool:
+        if self.lead_id and event.get("lead_id") != self.lead_id:
+            return False
+        if self.tenant_id and event.get("tenant_id") != self.tenant_id:
+            return False
+        return True
+
+    def _deliver(self, event: Dict[str, Any]) -> None:
+        # Runs on the subscriber's loop
+        if len(self.queue) == self.queue.maxlen:
+            self.dropped += len(self.queue) + 1
+            self.queue.clear()
+            self.overflowed = True
+        else:
+            self.queue.append(event)
+        self._ready.set()
+
+    async def next_event(self, timeout: Optional[float] = None) -> Optional[Dict[str, Any]]:
+        """
+        Wait for the next event. Returns None on timeout (send a heartbeat) and
+        {'type': 'resync'} after an overflow.
+        """
+        if not self.queue and not self.overflowed:
+            self._ready.clear()
+            try:
+                await asyncio.wait_for(self._ready.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.overflowed:
+            self.overflowed = False
+            return {"type": "resync", "dropped": self.dropped}
+        return self.queue.popleft() if self.queue else None
+
+    def _resync(self) -> None:
+        # Runs on the subscriber's loop
+        self.dropped += len(self.queue)
+        self.queue.clear()
+        self.overflowed = True
+        self._ready.set()
+
+    def close(self) -> None:
+        self.broker.unsubscribe(self)
+
+
+class EventBroker:
+    """Thread-safe publisher; delivery hops onto each subscriber's event loop."""
+
+    def __init__(self, max_queue: int = CLIENT_QUEUE_SIZE):
+        self.max_queue = max_queue
+        self._subscriptions: Dict[int, Subscription] = {}
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.published = 0
+
+    def subscribe(self, tenant_id: Optional[str] = None, lead_id: Optional[str] = None) -> Subscription:
+        """Register a viewer (must be called from the viewer's event loop)."""
+        subscription = Subscription(self, asyncio.get_running_loop(), tenant_id, lead_id, self.max_queue)
+        with self._lock:
+            self._subscriptions[subscription.id] = subscription
+        return subscription
+
+    def unsubscribe(self, subscription: Subscription) -> None:
+        with self._lock:
+            self._subscriptions.pop(subscription.id, None)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        """Fan an event out to matching subscribers (callable from any thread)."""
+        with self._lock:
+            targets = [s for s in self._subscriptions.values() if s.matches(event)]
+        self.published += 1
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._deliver, event)
+            except RuntimeError:
+                # Loop closed underneath a stale subscription
+                self.unsubscribe(subscription)
+
+    def apply_shared(self, event: Dict[str, Any]) -> None:
+        """An event from the coordinator; a RESET (events were missed) sends every viewer a resync."""
+        if event.get("op") != "RESET":
+            self.publish(event)
+            return
+        with self._lock:
+            targets = list(self._subscriptions.values())
+        for subscription in targets:
+            try:
+                subscription.loop.call_soon_threadsafe(subscription._resync)
+            except RuntimeError:
+                self.unsubscribe(subscription)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            subscriptions = list(self._subscriptions.values())
+        return {
+            "subscribers": len(subscriptions),
+            "published": self.published,
+            "queued": sum(len(s.queue) for s in subscriptions),
+            "dropped": sum(s.dropped for s in subscriptions),
+        }
+
+
+def format_sse(event: Dict[str, Any]) -> str:
+    """Encode an event as an SSE frame."""
+    return f"event: {event.get('type', 'message')}\ndata: {json.dumps(event, separators=(',', ':'), default=str)}\n\n"
+
+
+def message_delta(lead: Dict[str, Any], row: Dict[str, Any]) -> Dict[str, Any]:
+    return {
+        "type": "message",
+        "tenant_id": lead.get("tenant_id"),
+        "lead_id": lead.get("id"),
+        "id": row.get("id"),
+        "sender_type": row.get("sender_type"),
+        "content": row.get("content"),
+        "ts": row.get("timestamp"),
+    }
+
+
+def status_delta(lead: Dict[str, Any], status: str) -> Dict[str, Any]:
+    return {
+        "type": "status",
+        "tenant_id": lead.get("tenant_id"),
+        "lead_id": lead.get("id"),
+        "status": status,
+    }
+
+
+def score_delta(lead_id: str, tenant_id: Optional[str], score: int) -> Dict[str, Any]:
+    return {
+        "type": "score",
+        "tenant_id": tenant_id,
+        "lead_id": lead_id,
+        "priority_score": score,
+    }
+
+
+# Singleton instance
+_broker: Optional[EventBroker] = None
+_broker_lock = threading.Lock()
+
+
+def get_event_broker() -> EventBroker:
+    """
+    Get or create the process-wide event broker.
+
+    Returns:
+        EventBroker: Shared broker
+    """
+    global _broker
+
+    if _broker is None:
+        with _broker_lock:
+            if _broker is None:
+                broker = EventBroker()
+                coordinator = get_coordinator()
+                if coordinator.shared:
+                    coordinator.subscribe(DASHBOARD_CHANNEL, broker.apply_shared)
+                _broker = broker
+
+    return _broker
+
+
+def publish_event(event: Dict[str, Any]) -> None:
+    """Publish without letting a broker error affect the caller's write."""
+    try:
+        broker = get_event_broker()
+        coordinator = get_coordinator()
+        if coordinator.shared:
+            coordinator.publish(DASHBOARD_CHANNEL, event)
+        else:
+            broker.publish(event)
+    except Exception as e:
+        print(f"Error publishing event: {e}")
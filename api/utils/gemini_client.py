@@ -3,10 +3,8 @@ Enhanced Gemini 3 Pro client with distance objection detection and qualification
 Implements reasoning mode with status-aware response generation.
 """
 
-import os
 import re
 from typing import Optional, Dict, Any
-import google.generativeai as genai
 from dotenv import load_dotenv
 from api.utils.sales_prompts import (
     SALES_PERSONA_PROMPT,
@@ -17,11 +15,24 @@ from api.utils.sales_prompts import (
     get_qualification_questions
 )
 from api.utils.lead_manager import format_messages_for_ai
+from api.utils.knowledge_base import get_knowledge_base, format_knowledge_context
+from api.utils.token_budget import PromptSegment, build_prompt, get_plan_budget, estimate_tokens, record_usage
+from api.utils.model_router import ModelRouter
 
 load_dotenv()
 
-# Configure Gemini API
-genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+GENERATION_CONFIG = {
+    "temperature": 0.7,
+    "top_p": 0.95,
+    "top_k": 40,
+    "max_output_tokens": 500,  # Keep SMS responses concise
+}
+
+# Classification is short and should be deterministic
+ANALYSIS_CONFIG = {
+    "temperature": 0.0,
+    "max_output_tokens": 100,
+}
 
 
 class GeminiSalesAgent:
@@ -30,19 +41,17 @@ class GeminiSalesAgent:
     Enhanced with distance objection detection and qualification workflow.
     """
     
-    def __init__(self):
-        """Initialize Gemini model with reasoning configuration."""
-        self.model = genai.GenerativeModel(
-            model_name="gemini-2.0-flash-thinking-exp-1219",  # Gemini 3 Pro with thinking
-            generation_config={
-                "temperature": 0.7,
-                "top_p": 0.95,
-                "top_k": 40,
-                "max_output_tokens": 500,  # Keep SMS responses concise
-            }
-        )
+    def __init__(self, router: Optional[ModelRouter] = None):
+        """
+        Initialize the model router.
+        The 'fast' tier handles analyze_message, the 'reply' tier (thinking model first) handles replies.
+        
+        Args:
+            router: Optional preconfigured router (e.g. backed by FakeModel in tests)
+        """
+        self.router = router or ModelRouter()
     
-    def analyze_message(self, message: str, current_status: str) -> Dict[str, Any]:
+    def analyze_message(self, message: str, current_status: str, priority: str = "live") -> Dict[str, Any]:
         """
         Analyze incoming message to detect intent, objections, and next actions.
         This is the "thinking step" before generating response.
@@ -50,6 +59,7 @@ class GeminiSalesAgent:
         Args:
             message: Lead's incoming message
             current_status: Current lead status
+            priority: Rate limiter priority ('live', 'followup' or 'simulation')
             
         Returns:
             dict: Analysis with intent, objection_type, sentiment, suggested_status
@@ -74,8 +84,10 @@ Suggested_Status: [New/Qualifying/Booking_Offered/Booked/Objection_Distance/Huma
 """
         
         try:
-            response = self.model.generate_content(analysis_prompt)
-            analysis_text = response.text
+            analysis_text = self.router.generate(
+                "fast", analysis_prompt, generation_config=ANALYSIS_CONFIG, priority=priority
+            )
+            record_usage(estimate_tokens(analysis_prompt), estimate_tokens(analysis_text))
             
             # Parse response
             intent_match = re.search(r'Intent:\s*(\w+)', analysis_text, re.IGNORECASE)
@@ -118,7 +130,9 @@ Suggested_Status: [New/Qualifying/Booking_Offered/Booked/Objection_Distance/Huma
         message_history: list,
         lead_name: Optional[str] = None,
         current_status: str = "New",
-        analysis: Optional[Dict[str, Any]] = None
+        analysis: Optional[Dict[str, Any]] = None,
+        plan: Optional[str] = None,
+        priority: str = "live"
     ) -> str:
         """
         Generate context-aware sales response using Gemini 3 Pro.
@@ -129,6 +143,8 @@ Suggested_Status: [New/Qualifying/Booking_Offered/Booked/Objection_Distance/Huma
             lead_name: Lead's name if known
             current_status: Current lead status
             analysis: Pre-computed message analysis
+            plan: Tenant plan, selects the input/output token budget
+            priority: Rate limiter priority ('live', 'followup' or 'simulation')
             
         Returns:
             str: AI-generated response
@@ -181,6 +197,9 @@ CRITICAL CONTEXT RULES:
             if analysis["intent"] == "stop":
                 analysis_context += "\n\nIMPORTANT: Customer wants to opt out. Acknowledge politely and confirm removal."
         
+        # Pull only the studio reference sections relevant to this message
+        knowledge_context = format_knowledge_context(get_knowledge_base().search(incoming_message))
+        
         # Add status-specific guidance
         status_guidance = ""
         if current_status == "New":
@@ -190,23 +209,35 @@ CRITICAL CONTEXT RULES:
         elif current_status == "Booking_Offered":
             status_guidance = "\n\nNEXT STEP: Confirm their slot selection or handle any remaining objections."
         
-        prompt = f"""{SALES_PERSONA_PROMPT}
-
-{name_context}
-{status_context}
-
-{context}
-{context_validation}
-
-Customer's latest message: "{incoming_message}"
-{analysis_context}
-{status_guidance}
-
-Generate your response (concise but informative, WhatsApp allows up to 4,096 characters):"""
+        # Assemble prompt segments by priority and fit them to the tenant's budget
+        input_budget, output_tokens = get_plan_budget(plan)
+        segments = [
+            PromptSegment("persona", SALES_PERSONA_PROMPT, priority=100, required=True),
+            PromptSegment("lead", f"{name_context}\n{status_context}", priority=95, required=True),
+            PromptSegment("history", context, priority=50, trim="tail"),
+            PromptSegment("rules", context_validation.strip(), priority=90, required=True),
+            PromptSegment("message", f'Customer\'s latest message: "{incoming_message}"', priority=100, required=True),
+            PromptSegment("analysis", analysis_context.strip(), priority=70),
+            PromptSegment("guidance", status_guidance.strip(), priority=60),
+            PromptSegment("knowledge", knowledge_context, priority=55, trim="head"),
+            PromptSegment(
+                "instruction",
+                "Generate your response (concise but informative, WhatsApp allows up to 4,096 characters):",
+                priority=100,
+                required=True
+            ),
+        ]
+        prompt, breakdown = build_prompt(segments, input_budget, label="generate_response")
         
         try:
-            response = self.model.generate_content(prompt)
-            return response.text.strip()
+            response_text = self.router.generate(
+                "reply",
+                prompt,
+                generation_config={**GENERATION_CONFIG, "max_output_tokens": output_tokens},
+                priority=priority
+            )
+            record_usage(breakdown["total"], estimate_tokens(response_text))
+            return response_text.strip()
         except Exception as e:
             print(f"Error generating response: {e}")
             # Fallback response
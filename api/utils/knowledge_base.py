@@ -0,0 +1,401 @@
+"""
+Studio knowledge registry for the sales agent.
+Loads the operational reference texts into sectioned, indexed snippets once,
+hot-reloads files whose mtime changes and selects only the sections relevant to a message.
+"""
+
+import math
+import os
+import re
+import threading
+import time
+from dataclasses import dataclass
+from typing import Optional, Dict, List, Set, Tuple
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Repository root (the reference texts live next to main.py)
+_DEFAULT_KNOWLEDGE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+KNOWLEDGE_DIR = os.getenv("KNOWLEDGE_DIR", _DEFAULT_KNOWLEDGE_DIR)
+
+# Files loaded into the registry, relative to KNOWLEDGE_DIR
+KNOWLEDGE_FILES = [
+    "kentish_town_logistics.txt",
+    "local_knowledge.md",
+    "STUDIO IDENTITY THE KENTISH TOWN HU.txt",
+    "wardrobe_and_prep_standards.txt",
+    "features/wardrobe_and_prep_standards.txt",
+    "safeguarding_policy_summary.txt",
+    "features/safeguarding_policy_summary.txt",
+    "parent.txt",
+    "mature-market.txt",
+    "DEMOGRAPHIC-SPECIFIC REASSURANCE.txt",
+    "current_market_briefs_2026.txt",
+    "ethics_and_transparency.txt",
+    "features/ethics_and_compliance.txt",
+    "post_booking_comms.txt",
+    "appointment_retention_logic.txt",
+]
+
+# Seconds between mtime checks (hot reload without a restart)
+RELOAD_CHECK_INTERVAL = float(os.getenv("KNOWLEDGE_RELOAD_INTERVAL", "5"))
+
+# Longest snippet kept as one section before it is split on line boundaries
+MAX_SNIPPET_CHARS = 700
+
+STOPWORDS = {
+    "the", "and", "for", "are", "but", "not", "you", "your", "yours", "with", "this", "that",
+    "have", "has", "had", "was", "were", "will", "would", "can", "could", "should", "what",
+    "when", "where", "which", "who", "how", "why", "there", "their", "they", "them", "then",
+    "than", "just", "into", "from", "about", "our", "out", "all", "any", "get", "got", "its",
+    "it's", "i'm", "i've", "don't", "does", "did", "doing", "also", "very", "some", "more",
+    "been", "being", "here", "over", "only", "like", "want", "need", "know", "yes", "okay",
+    "please", "thanks", "thank", "hi", "hey", "hello", "we're", "you're", "we", "me", "my",
+    "great", "good", "cool", "sure", "fine", "nice", "perfect", "lovely", "sound", "sounds",
+    "name", "time", "before", "later", "maybe", "done", "day", "today", "tomorrow", "week",
+}
+
+# Message vocabulary that the reference texts phrase differently
+QUERY_SYNONYMS = {
+    "wear": ["wardrobe", "outfit", "clothes", "look"],
+    "clothes": ["wardrobe", "outfit", "look"],
+    "outfit": ["wardrobe", "clothes", "look"],
+    "bring": ["wardrobe", "look"],
+    "drive": ["parking", "car"],
+    "car": ["parking"],
+    "park": ["parking"],
+    "tube": ["station", "transport"],
+    "train": ["station", "transport"],
+    "bus": ["transport"],
+    "kid": ["child", "children", "parent"],
+    "son": ["child", "children", "parent"],
+    "daughter": ["child", "children", "parent"],
+    "child": ["children", "parent", "chaperone"],
+    "mum": ["parent", "guardian"],
+    "mom": ["parent", "guardian"],
+    "dad": ["parent", "guardian"],
+    "safe": ["safeguarding", "safety", "chaperone"],
+    "old": ["mature", "age"],
+    "age": ["mature"],
+    "makeup": ["hair", "natural"],
+    "scam": ["agency", "legitimate", "guarantee"],
+    "legit": ["agency", "legitimate", "guarantee"],
+    "cancel": ["reschedule", "slot"],
+    "job": ["agency", "guarantee"],
+}
+
+_TOKEN_RE = re.compile(r"[a-z0-9']+")
+_HEADING_RE = re.compile(r"^\s*#{1,6}\s*(.+?)\s*$")
+_LABEL_RE = re.compile(r"^\s*(?:\d+\.\s*)?([A-Za-z][A-Za-z '&/()\-]{1,60}?):\s*(.*)$")
+
+
+@dataclass(frozen=True)
+class KnowledgeSnippet:
+    """One indexed section of a reference file."""
+    source: str
+    title: str
+    text: str
+
+
+def _stem(token: str) -> str:
+    """Cheap suffix stripping so 'parking'/'parked'/'parks' share a term."""
+    for suffix in ("ing", "ed", "es", "s"):
+        if len(token) > len(suffix) + 3 and token.endswith(suffix):
+            return token[: -len(suffix)]
+    return token
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Split text into normalized index terms.
+
+    Args:
+        text: Raw text
+
+    Returns:
+        list: Lowercased, stemmed terms with stopwords removed
+    """
+    return [
+        _stem(token.strip("'"))
+        for token in _TOKEN_RE.findall(text.lower().replace("’", "'"))
+        if len(token) > 2 and token not in STOPWORDS
+    ]
+
+
+def _is_heading(line: str) -> bool:
+    """Detect standalone header lines such as 'LEGAL BOUNDARIES:' or '## Parking'."""
+    stripped = line.strip()
+    if not stripped or len(stripped) > 80:
+        return False
+    if _HEADING_RE.match(stripped):
+        return True
+    letters = [c for c in stripped if c.isalpha()]
+    return bool(letters) and stripped.upper() == stripped and (stripped.endswith(":") or len(stripped.split()) <= 8)
+
+
+def split_sections(source: str, text: str) -> List[KnowledgeSnippet]:
+    """
+    Split a reference file into titled snippets.
+    Markdown headings and all-caps header lines start a new section; blank-line
+    separated blocks become individual snippets under the current section.
+
+    Args:
+        source: File name the text came from
+        text: File contents
+
+    Returns:
+        list: KnowledgeSnippet entries in file order
+    """
+    snippets: List[KnowledgeSnippet] = []
+    section = os.path.splitext(os.path.basename(source))[0].replace("_", " ")
+    blocks = re.split(r"\n\s*\n", text.replace("\r\n", "\n"))
+
+    for block in blocks:
+        lines = [line.rstrip() for line in block.strip().split("\n") if line.strip()]
+
+        # Leading header lines rename the section
+        while lines and _is_heading(lines[0]):
+            heading = lines.pop(0).strip()
+            heading_match = _HEADING_RE.match(heading)
+            section = (heading_match.group(1) if heading_match else heading).rstrip(":").strip()
+
+        if not lines:
+            continue
+
+        # 'Parking: "..."' style blocks carry their own label
+        title = section
+        label_match = _LABEL_RE.match(lines[0])
+        if label_match and label_match.group(2):
+            title = f"{section} - {label_match.group(1).strip()}"
+
+        # Keep snippets small enough to be cheap in a prompt
+        chunk: List[str] = []
+        chunk_len = 0
+        for line in lines:
+            if chunk and chunk_len + len(line) > MAX_SNIPPET_CHARS:
+                snippets.append(KnowledgeSnippet(source, title, "\n".join(chunk)))
+                chunk, chunk_len = [], 0
+            chunk.append(line)
+            chunk_len += len(line) + 1
+        if chunk:
+            snippets.append(KnowledgeSnippet(source, title, "\n".join(chunk)))
+
+    return snippets
+
+
+class KnowledgeBase:
+    """
+    In-memory registry of studio reference snippets with an inverted index.
+    Files are read once; afterwards only their mtimes are checked (at most every
+    RELOAD_CHECK_INTERVAL seconds) and changed files are re-indexed in place.
+    """
+
+    def __init__(
+        self,
+        base_dir: str = KNOWLEDGE_DIR,
+        files: Optional[List[str]] = None,
+        reload_interval: float = RELOAD_CHECK_INTERVAL
+    ):
+        """
+        Initialize the registry and load all files.
+
+        Args:
+            base_dir: Directory the file names are relative to
+            files: Reference files to load (defaults to KNOWLEDGE_FILES)
+            reload_interval: Minimum seconds between mtime checks
+        """
+        self.base_dir = base_dir
+        self.files = list(files if files is not None else KNOWLEDGE_FILES)
+        self.reload_interval = reload_interval
+
+        self._lock = threading.Lock()
+        self._mtimes: Dict[str, float] = {}
+        self._file_snippets: Dict[str, List[KnowledgeSnippet]] = {}
+        self._last_check = 0.0
+
+        # Index state, swapped atomically on rebuild
+        self._snippets: List[KnowledgeSnippet] = []
+        self._postings: Dict[str, Set[int]] = {}
+        self._title_terms: List[Set[str]] = []
+        self._idf: Dict[str, float] = {}
+
+        self.reload(force=True)
+
+    @property
+    def snippets(self) -> List[KnowledgeSnippet]:
+        """All indexed snippets."""
+        return self._snippets
+
+    def _load_file(self, name: str) -> Optional[Tuple[float, List[KnowledgeSnippet]]]:
+        """Read and section one file, returning (mtime, snippets) or None if missing."""
+        path = os.path.join(self.base_dir, name)
+        try:
+            mtime = os.path.getmtime(path)
+            with open(path, "r", encoding="utf-8", errors="replace") as handle:
+                return mtime, split_sections(name, handle.read())
+        except OSError:
+            return None
+
+    def reload(self, force: bool = False) -> bool:
+        """
+        Re-read files whose mtime changed (or all files when forced) and rebuild the index.
+
+        Args:
+            force: Reload every file regardless of mtime
+
+        Returns:
+            bool: True if the index was rebuilt
+        """
+        with self._lock:
+            changed = False
+
+            for name in self.files:
+                path = os.path.join(self.base_dir, name)
+                try:
+                    mtime = os.path.getmtime(path)
+                except OSError:
+                    if name in self._file_snippets:
+                        del self._file_snippets[name]
+                        self._mtimes.pop(name, None)
+                        changed = True
+                    continue
+
+                if force or self._mtimes.get(name) != mtime:
+                    loaded = self._load_file(name)
+                    if loaded is None:
+                        continue
+                    self._mtimes[name], self._file_snippets[name] = loaded
+                    changed = True
+
+            self._last_check = time.monotonic()
+
+            if changed:
+                self._rebuild_index()
+                print(f"📚 Knowledge base loaded: {len(self._snippets)} snippets from {len(self._file_snippets)} files")
+
+            return changed
+
+    def maybe_reload(self) -> bool:
+        """
+        Check mtimes if the reload interval has elapsed.
+
+        Returns:
+            bool: True if the index was rebuilt
+        """
+        if time.monotonic() - self._last_check < self.reload_interval:
+            return False
+        return self.reload()
+
+    def _rebuild_index(self) -> None:
+        """Build postings, title terms and IDF weights from the per-file snippets."""
+        snippets: List[KnowledgeSnippet] = []
+        for name in self.files:
+            snippets.extend(self._file_snippets.get(name, []))
+
+        postings: Dict[str, Set[int]] = {}
+        title_terms: List[Set[str]] = []
+        for idx, snippet in enumerate(snippets):
+            source_terms = tokenize(os.path.splitext(os.path.basename(snippet.source))[0].replace("_", " "))
+            titles = set(tokenize(snippet.title)) | set(source_terms)
+            title_terms.append(titles)
+            for term in set(tokenize(snippet.text)) | titles:
+                postings.setdefault(term, set()).add(idx)
+
+        total = max(len(snippets), 1)
+        idf = {term: math.log(1 + total / len(ids)) for term, ids in postings.items()}
+
+        self._snippets, self._postings, self._title_terms, self._idf = snippets, postings, title_terms, idf
+
+    def _query_terms(self, message: str) -> Set[str]:
+        """Tokenize a message and expand it with QUERY_SYNONYMS."""
+        terms = set(tokenize(message))
+        for term in list(terms):
+            for synonym in QUERY_SYNONYMS.get(term, []):
+                terms.update(tokenize(synonym))
+        return terms
+
+    def search(self, message: str, max_snippets: int = 3, max_chars: int = 1200, min_score: float = 1.5) -> List[KnowledgeSnippet]:
+        """
+        Select the snippets most relevant to a message.
+
+        Args:
+            message: Lead's message (or any query text)
+            max_snippets: Maximum number of snippets returned
+            max_chars: Total character budget across returned snippets
+            min_score: Minimum relevance score for a snippet to be included
+
+        Returns:
+            list: Relevant snippets, best first, deduplicated by text
+        """
+        self.maybe_reload()
+
+        snippets, postings, title_terms, idf = self._snippets, self._postings, self._title_terms, self._idf
+        scores: Dict[int, float] = {}
+
+        for term in self._query_terms(message):
+            weight = idf.get(term)
+            if weight is None:
+                continue
+            for idx in postings[term]:
+                bonus = 2.0 if term in title_terms[idx] else 1.0
+                scores[idx] = scores.get(idx, 0.0) + weight * bonus
+
+        ranked = sorted(scores.items(), key=lambda item: (-item[1], item[0]))
+
+        selected: List[KnowledgeSnippet] = []
+        seen: Set[str] = set()
+        used_chars = 0
+        for idx, score in ranked:
+            if score < min_score or len(selected) >= max_snippets:
+                break
+            snippet = snippets[idx]
+            key = snippet.text.strip().lower()
+            if key in seen or used_chars + len(snippet.text) > max_chars:
+                continue
+            seen.add(key)
+            selected.append(snippet)
+            used_chars += len(snippet.text)
+
+        return selected
+
+
+def format_knowledge_context(snippets: List[KnowledgeSnippet]) -> str:
+    """
+    Format selected snippets as a prompt section.
+
+    Args:
+        snippets: Snippets returned by KnowledgeBase.search()
+
+    Returns:
+        str: Prompt text, or empty string if there is nothing relevant
+    """
+    if not snippets:
+        return ""
+
+    parts = ["STUDIO KNOWLEDGE (use only if relevant to the customer's message):"]
+    for snippet in snippets:
+        parts.append(f"[{snippet.title}]\n{snippet.text}")
+
+    return "\n\n".join(parts)
+
+
+# Singleton instance
+_knowledge_base: Optional[KnowledgeBase] = None
+
+
+def get_knowledge_base() -> KnowledgeBase:
+    """
+    Get or create the process-wide knowledge registry.
+    Uses singleton pattern so files are loaded once per process.
+
+    Returns:
+        KnowledgeBase: Loaded registry
+    """
+    global _knowledge_base
+
+    if _knowledge_base is None:
+        _knowledge_base = KnowledgeBase()
+
+    return _knowledge_base
@@ -0,0 +1,244 @@
+"""
+Collision-free lead codes.
+A database sequence (lead_code_seq, migration 033) hands out numbers that are never
+reused; a keyed Feistel permutation maps each one onto the #AAA000 code space, so
+codes are unique by construction yet still look random. Each process reserves a
+block of sequence values at a time (reserve_lead_codes, migration 034) and refills
+it in the background, so creating a lead takes a code from memory: no retries and
+no extra round trip. Legacy codes drawn at random before the sequence existed are
+dropped when a block is reserved.
+"""
+
+import hashlib
+import os
+import string
+import threading
+from collections import deque
+from typing import Optional, List, Any, Callable, Iterable, Set
+
+
+LEAD_CODE_SEQUENCE = "lead_code_seq"
+LETTERS = string.ascii_uppercase
+CODE_SPACE = 26 ** 3 * 1000  # #AAA000 - #ZZZ999
+
+# The permutation must be identical in every process: changing the key after codes
+# have been issued is safe (reservations skip taken codes) but reshuffles the mapping
+LEAD_CODE_KEY = os.getenv("LEAD_CODE_KEY", "lead-codes-v1")
+LEAD_CODE_BLOCK = int(os.getenv("LEAD_CODE_BLOCK", "200"))
+FEISTEL_ROUNDS = 6
+
+# Feistel halves live in Z_m x Z_m with m*m >= CODE_SPACE; values that land outside
+# the code space are walked through the permutation again (cycle walking)
+_HALF = 4193
+assert _HALF * _HALF >= CODE_SPACE
+
+
+def _round_keys(key: str) -> List[bytes]:
+    return [hashlib.blake2b(f"{key}:{i}".encode(), digest_size=16).digest() for i in range(FEISTEL_ROUNDS)]
+
+
+_ROUND_KEYS = _round_keys(LEAD_CODE_KEY)
+
+
+def _f(round_key: bytes, value: int) -> int:
+    digest = hashlib.blake2b(value.to_bytes(2, "big"), key=round_key, digest_size=8).digest()
+    return int.from_bytes(digest, "big") % _HALF
+
+
+def _encrypt(x: int) -> int:
+    left, right = divmod(x, _HALF)
+    for round_key in _ROUND_KEYS:
+        left, right = right, (left + _f(round_key, right)) % _HALF
+    return left * _HALF + right
+
+
+def _decrypt(y: int) -> int:
+    left, right = divmod(y, _HALF)
+    for round_key in reversed(_ROUND_KEYS):
+        left, right = (right - _f(round_key, left)) % _HALF, left
+    return left * _HALF + right
+
+
+def permute(n: int) -> int:
+    """Bijection on [0, CODE_SPACE): sequence value -> code index."""
+    if not 0 <= n < CODE_SPACE:
+        raise ValueError(f"Lead code sequence value out of range: {n}")
+    n = _encrypt(n)
+    while n >= CODE_SPACE:
+        n = _encrypt(n)
+    return n
+
+
+def unpermute(index: int) -> int:
+    """Inverse of permute (code index -> sequence value)."""
+    index = _decrypt(index)
+    while index >= CODE_SPACE:
+        index = _decrypt(index)
+    return index
+
+
+def format_lead_code(index: int) -> str:
+    """Code index -> #AAA000."""
+    letters, digits = divmod(index, 1000)
+    a, rest = divmod(letters, 26 * 26)
+    b, c = divmod(rest, 26)
+    return f"#{LETTERS[a]}{LETTERS[b]}{LETTERS[c]}{digits:03d}"
+
+
+def parse_lead_code(code: str) -> int:
+    """#AAA000 -> code index."""
+    letters, digits = code[1:4].upper(), int(code[4:7])
+    a, b, c = (LETTERS.index(ch) for ch in letters)
+    return (a * 26 * 26 + b * 26 + c) * 1000 + digits
+
+
+def lead_code_for(n: int) -> str:
+    """Lead code for a lead_code_seq value."""
+    return format_lead_code(permute(n))
+
+
+def _drop_taken(values: Iterable[int], is_taken: Callable[[List[str]], Set[str]]) -> List[str]:
+    candidates = [lead_code_for(v) for v in values]
+    taken = is_taken(candidates) if candidates else set()
+    return [code for code in candidates if code not in taken]
+
+
+def allocate_lead_codes(conn: Any, count: int) -> List[str]:
+    """
+    Reserve count codes on an open SQLAlchemy connection (bulk import): one
+    sequence round trip for the block, one lookup to drop legacy codes, topped
+    up until count are free.
+
+    Args:
+        conn: SQLAlchemy connection
+        count: Codes needed
+
+    Returns:
+        list: Unused lead codes
+    """
+    from sqlalchemy import text
+
+    def is_taken(codes: List[str]) -> Set[str]:
+        return set(
+            conn.execute(
+                text("SELECT lead_code FROM leads WHERE lead_code = ANY(CAST(:codes AS text[]))"),
+                {"codes": codes},
+            ).scalars().all()
+        )
+
+    codes: List[str] = []
+    while len(codes) < count:
+        values = conn.execute(
+            text(f"SELECT nextval('{LEAD_CODE_SEQUENCE}') FROM generate_series(1, :n)"),
+            {"n": count - len(codes)},
+        ).scalars().all()
+        codes.extend(_drop_taken(values, is_taken))
+    return codes
+
+
+class LeadCodeAllocator:
+    """
+    Per-process pool of reserved codes. next_code() pops from memory; when the pool
+    runs below a quarter of a block, the next block is reserved in the background.
+    """
+
+    def __init__(
+        self,
+        reserve: Callable[[int], List[int]],
+        is_taken: Callable[[List[str]], Set[str]],
+        block_size: int = LEAD_CODE_BLOCK
+    ):
+        """
+        Args:
+            reserve: reserve(n) -> n fresh lead_code_seq values
+            is_taken: is_taken(codes) -> the subset already used by existing leads
+            block_size: Sequence values reserved per round trip
+        """
+        self.reserve = reserve
+        self.is_taken = is_taken
+        self.block_size = block_size
+        self.low_water = max(1, block_size // 4)
+        self._codes: deque = deque()
+        self._lock = threading.Lock()
+        self._refill_lock = threading.Lock()
+        self._refilling = False
+        self.blocks_reserved = 0
+
+    def __len__(self) -> int:
+        return len(self._codes)
+
+    def _refill(self) -> None:
+        with self._refill_lock:
+            if len(self._codes) > self.low_water:
+                return
+            codes = _drop_taken(self.reserve(self.block_size), self.is_taken)
+            with self._lock:
+                self._codes.extend(codes)
+            self.blocks_reserved += 1
+
+    def _refill_in_background(self) -> None:
+        with self._lock:
+            if self._refilling:
+                return
+            self._refilling = True
+
+        def _run():
+            try:
+                self._refill()
+            except Exception as e:
+                print(f"Lead code block reservation failed (will retry on demand): {e}")
+            finally:
+                self._refilling = False
+
+        threading.Thread(target=_run, name="lead-code-refill", daemon=True).start()
+
+    def prefetch(self) -> None:
+        """Reserve the first block ahead of the first lead creation."""
+        if len(self._codes) <= self.low_water:
+            self._refill_in_background()
+
+    def next_code(self) -> str:
+        """
+        Take the next reserved code (reserves a block inline only if the pool is empty).
+
+        Returns:
+            str: Unused lead code
+        """
+        while True:
+            with self._lock:
+                if self._codes:
+                    code = self._codes.popleft()
+                    remaining = len(self._codes)
+                    break
+            self._refill()
+        if remaining <= self.low_water:
+            self._refill_in_background()
+        return code
+
+
+def _reserve_via_rpc(count: int) -> List[int]:
+    from api.utils.supabase_client import get_supabase_client
+
+    response = get_supabase_client().rpc("reserve_lead_codes", {"block_size": count}).execute()
+    return [int(v) for v in response.data or []]
+
+
+def _taken_via_rest(codes: List[str]) -> Set[str]:
+    from api.utils.supabase_client import get_supabase_client
+
+    response = get_supabase_client().table("leads").select("lead_code").in_("lead_code", codes).execute()
+    return {row["lead_code"] for row in response.data or []}
+
+
+# Singleton
+_allocator: Optional[LeadCodeAllocator] = None
+_allocator_lock = threading.Lock()
+
+
+def get_lead_code_allocator() -> LeadCodeAllocator:
+    global _allocator
+    if _allocator is None:
+        with _allocator_lock:
+            if _allocator is None:
+                _allocator = LeadCodeAllocator(_reserve_via_rpc, _taken_via_rest)
+    return _allocator
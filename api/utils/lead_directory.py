@@ -0,0 +1,260 @@
+"""
+Process-level lead directory keyed by the E.164 number as an integer.
+Holds the fields the webhook reads on every message (id, status, flags, tenant,
+scoring state) in __slots__ records, so a lookup is one int-keyed dict probe instead
+of a PostgREST query. Warmed by one streamed bulk select at startup, kept coherent
+by write-through from lead_manager and the lead_changes feed (migration 030).
+"""
+
+import os
+import sys
+import threading
+import time
+from typing import Optional, Dict, Any, Iterable
+
+from api.utils.message_cache import MESSAGE_FEED_DSN, LocalChangeFeed, PostgresChangeFeed
+
+
+LEAD_FEED_CHANNEL = "lead_changes"
+WARM_BATCH_SIZE = int(os.getenv("LEAD_DIRECTORY_WARM_BATCH", "10000"))
+
+DIRECTORY_COLUMNS = [
+    "id", "phone", "lead_code", "name", "status", "is_manual_mode", "is_test",
+    "whatsapp_mode", "tenant_id", "priority_score", "score_features",
+]
+
+# Scoring state is stored as a tuple in this key order (a dict costs ~3x the memory)
+_FEATURE_KEYS = ("v", "sentiment", "inbound", "latency_min", "objection", "intent")
+
+
+def phone_key(phone: Optional[str]) -> Optional[int]:
+    """
+    Normalize an E.164 number ('+447700900000', 'whatsapp:+44 7700 900000') to an int.
+
+    Returns:
+        int: Digits as an integer, or None if the number has no digits
+    """
+    if not phone:
+        return None
+    try:
+        # Fast path: int() accepts the leading '+' of a clean E.164 string
+        return int(phone)
+    except ValueError:
+        digits = "".join(ch for ch in phone if ch.isdigit())
+        return int(digits) if digits else None
+
+
+def _pack_features(features: Optional[Dict[str, Any]]) -> Optional[tuple]:
+    if not features or not features.get("v"):
+        return None
+    return tuple(features.get(key, 0) for key in _FEATURE_KEYS)
+
+
+class LeadRecord:
+    """
+    Compact lead row (the columns the conversation pipeline reads).
+    The phone number is kept as its integer key and the scoring state as a tuple.
+    """
+
+    __slots__ = ("id", "key", "lead_code", "name", "status", "is_manual_mode", "is_test",
+                 "whatsapp_mode", "tenant_id", "priority_score", "features")
+
+    def __init__(self, row: Dict[str, Any], key: int):
+        self.id = str(row["id"])
+        self.key = key
+        self.lead_code = row.get("lead_code")
+        self.name = row.get("name")
+        self.status = sys.intern(row.get("status") or "New")
+        self.is_manual_mode = bool(row.get("is_manual_mode"))
+        self.is_test = bool(row.get("is_test"))
+        self.whatsapp_mode = bool(row.get("whatsapp_mode"))
+        tenant_id = row.get("tenant_id")
+        self.tenant_id = sys.intern(str(tenant_id)) if tenant_id else None
+        self.priority_score = row.get("priority_score") or 0
+        self.features = _pack_features(row.get("score_features"))
+
+    @property
+    def phone(self) -> str:
+        return f"+{self.key}"
+
+    def update(self, fields: Dict[str, Any]) -> None:
+        for column, value in fields.items():
+            if column == "status" and value:
+                value = sys.intern(value)
+            elif column == "tenant_id" and value:
+                value = sys.intern(str(value))
+            elif column == "score_features":
+                column, value = "features", _pack_features(value)
+            elif column in ("id", "phone") or column not in DIRECTORY_COLUMNS:
+                continue
+            setattr(self, column, value)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "id": self.id,
+            "phone": self.phone,
+            "lead_code": self.lead_code,
+            "name": self.name,
+            "status": self.status,
+            "is_manual_mode": self.is_manual_mode,
+            "is_test": self.is_test,
+            "whatsapp_mode": self.whatsapp_mode,
+            "tenant_id": self.tenant_id,
+            "priority_score": self.priority_score,
+            "score_features": dict(zip(_FEATURE_KEYS, self.features)) if self.features else {},
+        }
+
+
+class LeadDirectory:
+    """
+    phone_key -> LeadRecord, with an id -> phone_key side index for id-keyed writes.
+    Reads are lock-free dict probes; writers take a lock.
+    """
+
+    def __init__(self):
+        self._by_phone: Dict[int, LeadRecord] = {}
+        self._key_by_id: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self.ready = False
+        self.warm_seconds: Optional[float] = None
+
+    def __len__(self) -> int:
+        return len(self._by_phone)
+
+    def get(self, phone: str) -> Optional[LeadRecord]:
+        key = phone_key(phone)
+        return self._by_phone.get(key) if key is not None else None
+
+    def get_by_id(self, lead_id: str) -> Optional[LeadRecord]:
+        key = self._key_by_id.get(str(lead_id))
+        return self._by_phone.get(key) if key is not None else None
+
+    def put(self, row: Dict[str, Any], overwrite: bool = True) -> Optional[LeadRecord]:
+        """Insert or replace a lead (overwrite=False keeps an existing, fresher record)."""
+        key = phone_key(row.get("phone"))
+        if key is None or not row.get("id"):
+            return None
+        with self._lock:
+            existing = self._by_phone.get(key)
+            if existing is not None and not overwrite:
+                return existing
+            record = LeadRecord(row, existing.key if existing is not None else key)
+            if existing is not None and existing.id != record.id:
+                self._key_by_id.pop(existing.id, None)
+            self._by_phone[record.key] = record
+            self._key_by_id[record.id] = key
+            return record
+
+    def update(self, fields: Dict[str, Any], phone: Optional[str] = None, lead_id: Optional[str] = None) -> bool:
+        """Write-through of changed columns; returns False if the lead isn't cached."""
+        with self._lock:
+            record = self.get(phone) if phone else self.get_by_id(lead_id)
+            if record is None:
+                return False
+            record.update(fields)
+            return True
+
+    def remove(self, lead_id: str) -> None:
+        with self._lock:
+            key = self._key_by_id.pop(str(lead_id), None)
+            if key is not None:
+                self._by_phone.pop(key, None)
+
+    def load(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Bulk load (warm-up); records written meanwhile by write-through win."""
+        count = 0
+        for row in rows:
+            self.put(row, overwrite=False)
+            count += 1
+        return count
+
+    def apply_change(self, event: Dict[str, Any]) -> None:
+        """Apply a lead_changes notification (full compact row, or a delete)."""
+        if event.get("op") == "DELETE":
+            self.remove(event.get("id"))
+        elif event.get("op") == "RESET":
+            # Notifications may have been missed: drop everything and refetch lazily
+            with self._lock:
+                self._by_phone.clear()
+                self._key_by_id.clear()
+        elif event.get("id"):
+            self.put(event)
+
+    def warm(self, batch_size: int = WARM_BATCH_SIZE) -> int:
+        """
+        Load every lead with one streamed select.
+
+        Returns:
+            int: Leads loaded
+        """
+        from sqlalchemy import text
+        from api.utils.supabase_client import get_sqlalchemy_engine
+
+        started = time.perf_counter()
+        loaded = 0
+        with get_sqlalchemy_engine().connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=batch_size).execute(
+                text(f"SELECT {', '.join(DIRECTORY_COLUMNS)} FROM leads")
+            )
+            for partition in result.mappings().partitions():
+                loaded += self.load(partition)
+        self.ready = True
+        self.warm_seconds = time.perf_counter() - started
+        print(f"📇 Lead directory warmed: {loaded} leads in {self.warm_seconds:.2f}s")
+        return loaded
+
+    def stats(self) -> Dict[str, Any]:
+        return {"leads": len(self._by_phone), "ready": self.ready, "warm_seconds": self.warm_seconds}
+
+
+# Singletons
+_directory: Optional[LeadDirectory] = None
+_directory_feed: Optional[LocalChangeFeed] = None
+_directory_lock = threading.Lock()
+
+
+def get_lead_directory() -> Optional[LeadDirectory]:
+    """
+    Get the process-wide lead directory, or None when it is disabled.
+    Enabled when MESSAGE_FEED_DSN is set (lead_changes keeps instances coherent) or
+    LEAD_DIRECTORY=local (single instance only: direct writes from the dashboard are not seen).
+    """
+    global _directory, _directory_feed
+
+    if _directory is None:
+        with _directory_lock:
+            if _directory is None:
+                if MESSAGE_FEED_DSN:
+                    feed = PostgresChangeFeed(MESSAGE_FEED_DSN, channel=LEAD_FEED_CHANNEL)
+                elif os.getenv("LEAD_DIRECTORY", "").lower() == "local":
+                    feed = LocalChangeFeed()
+                else:
+                    return None
+                directory = LeadDirectory()
+                feed.subscribe(directory.apply_change)
+                feed.start()
+                _directory_feed = feed
+                _directory = directory
+
+    return _directory
+
+
+def get_lead_feed() -> Optional[LocalChangeFeed]:
+    """The feed keeping the directory coherent (None when the directory is disabled)."""
+    get_lead_directory()
+    return _directory_feed
+
+
+def warm_lead_directory_in_background() -> None:
+    """Start warming at startup without delaying it; misses fall back to the database."""
+    directory = get_lead_directory()
+    if directory is None or directory.ready:
+        return
+
+    def _warm():
+        try:
+            directory.warm()
+        except Exception as e:
+            print(f"Lead directory warm-up failed (lookups fall back to the database): {e}")
+
+    threading.Thread(target=_warm, name="lead-directory-warm", daemon=True).start()
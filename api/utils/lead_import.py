@@ -0,0 +1,360 @@
+"""
+Bulk lead import for POST /api/leads/bulk.
+The request body (NDJSON, or CSV with a header row) is parsed line by line as it
+streams in (a quoted CSV field may span lines); each row's phone is normalized to E.164 and the row validated, and
+valid rows are inserted in batches: one sequence round trip for the batch's lead
+codes (see lead_codes.py) and one multi-row INSERT ... ON CONFLICT (phone) via unnest.
+Invalid rows and per-row outcomes are reported by line number instead of failing
+the import.
+"""
+
+import codecs
+import csv
+import hashlib
+import json
+import os
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Callable, Tuple
+
+from api.utils.lead_codes import allocate_lead_codes
+
+
+IMPORT_BATCH_SIZE = int(os.getenv("LEAD_IMPORT_BATCH_SIZE", "5000"))
+DEFAULT_COUNTRY_CODE = os.getenv("LEAD_IMPORT_DEFAULT_COUNTRY_CODE", "44")
+MAX_REPORTED_ERRORS = 1000
+# A quoted CSV field may span lines (RFC 4180); a record still open past this is rejected
+MAX_CSV_RECORD_BYTES = 64 * 1024
+MAX_NAME_LENGTH = 200
+
+FORMATS = ("ndjson", "csv")
+ON_CONFLICT = ("skip", "update")
+RESERVED_FIELDS = {"phone", "name", "source"}
+
+
+def normalize_phone(raw: Any, default_country: str = DEFAULT_COUNTRY_CODE) -> str:
+    """
+    Normalize a phone number to E.164 ('07700 900123' -> '+447700900123').
+
+    Args:
+        raw: Number as supplied (spaces, dashes, brackets, 00 or whatsapp: prefixes allowed)
+        default_country: Country calling code for national numbers starting with 0
+
+    Returns:
+        str: E.164 number
+
+    Raises:
+        ValueError: If the number can't be normalized
+    """
+    value = str(raw or "").strip()
+    if value.lower().startswith("whatsapp:"):
+        value = value[9:].strip()
+    if not value:
+        raise ValueError("missing phone")
+
+    digits = "".join(ch for ch in value if ch.isdigit())
+    if not value.startswith("+"):
+        if digits.startswith("00"):
+            digits = digits[2:]
+        elif digits.startswith("0"):
+            digits = default_country + digits[1:]
+
+    if not 8 <= len(digits) <= 15 or digits[0] == "0":
+        raise ValueError(f"invalid phone number: {str(raw)[:40]}")
+    if any(ch.isalpha() for ch in value):
+        raise ValueError(f"invalid phone number: {str(raw)[:40]}")
+    return "+" + digits
+
+
+def normalize_row(record: Dict[str, Any], imported_at: str) -> Dict[str, Any]:
+    """
+    Validate one input record and shape it as a lead row.
+    Unknown fields are kept in lead_metadata, as the CRM webhook does.
+
+    Returns:
+        dict: phone, name and metadata
+
+    Raises:
+        ValueError: If the record is unusable
+    """
+    fields = {str(k).strip().lower(): v for k, v in record.items() if k is not None}
+    phone = normalize_phone(fields.get("phone"))
+    name = fields.get("name")
+    name = str(name).strip()[:MAX_NAME_LENGTH] if name not in (None, "") else None
+    metadata = {
+        key: value for key, value in fields.items()
+        if key not in RESERVED_FIELDS and value not in (None, "")
+    }
+    metadata["source"] = fields.get("source") or "Bulk Import"
+    metadata["imported_at"] = imported_at
+    return {"phone": phone, "name": name, "metadata": metadata}
+
+
+class LineSplitter:
+    """Split a byte stream into text lines across chunk boundaries (UTF-8, BOM and CRLF tolerant)."""
+
+    def __init__(self):
+        self._decoder = codecs.getincrementaldecoder("utf-8-sig")(errors="replace")
+        self._partial = ""
+
+    def feed(self, chunk: bytes) -> List[str]:
+        text = self._partial + self._decoder.decode(chunk)
+        lines = text.split("\n")
+        self._partial = lines.pop()
+        return [line.rstrip("\r") for line in lines]
+
+    def close(self) -> List[str]:
+        tail = (self._partial + self._decoder.decode(b"", final=True)).rstrip("\r")
+        self._partial = ""
+        return [tail] if tail else []
+
+
+def insert_leads(tenant_id: str, rows: List[Dict[str, Any]], on_conflict: str = "skip") -> Dict[str, Tuple[str, str, bool]]:
+    """
+    Insert one batch of normalized rows (phones unique within the batch).
+
+    Args:
+        tenant_id: Owning tenant
+        rows: Output of normalize_row
+        on_conflict: 'skip' existing phones, or 'update' them (fill a missing name,
+            merge metadata) when they belong to the same tenant
+
+    Returns:
+        dict: phone -> (lead id, lead code, inserted) for rows written; skipped phones are absent
+    """
+    from sqlalchemy import text
+    from api.utils.supabase_client import get_sqlalchemy_engine
+
+    if on_conflict == "update":
+        conflict = (
+            "ON CONFLICT (phone) DO UPDATE SET "
+            "name = COALESCE(leads.name, EXCLUDED.name), "
+            "lead_metadata = COALESCE(leads.lead_metadata, '{}'::jsonb) || EXCLUDED.lead_metadata "
+            "WHERE leads.tenant_id = EXCLUDED.tenant_id"
+        )
+    else:
+        conflict = "ON CONFLICT (phone) DO NOTHING"
+
+    with get_sqlalchemy_engine().begin() as conn:
+        codes = allocate_lead_codes(conn, len(rows))
+        result = conn.execute(
+            text(
+                "INSERT INTO leads (tenant_id, phone, name, lead_code, status, is_manual_mode, lead_metadata) "
+                "SELECT CAST(:tenant_id AS uuid), v.phone, v.name, v.lead_code, 'New', false, v.metadata "
+                "FROM unnest(CAST(:phones AS text[]), CAST(:names AS text[]), CAST(:codes AS text[]), "
+                "CAST(:metadata AS jsonb[])) AS v(phone, name, lead_code, metadata) "
+                f"{conflict} "
+                "RETURNING id, phone, lead_code, (xmax = 0) AS inserted"
+            ),
+            {
+                "tenant_id": tenant_id,
+                "phones": [row["phone"] for row in rows],
+                "names": [row["name"] for row in rows],
+                "codes": codes,
+                "metadata": [json.dumps(row["metadata"], default=str) for row in rows],
+            },
+        ).all()
+    return {r.phone: (str(r.id), r.lead_code, bool(r.inserted)) for r in result}
+
+
+class LeadImport:
+    """
+    One import job: feed it lines, flush when ready(), finish() at the end of the input, then read summary().
+    The insert callable is swappable so the parsing path can be benchmarked alone.
+    """
+
+    def __init__(
+        self,
+        tenant_id: str,
+        fmt: str = "ndjson",
+        on_conflict: str = "skip",
+        insert: Optional[Callable[..., Dict[str, Tuple[str, str, bool]]]] = None,
+        batch_size: int = IMPORT_BATCH_SIZE
+    ):
+        if fmt not in FORMATS:
+            raise ValueError(f"Unsupported format: {fmt} (use one of {', '.join(FORMATS)})")
+        if on_conflict not in ON_CONFLICT:
+            raise ValueError(f"Unsupported on_conflict: {on_conflict} (use one of {', '.join(ON_CONFLICT)})")
+        self.tenant_id = tenant_id
+        self.fmt = fmt
+        self.on_conflict = on_conflict
+        self.insert = insert or insert_leads
+        self.batch_size = batch_size
+        self.imported_at = datetime.now(timezone.utc).isoformat()
+        self._header: Optional[List[str]] = None
+        self._line = 0
+        # Physical lines of a CSV record whose quoted field is still open, and its first line number
+        self._record: List[str] = []
+        self._record_line = 0
+        self._record_quotes = 0
+        self._record_bytes = 0
+        self._seen: Dict[str, int] = {}
+        self._batch: List[Tuple[int, Dict[str, Any]]] = []
+        self.counts = {"rows": 0, "inserted": 0, "updated": 0, "existing": 0, "invalid": 0, "failed": 0}
+        self.errors: List[Dict[str, Any]] = []
+        self._unreported = 0
+
+    def _error(self, line: int, message: str, phone: Optional[str] = None) -> None:
+        if len(self.errors) >= MAX_REPORTED_ERRORS:
+            self._unreported += 1
+            return
+        error = {"line": line, "error": message}
+        if phone:
+            error["phone"] = phone
+        self.errors.append(error)
+
+    def _parse(self, line: str) -> Optional[Dict[str, Any]]:
+        if self.fmt == "ndjson":
+            record = json.loads(line)
+            if not isinstance(record, dict):
+                raise ValueError("expected a JSON object")
+            return record
+        values = next(csv.reader([line]))
+        if self._header is None:
+            header = [value.strip().lower() for value in values]
+            if "phone" not in header:
+                raise ValueError("CSV header must include a phone column")
+            self._header = header
+            return None
+        if len(values) != len(self._header):
+            raise ValueError(f"expected {len(self._header)} columns, got {len(values)}")
+        return dict(zip(self._header, values))
+
+    def feed_line(self, line: str) -> None:
+        self._line += 1
+        if self.fmt != "csv":
+            self._accept(line, self._line)
+            return
+        if not self._record:
+            if not line.strip():
+                return
+            self._record_line = self._line
+        self._record.append(line)
+        self._record_quotes += line.count('"')
+        self._record_bytes += len(line) + 1
+        if self._record_quotes % 2 == 0:
+            text, line_number = "\n".join(self._record), self._record_line
+            self._reset_record()
+            self._accept(text, line_number)
+        elif self._record_bytes > MAX_CSV_RECORD_BYTES:
+            line_number = self._record_line
+            self._reset_record()
+            self._reject(line_number, "unterminated quoted field")
+
+    def finish(self) -> None:
+        """End of input: a CSV record with a quoted field still open is invalid."""
+        if self._record:
+            line_number = self._record_line
+            self._reset_record()
+            self._reject(line_number, "unterminated quoted field")
+
+    def _reset_record(self) -> None:
+        self._record = []
+        self._record_quotes = 0
+        self._record_bytes = 0
+
+    def _reject(self, line: int, message: str) -> None:
+        if self._header is None:
+            raise ValueError(message)
+        self.counts["invalid"] += 1
+        self._error(line, message)
+
+    def _accept(self, line: str, line_number: int) -> None:
+        if not line.strip():
+            return
+        try:
+            record = self._parse(line)
+            if record is None:
+                return
+            self.counts["rows"] += 1
+            row = normalize_row(record, self.imported_at)
+        except (ValueError, StopIteration) as e:
+            if self._header is None and self.fmt == "csv":
+                raise ValueError(str(e))
+            self.counts["invalid"] += 1
+            self._error(line_number, str(e))
+            return
+
+        first = self._seen.get(row["phone"])
+        if first is not None:
+            self.counts["invalid"] += 1
+            self._error(line_number, f"duplicate phone (first seen on line {first})", row["phone"])
+            return
+        self._seen[row["phone"]] = line_number
+        self._batch.append((line_number, row))
+
+    def ready(self) -> bool:
+        return len(self._batch) >= self.batch_size
+
+    def flush(self) -> None:
+        """Insert the pending batch (blocking: call from a worker thread in async code)."""
+        if not self._batch:
+            return
+        batch, self._batch = self._batch, []
+        try:
+            written = self.insert(self.tenant_id, [row for _, row in batch], self.on_conflict)
+        except Exception as e:
+            print(f"Bulk import batch of {len(batch)} failed: {e}")
+            self.counts["failed"] += len(batch)
+            for line, row in batch:
+                self._error(line, f"insert failed: {str(e)[:200]}", row["phone"])
+            return
+
+        inserted = 0
+        for line, row in batch:
+            outcome = written.get(row["phone"])
+            if outcome is None:
+                self.counts["existing"] += 1
+            elif outcome[2]:
+                inserted += 1
+            else:
+                self.counts["updated"] += 1
+        self.counts["inserted"] += inserted
+        self._publish(batch, written, inserted)
+
+    def _publish(self, batch: List[Tuple[int, Dict[str, Any]]], written: Dict[str, Tuple[str, str, bool]], inserted: int) -> None:
+        """Count new leads in the dashboard stats and make them visible to this worker's lead directory."""
+        from api.utils.lead_directory import get_lead_directory
+        from api.utils.lead_stats import get_lead_stats
+
+        get_lead_stats().record_created(self.tenant_id, count=inserted)
+        directory = get_lead_directory()
+        if directory is None:
+            return
+        for _, row in batch:
+            outcome = written.get(row["phone"])
+            if outcome and outcome[2]:
+                directory.put({
+                    "id": outcome[0], "phone": row["phone"], "lead_code": outcome[1], "name": row["name"],
+                    "status": "New", "is_manual_mode": False, "tenant_id": self.tenant_id,
+                }, overwrite=False)
+
+    def summary(self) -> Dict[str, Any]:
+        return {
+            "success": self.counts["failed"] == 0,
+            **self.counts,
+            "errors": self.errors,
+            "errors_not_reported": self._unreported,
+        }
+
+
+def resolve_api_key(api_key: Optional[str]) -> Optional[str]:
+    """
+    Resolve a tenant API key (as issued for the CRM inbound webhook) to its tenant.
+
+    Returns:
+        str: tenant_id, or None for a missing or unknown key
+    """
+    if not api_key or len(api_key) < 8:
+        return None
+    from api.utils.supabase_client import get_supabase_client
+
+    key_hash = hashlib.sha256(api_key.encode("utf-8")).hexdigest()
+    response = (
+        get_supabase_client()
+        .table("api_keys")
+        .select("tenant_id")
+        .eq("key_hash", key_hash)
+        .limit(1)
+        .execute()
+    )
+    return str(response.data[0]["tenant_id"]) if response.data else None
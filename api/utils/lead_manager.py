@@ -3,13 +3,25 @@ Enhanced lead management functions with new status workflow and manual mode.
 Handles lead creation, tracking, conversation context, and manual takeover.
 """
 
-import random
-import string
-from datetime import datetime
-from typing import Optional, List, Dict, Any
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any, Iterator
 from api.utils.supabase_client import get_supabase_client
+from api.utils.message_cache import get_history_cache, message_time
+from api.utils.lead_directory import get_lead_directory
+from api.utils.lead_codes import get_lead_code_allocator
+from api.utils.takeover import get_takeover_cache, publish_takeover
+from api.utils.lead_stats import get_lead_stats
+from api.utils.write_behind import get_write_buffer
+from api.utils.sentiment import analysis_sentiment, score_text, sentiment_label
+from api.utils.event_stream import publish_event, message_delta, status_delta, score_delta
+from api.utils.coordination import get_coordinator, LockGrant
 
 
+# Seconds to wait after an insert before reading history back (Supabase commit latency)
+READ_AFTER_WRITE_DELAY = 0.5
+
 # Valid status values
 VALID_STATUSES = [
     'New',
@@ -21,18 +33,56 @@ VALID_STATUSES = [
 ]
 
 
+def _forget_lead(phone: str) -> None:
+    """Drop this worker's cached copy of a lead (another worker may have changed it)."""
+    directory = get_lead_directory()
+    record = directory.get(phone) if directory is not None else None
+    cache = get_history_cache()
+    if record is not None:
+        directory.remove(record.id)
+        if cache:
+            cache.invalidate(record.id)
+    elif cache:
+        # History is keyed by lead id, which only the directory maps from a phone
+        cache.clear()
+
+
+@contextmanager
+def lead_lock(phone: str) -> Iterator[LockGrant]:
+    """
+    Process one lead's messages one at a time, in arrival order, across all workers.
+    When another worker held the lead last, its cached state here is dropped first;
+    with a shared coordinator, this worker's buffered messages are flushed before
+    the lock is released so the next holder reads them from the database.
+    
+    Args:
+        phone: Lead's phone number in E.164 format
+        
+    Raises:
+        CoordinationTimeout: If the lead stays locked for COORDINATION_LOCK_WAIT_SECONDS
+    """
+    coordinator = get_coordinator()
+    with coordinator.lock(f"lead:{phone}") as grant:
+        if grant.handoff:
+            _forget_lead(phone)
+        try:
+            yield grant
+        finally:
+            buffer = get_write_buffer()
+            if coordinator.shared and buffer is not None and not buffer.flush_barrier():
+                print(f"⚠️ Messages for {phone} not flushed before releasing its lock")
+
+
 def generate_lead_code() -> str:
     """
-    Generate a unique lead tracking code with # prefix.
+    Take the next unique lead tracking code from this process's reserved block.
     Format: #[3 uppercase letters][3 digits]
     Example: #LON001, #NYC123
     
     Returns:
         str: Unique lead code starting with #
     """
-    letters = ''.join(random.choices(string.ascii_uppercase, k=3))
-    numbers = ''.join(random.choices(string.digits, k=3))
-    return f"#{letters}{numbers}"
+    return get_lead_code_allocator().next_code()
 
 
 def get_or_create_lead(phone: str) -> Dict[str, Any]:
@@ -48,38 +98,52 @@ def get_or_create_lead(phone: str) -> Dict[str, Any]:
     Raises:
         Exception: If database operation fails
     """
+    # Hot path: in-process lead directory
+    directory = get_lead_directory()
+    if directory is not None:
+        record = directory.get(phone)
+        if record is not None:
+            return record.to_dict()
+    
     client = get_supabase_client()
     
     # Try to find existing lead
     response = client.table("leads").select("*").eq("phone", phone).execute()
     
     if response.data and len(response.data) > 0:
+        if directory is not None:
+            directory.put(response.data[0])
         return response.data[0]
     
-    # Create new lead with unique code
-    max_attempts = 5
-    for attempt in range(max_attempts):
-        lead_code = generate_lead_code()
-        
-        try:
-            new_lead = {
-                "phone": phone,
-                "lead_code": lead_code,
-                "status": "New",
-                "is_manual_mode": False
-            }
-            
-            response = client.table("leads").insert(new_lead).execute()
-            
-            if response.data and len(response.data) > 0:
-                return response.data[0]
-        except Exception as e:
-            # If unique constraint fails, try again with new code
-            if attempt == max_attempts - 1:
-                raise Exception(f"Failed to create lead after {max_attempts} attempts: {e}")
-            continue
+    # Create new lead (codes are unique by construction, so no retry loop)
+    new_lead = {
+        "phone": phone,
+        "lead_code": generate_lead_code(),
+        "status": "New",
+        "is_manual_mode": False
+    }
     
-    raise Exception("Failed to create lead")
+    try:
+        response = client.table("leads").insert(new_lead).execute()
+    except Exception as e:
+        # Another worker created this phone's lead first: use theirs
+        response = client.table("leads").select("*").eq("phone", phone).execute()
+        if not response.data:
+            raise Exception(f"Failed to create lead: {e}")
+        if directory is not None:
+            directory.put(response.data[0])
+        return response.data[0]
+    
+    if not response.data:
+        raise Exception("Failed to create lead")
+    get_lead_stats().record_created(response.data[0].get("tenant_id"), bool(response.data[0].get("is_test")))
+    if directory is not None:
+        directory.put(response.data[0])
+    # A brand-new lead has no history yet: prime an empty buffer
+    cache = get_history_cache()
+    if cache:
+        cache.prime(response.data[0]["id"], [])
+    return response.data[0]
 
 
 def update_lead_name(phone: str, name: str) -> bool:
@@ -96,13 +160,16 @@ def update_lead_name(phone: str, name: str) -> bool:
     try:
         client = get_supabase_client()
         client.table("leads").update({"name": name}).eq("phone", phone).execute()
+        directory = get_lead_directory()
+        if directory is not None:
+            directory.update({"name": name}, phone=phone)
         return True
     except Exception as e:
         print(f"Error updating lead name: {e}")
         return False
 
 
-def update_lead_status(phone: str, status: str) -> bool:
+def update_lead_status(phone: str, status: str, previous: Optional[str] = None) -> bool:
     """
     Update lead's status in database.
     Valid statuses: New, Qualifying, Booking_Offered, Booked, Objection_Distance, Human_Required
@@ -110,6 +177,7 @@ def update_lead_status(phone: str, status: str) -> bool:
     Args:
         phone: Lead's phone number
         status: New status value
+        previous: Status the caller read under the lead's lock (saves looking it up)
         
     Returns:
         bool: True if update successful
@@ -120,33 +188,92 @@ def update_lead_status(phone: str, status: str) -> bool:
     
     try:
         client = get_supabase_client()
-        client.table("leads").update({"status": status}).eq("phone", phone).execute()
+        # Previous status for the dashboard counters (from the caller, a directory hit, else one indexed read)
+        directory = get_lead_directory()
+        if previous is None:
+            record = directory.get(phone) if directory is not None else None
+            if record is not None:
+                previous = record.status
+            else:
+                current = client.table("leads").select("status").eq("phone", phone).execute()
+                previous = current.data[0].get("status") if current.data else None
+        
+        fields = {"status": status}
+        if status == "Booked" and previous != "Booked":
+            fields["booked_at"] = datetime.now(timezone.utc).isoformat()
+        response = client.table("leads").update(fields).eq("phone", phone).execute()
+        if directory is not None:
+            directory.update({"status": status}, phone=phone)
+        stats = get_lead_stats()
+        for lead in response.data or []:
+            stats.record_transition(lead.get("tenant_id"), previous, status, bool(lead.get("is_test")))
+            publish_event(status_delta(lead, status))
         return True
     except Exception as e:
         print(f"Error updating lead status: {e}")
         return False
 
 
-def set_manual_mode(lead_id: str, enabled: bool) -> bool:
+def update_lead_score(lead_id: str, score: int, features: Dict[str, Any]) -> bool:
     """
-    Enable or disable manual mode for a lead (takeover functionality).
+    Store a lead's priority score and the scoring state it was computed from.
     
     Args:
         lead_id: Lead's UUID
-        enabled: True to enable manual mode, False to disable
+        score: Priority score (0-100)
+        features: Scoring state from lead_scoring.update_features
         
     Returns:
         bool: True if update successful
     """
     try:
         client = get_supabase_client()
-        client.table("leads").update({"is_manual_mode": enabled}).eq("id", lead_id).execute()
+        response = (
+            client.table("leads")
+            .update({"priority_score": score, "score_features": features})
+            .eq("id", lead_id)
+            .execute()
+        )
+        directory = get_lead_directory()
+        if directory is not None:
+            directory.update({"priority_score": score, "score_features": features}, lead_id=lead_id)
+        for lead in response.data or []:
+            publish_event(score_delta(lead_id, lead.get("tenant_id"), score))
         return True
     except Exception as e:
-        print(f"Error setting manual mode: {e}")
+        print(f"Error updating lead score: {e}")
         return False
 
 
+def set_manual_mode(lead_id: str, enabled: bool) -> Optional[Dict[str, Any]]:
+    """
+    Enable or disable manual mode for a lead (takeover functionality).
+    One UPDATE ... RETURNING; the toggle applies to this worker's takeover cache
+    at once and reaches the other workers through the lead_takeover channel.
+    
+    Args:
+        lead_id: Lead's UUID
+        enabled: True to enable manual mode, False to disable
+        
+    Returns:
+        dict: Updated lead ({} if no lead has that id), or None if the update failed
+    """
+    try:
+        client = get_supabase_client()
+        response = client.table("leads").update({"is_manual_mode": enabled}).eq("id", lead_id).execute()
+        if not response.data:
+            return {}
+        lead = response.data[0]
+        publish_takeover(lead_id, lead.get("phone"), enabled)
+        directory = get_lead_directory()
+        if directory is not None:
+            directory.update({"is_manual_mode": enabled}, lead_id=lead_id)
+        return lead
+    except Exception as e:
+        print(f"Error setting manual mode: {e}")
+        return None
+
+
 def is_lead_in_manual_mode(phone: str) -> bool:
     """
     Check if lead is in manual mode.
@@ -157,6 +284,18 @@ def is_lead_in_manual_mode(phone: str) -> bool:
     Returns:
         bool: True if in manual mode, False otherwise
     """
+    takeover = get_takeover_cache()
+    if takeover is not None:
+        manual = takeover.is_manual(phone)
+        if manual is not None:
+            return manual
+
+    directory = get_lead_directory()
+    if directory is not None:
+        record = directory.get(phone)
+        if record is not None:
+            return record.is_manual_mode
+    
     try:
         client = get_supabase_client()
         response = client.table("leads").select("is_manual_mode").eq("phone", phone).execute()
@@ -169,14 +308,51 @@ def is_lead_in_manual_mode(phone: str) -> bool:
         return False
 
 
-def save_message(phone: str, sender_type: str, content: str) -> Optional[str]:
+def message_analysis_fields(sender_type: str, content: str, analysis: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """
+    Sentiment and analysis columns for a message row.
+    Lead messages use analyze_message's sentiment when available, otherwise the
+    local lexicon score; outbound messages get NULLs (every row has the same keys
+    so write-behind batches stay uniform).
+    
+    Args:
+        sender_type: Either 'lead', 'bot', or 'human'
+        content: Message content
+        analysis: Output of GeminiSalesAgent.analyze_message, if any
+        
+    Returns:
+        dict: sentiment_score, sentiment_label, analysis
+    """
+    if sender_type != "lead":
+        return {"sentiment_score": None, "sentiment_label": None, "analysis": None}
+    
+    score, label = analysis_sentiment(analysis)
+    if score is None:
+        score = round(score_text(content), 4)
+        label = sentiment_label(score)
+    
+    stored_analysis = None
+    if analysis:
+        stored_analysis = {
+            key: analysis.get(key)
+            for key in ("intent", "objection_type", "sentiment", "suggested_status")
+            if analysis.get(key) is not None
+        }
+    return {"sentiment_score": score, "sentiment_label": label, "analysis": stored_analysis}
+
+
+def save_message(phone: str, sender_type: str, content: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[str]:
     """
     Save message to messages table and return message ID for verification.
+    With write-behind enabled the row is queued (and WAL-logged) and the ID
+    returned immediately; the insert happens in the next batch flush.
+    Inbound messages carry their sentiment and analysis in the same insert.
     
     Args:
         phone: Lead's phone number
         sender_type: Either 'lead', 'bot', or 'human'
         content: Message content
+        analysis: Optional analyze_message output for an inbound message
         
     Returns:
         str: Message ID if save successful, None otherwise
@@ -194,12 +370,30 @@ def save_message(phone: str, sender_type: str, content: str) -> Optional[str]:
         message_entry = {
             "lead_id": lead["id"],
             "content": content,
-            "sender_type": sender_type
+            "sender_type": sender_type,
+            **message_analysis_fields(sender_type, content, analysis)
         }
         
+        buffer = get_write_buffer()
+        if buffer:
+            try:
+                row = buffer.submit(message_entry)
+            except RuntimeError:
+                row = None  # Draining for shutdown: insert directly
+            if row:
+                cache = get_history_cache()
+                if cache:
+                    cache.append(lead["id"], row)
+                publish_event(message_delta(lead, row))
+                return row["id"]
+        
         response = client.table("messages").insert(message_entry).execute()
         
         if response.data and len(response.data) > 0:
+            cache = get_history_cache()
+            if cache:
+                cache.append(lead["id"], response.data[0])
+            publish_event(message_delta(lead, response.data[0]))
             return response.data[0].get("id")
         return None
     except Exception as e:
@@ -222,6 +416,11 @@ def verify_message_saved(lead_id: str, message_id: str, max_attempts: int = 5) -
     """
     import time
     
+    # Queued in the write-behind buffer counts as saved
+    buffer = get_write_buffer()
+    if buffer and buffer.is_pending(message_id):
+        return True
+    
     client = get_supabase_client()
     
     for attempt in range(max_attempts):
@@ -254,7 +453,8 @@ def verify_message_saved(lead_id: str, message_id: str, max_attempts: int = 5) -
 def get_messages_with_retry(phone: str, expected_count: Optional[int] = None, limit: int = 10, max_retries: int = 3) -> List[Dict[str, Any]]:
     """
     Retrieve recent messages with retry logic to ensure latest message is included.
-    Handles race conditions where Supabase hasn't committed recent inserts.
+    Handles race conditions where Supabase hasn't committed recent inserts
+    (the commit delay is skipped when the lead's history is cached).
     
     Args:
         phone: Lead's phone number
@@ -267,6 +467,16 @@ def get_messages_with_retry(phone: str, expected_count: Optional[int] = None, li
     """
     import time
     
+    # Hot leads are served from the history cache, which already holds our own writes
+    cache = get_history_cache()
+    if cache:
+        cached = cache.get(get_or_create_lead(phone)["id"], limit)
+        if cached is not None:
+            return cached
+    
+    # Give Supabase time to commit the insert we just made
+    time.sleep(READ_AFTER_WRITE_DELAY)
+    
     for attempt in range(max_retries):
         messages = get_messages(phone, limit)
         
@@ -288,6 +498,7 @@ def get_messages(phone: str, limit: int = 10) -> List[Dict[str, Any]]:
     """
     Retrieve recent messages for a lead.
     Returns messages in chronological order (oldest first).
+    Served from the in-process history cache when the lead is hot.
     
     Args:
         phone: Lead's phone number
@@ -302,17 +513,40 @@ def get_messages(phone: str, limit: int = 10) -> List[Dict[str, Any]]:
         # Get lead_id first
         lead = get_or_create_lead(phone)
         
+        cache = get_history_cache()
+        if cache:
+            cached = cache.get(lead["id"], limit)
+            if cached is not None:
+                return cached
+        
+        # Fetch a full buffer's worth on a miss so the cache can be primed
+        fetch_limit = max(limit, cache.capacity) if cache else limit
         response = (
             client.table("messages")
-            .select("sender_type, content, timestamp")
+            .select("id, sender_type, content, timestamp")
             .eq("lead_id", lead["id"])
             .order("timestamp", desc=True)
-            .limit(limit)
+            .limit(fetch_limit)
             .execute()
         )
         
         # Reverse to get chronological order (oldest first)
-        messages = list(reversed(response.data)) if response.data else []
+        rows = list(reversed(response.data)) if response.data else []
+        
+        # Read-your-writes: include rows still waiting in the write-behind buffer
+        buffer = get_write_buffer()
+        pending = buffer.pending_for(lead["id"]) if buffer else []
+        if pending:
+            seen = {row.get("id") for row in rows}
+            rows = sorted(rows + [row for row in pending if row["id"] not in seen], key=lambda m: message_time(m["timestamp"]))
+        
+        if cache:
+            cache.prime(lead["id"], rows)
+        
+        messages = [
+            {"sender_type": m["sender_type"], "content": m["content"], "timestamp": m["timestamp"]}
+            for m in rows[-limit:]
+        ] if limit else []
         return messages
     except Exception as e:
         print(f"Error retrieving messages: {e}")
@@ -368,3 +602,37 @@ def get_lead_by_id(lead_id: str) -> Optional[Dict[str, Any]]:
     except Exception as e:
         print(f"Error getting lead by ID: {e}")
         return None
+
+
+# Tenant plan cache: tenant_id -> (plan, fetched_at). Plans change rarely.
+_tenant_plan_cache: Dict[str, tuple] = {}
+TENANT_PLAN_TTL_SECONDS = 300
+
+
+def get_tenant_plan(tenant_id: Optional[str]) -> Optional[str]:
+    """
+    Get a tenant's plan (starter/pro/enterprise), cached per process.
+    
+    Args:
+        tenant_id: Tenant UUID from the lead record
+        
+    Returns:
+        str: Plan name, or None if unknown
+    """
+    if not tenant_id:
+        return None
+    
+    cached = _tenant_plan_cache.get(tenant_id)
+    if cached and time.monotonic() - cached[1] < TENANT_PLAN_TTL_SECONDS:
+        return cached[0]
+    
+    try:
+        client = get_supabase_client()
+        response = client.table("tenants").select("plan").eq("id", tenant_id).execute()
+        plan = response.data[0].get("plan") if response.data else None
+    except Exception as e:
+        print(f"Error getting tenant plan: {e}")
+        plan = cached[0] if cached else None
+    
+    _tenant_plan_cache[tenant_id] = (plan, time.monotonic())
+    return plan
@@ -0,0 +1,206 @@
+"""
+Read queries for the dashboard APIs.
+Keyset (seek) pagination over the indexes from migrations 027 and 038, with column
+projection from a whitelist, so each page is an index range scan regardless of
+how deep the client has scrolled.
+"""
+
+import base64
+import json
+from typing import Optional, Dict, List, Any, Tuple
+
+from api.utils.supabase_client import get_sqlalchemy_engine
+
+
+LEAD_COLUMNS = [
+    "id", "phone", "name", "lead_code", "status", "priority_score", "last_contacted_at",
+    "is_manual_mode", "is_test", "tenant_id", "created_at", "updated_at",
+]
+DEFAULT_LEAD_COLUMNS = [
+    "id", "name", "phone", "lead_code", "status", "priority_score", "last_contacted_at", "is_manual_mode",
+]
+
+MESSAGE_COLUMNS = ["id", "lead_id", "sender_type", "content", "timestamp", "sentiment_score", "sentiment_label"]
+DEFAULT_MESSAGE_COLUMNS = ["id", "sender_type", "content", "timestamp"]
+
+MAX_PAGE_SIZE = 200
+
+# Sort keys (must match the expression index in migration 038)
+_LEAD_PRIORITY = "COALESCE(priority_score, 0)"
+_LEAD_CONTACTED = "COALESCE(last_contacted_at, '1970-01-01 00:00:00+00'::timestamptz)"
+
+
+class InvalidCursorError(ValueError):
+    """Raised for cursors that cannot be decoded."""
+    pass
+
+
+def encode_cursor(values: List[Any]) -> str:
+    raw = json.dumps(values, separators=(",", ":"), default=str).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(cursor: str, size: int) -> List[Any]:
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        values = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))
+    except Exception:
+        raise InvalidCursorError("Malformed cursor")
+    if not isinstance(values, list) or len(values) != size:
+        raise InvalidCursorError("Malformed cursor")
+    return values
+
+
+def select_columns(requested: Optional[str], allowed: List[str], default: List[str]) -> List[str]:
+    """
+    Resolve a comma-separated `fields` parameter against a column whitelist.
+    The id column is always included (it is the pagination tiebreaker).
+
+    Raises:
+        ValueError: If an unknown column is requested
+    """
+    if not requested:
+        columns = list(default)
+    else:
+        columns = [c.strip() for c in requested.split(",") if c.strip()]
+        unknown = [c for c in columns if c not in allowed]
+        if unknown:
+            raise ValueError(f"Unknown fields: {', '.join(unknown)}")
+    if "id" not in columns:
+        columns.insert(0, "id")
+    return columns
+
+
+def _fetch(sql: str, params: Dict[str, Any]) -> List[Dict[str, Any]]:
+    from sqlalchemy import text
+
+    with get_sqlalchemy_engine().connect() as conn:
+        return [dict(row._mapping) for row in conn.execute(text(sql), params)]
+
+
+def list_leads(
+    columns: List[str],
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    status: Optional[str] = None,
+    tenant_id: Optional[str] = None,
+    include_test: bool = False
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of leads ordered by (status, priority_score DESC, last_contacted_at DESC, id DESC).
+
+    Args:
+        columns: Projected columns (validated with select_columns)
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: Opaque cursor from the previous page
+        status: Optional status filter
+        tenant_id: Optional tenant filter
+        include_test: Include sandbox test leads
+
+    Returns:
+        tuple: (rows, next_cursor or None on the last page)
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    conditions = []
+    params: Dict[str, Any] = {"limit": limit + 1}
+
+    if status:
+        conditions.append("status = :status")
+        params["status"] = status
+    if tenant_id:
+        conditions.append("tenant_id = CAST(:tenant_id AS uuid)")
+        params["tenant_id"] = tenant_id
+    if not include_test:
+        conditions.append("is_test IS NOT TRUE")
+    if cursor:
+        after_status, after_priority, after_contacted, after_id = decode_cursor(cursor, 4)
+        # Status ascends, the rest descend: seek within the status group, then later groups
+        conditions.append(
+            f"(status > :after_status OR (status = :after_status AND "
+            f"({_LEAD_PRIORITY}, {_LEAD_CONTACTED}, id) < "
+            f"(:after_priority, CAST(:after_contacted AS timestamptz), CAST(:after_id AS uuid))))"
+        )
+        params.update(
+            after_status=after_status, after_priority=after_priority,
+            after_contacted=after_contacted, after_id=after_id
+        )
+
+    sql = (
+        f"SELECT {', '.join(columns)}, status AS _status, {_LEAD_PRIORITY} AS _priority, "
+        f"{_LEAD_CONTACTED} AS _contacted "
+        f"FROM leads "
+        f"{'WHERE ' + ' AND '.join(conditions) if conditions else ''} "
+        f"ORDER BY status ASC, {_LEAD_PRIORITY} DESC, {_LEAD_CONTACTED} DESC, id DESC "
+        f"LIMIT :limit"
+    )
+    rows = _fetch(sql, params)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([last["_status"], last["_priority"], last["_contacted"].isoformat(), str(last["id"])])
+
+    for row in rows:
+        del row["_status"], row["_priority"], row["_contacted"]
+    return rows, next_cursor
+
+
+def list_messages(
+    lead_id: str,
+    columns: List[str],
+    limit: int = 50,
+    cursor: Optional[str] = None,
+    newest_first: bool = True,
+    tenant_id: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    One page of a lead's messages keyed on (lead_id, timestamp, id).
+
+    Args:
+        lead_id: Lead UUID
+        columns: Projected columns (validated with select_columns)
+        limit: Page size (capped at MAX_PAGE_SIZE)
+        cursor: Opaque cursor from the previous page
+        newest_first: Page backwards from the latest message (chat scroll-back)
+        tenant_id: Only if the lead belongs to this tenant (otherwise an empty page)
+
+    Returns:
+        tuple: (rows in page order, next_cursor or None on the last page)
+    """
+    limit = max(1, min(limit, MAX_PAGE_SIZE))
+    comparison, direction = ("<", "DESC") if newest_first else (">", "ASC")
+    conditions = ["lead_id = CAST(:lead_id AS uuid)"]
+    params: Dict[str, Any] = {"lead_id": lead_id, "limit": limit + 1}
+
+    if tenant_id:
+        conditions.append(
+            "EXISTS (SELECT 1 FROM leads WHERE leads.id = CAST(:lead_id AS uuid) "
+            "AND leads.tenant_id = CAST(:tenant_id AS uuid))"
+        )
+        params["tenant_id"] = tenant_id
+    if cursor:
+        after_timestamp, after_id = decode_cursor(cursor, 2)
+        conditions.append(
+            f"(timestamp, id) {comparison} (CAST(:after_timestamp AS timestamptz), CAST(:after_id AS uuid))"
+        )
+        params.update(after_timestamp=after_timestamp, after_id=after_id)
+
+    selected = list(columns)
+    if "timestamp" not in selected:
+        selected.append("timestamp AS _timestamp")
+    sql = (
+        f"SELECT {', '.join(selected)} FROM messages WHERE {' AND '.join(conditions)} "
+        f"ORDER BY timestamp {direction}, id {direction} LIMIT :limit"
+    )
+    rows = _fetch(sql, params)
+
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        last = rows[-1]
+        next_cursor = encode_cursor([(last.get("timestamp") or last.get("_timestamp")).isoformat(), str(last["id"])])
+
+    for row in rows:
+        row.pop("_timestamp", None)
+    return rows, next_cursor
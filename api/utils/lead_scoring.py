@@ -0,0 +1,314 @@
+"""
+Lead priority scoring without a model call.
+Each inbound message updates a small feature state (sentiment EWMA, inbound count,
+reply latency EWMA, decayed objection penalty) in O(1); the score is a logistic of
+a weighted sum of those features plus the lead's status, scaled to 0-100
+(leads.priority_score). The same weights drive a vectorized NumPy re-score of the
+whole table, e.g. after tuning weights or to bootstrap leads with no stored state.
+
+Usage:
+    python -m api.utils.lead_scoring            # dry run, prints the score distribution
+    python -m api.utils.lead_scoring --write    # bulk-update leads.priority_score
+"""
+
+import argparse
+import math
+from datetime import datetime
+from typing import Optional, Dict, List, Any
+
+from api.utils.lead_manager import VALID_STATUSES
+
+
+FEATURES_VERSION = 1
+
+STATUS_WEIGHTS = {
+    "New": 0.0,
+    "Qualifying": 0.6,
+    "Objection_Distance": 0.2,
+    "Booking_Offered": 1.6,
+    "Booked": 3.0,
+    "Human_Required": -1.5,
+}
+
+OBJECTION_PENALTIES = {
+    "none": 0.0,
+    "distance": 0.3,
+    "busy": 0.2,
+    "cost": 0.5,
+    "experience": 0.1,
+    "nervous": 0.1,
+    "thinking": 0.4,
+    "other": 0.3,
+}
+
+INTENT_BONUS = {
+    "booking": 0.8,
+    "slot_selection": 1.0,
+    "interested": 0.4,
+    "question": 0.2,
+    "qualifying_response": 0.2,
+    "stop": -3.0,
+}
+
+SENTIMENT_VALUES = {"positive": 1.0, "neutral": 0.0, "negative": -1.0}
+
+WEIGHTS = {
+    "bias": -1.2,
+    "sentiment": 1.2,
+    "engagement": 0.45,   # x log1p(inbound messages)
+    "latency": -0.35,     # x log1p(reply latency EWMA in minutes)
+    "objection": -1.0,    # x decayed objection penalty
+    "intent": 1.0,        # x decayed intent bonus
+}
+
+SENTIMENT_ALPHA = 0.4
+LATENCY_ALPHA = 0.3
+PENALTY_DECAY = 0.7
+
+
+def empty_features() -> Dict[str, Any]:
+    return {
+        "v": FEATURES_VERSION,
+        "sentiment": 0.0,
+        "inbound": 0,
+        "latency_min": 0.0,
+        "objection": 0.0,
+        "intent": 0.0,
+    }
+
+
+def _parse_timestamp(value: Any) -> Optional[datetime]:
+    if isinstance(value, datetime):
+        return value
+    try:
+        return datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    except (TypeError, ValueError):
+        return None
+
+
+def reply_latency_minutes(history: List[Dict[str, Any]]) -> Optional[float]:
+    """
+    Minutes between our last outbound message and the lead's reply, from history
+    (oldest first, ending with the reply). None if the lead wasn't replying to us.
+    """
+    if len(history) < 2 or history[-1].get("sender_type") != "lead":
+        return None
+    previous = history[-2]
+    if previous.get("sender_type") not in ("bot", "human"):
+        return None
+    sent, replied = _parse_timestamp(previous.get("timestamp")), _parse_timestamp(history[-1].get("timestamp"))
+    if sent is None or replied is None:
+        return None
+    return max(0.0, (replied - sent).total_seconds() / 60)
+
+
+def update_features(
+    features: Optional[Dict[str, Any]],
+    sentiment: str,
+    objection: str,
+    intent: str,
+    latency_minutes: Optional[float] = None
+) -> Dict[str, Any]:
+    """
+    Fold one inbound message into a lead's feature state (O(1)).
+
+    Args:
+        features: Stored state (leads.score_features), or None/{} for a new lead
+        sentiment: Normalized sentiment from analyze_message
+        objection: Normalized objection type
+        intent: Normalized intent
+        latency_minutes: Reply latency for this message, if it answered us
+
+    Returns:
+        dict: New feature state
+    """
+    state = dict(features) if features and features.get("v") == FEATURES_VERSION else empty_features()
+    state["sentiment"] += SENTIMENT_ALPHA * (SENTIMENT_VALUES.get(sentiment, 0.0) - state["sentiment"])
+    state["inbound"] += 1
+    if latency_minutes is not None:
+        if state["latency_min"]:
+            state["latency_min"] += LATENCY_ALPHA * (latency_minutes - state["latency_min"])
+        else:
+            state["latency_min"] = latency_minutes
+    state["objection"] = PENALTY_DECAY * state["objection"] + OBJECTION_PENALTIES.get(objection, 0.3)
+    state["intent"] = PENALTY_DECAY * state["intent"] + INTENT_BONUS.get(intent, 0.0)
+    return state
+
+
+def compute_score(features: Optional[Dict[str, Any]], status: str) -> int:
+    """Score a single lead (0-100) from its feature state and status."""
+    state = features if features and features.get("v") == FEATURES_VERSION else empty_features()
+    logit = (
+        WEIGHTS["bias"]
+        + STATUS_WEIGHTS.get(status, 0.0)
+        + WEIGHTS["sentiment"] * state["sentiment"]
+        + WEIGHTS["engagement"] * math.log1p(state["inbound"])
+        + WEIGHTS["latency"] * math.log1p(state["latency_min"])
+        + WEIGHTS["objection"] * state["objection"]
+        + WEIGHTS["intent"] * state["intent"]
+    )
+    return int(round(100 / (1 + math.exp(-logit))))
+
+
+def score_batch(
+    statuses: Any,
+    sentiment: Any,
+    inbound: Any,
+    latency_min: Any,
+    objection: Any,
+    intent: Any
+) -> Any:
+    """
+    Vectorized compute_score over parallel arrays.
+
+    Returns:
+        numpy.ndarray: int16 scores (0-100)
+    """
+    import numpy as np
+
+    status_weights = np.array([STATUS_WEIGHTS.get(s, 0.0) for s in VALID_STATUSES])
+    status_index = {name: i for i, name in enumerate(VALID_STATUSES)}
+    status_codes = np.fromiter((status_index.get(s, 0) for s in statuses), dtype=np.int8, count=len(statuses))
+
+    logit = (
+        WEIGHTS["bias"]
+        + status_weights[status_codes]
+        + WEIGHTS["sentiment"] * np.asarray(sentiment, dtype=np.float64)
+        + WEIGHTS["engagement"] * np.log1p(np.asarray(inbound, dtype=np.float64))
+        + WEIGHTS["latency"] * np.log1p(np.asarray(latency_min, dtype=np.float64))
+        + WEIGHTS["objection"] * np.asarray(objection, dtype=np.float64)
+        + WEIGHTS["intent"] * np.asarray(intent, dtype=np.float64)
+    )
+    return np.rint(100 / (1 + np.exp(-logit))).astype(np.int16)
+
+
+def bootstrap_features(lead_ids: Any, sender_types: Any, timestamps: Any, sentiment_scores: Any) -> Dict[str, Dict[str, Any]]:
+    """
+    Derive feature state from message history for leads with none stored.
+    Inputs are parallel arrays in timestamp order per lead; objection and
+    intent are unknown from history and start at 0.
+
+    Returns:
+        dict: lead_id -> feature state
+    """
+    import numpy as np
+
+    lead_ids = np.asarray(lead_ids).astype(str)
+    if not len(lead_ids):
+        return {}
+    # Group by lead (stable, so each lead's messages stay in time order)
+    order = np.argsort(lead_ids, kind="stable")
+    lead_ids = lead_ids[order]
+    is_lead = np.asarray(sender_types)[order] == "lead"
+    times = np.asarray(timestamps, dtype="datetime64[s]").astype(np.int64)[order]
+    scores = np.nan_to_num(np.asarray(sentiment_scores, dtype=np.float64), nan=0.0)[order]
+
+    unique, starts = np.unique(lead_ids, return_index=True)
+    inbound = np.add.reduceat(is_lead.astype(np.int64), starts)
+
+    # Reply latency: lead message directly after one of ours, same lead
+    same_lead = np.concatenate([[False], lead_ids[1:] == lead_ids[:-1]])
+    replied = np.concatenate([[False], ~is_lead[:-1]]) & is_lead & same_lead
+    gaps = np.where(replied, np.diff(times, prepend=times[0]) / 60.0, 0.0)
+    latency_sum = np.add.reduceat(gaps, starts)
+    latency_n = np.add.reduceat(replied.astype(np.int64), starts)
+    latency = np.divide(latency_sum, latency_n, out=np.zeros_like(latency_sum), where=latency_n > 0)
+
+    sentiment_sum = np.add.reduceat(np.where(is_lead, scores, 0.0), starts)
+    sentiment = np.divide(sentiment_sum, inbound, out=np.zeros_like(sentiment_sum), where=inbound > 0)
+
+    return {
+        lead: {
+            "v": FEATURES_VERSION,
+            "sentiment": float(sentiment[i]),
+            "inbound": int(inbound[i]),
+            "latency_min": float(latency[i]),
+            "objection": 0.0,
+            "intent": 0.0,
+        }
+        for i, lead in enumerate(unique.tolist())
+    }
+
+
+def rescore_all(write: bool = False, chunk_size: int = 5000) -> Dict[str, Any]:
+    """
+    Re-score every lead in one pass: stored feature state where present, otherwise
+    bootstrapped from messages, then a vectorized score and chunked bulk UPDATE.
+
+    Args:
+        write: Persist scores (and bootstrapped features) to leads
+        chunk_size: Rows per UPDATE statement
+
+    Returns:
+        dict: Lead count, bootstrapped count and score distribution
+    """
+    import json
+    import numpy as np
+    from sqlalchemy import text
+    from api.utils.supabase_client import get_sqlalchemy_engine
+
+    engine = get_sqlalchemy_engine()
+    with engine.connect() as conn:
+        leads = conn.execute(text("SELECT id, status, score_features FROM leads")).all()
+        missing = [str(row.id) for row in leads if not (row.score_features or {}).get("v")]
+        bootstrapped = {}
+        if missing:
+            messages = conn.execute(
+                text(
+                    "SELECT lead_id, sender_type, timestamp, sentiment_score FROM messages "
+                    "WHERE lead_id = ANY(CAST(:ids AS uuid[])) ORDER BY lead_id, timestamp"
+                ),
+                {"ids": missing},
+            ).all()
+            if messages:
+                columns = list(zip(*messages))
+                naive = [ts.replace(tzinfo=None) for ts in columns[2]]
+                sentiment = [s if s is not None else np.nan for s in columns[3]]
+                bootstrapped = bootstrap_features(columns[0], columns[1], naive, sentiment)
+
+    ids = [str(row.id) for row in leads]
+    states = [
+        row.score_features if (row.score_features or {}).get("v") else bootstrapped.get(str(row.id), empty_features())
+        for row in leads
+    ]
+    scores = score_batch(
+        [row.status for row in leads],
+        [s["sentiment"] for s in states],
+        [s["inbound"] for s in states],
+        [s["latency_min"] for s in states],
+        [s["objection"] for s in states],
+        [s["intent"] for s in states],
+    )
+
+    if write:
+        with engine.begin() as conn:
+            for start in range(0, len(ids), chunk_size):
+                end = start + chunk_size
+                conn.execute(
+                    text(
+                        "UPDATE leads SET priority_score = v.score, score_features = v.features "
+                        "FROM unnest(CAST(:ids AS uuid[]), CAST(:scores AS int[]), CAST(:features AS jsonb[])) "
+                        "AS v(id, score, features) WHERE leads.id = v.id"
+                    ),
+                    {
+                        "ids": ids[start:end],
+                        "scores": scores[start:end].tolist(),
+                        "features": [json.dumps(s) for s in states[start:end]],
+                    },
+                )
+
+    return {
+        "leads": len(ids),
+        "bootstrapped": len(bootstrapped),
+        "written": write,
+        "score_percentiles": (
+            {p: int(np.percentile(scores, p)) for p in (10, 50, 90)} if len(scores) else {}
+        ),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-score every lead's priority_score")
+    parser.add_argument("--write", action="store_true", help="Persist scores (default: dry run)")
+    args = parser.parse_args()
+    print(rescore_all(write=args.write))
@@ -0,0 +1,267 @@
+"""
+Declarative lead status transition table.
+Rules (status x intent x objection x sentiment -> next status + action) are compiled
+once at import into a dense dict, so every webhook transition is a single lookup.
+The same table drives vectorized offline replay.
+"""
+
+import itertools
+from typing import Optional, Dict, List, Tuple, Any, Sequence, NamedTuple
+
+from api.utils.lead_manager import VALID_STATUSES
+
+
+INTENTS = [
+    "interested",
+    "objection",
+    "question",
+    "booking",
+    "slot_selection",
+    "stop",
+    "qualifying_response",
+    "unknown",
+]
+
+OBJECTIONS = [
+    "none",
+    "distance",
+    "busy",
+    "cost",
+    "experience",
+    "nervous",
+    "thinking",
+    "other",
+]
+
+SENTIMENTS = ["positive", "neutral", "negative"]
+
+# What the webhook does after the transition
+ACTIONS = [
+    "reply",          # AI-generated response
+    "offer_slots",    # handle_booking_request
+    "confirm_slot",   # confirm_booking
+    "opt_out",        # STOP acknowledgement, no AI call
+]
+
+ANY = "*"
+
+# Ordered rules, first match wins. next_status None keeps the current status.
+# (status, intent, objection, sentiment, next_status, action)
+TRANSITION_RULES: List[Tuple[str, str, str, str, Optional[str], str]] = [
+    (ANY, "stop", ANY, ANY, "Human_Required", "opt_out"),
+    ("Booking_Offered", "slot_selection", ANY, ANY, "Booked", "confirm_slot"),
+    (ANY, "booking", ANY, ANY, "Booking_Offered", "offer_slots"),
+    (ANY, ANY, "distance", ANY, "Objection_Distance", "reply"),
+    (ANY, ANY, "none", "negative", None, "reply"),
+    (ANY, ANY, ANY, "negative", "Human_Required", "reply"),
+    ("New", ANY, ANY, "positive", "Qualifying", "reply"),
+    (ANY, ANY, ANY, ANY, None, "reply"),
+]
+
+STOP_KEYWORDS = ["STOP", "STOPALL", "UNSUBSCRIBE", "CANCEL", "END", "QUIT"]
+BOOKING_KEYWORDS = ["book", "slot", "appointment"]
+
+
+class Transition(NamedTuple):
+    """Result of a table lookup."""
+    next_status: str
+    action: str
+    changed: bool
+
+
+def _matches(pattern: str, value: str) -> bool:
+    return pattern == ANY or pattern == value
+
+
+def _compile(rules) -> Dict[Tuple[str, str, str, str], Tuple[Optional[str], str]]:
+    """Expand wildcard rules into a dense lookup over every combination."""
+    table = {}
+    for key in itertools.product(VALID_STATUSES, INTENTS, OBJECTIONS, SENTIMENTS):
+        for status, intent, objection, sentiment, next_status, action in rules:
+            if (
+                _matches(status, key[0]) and _matches(intent, key[1])
+                and _matches(objection, key[2]) and _matches(sentiment, key[3])
+            ):
+                table[key] = (next_status, action)
+                break
+    return table
+
+
+# Compiled once at import
+_TABLE = _compile(TRANSITION_RULES)
+
+
+def normalize_event(intent: Optional[str], objection: Optional[str], sentiment: Optional[str]) -> Tuple[str, str, str]:
+    """
+    Map free-text analysis fields onto the table's vocabularies.
+
+    Returns:
+        tuple: (intent, objection, sentiment) guaranteed to be table keys
+    """
+    intent = (intent or "unknown").lower()
+    objection = (objection or "none").lower()
+    sentiment = (sentiment or "neutral").lower()
+    return (
+        intent if intent in INTENTS else "unknown",
+        objection if objection in OBJECTIONS else "other",
+        sentiment if sentiment in SENTIMENTS else "neutral",
+    )
+
+
+def classify_event(
+    message: str,
+    analysis: Optional[Dict[str, Any]],
+    current_status: str,
+    num_slots: int = 5
+) -> Tuple[str, str, str]:
+    """
+    Derive the table event for an inbound message.
+    Deterministic message signals (STOP words, booking keywords, a valid slot number)
+    override the model's intent; objection and sentiment come from the analysis.
+
+    Args:
+        message: Lead's message
+        analysis: Output of GeminiSalesAgent.analyze_message (or None)
+        current_status: Lead's current status
+        num_slots: Number of slots offered (valid slot replies are 1..num_slots)
+
+    Returns:
+        tuple: (intent, objection, sentiment)
+    """
+    analysis = analysis or {}
+    intent, objection, sentiment = normalize_event(
+        analysis.get("intent"), analysis.get("objection_type"), analysis.get("sentiment")
+    )
+
+    text = message.strip()
+    lower = text.lower()
+    if text.upper() in STOP_KEYWORDS:
+        intent = "stop"
+    elif any(keyword in lower for keyword in BOOKING_KEYWORDS):
+        intent = "booking"
+    elif text.isdigit() and current_status == "Booking_Offered" and 1 <= int(text) <= num_slots:
+        intent = "slot_selection"
+    elif intent in ("booking", "slot_selection"):
+        # Only explicit keywords / slot numbers trigger the booking flow
+        intent = "interested"
+
+    return intent, objection, sentiment
+
+
+def transition(current_status: str, intent: str, objection: str = "none", sentiment: str = "neutral") -> Transition:
+    """
+    Look up the next status and action in O(1).
+
+    Args:
+        current_status: Lead's current status
+        intent: Normalized intent
+        objection: Normalized objection type
+        sentiment: Normalized sentiment
+
+    Returns:
+        Transition: next_status, action and whether the status changed
+    """
+    status = current_status if current_status in VALID_STATUSES else "New"
+    next_status, action = _TABLE[(status, *normalize_event(intent, objection, sentiment))]
+    next_status = next_status or status
+    return Transition(next_status, action, next_status != current_status)
+
+
+def transition_codes() -> Any:
+    """
+    The table as a dense NumPy tensor of next-status codes, indexed by
+    [status, intent, objection, sentiment] positions in the vocabularies.
+
+    Returns:
+        numpy.ndarray: int8 tensor
+    """
+    import numpy as np
+
+    status_index = {name: i for i, name in enumerate(VALID_STATUSES)}
+    next_codes = np.empty((len(VALID_STATUSES), len(INTENTS), len(OBJECTIONS), len(SENTIMENTS)), dtype=np.int8)
+    for (status, intent, objection, sentiment), (next_status, _) in _TABLE.items():
+        next_codes[
+            status_index[status], INTENTS.index(intent), OBJECTIONS.index(objection), SENTIMENTS.index(sentiment)
+        ] = status_index[next_status or status]
+    return next_codes
+
+
+def replay(
+    lead_ids: Sequence[Any],
+    intents: Sequence[str],
+    objections: Sequence[str],
+    sentiments: Sequence[str],
+    initial_statuses: Optional[Dict[Any, str]] = None
+) -> Dict[str, Any]:
+    """
+    Replay historical inbound events through the table, vectorized across leads.
+    Events must be in chronological order; each step advances every lead by one
+    of its own events using a dense NumPy transition tensor.
+
+    Args:
+        lead_ids: Lead id per event
+        intents: Normalized or raw intent per event
+        objections: Objection type per event
+        sentiments: Sentiment per event
+        initial_statuses: Optional starting status per lead (default 'New')
+
+    Returns:
+        dict: final status per lead, funnel counts (leads that ever reached each
+              status), final status distribution and conversion rates
+    """
+    import numpy as np
+
+    status_index = {name: i for i, name in enumerate(VALID_STATUSES)}
+    intent_index = {name: i for i, name in enumerate(INTENTS)}
+    objection_index = {name: i for i, name in enumerate(OBJECTIONS)}
+    sentiment_index = {name: i for i, name in enumerate(SENTIMENTS)}
+    next_codes = transition_codes()
+
+    # Encode events
+    unique_leads, lead_codes = np.unique(np.asarray(lead_ids, dtype=object).astype(str), return_inverse=True)
+    normalized = [normalize_event(i, o, s) for i, o, s in zip(intents, objections, sentiments)]
+    intent_codes = np.fromiter((intent_index[e[0]] for e in normalized), dtype=np.int8, count=len(normalized))
+    objection_codes = np.fromiter((objection_index[e[1]] for e in normalized), dtype=np.int8, count=len(normalized))
+    sentiment_codes = np.fromiter((sentiment_index[e[2]] for e in normalized), dtype=np.int8, count=len(normalized))
+
+    # Turn number of each event within its lead (stable order preserves chronology)
+    order = np.argsort(lead_codes, kind="stable")
+    sorted_leads = lead_codes[order]
+    starts = np.searchsorted(sorted_leads, np.arange(len(unique_leads)))
+    turn = np.empty(len(lead_codes), dtype=np.int64)
+    turn[order] = np.arange(len(lead_codes)) - starts[sorted_leads]
+
+    initial_statuses = initial_statuses or {}
+    state = np.array(
+        [status_index.get(initial_statuses.get(lead, "New"), 0) for lead in unique_leads],
+        dtype=np.int8
+    )
+    reached = np.zeros((len(unique_leads), len(VALID_STATUSES)), dtype=bool)
+    reached[np.arange(len(unique_leads)), state] = True
+
+    max_turns = int(turn.max()) + 1 if len(turn) else 0
+    for step in range(max_turns):
+        events = np.nonzero(turn == step)[0]
+        leads = lead_codes[events]
+        state[leads] = next_codes[state[leads], intent_codes[events], objection_codes[events], sentiment_codes[events]]
+        reached[leads, state[leads]] = True
+
+    funnel = {name: int(reached[:, i].sum()) for i, name in enumerate(VALID_STATUSES)}
+    final = {name: int((state == i).sum()) for i, name in enumerate(VALID_STATUSES)}
+
+    total_leads = len(unique_leads)
+    offered = reached[:, status_index["Booking_Offered"]]
+    booked_after_offer = offered & reached[:, status_index["Booked"]]
+
+    return {
+        "final_status": {lead: VALID_STATUSES[code] for lead, code in zip(unique_leads.tolist(), state.tolist())},
+        "funnel": funnel,
+        "final_distribution": final,
+        "conversion": {
+            "reached_rate": {name: count / total_leads for name, count in funnel.items()} if total_leads else {},
+            "offered_to_booked": int(booked_after_offer.sum()) / int(offered.sum()) if offered.any() else None,
+        },
+        "leads": len(unique_leads),
+        "events": len(lead_codes),
+    }
+
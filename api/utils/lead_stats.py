@@ -0,0 +1,283 @@
+"""
+Incrementally maintained dashboard counters.
+Per-tenant lead counts by status and bookings per day are kept in memory and
+adjusted on every lead creation and status transition (no lead rows are read).
+A background thread flushes the deltas to the lead_stats table (migration 035) as
+one additive upsert and reloads the table, so every worker converges on the same
+totals; one aggregate query over leads periodically rebuilds the table to correct
+drift (dashboard edits, deletions, is_test toggles, races between workers).
+GET /api/stats answers from memory.
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Tuple
+from zoneinfo import ZoneInfo
+
+
+STATS_SYNC_SECONDS = float(os.getenv("LEAD_STATS_SYNC_SECONDS", "5"))
+STATS_RECONCILE_SECONDS = float(os.getenv("LEAD_STATS_RECONCILE_SECONDS", "600"))
+# Day boundary for "bookings today"
+STATS_TIMEZONE = os.getenv("LEAD_STATS_TZ", "UTC")
+
+ALL_TENANTS = "*"
+NO_TENANT = ""
+STATUS_PREFIX = "status:"
+BOOKED_PREFIX = "booked:"
+
+
+def _tenant_key(tenant_id: Optional[Any]) -> str:
+    return str(tenant_id) if tenant_id else NO_TENANT
+
+
+class PostgresStatsStore:
+    """lead_stats table access (one statement per call, transaction-pooler safe)."""
+
+    def apply(self, deltas: Dict[Tuple[str, str], int]) -> None:
+        """Add deltas to the stored counters in one multi-row upsert."""
+        from sqlalchemy import text
+        from api.utils.supabase_client import get_sqlalchemy_engine
+
+        keys = [key for key, delta in deltas.items() if delta]
+        if not keys:
+            return
+        with get_sqlalchemy_engine().begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO lead_stats (tenant_key, metric, value) "
+                    "SELECT * FROM unnest(CAST(:tenants AS text[]), CAST(:metrics AS text[]), CAST(:deltas AS bigint[])) "
+                    "ON CONFLICT (tenant_key, metric) DO UPDATE "
+                    "SET value = lead_stats.value + EXCLUDED.value, updated_at = now()"
+                ),
+                {
+                    "tenants": [tenant for tenant, _ in keys],
+                    "metrics": [metric for _, metric in keys],
+                    "deltas": [deltas[key] for key in keys],
+                },
+            )
+
+    def load(self) -> List[Tuple[str, str, int]]:
+        from sqlalchemy import text
+        from api.utils.supabase_client import get_sqlalchemy_engine
+
+        with get_sqlalchemy_engine().connect() as conn:
+            rows = conn.execute(text("SELECT tenant_key, metric, value FROM lead_stats")).all()
+        return [(row.tenant_key, row.metric, int(row.value)) for row in rows]
+
+    def reconcile(self, booked_metric: str, day_start: datetime) -> Optional[List[Tuple[str, str, int]]]:
+        """
+        Rebuild the table from one aggregate query over leads.
+
+        Returns:
+            list: The rebuilt counters, or None if another worker is reconciling
+        """
+        from sqlalchemy import text
+        from api.utils.supabase_client import get_sqlalchemy_engine
+
+        with get_sqlalchemy_engine().begin() as conn:
+            if not conn.execute(text("SELECT pg_try_advisory_xact_lock(hashtext('lead_stats_reconcile'))")).scalar():
+                return None
+            counts = conn.execute(
+                text(
+                    "SELECT COALESCE(tenant_id::text, '') AS tenant_key, status, count(*) AS leads, "
+                    "count(*) FILTER (WHERE booked_at >= :day_start) AS booked "
+                    "FROM leads WHERE is_test IS NOT TRUE GROUP BY 1, 2"
+                ),
+                {"day_start": day_start},
+            ).all()
+
+            values: Dict[Tuple[str, str], int] = {}
+            for row in counts:
+                values[(row.tenant_key, STATUS_PREFIX + (row.status or "New"))] = int(row.leads)
+                if row.booked:
+                    key = (row.tenant_key, booked_metric)
+                    values[key] = values.get(key, 0) + int(row.booked)
+
+            conn.execute(text("DELETE FROM lead_stats"))
+            if values:
+                conn.execute(
+                    text(
+                        "INSERT INTO lead_stats (tenant_key, metric, value) "
+                        "SELECT * FROM unnest(CAST(:tenants AS text[]), CAST(:metrics AS text[]), CAST(:values AS bigint[]))"
+                    ),
+                    {
+                        "tenants": [tenant for tenant, _ in values],
+                        "metrics": [metric for _, metric in values],
+                        "values": list(values.values()),
+                    },
+                )
+        return [(tenant, metric, value) for (tenant, metric), value in values.items()]
+
+
+class LeadStats:
+    """
+    tenant_key -> metric -> value, plus the ALL_TENANTS roll-up, and the deltas
+    not yet flushed. Metrics are 'status:<Status>' and 'booked:<YYYY-MM-DD>'.
+    Test leads are not counted.
+    """
+
+    def __init__(self, store: Optional[Any] = None, timezone_name: str = STATS_TIMEZONE):
+        """
+        Args:
+            store: PostgresStatsStore (or None for memory-only counting)
+            timezone_name: Zone whose midnight starts a new bookings day
+        """
+        self.store = store
+        self.tz = ZoneInfo(timezone_name)
+        self._values: Dict[str, Dict[str, int]] = {}
+        self._pending: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self.synced_at: Optional[float] = None
+        self.reconciled_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+
+    def _today(self) -> datetime:
+        return datetime.now(self.tz).replace(hour=0, minute=0, second=0, microsecond=0)
+
+    def booked_metric(self) -> str:
+        return BOOKED_PREFIX + self._today().date().isoformat()
+
+    def _add(self, values: Dict[str, Dict[str, int]], tenant_key: str, metric: str, delta: int) -> None:
+        for key in (tenant_key, ALL_TENANTS):
+            counters = values.setdefault(key, {})
+            counters[metric] = counters.get(metric, 0) + delta
+
+    def _record(self, tenant_id: Optional[Any], metric: str, delta: int) -> None:
+        tenant_key = _tenant_key(tenant_id)
+        with self._lock:
+            self._add(self._values, tenant_key, metric, delta)
+            self._pending[(tenant_key, metric)] = self._pending.get((tenant_key, metric), 0) + delta
+
+    def record_created(self, tenant_id: Optional[Any], is_test: bool = False, status: str = "New", count: int = 1) -> None:
+        """Count newly created leads."""
+        if is_test or count <= 0:
+            return
+        self._record(tenant_id, STATUS_PREFIX + status, count)
+
+    def record_transition(self, tenant_id: Optional[Any], previous: Optional[str], status: str, is_test: bool = False) -> None:
+        """Move a lead between status counters (and count a booking when it becomes Booked)."""
+        if is_test or previous == status:
+            return
+        if previous:
+            self._record(tenant_id, STATUS_PREFIX + previous, -1)
+        self._record(tenant_id, STATUS_PREFIX + status, 1)
+        if status == "Booked":
+            self._record(tenant_id, self.booked_metric(), 1)
+
+    def _rebuild(self, rows: List[Tuple[str, str, int]]) -> None:
+        """Replace the counters with stored rows, keeping deltas recorded since the flush."""
+        values: Dict[str, Dict[str, int]] = {}
+        for tenant_key, metric, value in rows:
+            self._add(values, tenant_key, metric, value)
+        with self._lock:
+            for (tenant_key, metric), delta in self._pending.items():
+                self._add(values, tenant_key, metric, delta)
+            self._values = values
+
+    def sync(self) -> None:
+        """Flush pending deltas, then reload the shared counters (other workers' deltas)."""
+        with self._lock:
+            pending, self._pending = self._pending, {}
+        try:
+            self.store.apply(pending)
+        except Exception:
+            with self._lock:
+                for key, delta in pending.items():
+                    self._pending[key] = self._pending.get(key, 0) + delta
+            raise
+        self._rebuild(self.store.load())
+        self.synced_at = time.time()
+
+    def reconcile(self) -> bool:
+        """
+        Rebuild the counters from leads. Unflushed deltas are dropped (the aggregate
+        already includes their transitions); a transition racing the query can be
+        off by one until the next reconcile.
+
+        Returns:
+            bool: False if another worker held the reconcile lock (a sync ran instead)
+        """
+        with self._lock:
+            self._pending = {}
+        rows = self.store.reconcile(self.booked_metric(), self._today().astimezone(timezone.utc))
+        if rows is None:
+            self.sync()
+            return False
+        self._rebuild(rows)
+        self.synced_at = self.reconciled_at = time.time()
+        print(f"📈 Lead stats reconciled: {len(rows)} counters")
+        return True
+
+    def run_forever(self, stop: threading.Event, sync_seconds: float = STATS_SYNC_SECONDS, reconcile_seconds: float = STATS_RECONCILE_SECONDS) -> None:
+        next_reconcile = 0.0
+        while not stop.is_set():
+            try:
+                if time.time() >= next_reconcile:
+                    self.reconcile()
+                    next_reconcile = time.time() + reconcile_seconds
+                else:
+                    self.sync()
+                self.last_error = None
+            except Exception as e:
+                if self.last_error is None:
+                    print(f"Lead stats sync failed (counters are local until it recovers): {e}")
+                self.last_error = str(e)
+            stop.wait(sync_seconds)
+
+    def snapshot(self, tenant_id: Optional[str] = None) -> Dict[str, Any]:
+        """
+        Dashboard counters for one tenant, or all tenants.
+
+        Returns:
+            dict: total, by_status, bookings_today, human_required and freshness timestamps
+        """
+        counters = self._values.get(_tenant_key(tenant_id) if tenant_id else ALL_TENANTS, {})
+        by_status = {
+            metric[len(STATUS_PREFIX):]: value
+            for metric, value in counters.items() if metric.startswith(STATUS_PREFIX) and value
+        }
+        return {
+            "tenant_id": tenant_id,
+            "total": sum(by_status.values()),
+            "by_status": by_status,
+            "bookings_today": counters.get(self.booked_metric(), 0),
+            "human_required": by_status.get("Human_Required", 0),
+            "synced_at": datetime.fromtimestamp(self.synced_at, timezone.utc).isoformat() if self.synced_at else None,
+            "reconciled_at": datetime.fromtimestamp(self.reconciled_at, timezone.utc).isoformat() if self.reconciled_at else None,
+        }
+
+
+# Singleton
+_stats: Optional[LeadStats] = None
+_stats_lock = threading.Lock()
+_stats_stop = threading.Event()
+
+
+def get_lead_stats() -> LeadStats:
+    global _stats
+    if _stats is None:
+        with _stats_lock:
+            if _stats is None:
+                _stats = LeadStats(PostgresStatsStore())
+    return _stats
+
+
+def start_lead_stats() -> None:
+    """Run reconcile + sync in a daemon thread (LEAD_STATS_SYNC=0 keeps counters local)."""
+    if os.getenv("LEAD_STATS_SYNC", "1") == "0":
+        return
+    threading.Thread(
+        target=get_lead_stats().run_forever, args=(_stats_stop,), name="lead-stats-sync", daemon=True
+    ).start()
+
+
+def stop_lead_stats() -> None:
+    """Stop the sync thread and flush this worker's last deltas."""
+    _stats_stop.set()
+    if _stats is not None and _stats._pending and os.getenv("LEAD_STATS_SYNC", "1") != "0":
+        try:
+            _stats.store.apply(_stats._pending)
+        except Exception as e:
+            print(f"Lead stats final flush failed: {e}")
@@ -0,0 +1,140 @@
+"""
+In-memory stand-in for the lead_manager persistence functions.
+Implements the same call surface the conversation pipeline uses, so the real
+webhook logic can run offline (simulation, replay) without Supabase.
+"""
+
+import itertools
+import threading
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, List, Dict, Any
+
+from api.utils.lead_manager import VALID_STATUSES, format_messages_for_ai, message_analysis_fields
+
+
+class InMemoryLeadStore:
+    """
+    Thread-safe dict-backed store with lead_manager's function names.
+    Pass it as `store=` to api.webhook.process_inbound_message.
+    """
+
+    def __init__(self, tenant_plan: Optional[str] = None):
+        """
+        Args:
+            tenant_plan: Plan returned by get_tenant_plan for every tenant
+        """
+        self.tenant_plan = tenant_plan
+        self.leads: Dict[str, Dict[str, Any]] = {}
+        self.messages: Dict[str, List[Dict[str, Any]]] = {}
+        self._codes = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def get_or_create_lead(self, phone: str) -> Dict[str, Any]:
+        with self._lock:
+            lead = self.leads.get(phone)
+            if lead is None:
+                lead = {
+                    "id": str(uuid.uuid4()),
+                    "phone": phone,
+                    "lead_code": f"#SIM{next(self._codes):03d}",
+                    "name": None,
+                    "status": "New",
+                    "is_manual_mode": False,
+                    "is_test": False,
+                    "whatsapp_mode": False,
+                    "tenant_id": None,
+                    "priority_score": 0,
+                    "score_features": {},
+                    "created_at": datetime.now(timezone.utc).isoformat(),
+                }
+                self.leads[phone] = lead
+                self.messages[lead["id"]] = []
+            return dict(lead)
+
+    def update_lead_name(self, phone: str, name: str) -> bool:
+        with self._lock:
+            if phone not in self.leads:
+                return False
+            self.leads[phone]["name"] = name
+            return True
+
+    def update_lead_status(self, phone: str, status: str, previous: Optional[str] = None) -> bool:
+        if status not in VALID_STATUSES:
+            return False
+        with self._lock:
+            if phone not in self.leads:
+                return False
+            self.leads[phone]["status"] = status
+            return True
+
+    def update_lead_score(self, lead_id: str, score: int, features: Dict[str, Any]) -> bool:
+        with self._lock:
+            for lead in self.leads.values():
+                if lead["id"] == lead_id:
+                    lead["priority_score"] = score
+                    lead["score_features"] = dict(features)
+                    return True
+            return False
+
+    def set_manual_mode(self, lead_id: str, enabled: bool) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for lead in self.leads.values():
+                if lead["id"] == lead_id:
+                    lead["is_manual_mode"] = enabled
+                    return dict(lead)
+            return {}
+
+    def is_lead_in_manual_mode(self, phone: str) -> bool:
+        with self._lock:
+            return bool(self.leads.get(phone, {}).get("is_manual_mode", False))
+
+    def save_message(self, phone: str, sender_type: str, content: str, analysis: Optional[Dict[str, Any]] = None) -> Optional[str]:
+        if sender_type not in ["lead", "bot", "human"]:
+            return None
+        lead = self.get_or_create_lead(phone)
+        message = {
+            "id": str(uuid.uuid4()),
+            "lead_id": lead["id"],
+            "sender_type": sender_type,
+            "content": content,
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            **message_analysis_fields(sender_type, content, analysis),
+        }
+        with self._lock:
+            self.messages[lead["id"]].append(message)
+        return message["id"]
+
+    def verify_message_saved(self, lead_id: str, message_id: str, max_attempts: int = 5) -> bool:
+        with self._lock:
+            return any(m["id"] == message_id for m in self.messages.get(lead_id, []))
+
+    def get_messages(self, phone: str, limit: int = 10) -> List[Dict[str, Any]]:
+        lead = self.get_or_create_lead(phone)
+        with self._lock:
+            recent = self.messages[lead["id"]][-limit:]
+            return [
+                {"sender_type": m["sender_type"], "content": m["content"], "timestamp": m["timestamp"]}
+                for m in recent
+            ]
+
+    def get_messages_with_retry(
+        self,
+        phone: str,
+        expected_count: Optional[int] = None,
+        limit: int = 10,
+        max_retries: int = 3
+    ) -> List[Dict[str, Any]]:
+        return self.get_messages(phone, limit)
+
+    def get_lead_by_id(self, lead_id: str) -> Optional[Dict[str, Any]]:
+        with self._lock:
+            for lead in self.leads.values():
+                if lead["id"] == lead_id:
+                    return dict(lead)
+            return None
+
+    def get_tenant_plan(self, tenant_id: Optional[str]) -> Optional[str]:
+        return self.tenant_plan
+
+    format_messages_for_ai = staticmethod(format_messages_for_ai)
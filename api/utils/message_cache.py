@@ -0,0 +1,323 @@
+"""
+In-process read model for recent conversation history.
+Keeps a bounded ring buffer of the latest messages per active lead, filled by
+save_message and primed by the first history query. Leads are evicted LRU by count
+and approximate memory size. A change feed (Postgres LISTEN/NOTIFY from the messages
+trigger, or a local stand-in) applies writes made by other instances and the
+dashboard, so hot conversations can skip the history query entirely.
+"""
+
+import json
+import os
+import select
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Callable
+
+
+# Messages kept per lead (must cover the largest history limit requested)
+HISTORY_CAPACITY = int(os.getenv("MESSAGE_CACHE_CAPACITY", "20"))
+MAX_CACHED_LEADS = int(os.getenv("MESSAGE_CACHE_MAX_LEADS", "5000"))
+MAX_CACHE_BYTES = int(os.getenv("MESSAGE_CACHE_MAX_BYTES", str(32 * 1024 * 1024)))
+# Upper bound on staleness if a change notification is ever lost
+CACHE_TTL_SECONDS = float(os.getenv("MESSAGE_CACHE_TTL", "300"))
+
+# Direct (session mode, port 5432) Postgres DSN for LISTEN; the 6543 pooler cannot LISTEN
+MESSAGE_FEED_DSN = os.getenv("MESSAGE_FEED_DSN")
+MESSAGE_FEED_CHANNEL = "message_changes"
+
+# Rough per-message overhead (dict, strings, deque slot) for the memory bound
+_MESSAGE_OVERHEAD_BYTES = 200
+
+
+def message_time(value: Any) -> datetime:
+    """
+    Sort key for a message timestamp. Database rows, change-feed payloads and
+    buffered rows format timestamps differently ('Z' vs '+00:00', fewer fractional
+    digits), so compare them as datetimes; a naive value is UTC.
+    """
+    if not isinstance(value, datetime):
+        try:
+            value = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+        except ValueError:
+            return datetime.min.replace(tzinfo=timezone.utc)
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+class _LeadHistory:
+    __slots__ = ("messages", "ids", "size", "loaded_at")
+
+    def __init__(self, capacity: int):
+        self.messages: deque = deque(maxlen=capacity)
+        self.ids: set = set()
+        self.size = 0
+        self.loaded_at = time.monotonic()
+
+
+def _message_size(message: Dict[str, Any]) -> int:
+    return _MESSAGE_OVERHEAD_BYTES + len(message.get("content") or "")
+
+
+class MessageHistoryCache:
+    """
+    LRU of per-lead ring buffers. A lead's buffer is authoritative once primed
+    (from a history query or lead creation); writes for unprimed leads are ignored.
+    """
+
+    def __init__(
+        self,
+        capacity: int = HISTORY_CAPACITY,
+        max_leads: int = MAX_CACHED_LEADS,
+        max_bytes: int = MAX_CACHE_BYTES,
+        ttl: float = CACHE_TTL_SECONDS,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.capacity = capacity
+        self.max_leads = max_leads
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self.clock = clock
+        self._leads: "OrderedDict[str, _LeadHistory]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.invalidations = 0
+
+    def get(self, lead_id: str, limit: int = 10) -> Optional[List[Dict[str, Any]]]:
+        """
+        Return the last `limit` messages (oldest first), or None on a miss.
+        """
+        with self._lock:
+            history = self._leads.get(lead_id)
+            if history is None or limit > self.capacity or self.clock() - history.loaded_at > self.ttl:
+                self.misses += 1
+                return None
+            self._leads.move_to_end(lead_id)
+            self.hits += 1
+            recent = list(history.messages)[-limit:] if limit else []
+            return [
+                {"sender_type": m["sender_type"], "content": m["content"], "timestamp": m["timestamp"]}
+                for m in recent
+            ]
+
+    def prime(self, lead_id: str, messages: List[Dict[str, Any]]) -> None:
+        """Install a lead's history (oldest first) as read from the database."""
+        with self._lock:
+            self._drop(lead_id)
+            history = _LeadHistory(self.capacity)
+            history.loaded_at = self.clock()
+            self._leads[lead_id] = history
+            for message in messages[-self.capacity:]:
+                self._push(history, message)
+            self._evict()
+
+    def append(self, lead_id: str, message: Dict[str, Any]) -> None:
+        """
+        Add a message to a primed lead's buffer (idempotent by message id).
+        Out-of-order timestamps are placed in order.
+        """
+        with self._lock:
+            history = self._leads.get(lead_id)
+            if history is None or (message.get("id") and message["id"] in history.ids):
+                return
+            self._leads.move_to_end(lead_id)
+            newest = history.messages[-1]["timestamp"] if history.messages else None
+            timestamp = message.get("timestamp")
+            if newest is None or not timestamp or message_time(timestamp) >= message_time(newest):
+                self._push(history, message)
+            else:
+                ordered = sorted(list(history.messages) + [message], key=lambda m: message_time(m.get("timestamp") or ""))
+                self._clear(history)
+                for item in ordered[-self.capacity:]:
+                    self._push(history, item)
+            self._evict()
+
+    def invalidate(self, lead_id: str) -> None:
+        with self._lock:
+            if self._drop(lead_id):
+                self.invalidations += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._leads.clear()
+            self._bytes = 0
+
+    def apply_change(self, event: Dict[str, Any]) -> None:
+        """
+        Apply a change-feed event: inserts carrying the row are appended,
+        anything else (updates, deletes, truncated payloads) invalidates the lead.
+        """
+        lead_id = event.get("lead_id")
+        if not lead_id:
+            return
+        if event.get("op") == "INSERT" and event.get("content") is not None:
+            self.append(lead_id, event)
+        else:
+            self.invalidate(lead_id)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "leads": len(self._leads),
+                "bytes": self._bytes,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": self.hits / lookups if lookups else None,
+                "invalidations": self.invalidations,
+            }
+
+    def _push(self, history: _LeadHistory, message: Dict[str, Any]) -> None:
+        entry = {
+            "id": message.get("id"),
+            "sender_type": message.get("sender_type"),
+            "content": message.get("content"),
+            "timestamp": message.get("timestamp"),
+        }
+        if len(history.messages) == history.messages.maxlen:
+            evicted = history.messages[0]
+            history.ids.discard(evicted["id"])
+            history.size -= _message_size(evicted)
+            self._bytes -= _message_size(evicted)
+        history.messages.append(entry)
+        if entry["id"]:
+            history.ids.add(entry["id"])
+        history.size += _message_size(entry)
+        self._bytes += _message_size(entry)
+
+    def _clear(self, history: _LeadHistory) -> None:
+        self._bytes -= history.size
+        history.messages.clear()
+        history.ids.clear()
+        history.size = 0
+
+    def _drop(self, lead_id: str) -> bool:
+        history = self._leads.pop(lead_id, None)
+        if history is None:
+            return False
+        self._bytes -= history.size
+        return True
+
+    def _evict(self) -> None:
+        while self._leads and (len(self._leads) > self.max_leads or self._bytes > self.max_bytes):
+            _, history = self._leads.popitem(last=False)
+            self._bytes -= history.size
+
+
+class LocalChangeFeed:
+    """In-process change feed (single instance, tests): publish() calls subscribers directly."""
+
+    def __init__(self):
+        self._subscribers: List[Callable[[Dict[str, Any]], None]] = []
+
+    def subscribe(self, callback: Callable[[Dict[str, Any]], None]) -> None:
+        self._subscribers.append(callback)
+
+    def publish(self, event: Dict[str, Any]) -> None:
+        for callback in list(self._subscribers):
+            callback(event)
+
+    def start(self) -> None:
+        pass
+
+    def stop(self) -> None:
+        pass
+
+
+class PostgresChangeFeed(LocalChangeFeed):
+    """
+    LISTEN on the message_changes channel (see migration 026) in a daemon thread.
+    On disconnect subscribers receive a {"op": "RESET"} event before reconnecting,
+    since notifications sent while disconnected are lost.
+    """
+
+    def __init__(self, dsn: str, channel: str = MESSAGE_FEED_CHANNEL, reconnect_delay: float = 2.0):
+        super().__init__()
+        self.dsn = dsn
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self._stopped = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._thread = threading.Thread(target=self._run, name="message-feed", daemon=True)
+            self._thread.start()
+
+    def stop(self) -> None:
+        self._stopped.set()
+
+    def _run(self) -> None:
+        import psycopg2
+
+        while not self._stopped.is_set():
+            conn = None
+            try:
+                conn = psycopg2.connect(self.dsn)
+                conn.autocommit = True
+                with conn.cursor() as cursor:
+                    cursor.execute(f"LISTEN {self.channel};")
+                print(f"📡 Listening for message changes on {self.channel}")
+                while not self._stopped.is_set():
+                    if select.select([conn], [], [], 5.0) == ([], [], []):
+                        continue
+                    conn.poll()
+                    while conn.notifies:
+                        notify = conn.notifies.pop(0)
+                        try:
+                            self.publish(json.loads(notify.payload))
+                        except ValueError:
+                            print(f"Ignoring malformed change notification: {notify.payload[:100]}")
+            except Exception as e:
+                print(f"Message change feed error: {e}")
+            finally:
+                if conn is not None:
+                    try:
+                        conn.close()
+                    except Exception:
+                        pass
+            self.publish({"op": "RESET"})
+            self._stopped.wait(self.reconnect_delay)
+
+
+# Singletons
+_history_cache: Optional[MessageHistoryCache] = None
+_change_feed: Optional[LocalChangeFeed] = None
+
+
+def _on_change(event: Dict[str, Any]) -> None:
+    if event.get("op") == "RESET":
+        _history_cache.clear()
+    else:
+        _history_cache.apply_change(event)
+
+
+def get_history_cache() -> Optional[MessageHistoryCache]:
+    """
+    Get the process-wide history cache, or None when it is disabled.
+    Enabled when MESSAGE_FEED_DSN is set (cross-instance invalidation) or
+    MESSAGE_CACHE=local (single instance only: dashboard writes are not seen).
+    """
+    global _history_cache, _change_feed
+
+    if _history_cache is None:
+        if MESSAGE_FEED_DSN:
+            _change_feed = PostgresChangeFeed(MESSAGE_FEED_DSN)
+        elif os.getenv("MESSAGE_CACHE", "").lower() == "local":
+            _change_feed = LocalChangeFeed()
+        else:
+            return None
+        _history_cache = MessageHistoryCache()
+        _change_feed.subscribe(_on_change)
+        _change_feed.start()
+
+    return _history_cache
+
+
+def get_change_feed() -> Optional[LocalChangeFeed]:
+    """The feed feeding the history cache (None when the cache is disabled)."""
+    get_history_cache()
+    return _change_feed
@@ -0,0 +1,471 @@
+"""
+Model tiering and latency-aware fallback for Gemini calls.
+Routes cheap classification to a fast model and replies to the stronger model,
+with per-call timeouts, hedged requests after the observed p95 and a circuit
+breaker per model that downgrades a tier while its primary model is failing.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, Future, wait, FIRST_COMPLETED
+from typing import Optional, Dict, List, Any, Callable, Deque
+from dotenv import load_dotenv
+from api.utils.rate_limiter import AdaptiveRateLimiter, get_rate_limiter
+
+load_dotenv()
+
+
+def _model_chain(primary_env: str, primary_default: str, fallback_env: str, fallback_default: str) -> List[str]:
+    """Build an ordered model chain (primary first, then downgrades) from env vars."""
+    chain = [os.getenv(primary_env, primary_default)]
+    for name in os.getenv(fallback_env, fallback_default).split(","):
+        name = name.strip()
+        if name and name not in chain:
+            chain.append(name)
+    return chain
+
+
+# Ordered model chains per tier; later entries are downgrades
+MODEL_TIERS = {
+    "fast": _model_chain("GEMINI_FAST_MODEL", "gemini-2.0-flash", "GEMINI_FAST_FALLBACK_MODELS", "gemini-2.5-flash"),
+    "reply": _model_chain(
+        "GEMINI_REPLY_MODEL", "gemini-2.0-flash-thinking-exp-1219",
+        "GEMINI_REPLY_FALLBACK_MODELS", "gemini-2.5-flash,gemini-2.0-flash"
+    ),
+}
+
+# Hard per-call deadline (seconds) per tier, across hedges and downgrades
+TIER_TIMEOUTS = {
+    "fast": float(os.getenv("MODEL_TIMEOUT_FAST", "4")),
+    "reply": float(os.getenv("MODEL_TIMEOUT_REPLY", "12")),
+}
+
+# Hedge delay used until enough latency samples exist to compute a p95
+DEFAULT_HEDGE_DELAYS = {
+    "fast": float(os.getenv("MODEL_HEDGE_DELAY_FAST", "1.5")),
+    "reply": float(os.getenv("MODEL_HEDGE_DELAY_REPLY", "5")),
+}
+
+MIN_LATENCY_SAMPLES = 20
+MAX_MODEL_WORKERS = int(os.getenv("MODEL_MAX_WORKERS", "16"))
+
+
+class ModelUnavailableError(Exception):
+    """Raised when every model in a tier failed or timed out."""
+
+
+class LatencyTracker:
+    """Rolling window of call latencies for percentile estimates."""
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+        self._lock = threading.Lock()
+
+    def record(self, seconds: float) -> None:
+        with self._lock:
+            self._samples.append(seconds)
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+    def percentile(self, q: float) -> Optional[float]:
+        """
+        Get the q-th percentile (0-100) of recorded latencies.
+
+        Returns:
+            float: Latency in seconds, or None if there are no samples
+        """
+        with self._lock:
+            samples = sorted(self._samples)
+        if not samples:
+            return None
+        index = min(len(samples) - 1, int(round(q / 100.0 * (len(samples) - 1))))
+        return samples[index]
+
+
+class CircuitBreaker:
+    """
+    Error-rate circuit breaker over a rolling window of outcomes.
+    closed -> open when the error rate crosses the threshold; after the cooldown
+    one probe call is let through (half-open) and its outcome closes or reopens it.
+    """
+
+    def __init__(
+        self,
+        window: int = 20,
+        error_threshold: float = 0.5,
+        min_calls: int = 5,
+        cooldown: float = 30.0,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        self.window = window
+        self.error_threshold = error_threshold
+        self.min_calls = min_calls
+        self.cooldown = cooldown
+        self._clock = clock
+        self._outcomes: Deque[bool] = deque(maxlen=window)
+        self._opened_at: Optional[float] = None
+        self._probe_in_flight = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self) -> str:
+        if self._opened_at is None:
+            return "closed"
+        if self._clock() - self._opened_at >= self.cooldown:
+            return "half_open"
+        return "open"
+
+    def available(self) -> bool:
+        """True if allow() would admit a call now (does not take the half-open probe)."""
+        with self._lock:
+            state = self.state
+            return state == "closed" or (state == "half_open" and not self._probe_in_flight)
+
+    def allow(self) -> bool:
+        """Return True if a call may be made now (in half-open, takes the single probe)."""
+        with self._lock:
+            state = self.state
+            if state == "closed":
+                return True
+            if state == "half_open" and not self._probe_in_flight:
+                self._probe_in_flight = True
+                return True
+            return False
+
+    def release(self) -> None:
+        """Give back a probe taken by allow() for a call that was never made."""
+        with self._lock:
+            self._probe_in_flight = False
+
+    def record(self, success: bool) -> None:
+        """Record a call outcome and update the breaker state."""
+        with self._lock:
+            if self._opened_at is not None:
+                # Probe result decides whether to close or stay open
+                self._probe_in_flight = False
+                if success:
+                    self._opened_at = None
+                    self._outcomes.clear()
+                else:
+                    self._opened_at = self._clock()
+                return
+
+            self._outcomes.append(success)
+            if len(self._outcomes) >= self.min_calls:
+                errors = self._outcomes.count(False)
+                if errors / len(self._outcomes) >= self.error_threshold:
+                    self._opened_at = self._clock()
+                    print(f"⚡ Circuit opened after {errors}/{len(self._outcomes)} failures")
+
+    def error_rate(self) -> float:
+        with self._lock:
+            if not self._outcomes:
+                return 0.0
+            return self._outcomes.count(False) / len(self._outcomes)
+
+
+class FakeModel:
+    """
+    Stand-in for genai.GenerativeModel used in tests and offline simulation.
+    Simulates latency, failures and canned or computed replies.
+    """
+
+    def __init__(
+        self,
+        name: str = "fake",
+        latency: float = 0.0,
+        failure_rate: float = 0.0,
+        reply: Any = "OK",
+        seed: Optional[int] = None,
+        error_message: str = "simulated backend failure"
+    ):
+        """
+        Args:
+            name: Model name reported in errors
+            latency: Seconds to sleep per call (or a callable returning seconds)
+            failure_rate: Probability in [0, 1] that a call raises
+            reply: Response text, or a callable(prompt) -> text
+            seed: Seed for the failure draw (deterministic tests)
+            error_message: Failure text (e.g. "429 Resource exhausted" to simulate throttling)
+        """
+        import random
+        self.name = name
+        self.latency = latency
+        self.failure_rate = failure_rate
+        self.reply = reply
+        self.error_message = error_message
+        self.calls = 0
+        self._random = random.Random(seed)
+        self._lock = threading.Lock()
+
+    def generate_content(self, prompt: str, generation_config: Optional[Dict[str, Any]] = None):
+        with self._lock:
+            self.calls += 1
+            fail = self._random.random() < self.failure_rate
+        delay = self.latency() if callable(self.latency) else self.latency
+        if delay:
+            time.sleep(delay)
+        if fail:
+            raise RuntimeError(f"{self.name}: {self.error_message}")
+        text = self.reply(prompt) if callable(self.reply) else self.reply
+
+        class _Response:
+            pass
+
+        response = _Response()
+        response.text = text
+        return response
+
+
+_genai_configured = False
+
+
+def _default_model_factory(name: str):
+    """
+    Build a real Gemini model. google.generativeai is imported (and configured with
+    GEMINI_API_KEY) on first use: it keeps tests dependency-free and is the largest
+    single import of a cold start.
+    """
+    global _genai_configured
+    import google.generativeai as genai
+    if not _genai_configured:
+        genai.configure(api_key=os.getenv("GEMINI_API_KEY"))
+        _genai_configured = True
+    return genai.GenerativeModel(model_name=name)
+
+
+class ModelRouter:
+    """
+    Routes generate_content calls to tiered model chains.
+    Each attempt is hedged: if the primary has not answered by its p95 latency,
+    a backup request goes to the next healthy model and the first answer wins.
+    """
+
+    def __init__(
+        self,
+        tiers: Optional[Dict[str, List[str]]] = None,
+        model_factory: Optional[Callable[[str], Any]] = None,
+        timeouts: Optional[Dict[str, float]] = None,
+        hedge_delays: Optional[Dict[str, float]] = None,
+        breaker_factory: Optional[Callable[[], CircuitBreaker]] = None,
+        limiter: Optional[AdaptiveRateLimiter] = None,
+        max_workers: int = MAX_MODEL_WORKERS
+    ):
+        """
+        Args:
+            tiers: Tier name -> ordered model chain (defaults to MODEL_TIERS)
+            model_factory: Builds a model object from its name
+            timeouts: Tier name -> hard deadline in seconds
+            hedge_delays: Tier name -> hedge delay before p95 data exists
+            breaker_factory: Builds one CircuitBreaker per model
+            limiter: Admission control shared by all calls (defaults to the process-wide limiter)
+            max_workers: Thread pool size for concurrent model calls
+        """
+        self.tiers = {tier: list(chain) for tier, chain in (tiers or MODEL_TIERS).items()}
+        self.timeouts = dict(TIER_TIMEOUTS, **(timeouts or {}))
+        self.hedge_delays = dict(DEFAULT_HEDGE_DELAYS, **(hedge_delays or {}))
+        self._model_factory = model_factory or _default_model_factory
+        self._breaker_factory = breaker_factory or CircuitBreaker
+        self.limiter = limiter or get_rate_limiter()
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="model")
+
+        self._models: Dict[str, Any] = {}
+        self._latency: Dict[str, LatencyTracker] = {}
+        self._breakers: Dict[str, CircuitBreaker] = {}
+        self._lock = threading.Lock()
+
+        self.hedges_fired = 0
+        self.downgrades = 0
+
+    def _model(self, name: str) -> Any:
+        with self._lock:
+            if name not in self._models:
+                self._models[name] = self._model_factory(name)
+                self._latency[name] = LatencyTracker()
+                self._breakers[name] = self._breaker_factory()
+            return self._models[name]
+
+    def breaker(self, name: str) -> CircuitBreaker:
+        self._model(name)
+        return self._breakers[name]
+
+    def warm(self, connect: bool = False) -> List[str]:
+        """
+        Build every tier's models before the first request needs them.
+
+        Args:
+            connect: Also open the API connection with a count_tokens call per tier primary (nothing is generated)
+
+        Returns:
+            list: Model names built
+        """
+        names = [name for chain in self.tiers.values() for name in chain]
+        for name in names:
+            self._model(name)
+        if connect:
+            from google.api_core.retry import Retry
+
+            for primary in dict.fromkeys(chain[0] for chain in self.tiers.values()):
+                model = self._model(primary)
+                if hasattr(model, "count_tokens"):
+                    model.count_tokens("warm-up", request_options={"timeout": 5, "retry": Retry(timeout=5)})
+        return names
+
+    def _hedge_delay(self, tier: str, name: str) -> float:
+        tracker = self._latency.get(name)
+        if tracker is not None and len(tracker) >= MIN_LATENCY_SAMPLES:
+            return tracker.percentile(95) or self.hedge_delays.get(tier, 5.0)
+        return self.hedge_delays.get(tier, 5.0)
+
+    def _call(
+        self,
+        tier: str,
+        name: str,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]],
+        priority: str,
+        deadline: float
+    ) -> str:
+        """
+        Run one model call inside a limiter slot, recording latency and outcome.
+        Queue time is excluded from latency; calls slower than the tier timeout count as failures.
+        """
+        model = self._model(name)
+        called = False
+        try:
+            with self.limiter.slot(priority, timeout=max(0.0, deadline - time.monotonic())):
+                started = time.monotonic()
+                called = True
+                try:
+                    response = model.generate_content(prompt, generation_config=generation_config)
+                    text = response.text
+                except Exception:
+                    self._breakers[name].record(False)
+                    raise
+        finally:
+            if not called:
+                # No limiter slot before the deadline: the model was never asked
+                self._breakers[name].release()
+        elapsed = time.monotonic() - started
+        self._latency[name].record(elapsed)
+        self._breakers[name].record(elapsed <= self.timeouts.get(tier, elapsed))
+        return text
+
+    def _submit(
+        self,
+        tier: str,
+        name: str,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]],
+        priority: str,
+        deadline: float
+    ) -> Future:
+        return self._executor.submit(self._call, tier, name, prompt, generation_config, priority, deadline)
+
+    def _healthy_chain(self, tier: str) -> List[str]:
+        """
+        Models in the tier whose breaker would admit a call (last resort: the final model).
+        Only looks at breaker state; the half-open probe is taken by _admit when a model is called.
+        """
+        chain = self.tiers[tier]
+        healthy = [name for name in chain if self.breaker(name).available()]
+        return healthy or chain[-1:]
+
+    def _admit(self, name: str, last_resort: bool) -> bool:
+        """Take the breaker's permission right before calling a model (the last resort always goes)."""
+        return last_resort or self._breakers[name].allow()
+
+    def generate(
+        self,
+        tier: str,
+        prompt: str,
+        generation_config: Optional[Dict[str, Any]] = None,
+        priority: str = "live"
+    ) -> str:
+        """
+        Generate text from the best available model in a tier.
+
+        Args:
+            tier: 'fast' or 'reply' (or any configured tier)
+            prompt: Prompt text
+            generation_config: Optional per-call generation config
+            priority: Limiter priority ('live', 'followup' or 'simulation')
+
+        Returns:
+            str: Model response text
+
+        Raises:
+            ModelUnavailableError: If all models failed or the tier deadline passed
+        """
+        if tier not in self.tiers:
+            raise ValueError(f"Unknown model tier: {tier}")
+
+        deadline = time.monotonic() + self.timeouts.get(tier, 10.0)
+        chain = self._healthy_chain(tier)
+        last_resort = not self._breakers[chain[0]].available()
+        if chain[0] != self.tiers[tier][0]:
+            self.downgrades += 1
+            print(f"⬇️ {tier} tier downgraded to {chain[0]}")
+
+        errors: List[str] = []
+        for i, name in enumerate(chain):
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+
+            if not self._admit(name, last_resort):
+                errors.append(f"{name}: circuit open")
+                continue
+            backup = chain[i + 1] if i + 1 < len(chain) else name
+            pending = [self._submit(tier, name, prompt, generation_config, priority, deadline)]
+            hedged = False
+
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+
+                wait_for = remaining if hedged else min(self._hedge_delay(tier, name), remaining)
+                done, not_done = wait(pending, timeout=wait_for, return_when=FIRST_COMPLETED)
+                pending = list(not_done)
+
+                for future in done:
+                    try:
+                        return future.result()
+                    except Exception as e:
+                        errors.append(f"{name}: {e}")
+
+                if not done and not hedged:
+                    # Primary is slower than its p95: fire a backup request,
+                    # unless calls are already queueing (a hedge would only add load)
+                    hedged = True
+                    if not self.limiter.saturated() and self._admit(backup, last_resort):
+                        self.hedges_fired += 1
+                        pending.append(self._submit(tier, backup, prompt, generation_config, priority, deadline))
+                elif done and not pending:
+                    break
+
+        if time.monotonic() >= deadline:
+            errors.append(f"{tier} tier timed out after {self.timeouts.get(tier)}s")
+        raise ModelUnavailableError("; ".join(errors) or f"No model available for tier {tier}")
+
+    def stats(self) -> Dict[str, Any]:
+        """Per-model latency percentiles, error rates and breaker states."""
+        models = {}
+        for name, tracker in list(self._latency.items()):
+            models[name] = {
+                "p50": tracker.percentile(50),
+                "p95": tracker.percentile(95),
+                "samples": len(tracker),
+                "error_rate": self._breakers[name].error_rate(),
+                "breaker": self._breakers[name].state,
+            }
+        return {
+            "models": models,
+            "hedges_fired": self.hedges_fired,
+            "downgrades": self.downgrades,
+            "limiter": self.limiter.metrics(),
+        }
@@ -0,0 +1,472 @@
+"""
+Quiet-hours-aware outbound queue for WhatsApp sends initiated by us (reminders,
+manual takeover replies).
+A message submitted outside the tenant's quiet hours is sent at once. One that falls
+inside them is stored in outbound_messages (migration 036) with a release time at
+the end of the window plus a per-lead offset spread over OUTBOUND_RELEASE_SPREAD_SECONDS,
+so held messages go out as a smoothed burst instead of all at window open. The
+release loop claims due rows (FOR UPDATE SKIP LOCKED, safe with several workers)
+within a token budget of OUTBOUND_RELEASE_RATE messages/second, re-checks quiet
+hours and deadlines, and retries failed sends with backoff.
+
+Usage:
+    python -m api.utils.outbound --once        # release what's due (cron)
+    python -m api.utils.outbound --loop        # run the release loop in the foreground
+    python -m api.utils.outbound --simulate    # fake-clock check across a DST change, no database or Twilio
+"""
+
+import argparse
+import hashlib
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Callable
+
+from api.utils.quiet_hours import QuietHours, get_quiet_hours
+from api.utils.reminders import SystemClock, FakeClock
+
+
+RELEASE_RATE = float(os.getenv("OUTBOUND_RELEASE_RATE", "2"))        # messages/second per worker
+RELEASE_BURST = int(os.getenv("OUTBOUND_RELEASE_BURST", "10"))
+RELEASE_SPREAD_SECONDS = float(os.getenv("OUTBOUND_RELEASE_SPREAD_SECONDS", "1800"))
+POLL_SECONDS = float(os.getenv("OUTBOUND_POLL_SECONDS", "5"))
+SEND_CONCURRENCY = int(os.getenv("OUTBOUND_SEND_CONCURRENCY", "4"))
+MAX_ATTEMPTS = int(os.getenv("OUTBOUND_MAX_ATTEMPTS", "5"))
+RETRY_BASE_SECONDS = 30
+# A row left 'sending' this long (worker died mid-send) is claimed again
+SENDING_TIMEOUT = timedelta(minutes=10)
+
+
+def release_offset(key: str, spread_seconds: float = RELEASE_SPREAD_SECONDS) -> timedelta:
+    """Stable per-lead offset in [0, spread): a lead's held messages keep their order."""
+    fraction = int.from_bytes(hashlib.blake2b(str(key).encode(), digest_size=4).digest(), "big") / 2 ** 32
+    return timedelta(seconds=fraction * spread_seconds)
+
+
+class OutboundQueue:
+    """
+    submit() sends now or holds; run_pending() releases held messages that are due.
+    Rows: id, lead_id, tenant_id, phone, body, sender_type, kind, not_before, deadline, attempts.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        send: Callable[[str, str], str],
+        clock: Any = None,
+        record: Optional[Callable[[str, str, str], Any]] = None,
+        quiet_hours: Callable[[Optional[str]], Optional[QuietHours]] = get_quiet_hours,
+        rate: float = RELEASE_RATE,
+        burst: int = RELEASE_BURST,
+        spread_seconds: float = RELEASE_SPREAD_SECONDS,
+        send_concurrency: int = SEND_CONCURRENCY,
+        verbose: bool = True
+    ):
+        """
+        Args:
+            store: enqueue(row), claim(now, limit, stale_before) and complete(results) (see PostgresOutboundStore)
+            send: send(phone, body) -> message SID; raises on failure
+            clock: SystemClock (default) or FakeClock
+            record: Optional record(phone, sender_type, content) to add sent messages to history
+            quiet_hours: tenant_id -> QuietHours or None
+            rate: Held messages released per second
+            burst: Release budget that can accumulate while idle
+            spread_seconds: Window over which a quiet period's messages are spread
+            send_concurrency: Concurrent Twilio requests per release batch
+            verbose: Log each release round
+        """
+        self.store = store
+        self.send = send
+        self.clock = clock or SystemClock()
+        self.record = record
+        self.quiet_hours = quiet_hours
+        self.rate = rate
+        self.burst = burst
+        self.spread_seconds = spread_seconds
+        self.send_concurrency = send_concurrency
+        self.verbose = verbose
+        self._tokens = float(burst)
+        self._refilled_at: Optional[datetime] = None
+        self._lock = threading.Lock()
+        self.counters = {"sent_now": 0, "queued": 0, "released": 0, "deferred": 0, "expired": 0, "retried": 0, "failed": 0}
+
+    def _deliver(self, phone: str, body: str, sender_type: str) -> str:
+        sid = self.send(phone, body)
+        if self.record:
+            try:
+                self.record(phone, sender_type, body)
+            except Exception as e:
+                print(f"Outbound message sent but not added to history for {phone}: {e}")
+        return sid
+
+    def _hold_until(self, tenant_id: Optional[str], key: str, now: datetime) -> Optional[datetime]:
+        quiet = self.quiet_hours(tenant_id)
+        window_end = quiet.window_end(now) if quiet else None
+        return window_end + release_offset(key, self.spread_seconds) if window_end else None
+
+    def submit(
+        self,
+        phone: str,
+        body: str,
+        tenant_id: Optional[str] = None,
+        lead_id: Optional[str] = None,
+        sender_type: str = "bot",
+        kind: str = "message",
+        deadline: Optional[datetime] = None
+    ) -> Dict[str, Any]:
+        """
+        Send a message now, or hold it until the tenant's quiet hours end.
+
+        Args:
+            phone: Lead's E.164 number
+            body: Message text
+            tenant_id: Tenant whose quiet hours apply
+            lead_id: Lead (keys the release offset)
+            sender_type: 'bot' or 'human' (history record)
+            kind: Label for the queue row (e.g. 'manual', 'reminder_24h')
+            deadline: Drop instead of holding if the message couldn't go out before this
+
+        Returns:
+            dict: status ('sent', 'queued' or 'expired'), sid, id and send_after
+
+        Raises:
+            Exception: If an immediate send fails
+        """
+        tenant_id = str(tenant_id) if tenant_id else None
+        now = self.clock.now()
+        send_after = self._hold_until(tenant_id, lead_id or phone, now)
+        if send_after is None:
+            sid = self._deliver(phone, body, sender_type)
+            self.counters["sent_now"] += 1
+            return {"status": "sent", "sid": sid, "id": None, "send_after": None}
+        if deadline is not None and send_after >= deadline:
+            self.counters["expired"] += 1
+            return {"status": "expired", "sid": None, "id": None, "send_after": None}
+
+        queued_id = self.store.enqueue({
+            "lead_id": lead_id, "tenant_id": tenant_id, "phone": phone, "body": body,
+            "sender_type": sender_type, "kind": kind, "not_before": send_after, "deadline": deadline,
+        })
+        self.counters["queued"] += 1
+        return {"status": "queued", "sid": None, "id": queued_id, "send_after": send_after}
+
+    def _take_budget(self, now: datetime) -> int:
+        with self._lock:
+            if self._refilled_at is not None:
+                elapsed = max((now - self._refilled_at).total_seconds(), 0.0)
+                self._tokens = min(float(self.burst), self._tokens + elapsed * self.rate)
+            self._refilled_at = now
+            budget = int(self._tokens)
+            self._tokens -= budget
+            return budget
+
+    def _refund(self, tokens: int) -> None:
+        with self._lock:
+            self._tokens += tokens
+
+    def _release(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        now = self.clock.now()
+        result = {"id": row["id"], "status": "sent", "sid": None, "error": None, "not_before": None}
+        deadline = row.get("deadline")
+        if deadline is not None and deadline <= now:
+            result["status"] = "expired"
+            return result
+        # Settings may have changed since the message was held
+        hold_until = self._hold_until(row.get("tenant_id"), row.get("lead_id") or row["phone"], now)
+        if hold_until is not None:
+            result.update(status="queued", not_before=hold_until)
+            return result
+        try:
+            result["sid"] = self._deliver(row["phone"], row["body"], row.get("sender_type") or "bot")
+        except Exception as e:
+            result["error"] = str(e)[:500]
+            if row["attempts"] >= MAX_ATTEMPTS:
+                result["status"] = "failed"
+            else:
+                result["status"] = "queued"
+                result["not_before"] = now + timedelta(seconds=RETRY_BASE_SECONDS * 2 ** (row["attempts"] - 1))
+        return result
+
+    def run_pending(self) -> Dict[str, int]:
+        """
+        Release due messages within the rate budget.
+
+        Returns:
+            dict: Messages released, deferred again, expired, retried and failed in this call
+        """
+        counts = {"released": 0, "deferred": 0, "expired": 0, "retried": 0, "failed": 0}
+        while True:
+            now = self.clock.now()
+            budget = self._take_budget(now)
+            if budget <= 0:
+                break
+            rows = self.store.claim(now, budget, now - SENDING_TIMEOUT)
+            self._refund(budget - len(rows))
+            if not rows:
+                break
+            with ThreadPoolExecutor(max_workers=min(self.send_concurrency, len(rows))) as pool:
+                results = list(pool.map(self._release, rows))
+            self.store.complete(results)
+            for r in results:
+                if r["status"] == "sent":
+                    counts["released"] += 1
+                elif r["status"] == "expired":
+                    counts["expired"] += 1
+                elif r["status"] == "failed":
+                    counts["failed"] += 1
+                elif r["error"]:
+                    counts["retried"] += 1
+                else:
+                    counts["deferred"] += 1
+        for key, value in counts.items():
+            self.counters[key] += value
+        if self.verbose and any(counts.values()):
+            print(f"📤 Outbound queue: {counts['released']} released, {counts['deferred']} deferred, "
+                  f"{counts['retried']} retrying, {counts['expired']} expired, {counts['failed']} failed")
+        return counts
+
+    def run_forever(self, stop: threading.Event, poll_seconds: float = POLL_SECONDS) -> None:
+        while not stop.is_set():
+            try:
+                self.run_pending()
+            except Exception as e:
+                print(f"Outbound queue error: {e}")
+            self.clock.sleep(poll_seconds, stop)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"rate": self.rate, "tokens": round(self._tokens, 2), **self.counters}
+
+
+class PostgresOutboundStore:
+    """outbound_messages access via SQLAlchemy."""
+
+    def __init__(self, engine: Any = None):
+        self._engine = engine
+
+    @property
+    def engine(self) -> Any:
+        if self._engine is None:
+            from api.utils.supabase_client import get_sqlalchemy_engine
+            self._engine = get_sqlalchemy_engine()
+        return self._engine
+
+    def enqueue(self, row: Dict[str, Any]) -> int:
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            return conn.execute(
+                text(
+                    "INSERT INTO outbound_messages "
+                    "(lead_id, tenant_id, phone, body, sender_type, kind, not_before, deadline) "
+                    "VALUES (CAST(:lead_id AS uuid), CAST(:tenant_id AS uuid), :phone, :body, :sender_type, "
+                    ":kind, :not_before, :deadline) RETURNING id"
+                ),
+                row,
+            ).scalar()
+
+    def claim(self, now: datetime, limit: int, stale_before: datetime) -> List[Dict[str, Any]]:
+        """Mark up to limit due rows as sending (skipping rows other workers hold)."""
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "UPDATE outbound_messages SET status = 'sending', attempts = attempts + 1, claimed_at = now() "
+                    "WHERE id IN ("
+                    "SELECT id FROM outbound_messages "
+                    "WHERE (status = 'queued' AND not_before <= :now) "
+                    "OR (status = 'sending' AND claimed_at < :stale_before) "
+                    "ORDER BY not_before, id LIMIT :limit FOR UPDATE SKIP LOCKED) "
+                    "RETURNING id, lead_id, tenant_id, phone, body, sender_type, kind, deadline, attempts"
+                ),
+                {"now": now, "limit": limit, "stale_before": stale_before},
+            ).mappings().all()
+        return [
+            dict(row, lead_id=str(row["lead_id"]) if row["lead_id"] else None,
+                 tenant_id=str(row["tenant_id"]) if row["tenant_id"] else None)
+            for row in rows
+        ]
+
+    def complete(self, results: List[Dict[str, Any]]) -> None:
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "UPDATE outbound_messages SET status = v.status, message_sid = v.sid, error = v.error, "
+                    "not_before = COALESCE(v.not_before, outbound_messages.not_before), "
+                    "sent_at = CASE WHEN v.status = 'sent' THEN now() END "
+                    "FROM unnest(CAST(:ids AS bigint[]), CAST(:statuses AS text[]), CAST(:sids AS text[]), "
+                    "CAST(:errors AS text[]), CAST(:not_befores AS timestamptz[])) "
+                    "AS v(id, status, sid, error, not_before) "
+                    "WHERE outbound_messages.id = v.id"
+                ),
+                {
+                    "ids": [r["id"] for r in results],
+                    "statuses": [r["status"] for r in results],
+                    "sids": [r["sid"] for r in results],
+                    "errors": [r["error"] for r in results],
+                    "not_befores": [r["not_before"] for r in results],
+                },
+            )
+
+
+class MemoryOutboundStore:
+    """In-memory outbound_messages for simulations."""
+
+    def __init__(self):
+        self.rows: Dict[int, Dict[str, Any]] = {}
+        self._ids = itertools.count(1)
+        self._lock = threading.Lock()
+
+    def enqueue(self, row: Dict[str, Any]) -> int:
+        with self._lock:
+            row_id = next(self._ids)
+            self.rows[row_id] = dict(row, id=row_id, status="queued", attempts=0, claimed_at=None, sid=None)
+            return row_id
+
+    def claim(self, now: datetime, limit: int, stale_before: datetime) -> List[Dict[str, Any]]:
+        with self._lock:
+            due = sorted(
+                (r for r in self.rows.values()
+                 if (r["status"] == "queued" and r["not_before"] <= now)
+                 or (r["status"] == "sending" and r["claimed_at"] < stale_before)),
+                key=lambda r: (r["not_before"], r["id"])
+            )[:limit]
+            for r in due:
+                r.update(status="sending", attempts=r["attempts"] + 1, claimed_at=now)
+            return [dict(r) for r in due]
+
+    def complete(self, results: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for r in results:
+                row = self.rows[r["id"]]
+                row.update(status=r["status"], sid=r["sid"], error=r["error"])
+                if r["not_before"] is not None:
+                    row["not_before"] = r["not_before"]
+
+
+# Singleton
+_queue: Optional[OutboundQueue] = None
+_queue_lock = threading.Lock()
+_queue_stop = threading.Event()
+
+
+def get_outbound_queue() -> OutboundQueue:
+    global _queue
+    if _queue is None:
+        with _queue_lock:
+            if _queue is None:
+                from api.utils.twilio_client import send_whatsapp
+                from api.utils.lead_manager import save_message
+                _queue = OutboundQueue(PostgresOutboundStore(), send_whatsapp, record=save_message)
+    return _queue
+
+
+def start_outbound_dispatcher() -> None:
+    """Run the release loop in a daemon thread (OUTBOUND_DISPATCHER=0 leaves it to another host)."""
+    if os.getenv("OUTBOUND_DISPATCHER", "1") == "0":
+        return
+    threading.Thread(
+        target=get_outbound_queue().run_forever, args=(_queue_stop,), name="outbound-release", daemon=True
+    ).start()
+
+
+def stop_outbound_dispatcher() -> None:
+    _queue_stop.set()
+
+
+def simulate(messages: int = 2000, failure_rate: float = 0.02, step_seconds: float = 10.0) -> Dict[str, Any]:
+    """
+    Submit messages through an evening and night that spans the Europe/London
+    spring-forward (2026-03-29), for tenants with overnight quiet hours in London
+    and New York, then run the release loop on a fake clock.
+    Checks that nothing is sent inside a quiet window, every held message is
+    released, and releases stay within the rate budget.
+    """
+    import random
+
+    rng = random.Random(7)
+    tenants = {
+        "london": QuietHours.from_tenant({"quiet_hours_start": "21:00", "quiet_hours_end": "08:00", "quiet_hours_tz": "Europe/London"}),
+        "new-york": QuietHours.from_tenant({"quiet_hours_start": "22:00", "quiet_hours_end": "07:30", "quiet_hours_tz": "America/New_York"}),
+        "none": None,
+    }
+    clock = FakeClock(datetime(2026, 3, 28, 17, 0, tzinfo=timezone.utc))
+    start = clock.now()
+    deliveries: List[tuple] = []
+    tenant_by_phone: Dict[str, str] = {}
+
+    def send(phone: str, body: str) -> str:
+        if rng.random() < failure_rate:
+            raise RuntimeError("simulated Twilio 503")
+        deliveries.append((phone, clock.now()))
+        return f"SM{len(deliveries):032d}"
+
+    store = MemoryOutboundStore()
+    queue = OutboundQueue(store, send, clock=clock, quiet_hours=lambda tenant: tenants.get(tenant),
+                          send_concurrency=1, verbose=False)
+    submit_times = sorted(start + timedelta(seconds=rng.uniform(0, 12 * 3600)) for _ in range(messages))
+    stop = threading.Event()
+    outcomes = {"sent": 0, "queued": 0, "expired": 0, "failed": 0}
+    i = 0
+    while clock.now() < start + timedelta(hours=30):
+        while i < len(submit_times) and submit_times[i] <= clock.now():
+            tenant = rng.choice(list(tenants))
+            phone = f"+4477009{i:05d}"
+            tenant_by_phone[phone] = tenant
+            try:
+                outcomes[queue.submit(phone, "Hi!", tenant_id=tenant, lead_id=f"lead-{i}")["status"]] += 1
+            except RuntimeError:
+                outcomes["failed"] += 1
+            i += 1
+        queue.run_pending()
+        clock.sleep(step_seconds, stop)
+
+    in_quiet = sum(1 for phone, at in deliveries if tenants[tenant_by_phone[phone]] and tenants[tenant_by_phone[phone]].is_quiet(at))
+    per_minute: Dict[datetime, int] = {}
+    for _, at in deliveries:
+        minute = at.replace(second=0, microsecond=0)
+        per_minute[minute] = per_minute.get(minute, 0) + 1
+    first_release = {
+        name: min((at for phone, at in deliveries if tenant_by_phone[phone] == name and at > start + timedelta(hours=12)), default=None)
+        for name in tenants if tenants[name]
+    }
+    return {
+        "submitted": messages,
+        "outcomes": outcomes,
+        "delivered": len(deliveries),
+        "still_held": sum(1 for r in store.rows.values() if r["status"] in ("queued", "sending")),
+        "failed_after_retries": sum(1 for r in store.rows.values() if r["status"] == "failed"),
+        "sent_in_quiet_hours": in_quiet,
+        "peak_per_minute": max(per_minute.values(), default=0),
+        "rate_budget_per_minute": int(RELEASE_RATE * 60 + RELEASE_BURST),
+        "first_release_local": {
+            name: at.astimezone(tenants[name].tz).isoformat() if at else None for name, at in first_release.items()
+        },
+        "queue": queue.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Quiet-hours-aware outbound queue")
+    parser.add_argument("--once", action="store_true", help="Release what's due, then exit")
+    parser.add_argument("--loop", action="store_true", help="Run until interrupted")
+    parser.add_argument("--simulate", action="store_true", help="Fake-clock run without database or Twilio")
+    parser.add_argument("--messages", type=int, default=2000)
+    args = parser.parse_args()
+
+    if args.simulate:
+        import json
+        print(json.dumps(simulate(messages=args.messages), indent=2, default=str))
+    elif args.once:
+        print(get_outbound_queue().run_pending())
+    elif args.loop:
+        try:
+            get_outbound_queue().run_forever(_queue_stop)
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.print_help()
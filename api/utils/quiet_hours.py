@@ -0,0 +1,123 @@
+"""
+Tenant quiet hours (migration 020: tenants.quiet_hours_start / _end / _tz).
+Python counterpart of lib/utils/quiet-hours.ts, using zoneinfo so windows follow
+the tenant's local clock across DST changes. Overnight windows (21:00 -> 08:00)
+are supported; missing or malformed settings mean no quiet hours (fail open).
+"""
+
+import os
+import threading
+import time
+from datetime import datetime, time as dt_time, timedelta, timezone
+from typing import Optional, Dict, Any, Tuple
+from zoneinfo import ZoneInfo, ZoneInfoNotFoundError
+
+
+DEFAULT_TIMEZONE = "Europe/London"
+QUIET_HOURS_CACHE_SECONDS = float(os.getenv("QUIET_HOURS_CACHE_SECONDS", "300"))
+
+
+def _parse_time(value: Any) -> dt_time:
+    hours, minutes = str(value).strip().split(":")[:2]
+    return dt_time(int(hours), int(minutes))
+
+
+class QuietHours:
+    """A daily local-time window during which outbound messages are held."""
+
+    __slots__ = ("start", "end", "tz")
+
+    def __init__(self, start: dt_time, end: dt_time, tz: ZoneInfo):
+        self.start = start
+        self.end = end
+        self.tz = tz
+
+    @classmethod
+    def from_tenant(cls, row: Optional[Dict[str, Any]]) -> Optional["QuietHours"]:
+        """
+        Build from a tenants row.
+
+        Returns:
+            QuietHours: The window, or None when unset or invalid
+        """
+        if not row or not row.get("quiet_hours_start") or not row.get("quiet_hours_end"):
+            return None
+        try:
+            quiet = cls(
+                _parse_time(row["quiet_hours_start"]),
+                _parse_time(row["quiet_hours_end"]),
+                ZoneInfo(row.get("quiet_hours_tz") or DEFAULT_TIMEZONE),
+            )
+        except (ValueError, ZoneInfoNotFoundError) as e:
+            print(f"Ignoring invalid quiet hours for tenant {row.get('id')}: {e}")
+            return None
+        return quiet if quiet.start != quiet.end else None
+
+    def window_end(self, at: datetime) -> Optional[datetime]:
+        """
+        When the quiet window containing `at` ends.
+
+        Args:
+            at: Aware datetime
+
+        Returns:
+            datetime: End of the current window (UTC), or None if `at` isn't quiet
+        """
+        local = at.astimezone(self.tz)
+        now = local.time().replace(tzinfo=None)
+        if self.start < self.end:
+            if not self.start <= now < self.end:
+                return None
+            end_date = local.date()
+        else:
+            # Overnight window
+            if now >= self.start:
+                end_date = local.date() + timedelta(days=1)
+            elif now < self.end:
+                end_date = local.date()
+            else:
+                return None
+        return datetime.combine(end_date, self.end, tzinfo=self.tz).astimezone(timezone.utc)
+
+    def is_quiet(self, at: datetime) -> bool:
+        return self.window_end(at) is not None
+
+    def __repr__(self) -> str:
+        return f"QuietHours({self.start:%H:%M}-{self.end:%H:%M} {self.tz.key})"
+
+
+# tenant_id -> (expires_at, QuietHours or None)
+_cache: Dict[str, Tuple[float, Optional[QuietHours]]] = {}
+_cache_lock = threading.Lock()
+
+
+def get_quiet_hours(tenant_id: Optional[str]) -> Optional[QuietHours]:
+    """
+    A tenant's quiet hours, cached for QUIET_HOURS_CACHE_SECONDS (settings changes
+    apply within that delay). Lookup failures fail open.
+    """
+    if not tenant_id:
+        return None
+    tenant_id = str(tenant_id)
+    cached = _cache.get(tenant_id)
+    if cached is not None and cached[0] > time.monotonic():
+        return cached[1]
+
+    from api.utils.supabase_client import get_supabase_client
+
+    try:
+        response = (
+            get_supabase_client()
+            .table("tenants")
+            .select("id, quiet_hours_start, quiet_hours_end, quiet_hours_tz")
+            .eq("id", tenant_id)
+            .limit(1)
+            .execute()
+        )
+        quiet = QuietHours.from_tenant(response.data[0] if response.data else None)
+    except Exception as e:
+        print(f"Quiet hours lookup failed for tenant {tenant_id} (sending without them): {e}")
+        return cached[1] if cached is not None else None
+    with _cache_lock:
+        _cache[tenant_id] = (time.monotonic() + QUIET_HOURS_CACHE_SECONDS, quiet)
+    return quiet
@@ -0,0 +1,246 @@
+"""
+Process-wide admission control for Gemini calls.
+Token bucket plus concurrency limit with AIMD adaptation to 429s: the rate
+creeps up additively on success and halves on every throttle. Waiters are
+served by priority so live conversations go ahead of follow-ups and simulations.
+"""
+
+import heapq
+import itertools
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Optional, Dict, Any, Callable, List, Tuple
+from dotenv import load_dotenv
+
+from api.utils.coordination import worker_count
+
+load_dotenv()
+
+# Lower value = served first
+PRIORITIES = {
+    "live": 0,
+    "followup": 1,
+    "simulation": 2,
+}
+
+# Rates and burst are for the whole deployment (the API key's quota), split
+# evenly between the workers (WEB_CONCURRENCY)
+_WORKERS = worker_count()
+INITIAL_RATE = float(os.getenv("GEMINI_RATE_LIMIT", "5")) / _WORKERS          # requests/second
+MAX_RATE = float(os.getenv("GEMINI_MAX_RATE", "20")) / _WORKERS
+MIN_RATE = min(float(os.getenv("GEMINI_MIN_RATE", "0.5")), INITIAL_RATE)
+BURST = max(1, int(os.getenv("GEMINI_BURST", "10")) // _WORKERS)
+MAX_CONCURRENCY = int(os.getenv("GEMINI_MAX_CONCURRENCY", "8"))
+
+
+class RateLimitedError(Exception):
+    """Raised when a call could not be admitted before its deadline."""
+
+
+def is_throttle_error(error: Exception) -> bool:
+    """
+    Detect a 429 / quota error from the Gemini SDK (or a fake backend).
+
+    Args:
+        error: Exception raised by generate_content
+
+    Returns:
+        bool: True if the backend asked us to slow down
+    """
+    name = type(error).__name__
+    if name in ("ResourceExhausted", "TooManyRequests"):
+        return True
+    message = str(error).lower()
+    return "429" in message or "resource exhausted" in message or "rate limit" in message
+
+
+class AdaptiveRateLimiter:
+    """
+    Token bucket + concurrency limiter with AIMD rate control and priority queueing.
+    """
+
+    def __init__(
+        self,
+        rate: float = INITIAL_RATE,
+        burst: int = BURST,
+        max_concurrency: int = MAX_CONCURRENCY,
+        min_rate: float = MIN_RATE,
+        max_rate: float = MAX_RATE,
+        increase_step: float = 0.5,
+        decrease_factor: float = 0.5,
+        clock: Callable[[], float] = time.monotonic
+    ):
+        """
+        Args:
+            rate: Initial refill rate in requests/second
+            burst: Bucket capacity
+            max_concurrency: Ceiling for in-flight calls
+            min_rate: Floor for the adaptive rate
+            max_rate: Ceiling for the adaptive rate
+            increase_step: Requests/second added per second of clean traffic
+            decrease_factor: Multiplier applied to rate and concurrency on a 429
+            clock: Monotonic clock (injectable for tests)
+        """
+        self.rate = rate
+        self.burst = burst
+        self.max_concurrency = max_concurrency
+        self.concurrency_limit = max_concurrency
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.increase_step = increase_step
+        self.decrease_factor = decrease_factor
+        self._clock = clock
+
+        self._tokens = float(burst)
+        self._refilled_at = clock()
+        self._in_flight = 0
+        self._waiters: List[Tuple[int, int]] = []
+        self._seq = itertools.count()
+        self._cond = threading.Condition()
+
+        self._admitted: Dict[str, int] = {name: 0 for name in PRIORITIES}
+        self._rejected: Dict[str, int] = {name: 0 for name in PRIORITIES}
+        self._queued: Dict[str, int] = {name: 0 for name in PRIORITIES}
+        self._max_queue_depth = 0
+        self._throttles = 0
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(float(self.burst), self._tokens + (now - self._refilled_at) * self.rate)
+        self._refilled_at = now
+
+    def _can_admit(self, ticket: Tuple[int, int]) -> bool:
+        return (
+            bool(self._waiters)
+            and self._waiters[0] == ticket
+            and self._tokens >= 1.0
+            and self._in_flight < self.concurrency_limit
+        )
+
+    def acquire(self, priority: str = "live", timeout: Optional[float] = None) -> None:
+        """
+        Block until a call may start.
+
+        Args:
+            priority: 'live', 'followup' or 'simulation'
+            timeout: Maximum seconds to wait (None waits indefinitely)
+
+        Raises:
+            RateLimitedError: If not admitted within the timeout
+        """
+        level = PRIORITIES.get(priority, PRIORITIES["simulation"])
+        deadline = None if timeout is None else self._clock() + timeout
+        ticket = (level, next(self._seq))
+
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+            self._queued[priority] = self._queued.get(priority, 0) + 1
+            self._max_queue_depth = max(self._max_queue_depth, len(self._waiters))
+            try:
+                while True:
+                    self._refill()
+                    if self._can_admit(ticket):
+                        heapq.heappop(self._waiters)
+                        self._tokens -= 1.0
+                        self._in_flight += 1
+                        self._admitted[priority] = self._admitted.get(priority, 0) + 1
+                        # Let the next waiter re-check the bucket
+                        self._cond.notify_all()
+                        return
+
+                    wait_for = (1.0 - self._tokens) / self.rate if self._tokens < 1.0 else None
+                    if deadline is not None:
+                        remaining = deadline - self._clock()
+                        if remaining <= 0:
+                            self._waiters.remove(ticket)
+                            heapq.heapify(self._waiters)
+                            self._rejected[priority] = self._rejected.get(priority, 0) + 1
+                            self._cond.notify_all()
+                            raise RateLimitedError(f"Gemini call ({priority}) not admitted within {timeout}s")
+                        wait_for = remaining if wait_for is None else min(wait_for, remaining)
+                    self._cond.wait(timeout=wait_for)
+            finally:
+                self._queued[priority] -= 1
+
+    def release(self, success: bool = True, throttled: bool = False) -> None:
+        """
+        Mark a call finished and adapt the rate.
+
+        Args:
+            success: The call returned a response
+            throttled: The call failed with a 429 / quota error
+        """
+        with self._cond:
+            self._in_flight -= 1
+            if throttled:
+                # Multiplicative decrease on rate and concurrency; drain the bucket
+                self._throttles += 1
+                self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+                self.concurrency_limit = max(1, int(self.concurrency_limit * self.decrease_factor))
+                self._tokens = min(self._tokens, 0.0)
+                print(f"🐢 Gemini 429: rate -> {self.rate:.2f}/s, concurrency -> {self.concurrency_limit}")
+            elif success:
+                # Additive increase, roughly increase_step per second at the current rate
+                self.rate = min(self.max_rate, self.rate + self.increase_step / max(self.rate, 1.0))
+                if self.concurrency_limit < self.max_concurrency and self._in_flight + 1 >= self.concurrency_limit:
+                    self.concurrency_limit += 1
+            self._cond.notify_all()
+
+    @contextmanager
+    def slot(self, priority: str = "live", timeout: Optional[float] = None):
+        """
+        Context manager around one model call.
+        Exceptions are classified with is_throttle_error() and re-raised.
+        """
+        self.acquire(priority, timeout)
+        try:
+            yield
+        except Exception as e:
+            self.release(success=False, throttled=is_throttle_error(e))
+            raise
+        else:
+            self.release(success=True)
+
+    def saturated(self) -> bool:
+        """True when calls are already queueing (hedging would only add load)."""
+        with self._cond:
+            return bool(self._waiters) or self._in_flight >= self.concurrency_limit
+
+    def metrics(self) -> Dict[str, Any]:
+        """Queue depth, in-flight count, adaptive limits and per-priority counters."""
+        with self._cond:
+            self._refill()
+            return {
+                "rate": round(self.rate, 3),
+                "tokens": round(self._tokens, 3),
+                "concurrency_limit": self.concurrency_limit,
+                "in_flight": self._in_flight,
+                "queue_depth": len(self._waiters),
+                "queue_depth_by_priority": dict(self._queued),
+                "max_queue_depth": self._max_queue_depth,
+                "admitted": dict(self._admitted),
+                "rejected": dict(self._rejected),
+                "throttles": self._throttles,
+            }
+
+
+# Singleton instance
+_rate_limiter: Optional[AdaptiveRateLimiter] = None
+
+
+def get_rate_limiter() -> AdaptiveRateLimiter:
+    """
+    Get or create the process-wide Gemini limiter.
+    Uses singleton pattern so every model call shares one budget.
+
+    Returns:
+        AdaptiveRateLimiter: Shared limiter
+    """
+    global _rate_limiter
+
+    if _rate_limiter is None:
+        _rate_limiter = AdaptiveRateLimiter()
+
+    return _rate_limiter
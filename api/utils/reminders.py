@@ -0,0 +1,566 @@
+"""
+Shoot reminder dispatcher.
+Booked leads with an upcoming leads.shoot_date (migration 010) are loaded by one
+index-backed query into a min-heap of fire times, and the 48h / 24h / 2h reminders
+are sent when due. Each reminder is claimed in shoot_reminders (migration 032)
+before it is sent, so it goes out once even with several instances running.
+Failed sends are released and retried on the next reload; a claim left behind by an
+instance that died mid-send is taken over after CLAIM_TIMEOUT. A reminder that is overdue
+because the shoot was booked late is sent only until the next reminder takes over.
+Sends go through the outbound queue (outbound.py), so tenant quiet hours apply.
+
+Usage:
+    python -m api.utils.reminders --once        # reload and send what's due (cron)
+    python -m api.utils.reminders --loop        # run the dispatcher in the foreground
+    python -m api.utils.reminders --simulate    # fake-clock check, no database or Twilio
+"""
+
+import argparse
+import heapq
+import itertools
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Callable, Iterable, Tuple
+
+
+# (kind, seconds before the shoot), latest reminder last
+REMINDERS: List[Tuple[str, int]] = [
+    ("48h", 48 * 3600),
+    ("24h", 24 * 3600),
+    ("2h", 2 * 3600),
+]
+
+REMINDER_MESSAGES = {
+    "48h": (
+        "Hey {name}! Can't wait to see you for your shoot in 48h! 📸 Here's the studio location: "
+        "https://maps.google.com/?q=London+Photography+Studio+Kentish+Town"
+    ),
+    "24h": (
+        "Hi {name}, your shoot is tomorrow! Don't forget your outfit checklist: 1. Jeans/T-shirt (Casual) "
+        "2. Dress/Suit (Smart) 3. Something you feel great in! See you soon."
+    ),
+    "2h": "Hi {name}, see you in about 2 hours at the studio! Reply here if you're running late. 😊",
+}
+
+RELOAD_INTERVAL = float(os.getenv("REMINDER_RELOAD_SECONDS", "300"))
+SEND_CONCURRENCY = int(os.getenv("REMINDER_SEND_CONCURRENCY", "8"))
+SEND_BATCH_SIZE = int(os.getenv("REMINDER_SEND_BATCH_SIZE", "50"))
+# Shoots further out than the earliest reminder (plus a reload) are loaded later
+HORIZON = timedelta(seconds=REMINDERS[0][1] + 2 * RELOAD_INTERVAL)
+# A reminder left 'claimed' this long (instance died mid-send) is claimed again
+CLAIM_TIMEOUT = timedelta(minutes=10)
+
+
+class SystemClock:
+    def now(self) -> datetime:
+        return datetime.now(timezone.utc)
+
+    def sleep(self, seconds: float, stop: threading.Event) -> None:
+        stop.wait(seconds)
+
+
+class FakeClock:
+    """Manually advanced clock for simulations and tests."""
+
+    def __init__(self, start: Optional[datetime] = None):
+        self._now = start or datetime(2026, 1, 1, tzinfo=timezone.utc)
+
+    def now(self) -> datetime:
+        return self._now
+
+    def advance(self, seconds: float) -> None:
+        self._now += timedelta(seconds=seconds)
+
+    def sleep(self, seconds: float, stop: threading.Event) -> None:
+        self.advance(seconds)
+
+
+def reminder_windows(shoot_date: datetime) -> List[Tuple[str, datetime, datetime]]:
+    """
+    (kind, fire_at, expires_at) for a shoot. A reminder expires when the next one
+    becomes due (the last one at the shoot itself).
+    """
+    windows = []
+    for i, (kind, offset) in enumerate(REMINDERS):
+        next_offset = REMINDERS[i + 1][1] if i + 1 < len(REMINDERS) else 0
+        windows.append((kind, shoot_date - timedelta(seconds=offset), shoot_date - timedelta(seconds=next_offset)))
+    return windows
+
+
+def render_reminder(kind: str, lead: Dict[str, Any]) -> str:
+    name = (lead.get("name") or "").split(" ")[0] or "there"
+    return REMINDER_MESSAGES[kind].format(name=name)
+
+
+def _parse_shoot_date(value: Any) -> datetime:
+    if isinstance(value, datetime):
+        shoot = value
+    else:
+        shoot = datetime.fromisoformat(str(value).replace("Z", "+00:00"))
+    return shoot if shoot.tzinfo else shoot.replace(tzinfo=timezone.utc)
+
+
+class ReminderDispatcher:
+    """
+    Heap of (fire_at, seq, lead_id, kind, shoot_date, expires_at). Rescheduling or
+    cancelling a shoot leaves stale entries in the heap; they are skipped when popped
+    because the lead's current shoot_date no longer matches.
+    """
+
+    def __init__(
+        self,
+        store: Any,
+        send: Callable[[str, str], str],
+        clock: Any = None,
+        record: Optional[Callable[[str, str, str], Any]] = None,
+        send_concurrency: int = SEND_CONCURRENCY,
+        batch_size: int = SEND_BATCH_SIZE,
+        verbose: bool = True,
+        outbound: Any = None
+    ):
+        """
+        Args:
+            store: load_upcoming(start, end, stale_before), claim(due, now, stale_before) and
+                release(results) (see PostgresReminderStore)
+            send: send(phone, body) -> message SID; raises on failure
+            clock: SystemClock (default) or FakeClock
+            record: Optional record(phone, sender_type, content) to add sent reminders to history
+            send_concurrency: Concurrent Twilio requests per batch
+            batch_size: Due reminders claimed per round trip
+            verbose: Log each dispatch round
+            outbound: Optional OutboundQueue; when set, reminders go through it (quiet hours
+                apply, a reminder that can't go out before its window closes is dropped)
+                instead of send/record
+        """
+        self.store = store
+        self.send = send
+        self.clock = clock or SystemClock()
+        self.record = record
+        self.outbound = outbound
+        self.send_concurrency = send_concurrency
+        self.batch_size = batch_size
+        self.verbose = verbose
+        self._heap: List[tuple] = []
+        self._seq = itertools.count()
+        self._leads: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+        self.last_reload: Optional[datetime] = None
+        self.counters = {"sent": 0, "failed": 0, "skipped": 0, "expired": 0, "held": 0, "quiet_dropped": 0}
+
+    def __len__(self) -> int:
+        return len(self._heap)
+
+    def schedule(self, lead: Dict[str, Any], sent: Iterable[str] = ()) -> int:
+        """
+        (Re)schedule a lead's outstanding reminders.
+
+        Args:
+            lead: Lead row with id, phone, name and shoot_date
+            sent: Reminder kinds already delivered for this shoot_date
+
+        Returns:
+            int: Reminders scheduled
+        """
+        shoot_date = _parse_shoot_date(lead["shoot_date"])
+        lead = dict(lead, id=str(lead["id"]), shoot_date=shoot_date)
+        now = self.clock.now()
+        sent = set(sent)
+        scheduled = 0
+        with self._lock:
+            self._leads[lead["id"]] = lead
+            for kind, fire_at, expires_at in reminder_windows(shoot_date):
+                if kind in sent or expires_at <= now:
+                    continue
+                heapq.heappush(self._heap, (fire_at, next(self._seq), lead["id"], kind, shoot_date, expires_at))
+                scheduled += 1
+        return scheduled
+
+    def cancel(self, lead_id: str) -> None:
+        with self._lock:
+            self._leads.pop(str(lead_id), None)
+
+    def reload(self) -> int:
+        """
+        Rebuild the heap from the store (upcoming shoots within the horizon).
+
+        Returns:
+            int: Reminders scheduled
+        """
+        now = self.clock.now()
+        rows = self.store.load_upcoming(now, now + HORIZON, now - CLAIM_TIMEOUT)
+        with self._lock:
+            self._heap = []
+            self._leads = {}
+        scheduled = sum(self.schedule(row, row.get("sent") or ()) for row in rows)
+        self.last_reload = now
+        return scheduled
+
+    def next_due(self) -> Optional[datetime]:
+        with self._lock:
+            return self._heap[0][0] if self._heap else None
+
+    def _pop_due(self) -> List[Dict[str, Any]]:
+        now = self.clock.now()
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now and len(due) < self.batch_size:
+                fire_at, _, lead_id, kind, shoot_date, expires_at = heapq.heappop(self._heap)
+                lead = self._leads.get(lead_id)
+                if lead is None or lead["shoot_date"] != shoot_date:
+                    self.counters["skipped"] += 1
+                    continue
+                if expires_at <= now:
+                    self.counters["expired"] += 1
+                    continue
+                due.append({"lead": lead, "kind": kind, "shoot_date": shoot_date, "expires_at": expires_at})
+        return due
+
+    def _deliver(self, item: Dict[str, Any]) -> Dict[str, Any]:
+        lead, kind = item["lead"], item["kind"]
+        body = render_reminder(kind, lead)
+        result = {"lead_id": lead["id"], "kind": kind, "shoot_date": item["shoot_date"], "sid": None, "error": None}
+        if self.outbound is not None:
+            # Held or dropped for quiet hours counts as handled: the marker stops re-sends
+            try:
+                outcome = self.outbound.submit(
+                    lead["phone"], body, tenant_id=lead.get("tenant_id"), lead_id=lead["id"],
+                    kind=f"reminder_{kind}", deadline=item["expires_at"]
+                )
+            except Exception as e:
+                result["error"] = str(e)[:500]
+                return result
+            result["sid"] = outcome["sid"]
+            if outcome["status"] == "queued":
+                self.counters["held"] += 1
+            elif outcome["status"] == "expired":
+                self.counters["quiet_dropped"] += 1
+            return result
+        try:
+            result["sid"] = self.send(lead["phone"], body)
+        except Exception as e:
+            result["error"] = str(e)[:500]
+            return result
+        if self.record:
+            try:
+                self.record(lead["phone"], "bot", body)
+            except Exception as e:
+                print(f"Reminder sent but not added to history for {lead['id']}: {e}")
+        return result
+
+    def run_pending(self) -> Dict[str, int]:
+        """
+        Claim and send every due reminder, batch by batch.
+
+        Returns:
+            dict: Reminders sent and failed in this call
+        """
+        sent = failed = 0
+        while True:
+            due = self._pop_due()
+            if not due:
+                break
+            now = self.clock.now()
+            claimed = self.store.claim(due, now, now - CLAIM_TIMEOUT)
+            due = [item for item in due if (item["lead"]["id"], item["kind"]) in claimed]
+            if not due:
+                continue
+            with ThreadPoolExecutor(max_workers=min(self.send_concurrency, len(due))) as pool:
+                results = list(pool.map(self._deliver, due))
+            self.store.release(results)
+            batch_failed = sum(1 for r in results if r["error"])
+            sent += len(results) - batch_failed
+            failed += batch_failed
+        self.counters["sent"] += sent
+        self.counters["failed"] += failed
+        if self.verbose and (sent or failed):
+            print(f"⏰ Shoot reminders: {sent} sent, {failed} failed")
+        return {"sent": sent, "failed": failed}
+
+    def run_forever(self, stop: threading.Event, reload_interval: float = RELOAD_INTERVAL) -> None:
+        """Reload periodically and sleep until the next reminder is due."""
+        while not stop.is_set():
+            try:
+                now = self.clock.now()
+                if self.last_reload is None or (now - self.last_reload).total_seconds() >= reload_interval:
+                    self.reload()
+                self.run_pending()
+            except Exception as e:
+                print(f"Reminder dispatcher error: {e}")
+            now = self.clock.now()
+            wait = reload_interval - (now - self.last_reload).total_seconds() if self.last_reload else reload_interval
+            next_due = self.next_due()
+            if next_due is not None:
+                wait = min(wait, (next_due - now).total_seconds())
+            self.clock.sleep(max(wait, 0.05), stop)
+
+    def stats(self) -> Dict[str, Any]:
+        return {"scheduled": len(self._heap), "leads": len(self._leads), **self.counters}
+
+
+class PostgresReminderStore:
+    """Booked-shoot queries and delivery markers (shoot_reminders) via SQLAlchemy."""
+
+    def __init__(self, engine: Any = None):
+        self._engine = engine
+
+    @property
+    def engine(self) -> Any:
+        if self._engine is None:
+            from api.utils.supabase_client import get_sqlalchemy_engine
+            self._engine = get_sqlalchemy_engine()
+        return self._engine
+
+    def load_upcoming(self, start: datetime, end: datetime, stale_before: datetime) -> List[Dict[str, Any]]:
+        """
+        Booked leads with a shoot in (start, end] and the reminders already delivered
+        (or being sent) for it. Claims older than stale_before don't count.
+        """
+        from sqlalchemy import text
+
+        with self.engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT l.id, l.phone, l.name, l.tenant_id, l.shoot_date, "
+                    "COALESCE(array_agg(r.kind) FILTER (WHERE r.kind IS NOT NULL), '{}') AS sent "
+                    "FROM leads l "
+                    "LEFT JOIN shoot_reminders r ON r.lead_id = l.id AND r.shoot_date = l.shoot_date "
+                    "AND (r.status = 'sent' OR (r.status = 'claimed' AND r.claimed_at >= :stale_before)) "
+                    "WHERE l.status = 'Booked' AND l.shoot_date > :start AND l.shoot_date <= :end "
+                    "AND NOT COALESCE(l.is_test, false) "
+                    "GROUP BY l.id"
+                ),
+                {"start": start, "end": end, "stale_before": stale_before},
+            ).mappings().all()
+        return [dict(row) for row in rows]
+
+    def claim(self, due: List[Dict[str, Any]], now: datetime, stale_before: datetime) -> set:
+        """
+        Insert delivery markers for due reminders. Only rows this call inserts (or
+        re-claims after a failure, or from an instance that claimed them before
+        stale_before and never reported back) are returned, and only while the lead
+        is still Booked for the same shoot_date.
+
+        Returns:
+            set: (lead_id, kind) pairs this instance may send
+        """
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            rows = conn.execute(
+                text(
+                    "INSERT INTO shoot_reminders (lead_id, kind, shoot_date, status, claimed_at) "
+                    "SELECT v.lead_id, v.kind, v.shoot_date, 'claimed', now() "
+                    "FROM unnest(CAST(:ids AS uuid[]), CAST(:kinds AS text[]), CAST(:shoots AS timestamptz[])) "
+                    "AS v(lead_id, kind, shoot_date) "
+                    "JOIN leads l ON l.id = v.lead_id AND l.status = 'Booked' AND l.shoot_date = v.shoot_date "
+                    "ON CONFLICT (lead_id, kind, shoot_date) DO UPDATE "
+                    "SET status = 'claimed', claimed_at = now(), error = NULL "
+                    "WHERE shoot_reminders.status = 'failed' "
+                    "OR (shoot_reminders.status = 'claimed' AND shoot_reminders.claimed_at < :stale_before) "
+                    "RETURNING lead_id, kind"
+                ),
+                {
+                    "ids": [item["lead"]["id"] for item in due],
+                    "kinds": [item["kind"] for item in due],
+                    "shoots": [item["shoot_date"] for item in due],
+                    "stale_before": stale_before,
+                },
+            ).all()
+        return {(str(row.lead_id), row.kind) for row in rows}
+
+    def release(self, results: List[Dict[str, Any]]) -> None:
+        """Record the outcome of claimed reminders (failed ones are retried after the next reload)."""
+        from sqlalchemy import text
+
+        with self.engine.begin() as conn:
+            conn.execute(
+                text(
+                    "UPDATE shoot_reminders SET "
+                    "status = CASE WHEN v.error IS NULL THEN 'sent' ELSE 'failed' END, "
+                    "message_sid = v.sid, error = v.error, "
+                    "sent_at = CASE WHEN v.error IS NULL THEN now() END "
+                    "FROM unnest(CAST(:ids AS uuid[]), CAST(:kinds AS text[]), CAST(:shoots AS timestamptz[]), "
+                    "CAST(:sids AS text[]), CAST(:errors AS text[])) AS v(lead_id, kind, shoot_date, sid, error) "
+                    "WHERE shoot_reminders.lead_id = v.lead_id AND shoot_reminders.kind = v.kind "
+                    "AND shoot_reminders.shoot_date = v.shoot_date"
+                ),
+                {
+                    "ids": [r["lead_id"] for r in results],
+                    "kinds": [r["kind"] for r in results],
+                    "shoots": [r["shoot_date"] for r in results],
+                    "sids": [r["sid"] for r in results],
+                    "errors": [r["error"] for r in results],
+                },
+            )
+
+
+class MemoryReminderStore:
+    """In-memory store with the same claim semantics, for simulations and tests."""
+
+    def __init__(self, leads: Optional[List[Dict[str, Any]]] = None):
+        self.leads: Dict[str, Dict[str, Any]] = {str(lead["id"]): dict(lead) for lead in leads or []}
+        self.markers: Dict[tuple, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def _holds(self, marker: Dict[str, Any], stale_before: datetime) -> bool:
+        return marker["status"] == "sent" or (marker["status"] == "claimed" and marker["claimed_at"] >= stale_before)
+
+    def load_upcoming(self, start: datetime, end: datetime, stale_before: datetime) -> List[Dict[str, Any]]:
+        rows = []
+        for lead in self.leads.values():
+            if lead.get("status") != "Booked" or not lead.get("shoot_date"):
+                continue
+            shoot = _parse_shoot_date(lead["shoot_date"])
+            if start < shoot <= end:
+                sent = [
+                    k for (lid, k, s), m in self.markers.items()
+                    if lid == lead["id"] and s == shoot and self._holds(m, stale_before)
+                ]
+                rows.append(dict(lead, shoot_date=shoot, sent=sent))
+        return rows
+
+    def claim(self, due: List[Dict[str, Any]], now: datetime, stale_before: datetime) -> set:
+        claimed = set()
+        with self._lock:
+            for item in due:
+                lead = self.leads.get(item["lead"]["id"])
+                if lead is None or lead.get("status") != "Booked" or _parse_shoot_date(lead["shoot_date"]) != item["shoot_date"]:
+                    continue
+                key = (lead["id"], item["kind"], item["shoot_date"])
+                if key in self.markers and self._holds(self.markers[key], stale_before):
+                    continue
+                self.markers[key] = {"status": "claimed", "sid": None, "claimed_at": now}
+                claimed.add((lead["id"], item["kind"]))
+        return claimed
+
+    def release(self, results: List[Dict[str, Any]]) -> None:
+        with self._lock:
+            for r in results:
+                self.markers[(r["lead_id"], r["kind"], r["shoot_date"])] = {
+                    "status": "failed" if r["error"] else "sent", "sid": r["sid"], "claimed_at": None
+                }
+
+
+# Singleton
+_dispatcher: Optional[ReminderDispatcher] = None
+_dispatcher_stop = threading.Event()
+
+
+def get_reminder_dispatcher() -> ReminderDispatcher:
+    global _dispatcher
+    if _dispatcher is None:
+        from api.utils.twilio_client import send_whatsapp
+        from api.utils.lead_manager import save_message
+        from api.utils.outbound import get_outbound_queue
+        _dispatcher = ReminderDispatcher(
+            PostgresReminderStore(), send_whatsapp, record=save_message, outbound=get_outbound_queue()
+        )
+    return _dispatcher
+
+
+def start_reminder_dispatcher() -> None:
+    """Run the dispatcher in a daemon thread when REMINDER_DISPATCHER=1 (one long-running host)."""
+    if os.getenv("REMINDER_DISPATCHER", "0") != "1":
+        return
+    dispatcher = get_reminder_dispatcher()
+    threading.Thread(
+        target=dispatcher.run_forever, args=(_dispatcher_stop,), name="reminder-dispatcher", daemon=True
+    ).start()
+    print("⏰ Shoot reminder dispatcher started")
+
+
+def stop_reminder_dispatcher() -> None:
+    _dispatcher_stop.set()
+
+
+def simulate(leads: int = 200, days: float = 4.0, step_seconds: float = 300.0, failure_rate: float = 0.05) -> Dict[str, Any]:
+    """
+    Run the dispatcher against a fake clock and in-memory store: shoots spread over
+    the next few days, some booked late, some rescheduled, and flaky sends.
+    Checks that every reminder is delivered exactly once and inside its window.
+    """
+    import random
+
+    rng = random.Random(7)
+    clock = FakeClock()
+    start = clock.now()
+    rows = [
+        {
+            "id": f"lead-{i}", "phone": f"+4477009{i:05d}", "name": f"Lead {i}", "status": "Booked",
+            "shoot_date": start + timedelta(hours=rng.uniform(1, days * 24)),
+        }
+        for i in range(leads)
+    ]
+    store = MemoryReminderStore(rows)
+    by_phone = {lead["phone"]: lead for lead in store.leads.values()}
+    deliveries: List[Tuple[str, str, datetime, datetime]] = []
+
+    def send(phone: str, body: str) -> str:
+        if rng.random() < failure_rate:
+            raise RuntimeError("simulated Twilio 503")
+        deliveries.append((phone, body, by_phone[phone]["shoot_date"], clock.now()))
+        return f"SM{len(deliveries):032d}"
+
+    dispatcher = ReminderDispatcher(store, send, clock=clock, send_concurrency=1, verbose=False)
+    stop = threading.Event()
+    rescheduled = set()
+    elapsed = 0.0
+    while elapsed < days * 86400:
+        if dispatcher.last_reload is None or (clock.now() - dispatcher.last_reload).total_seconds() >= RELOAD_INTERVAL:
+            dispatcher.reload()
+        dispatcher.run_pending()
+        # Occasionally move a shoot later (new reminders apply to the new date)
+        if rng.random() < 0.05:
+            lead = store.leads[f"lead-{rng.randrange(leads)}"]
+            if lead["shoot_date"] > clock.now() + timedelta(hours=3):
+                lead["shoot_date"] = lead["shoot_date"] + timedelta(hours=rng.uniform(1, 12))
+                rescheduled.add(lead["id"])
+                dispatcher.schedule(lead)
+        clock.sleep(step_seconds, stop)
+        elapsed += step_seconds
+
+    # Each (lead, reminder, shoot date) at most once, and never outside its window
+    seen: Dict[tuple, int] = {}
+    out_of_window = 0
+    for phone, body, shoot_date, sent_at in deliveries:
+        kind = next(k for k in REMINDER_MESSAGES if render_reminder(k, by_phone[phone]) == body)
+        seen[(phone, kind, shoot_date)] = seen.get((phone, kind, shoot_date), 0) + 1
+        window = next(w for w in reminder_windows(shoot_date) if w[0] == kind)
+        if not window[1] <= sent_at < window[2] + timedelta(seconds=step_seconds):
+            out_of_window += 1
+    return {
+        "leads": leads,
+        "rescheduled": len(rescheduled),
+        "delivered": len(deliveries),
+        "sent_markers": sum(1 for m in store.markers.values() if m["status"] == "sent"),
+        "failed_markers": sum(1 for m in store.markers.values() if m["status"] == "failed"),
+        "duplicates": sum(n - 1 for n in seen.values()),
+        "out_of_window": out_of_window,
+        "dispatcher": dispatcher.stats(),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shoot reminder dispatcher")
+    parser.add_argument("--once", action="store_true", help="Reload and send what's due, then exit")
+    parser.add_argument("--loop", action="store_true", help="Run until interrupted")
+    parser.add_argument("--simulate", action="store_true", help="Fake-clock run without database or Twilio")
+    parser.add_argument("--leads", type=int, default=200)
+    args = parser.parse_args()
+
+    if args.simulate:
+        import json
+        print(json.dumps(simulate(leads=args.leads), indent=2, default=str))
+    elif args.once:
+        dispatcher = get_reminder_dispatcher()
+        dispatcher.reload()
+        print(dispatcher.run_pending())
+    elif args.loop:
+        try:
+            get_reminder_dispatcher().run_forever(_dispatcher_stop)
+        except KeyboardInterrupt:
+            pass
+    else:
+        parser.print_help()
@@ -0,0 +1,199 @@
+"""
+Local lexicon sentiment classifier (no model calls).
+Used to backfill messages.sentiment_score/sentiment_label for history that predates
+persisting analyze_message output, and for any analytics that need a score for
+text the model never saw. Scores are in [-1, 1] with the same label thresholds as
+the dashboard (> 0.3 Positive, < -0.3 Negative).
+
+Usage:
+    python -m api.utils.sentiment "Is this a scam?"
+    python -m api.utils.sentiment --backfill            # dry run
+    python -m api.utils.sentiment --backfill --write
+"""
+
+import argparse
+import re
+from typing import Optional, Dict, List, Any, Tuple
+
+
+# Word valences tuned for lead conversations (model-shoot bookings)
+LEXICON: Dict[str, float] = {
+    # Positive
+    "yes": 1.0, "yeah": 1.0, "yep": 1.0, "sure": 0.8, "ok": 0.4, "okay": 0.4,
+    "great": 1.5, "brilliant": 1.8, "amazing": 2.0, "perfect": 1.8, "lovely": 1.5,
+    "love": 2.0, "excited": 2.0, "exciting": 1.8, "happy": 1.5, "thanks": 1.0,
+    "thank": 1.0, "cheers": 0.8, "interested": 1.5, "keen": 1.5, "fab": 1.5,
+    "fantastic": 2.0, "awesome": 1.8, "good": 1.0, "nice": 1.0, "cool": 0.8,
+    "definitely": 1.2, "absolutely": 1.2, "wonderful": 1.8, "can't wait": 2.0,
+    # Negative
+    "no": -1.0, "nope": -1.0, "not": -0.5, "scam": -2.5, "fake": -2.0, "con": -1.5,
+    "expensive": -1.5, "cost": -0.6, "pay": -0.5, "money": -0.5, "far": -0.8,
+    "busy": -0.8, "worried": -1.5, "nervous": -1.0, "scared": -1.5, "unsure": -1.0,
+    "stop": -2.0, "unsubscribe": -2.0, "hate": -2.5, "waste": -2.0, "rubbish": -2.0,
+    "annoying": -2.0, "annoyed": -2.0, "spam": -2.5, "suspicious": -2.0,
+    "ridiculous": -2.0, "bad": -1.5, "terrible": -2.5, "awful": -2.5, "never": -1.0,
+    "cancel": -1.5, "sorry": -0.5, "problem": -1.0, "difficult": -1.0,
+}
+
+EMOJI_VALENCE: Dict[str, float] = {
+    "😊": 1.5, "😀": 1.5, "😁": 1.5, "😍": 2.0, "🥰": 2.0, "👍": 1.2, "🙏": 1.0,
+    "❤": 2.0, "🎉": 1.8, "✨": 1.0, "🙂": 1.0,
+    "😡": -2.5, "😠": -2.0, "👎": -1.5, "😒": -1.5, "😞": -1.5, "😢": -1.5, "🙄": -1.5,
+}
+
+NEGATORS = {"not", "no", "never", "don't", "dont", "isn't", "isnt", "won't", "wont", "can't", "cant", "didn't", "didnt"}
+NEGATION_WINDOW = 3
+NEGATION_FLIP = -0.7
+
+POSITIVE_THRESHOLD = 0.3
+NEGATIVE_THRESHOLD = -0.3
+
+# Values stored for analyze_message labels
+ANALYSIS_SENTIMENT_SCORES = {"positive": 0.7, "neutral": 0.0, "negative": -0.7}
+
+_TOKEN_RE = re.compile(r"can't wait|[a-z']+|[\U0001F300-\U0001FAFF❤]", re.IGNORECASE)
+
+
+def tokenize(text: str) -> List[str]:
+    return [token.lower() for token in _TOKEN_RE.findall(text or "")]
+
+
+def sentiment_label(score: Optional[float]) -> Optional[str]:
+    """Dashboard label for a score (None stays None)."""
+    if score is None:
+        return None
+    if score > POSITIVE_THRESHOLD:
+        return "Positive"
+    if score < NEGATIVE_THRESHOLD:
+        return "Negative"
+    return "Neutral"
+
+
+def analysis_sentiment(analysis: Optional[Dict[str, Any]]) -> Tuple[Optional[float], Optional[str]]:
+    """
+    Map analyze_message's sentiment onto (sentiment_score, sentiment_label).
+
+    Returns:
+        tuple: (score, label), or (None, None) without a usable analysis
+    """
+    sentiment = ((analysis or {}).get("sentiment") or "").lower()
+    if sentiment not in ANALYSIS_SENTIMENT_SCORES:
+        return None, None
+    score = ANALYSIS_SENTIMENT_SCORES[sentiment]
+    return score, sentiment_label(score)
+
+
+def score_texts(texts: List[str]) -> Any:
+    """
+    Vectorized lexicon scoring: valence per token, negation flips within a short
+    window, summed per message and squashed with tanh(sum / sqrt(tokens)).
+
+    Returns:
+        numpy.ndarray: float64 scores in [-1, 1], one per text
+    """
+    import numpy as np
+
+    token_lists = [tokenize(text) for text in texts]
+    lengths = np.fromiter((len(tokens) for tokens in token_lists), dtype=np.int64, count=len(token_lists))
+    tokens = [token for tokens in token_lists for token in tokens]
+    if not tokens:
+        return np.zeros(len(texts))
+
+    valence = np.fromiter(
+        (LEXICON.get(t, EMOJI_VALENCE.get(t, 0.0)) for t in tokens), dtype=np.float64, count=len(tokens)
+    )
+    negator = np.fromiter((t in NEGATORS for t in tokens), dtype=bool, count=len(tokens))
+    message_index = np.repeat(np.arange(len(texts)), lengths)
+
+    # A token is negated if a negator precedes it within the window in the same message
+    negated = np.zeros(len(tokens), dtype=bool)
+    for shift in range(1, NEGATION_WINDOW + 1):
+        negated[shift:] |= negator[:-shift] & (message_index[shift:] == message_index[:-shift])
+    valence = np.where(negated & ~negator, valence * NEGATION_FLIP, valence)
+
+    totals = np.bincount(message_index, weights=valence, minlength=len(texts))
+    return np.tanh(totals / np.sqrt(np.maximum(lengths, 1)))
+
+
+def score_text(text: str) -> float:
+    """Score a single message."""
+    return float(score_texts([text])[0])
+
+
+def backfill_sentiment(write: bool = False, batch_size: int = 5000, limit: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Fill sentiment_score/sentiment_label for lead messages that have none,
+    paging by id and writing each page with one unnest UPDATE.
+
+    Args:
+        write: Persist results (default: dry run)
+        batch_size: Messages per page
+        limit: Optional cap on messages processed
+
+    Returns:
+        dict: Processed count and label distribution
+    """
+    from sqlalchemy import text
+    from api.utils.supabase_client import get_sqlalchemy_engine
+
+    engine = get_sqlalchemy_engine()
+    processed = 0
+    labels = {"Positive": 0, "Neutral": 0, "Negative": 0}
+    after_id = "00000000-0000-0000-0000-000000000000"
+
+    while limit is None or processed < limit:
+        page_size = batch_size if limit is None else min(batch_size, limit - processed)
+        with engine.connect() as conn:
+            rows = conn.execute(
+                text(
+                    "SELECT id, content FROM messages "
+                    "WHERE sender_type = 'lead' AND sentiment_score IS NULL AND id > CAST(:after_id AS uuid) "
+                    "ORDER BY id LIMIT :limit"
+                ),
+                {"after_id": after_id, "limit": page_size},
+            ).all()
+        if not rows:
+            break
+
+        scores = score_texts([row.content for row in rows])
+        page_labels = [sentiment_label(float(score)) for score in scores]
+        for label in page_labels:
+            labels[label] += 1
+
+        if write:
+            with engine.begin() as conn:
+                conn.execute(
+                    text(
+                        "UPDATE messages SET sentiment_score = v.score, sentiment_label = v.label "
+                        "FROM unnest(CAST(:ids AS uuid[]), CAST(:scores AS float8[]), CAST(:labels AS text[])) "
+                        "AS v(id, score, label) WHERE messages.id = v.id"
+                    ),
+                    {
+                        "ids": [str(row.id) for row in rows],
+                        "scores": [round(float(score), 4) for score in scores],
+                        "labels": page_labels,
+                    },
+                )
+
+        processed += len(rows)
+        after_id = str(rows[-1].id)
+        print(f"Sentiment backfill: {processed} messages{' written' if write else ''}")
+
+    return {"processed": processed, "written": write, "labels": labels}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Lexicon sentiment scoring and backfill")
+    parser.add_argument("text", nargs="?", help="Score a single message")
+    parser.add_argument("--backfill", action="store_true", help="Fill missing messages.sentiment_score")
+    parser.add_argument("--write", action="store_true", help="Persist the backfill (default: dry run)")
+    parser.add_argument("--limit", type=int, default=None)
+    args = parser.parse_args()
+
+    if args.backfill:
+        print(backfill_sentiment(write=args.write, limit=args.limit))
+    elif args.text:
+        score = score_text(args.text)
+        print(f"{score:+.3f} {sentiment_label(score)}")
+    else:
+        parser.print_help()
@@ -0,0 +1,407 @@
+"""
+Parallel offline conversation simulator.
+Plays N scenarios x M personas concurrently through the real webhook pipeline
+(api.webhook.process_inbound_message) with fake or real models behind an async pool,
+records per-turn latency and token usage and bulk-writes sim_results.
+
+Usage:
+    python -m api.utils.simulator --fake --turns 6 --concurrency 50 --repeat 10
+    python -m api.utils.simulator --scenarios db --personas eager,skeptic --write-results
+"""
+
+import argparse
+import asyncio
+import contextlib
+import io
+import json
+import re
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Optional, Dict, List, Any, Callable
+
+from api.utils.memory_store import InMemoryLeadStore
+from api.utils.model_router import ModelRouter, FakeModel
+from api.utils.rate_limiter import AdaptiveRateLimiter
+from api.utils.token_budget import track_usage
+
+
+# Scripted lead lines per persona (used when personas are not model-driven)
+BUILTIN_PERSONAS = {
+    "eager": [
+        "Hi! Yes I'm really interested in modelling, my name is Jess",
+        "I've never done a shoot before, is that ok?",
+        "Can I book a slot this weekend?",
+        "1",
+    ],
+    "distance": [
+        "Hi, I'm interested but I live quite far away",
+        "It's a 2 hour drive, where do I park?",
+        "Ok fine, what appointment times do you have?",
+        "2",
+    ],
+    "skeptic": [
+        "Is this a scam? How much does it cost?",
+        "So you'll get me jobs then?",
+        "I'm not sure, I need to think about it",
+        "Fine, book me in",
+        "3",
+    ],
+    "parent": [
+        "Hi, this is about my daughter, she's 9",
+        "Do I stay with her the whole time?",
+        "What should she wear?",
+        "Ok let's book",
+        "1",
+    ],
+    "stopper": [
+        "Who is this?",
+        "STOP",
+    ],
+}
+
+# Used when simulated_scenarios cannot be loaded
+BUILTIN_SCENARIOS = [
+    {"id": None, "scenario_name": "Protective Parent (The Scam-Hunter)", "lead_persona": "A protective parent looking for signs of upfront fees.", "lead_name": "Alex"},
+    {"id": None, "scenario_name": "Silver Aspirant (The Insecurity Probe)", "lead_persona": "A 55-year-old who thinks the industry is only for youngsters.", "lead_name": "Alex"},
+    {"id": None, "scenario_name": "Value Griller (The High-Stakes Investor)", "lead_persona": "A parent comparing the studio to a £50 headshot.", "lead_name": "Alex"},
+    {"id": None, "scenario_name": "Logistics Weary (Distance Staller)", "lead_persona": "A lead using the commute and parking as an excuse.", "lead_name": "Alex"},
+]
+
+_OPENING_LINE_RE = re.compile(r"opening line:\s*[\"“](.+?)[\"”]\s*$", re.IGNORECASE | re.DOTALL)
+
+
+class ScriptedPersona:
+    """Replays a fixed list of lead messages, optionally opening with the scenario's line."""
+
+    def __init__(self, lines: List[str], opening_line: Optional[str] = None):
+        self.lines = ([opening_line] if opening_line else []) + list(lines)
+        self._turn = 0
+
+    def next_message(self, transcript: List[Dict[str, Any]]) -> Optional[str]:
+        if self._turn >= len(self.lines):
+            return None
+        line = self.lines[self._turn]
+        self._turn += 1
+        return line
+
+
+class ModelPersona:
+    """Lead played by a model (same attacker prompt as the Next.js Flight Simulator)."""
+
+    def __init__(self, router: ModelRouter, scenario: Dict[str, Any], style: str):
+        self.router = router
+        self.scenario = scenario
+        self.style = style
+
+    def next_message(self, transcript: List[Dict[str, Any]]) -> Optional[str]:
+        history = "\n".join(
+            f"{'Alex (Sales Agent)' if turn['sender'] == 'bot' else 'You (Customer)'}: {turn['content']}"
+            for turn in transcript
+        )
+        prompt = f"""You are roleplaying a specific customer persona in a chat with a Sales Bot named Alex.
+Stay IN CHARACTER at all times. Style: {self.style}.
+
+SCENARIO: {self.scenario.get('scenario_name')}
+YOUR PERSONA:
+{self.scenario.get('lead_persona')}
+
+Keep responses under 2-3 sentences, like a real WhatsApp chat.
+
+Conversation History:
+{history}
+
+You (Customer):"""
+        text = self.router.generate("fast", prompt, priority="simulation").strip()
+        return text or None
+
+
+def _fake_agent_reply(prompt: str) -> str:
+    """Deterministic fake model output: structured analysis or a canned reply."""
+    if "Respond in this exact format" in prompt:
+        message = prompt.split('Message: "', 1)[-1].split('"\n', 1)[0].lower()
+        objection = "none"
+        for keyword, kind in (("far", "distance"), ("drive", "distance"), ("cost", "cost"),
+                              ("scam", "other"), ("think", "thinking"), ("never", "experience")):
+            if keyword in message:
+                objection = kind
+                break
+        sentiment = "negative" if any(w in message for w in ("scam", "not sure", "who is")) else "positive"
+        name_match = re.search(r"my name is (\w+)", message)
+        return (
+            f"Intent: {'objection' if objection != 'none' else 'interested'}\n"
+            f"Objection: {objection}\n"
+            f"Sentiment: {sentiment}\n"
+            f"Name: {name_match.group(1).title() if name_match else 'none'}\n"
+            f"Suggested_Status: Qualifying"
+        )
+    return "Great! To see if you're a fit for our current briefs, let's get you in for an assessment. Does Saturday at 10 AM work?"
+
+
+def build_fake_agent(latency: float = 0.05, failure_rate: float = 0.0, seed: int = 7, workers: int = 64):
+    """
+    Build a GeminiSalesAgent whose router is backed by FakeModel (no network, no quota).
+
+    Args:
+        latency: Seconds per fake model call
+        failure_rate: Probability a fake call fails
+        seed: Seed for deterministic failures
+        workers: Router thread pool size
+
+    Returns:
+        GeminiSalesAgent: Agent wired to fake models and an unthrottled limiter
+    """
+    from api.utils.gemini_client import GeminiSalesAgent
+
+    router = ModelRouter(
+        model_factory=lambda name: FakeModel(name, latency=latency, failure_rate=failure_rate, reply=_fake_agent_reply, seed=seed),
+        limiter=AdaptiveRateLimiter(rate=1e6, burst=10 ** 6, max_concurrency=10 ** 6, max_rate=1e6),
+        max_workers=workers
+    )
+    return GeminiSalesAgent(router=router)
+
+
+def run_conversation(
+    index: int,
+    scenario: Dict[str, Any],
+    persona_name: str,
+    persona: Any,
+    agent: Any,
+    store: Any,
+    max_turns: int
+) -> Dict[str, Any]:
+    """
+    Play one conversation turn by turn through process_inbound_message.
+
+    Returns:
+        dict: Scenario/persona labels, per-turn transcript with latency and tokens, summary scores
+    """
+    from api.webhook import process_inbound_message
+
+    phone = f"+44700{index:07d}"
+    transcript: List[Dict[str, Any]] = []
+    turns: List[Dict[str, Any]] = []
+    status = "New"
+    errors = 0
+
+    for turn in range(max_turns):
+        try:
+            lead_message = persona.next_message(transcript)
+        except Exception as e:
+            errors += 1
+            print(f"Persona error: {e}")
+            break
+        if not lead_message:
+            break
+
+        transcript.append({"sender": "lead", "content": lead_message})
+        started = time.perf_counter()
+        with track_usage() as usage:
+            try:
+                result = process_inbound_message(phone, lead_message, store=store, agent=agent, priority="simulation")
+            except Exception as e:
+                errors += 1
+                result = {"response": None, "status": status, "action": "error", "error": str(e)}
+        latency_ms = (time.perf_counter() - started) * 1000
+
+        status = result["status"]
+        turns.append({
+            "turn": turn + 1,
+            "lead": lead_message,
+            "bot": result["response"],
+            "status": status,
+            "action": result["action"],
+            "latency_ms": round(latency_ms, 2),
+            "input_tokens": usage["input_tokens"],
+            "output_tokens": usage["output_tokens"],
+            "model_calls": usage["calls"],
+        })
+        if result["response"]:
+            transcript.append({"sender": "bot", "content": result["response"]})
+        if result["action"] in ("opt_out", "confirm_slot", "manual_mode", "error"):
+            break
+
+    latencies = sorted(t["latency_ms"] for t in turns)
+    scores = {
+        "booked": status == "Booked",
+        "final_status": status,
+        "turns": len(turns),
+        "errors": errors,
+        "p50_latency_ms": round(statistics.median(latencies), 2) if latencies else None,
+        "p95_latency_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))], 2) if latencies else None,
+        "input_tokens": sum(t["input_tokens"] for t in turns),
+        "output_tokens": sum(t["output_tokens"] for t in turns),
+    }
+    return {"scenario": scenario, "persona": persona_name, "scores": scores, "turns": turns}
+
+
+async def run_simulation(
+    scenarios: List[Dict[str, Any]],
+    persona_names: List[str],
+    persona_factory: Callable[[Dict[str, Any], str], Any],
+    agent: Any,
+    store: Optional[Any] = None,
+    concurrency: int = 20,
+    max_turns: int = 6,
+    repeat: int = 1
+) -> List[Dict[str, Any]]:
+    """
+    Run every scenario x persona (x repeat) conversation concurrently.
+
+    Args:
+        scenarios: Scenario dicts (id, scenario_name, lead_persona, lead_name)
+        persona_names: Persona names passed to persona_factory
+        persona_factory: Builds a persona for (scenario, persona_name)
+        agent: Sales agent used by the pipeline
+        store: Lead store (defaults to a fresh InMemoryLeadStore)
+        concurrency: Maximum conversations in flight
+        max_turns: Maximum lead messages per conversation
+        repeat: Copies of each scenario x persona pair
+
+    Returns:
+        list: One result dict per conversation (see run_conversation)
+    """
+    store = store or InMemoryLeadStore()
+    loop = asyncio.get_running_loop()
+    executor = ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix="sim")
+    semaphore = asyncio.Semaphore(concurrency)
+
+    jobs = [
+        (scenario, persona_name)
+        for _ in range(repeat)
+        for scenario in scenarios
+        for persona_name in persona_names
+    ]
+
+    async def _run(index: int, scenario: Dict[str, Any], persona_name: str) -> Dict[str, Any]:
+        async with semaphore:
+            persona = persona_factory(scenario, persona_name)
+            return await loop.run_in_executor(
+                executor, run_conversation, index, scenario, persona_name, persona, agent, store, max_turns
+            )
+
+    try:
+        return await asyncio.gather(*(_run(i, scenario, name) for i, (scenario, name) in enumerate(jobs)))
+    finally:
+        executor.shutdown(wait=False)
+
+
+def summarize(results: List[Dict[str, Any]], elapsed: float) -> Dict[str, Any]:
+    """Aggregate a sweep: booking rate, latency percentiles and token totals."""
+    turn_latencies = sorted(t["latency_ms"] for r in results for t in r["turns"])
+
+    def _pct(q: float) -> Optional[float]:
+        if not turn_latencies:
+            return None
+        return turn_latencies[min(len(turn_latencies) - 1, int(q * len(turn_latencies)))]
+
+    return {
+        "conversations": len(results),
+        "turns": len(turn_latencies),
+        "elapsed_s": round(elapsed, 2),
+        "booked_rate": sum(r["scores"]["booked"] for r in results) / len(results) if results else None,
+        "errors": sum(r["scores"]["errors"] for r in results),
+        "turn_latency_ms": {"p50": _pct(0.5), "p95": _pct(0.95), "p99": _pct(0.99)},
+        "input_tokens": sum(r["scores"]["input_tokens"] for r in results),
+        "output_tokens": sum(r["scores"]["output_tokens"] for r in results),
+    }
+
+
+def write_sim_results(results: List[Dict[str, Any]], coach_note: str, chunk_size: int = 100) -> int:
+    """
+    Bulk-insert results into sim_results (migration 013) in multi-row chunks.
+
+    Returns:
+        int: Number of rows written
+    """
+    from api.utils.supabase_client import get_supabase_client
+
+    client = get_supabase_client()
+    rows = [
+        {
+            "scenario_id": r["scenario"].get("id"),
+            "lead_persona_name": f"{r['scenario'].get('lead_name') or 'Lead'} ({r['persona']})",
+            "scores": r["scores"],
+            "coach_note": coach_note,
+            "chat_log": json.dumps(r["turns"]),
+        }
+        for r in results
+    ]
+
+    written = 0
+    for start in range(0, len(rows), chunk_size):
+        chunk = rows[start:start + chunk_size]
+        client.table("sim_results").insert(chunk).execute()
+        written += len(chunk)
+    return written
+
+
+def load_scenarios(limit: Optional[int] = None) -> List[Dict[str, Any]]:
+    """Load simulated_scenarios in one select (falls back to BUILTIN_SCENARIOS)."""
+    try:
+        from api.utils.supabase_client import get_supabase_client
+
+        query = get_supabase_client().table("simulated_scenarios").select("id, scenario_name, lead_persona, lead_name")
+        if limit:
+            query = query.limit(limit)
+        response = query.execute()
+        if response.data:
+            return response.data
+    except Exception as e:
+        print(f"Could not load simulated_scenarios, using built-in scenarios: {e}")
+    return BUILTIN_SCENARIOS[:limit] if limit else list(BUILTIN_SCENARIOS)
+
+
+def _opening_line(scenario: Dict[str, Any]) -> Optional[str]:
+    match = _OPENING_LINE_RE.search(scenario.get("lead_persona") or "")
+    return match.group(1).strip() if match else None
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Run parallel conversation simulations through the webhook pipeline.")
+    parser.add_argument("--scenarios", choices=["builtin", "db"], default="builtin")
+    parser.add_argument("--limit", type=int, default=None, help="Maximum scenarios to load")
+    parser.add_argument("--personas", default=",".join(BUILTIN_PERSONAS), help="Comma-separated persona names")
+    parser.add_argument("--turns", type=int, default=6)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--repeat", type=int, default=1)
+    parser.add_argument("--fake", action="store_true", help="Use fake models (no Gemini calls)")
+    parser.add_argument("--fake-latency", type=float, default=0.05)
+    parser.add_argument("--fake-failure-rate", type=float, default=0.0)
+    parser.add_argument("--model-personas", action="store_true", help="Let a model play the lead instead of scripts")
+    parser.add_argument("--write-results", action="store_true", help="Bulk-insert rows into sim_results")
+    parser.add_argument("--verbose", action="store_true", help="Show pipeline logs")
+    args = parser.parse_args()
+
+    scenarios = load_scenarios(args.limit) if args.scenarios == "db" else list(BUILTIN_SCENARIOS[:args.limit] if args.limit else BUILTIN_SCENARIOS)
+    persona_names = [name.strip() for name in args.personas.split(",") if name.strip()]
+
+    if args.fake:
+        agent = build_fake_agent(args.fake_latency, args.fake_failure_rate, workers=max(16, args.concurrency * 2))
+    else:
+        from api.utils.gemini_client import get_gemini_agent
+        agent = get_gemini_agent()
+
+    def persona_factory(scenario: Dict[str, Any], persona_name: str) -> Any:
+        if args.model_personas:
+            return ModelPersona(agent.router, scenario, persona_name)
+        return ScriptedPersona(BUILTIN_PERSONAS.get(persona_name, BUILTIN_PERSONAS["eager"]), _opening_line(scenario))
+
+    started = time.perf_counter()
+    log_sink = contextlib.nullcontext() if args.verbose else contextlib.redirect_stdout(io.StringIO())
+    with log_sink:
+        results = asyncio.run(run_simulation(
+            scenarios, persona_names, persona_factory, agent,
+            concurrency=args.concurrency, max_turns=args.turns, repeat=args.repeat
+        ))
+    summary = summarize(results, time.perf_counter() - started)
+    print(json.dumps(summary, indent=2))
+
+    if args.write_results:
+        mode = "fake models" if args.fake else "live models"
+        written = write_sim_results(results, coach_note=f"Python simulator sweep ({mode})")
+        print(f"Wrote {written} sim_results rows")
+
+
+if __name__ == "__main__":
+    main()
@@ -4,21 +4,23 @@ Optimized for Vercel serverless with Supavisor connection pooling (Port 6543).
 """
 
 import os
-from typing import Optional
-from supabase import create_client, Client
-from sqlalchemy import create_engine, pool
-from sqlalchemy.engine import Engine
+from typing import Optional, TYPE_CHECKING
 from dotenv import load_dotenv
 
+# supabase and sqlalchemy are imported on first use (they add ~0.4s to a cold start)
+if TYPE_CHECKING:
+    from supabase import Client
+    from sqlalchemy.engine import Engine
+
 # Load environment variables
 load_dotenv()
 
 # Global client instances
-_supabase_client: Optional[Client] = None
-_sqlalchemy_engine: Optional[Engine] = None
+_supabase_client: Optional["Client"] = None
+_sqlalchemy_engine: Optional["Engine"] = None
 
 
-def get_supabase_client() -> Client:
+def get_supabase_client() -> "Client":
     """
     Get or create Supabase client instance.
     Uses singleton pattern to reuse connection across requests.
@@ -40,12 +42,14 @@ def get_supabase_client() -> Client:
                 "Missing required environment variables: SUPABASE_URL and SUPABASE_KEY"
             )
         
+        from supabase import create_client
+
         _supabase_client = create_client(supabase_url, supabase_key)
     
     return _supabase_client
 
 
-def get_sqlalchemy_engine() -> Engine:
+def get_sqlalchemy_engine() -> "Engine":
     """
     Get or create SQLAlchemy engine for direct database access.
     Configured for Vercel serverless with Supavisor (Port 6543, Transaction Mode).
@@ -84,6 +88,8 @@ def get_sqlalchemy_engine() -> Engine:
             f"@db.{project_ref}.supabase.co:6543/postgres"
         )
         
+        from sqlalchemy import create_engine, pool
+
         # Create engine with Vercel-optimized settings
         _sqlalchemy_engine = create_engine(
             connection_string,
@@ -0,0 +1,187 @@
+"""
+Shared takeover (manual mode) state.
+Every worker keeps the set of leads currently under human takeover in a local dict,
+loaded once with a single query and then maintained by pub/sub: toggles apply locally
+at once and fan out to the other workers on the lead_takeover channel (migration 031).
+Takeovers are rare, so the set is small and a lead missing from it is known to be in
+AI mode: the webhook answers is_lead_in_manual_mode without touching the database.
+"""
+
+import os
+import threading
+from typing import Optional, Dict, Any
+
+from api.utils.message_cache import MESSAGE_FEED_DSN, LocalChangeFeed, PostgresChangeFeed
+from api.utils.lead_directory import phone_key
+
+
+TAKEOVER_CHANNEL = "lead_takeover"
+
+
+class TakeoverCache:
+    """
+    phone_key -> lead_id for leads in manual mode, plus the reverse index.
+    Until load() completes (and after a feed RESET) answers are unknown (None)
+    and callers fall back to the database.
+    """
+
+    def __init__(self):
+        self._manual: Dict[int, str] = {}
+        self._key_by_id: Dict[str, int] = {}
+        self._lock = threading.Lock()
+        self._loading = False
+        # Toggles received while a load is in flight, re-applied over its snapshot
+        self._replay: Optional[list] = None
+        self.complete = False
+
+    def __len__(self) -> int:
+        return len(self._manual)
+
+    def is_manual(self, phone: str) -> Optional[bool]:
+        """True/False from the shared set, or None while the set isn't complete."""
+        if not self.complete:
+            return None
+        return phone_key(phone) in self._manual
+
+    def set(self, lead_id: str, phone: Optional[str], enabled: bool) -> None:
+        lead_id = str(lead_id)
+        with self._lock:
+            if self._replay is not None:
+                self._replay.append((lead_id, phone, enabled))
+            self._apply(lead_id, phone, enabled)
+
+    def _apply(self, lead_id: str, phone: Optional[str], enabled: bool) -> None:
+        key = phone_key(phone) if phone else self._key_by_id.get(lead_id)
+        if enabled:
+            if key is not None:
+                previous = self._key_by_id.get(lead_id)
+                if previous is not None and previous != key:
+                    self._manual.pop(previous, None)  # Phone number changed
+                self._manual[key] = lead_id
+                self._key_by_id[lead_id] = key
+        else:
+            key = self._key_by_id.pop(lead_id, key)
+            if key is not None:
+                self._manual.pop(key, None)
+
+    def apply_change(self, event: Dict[str, Any]) -> None:
+        """Apply a lead_takeover notification: {"id", "phone", "enabled"}, or a RESET."""
+        if event.get("op") == "RESET":
+            # Toggles may have been missed while disconnected: reload the set
+            self.complete = False
+            self.load_in_background()
+        elif event.get("id"):
+            self.set(event["id"], event.get("phone"), bool(event.get("enabled")))
+
+    def load(self) -> int:
+        """
+        Replace the set with the leads currently in manual mode.
+
+        Returns:
+            int: Leads in manual mode
+        """
+        from api.utils.supabase_client import get_supabase_client
+
+        with self._lock:
+            self._replay = []
+        try:
+            response = (
+                get_supabase_client()
+                .table("leads")
+                .select("id, phone")
+                .eq("is_manual_mode", True)
+                .execute()
+            )
+        except Exception:
+            with self._lock:
+                self._replay = None
+            raise
+        manual = {}
+        for row in response.data or []:
+            key = phone_key(row.get("phone"))
+            if key is not None:
+                manual[key] = str(row["id"])
+        with self._lock:
+            self._manual = manual
+            self._key_by_id = {lead_id: key for key, lead_id in manual.items()}
+            for toggle in self._replay:
+                self._apply(*toggle)
+            self._replay = None
+            self.complete = True
+        print(f"🙋 Takeover state loaded: {len(manual)} leads in manual mode")
+        return len(manual)
+
+    def load_in_background(self) -> None:
+        with self._lock:
+            if self._loading:
+                return
+            self._loading = True
+
+        def _load():
+            try:
+                self.load()
+            except Exception as e:
+                print(f"Takeover state load failed (manual-mode checks fall back to the database): {e}")
+            finally:
+                self._loading = False
+
+        threading.Thread(target=_load, name="takeover-load", daemon=True).start()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"manual_leads": len(self._manual), "complete": self.complete}
+
+
+# Singletons
+_takeover: Optional[TakeoverCache] = None
+_takeover_feed: Optional[LocalChangeFeed] = None
+_takeover_lock = threading.Lock()
+
+
+def get_takeover_cache() -> Optional[TakeoverCache]:
+    """
+    Get the process-wide takeover cache, or None when it is disabled.
+    Enabled when MESSAGE_FEED_DSN is set (toggles fan out to every worker over
+    LISTEN lead_takeover) or TAKEOVER_CACHE=local (single worker, tests, or workers
+    sharing a COORDINATION_URL, which then carries the toggles).
+    """
+    global _takeover, _takeover_feed
+
+    if _takeover is None:
+        with _takeover_lock:
+            if _takeover is None:
+                if MESSAGE_FEED_DSN:
+                    feed = PostgresChangeFeed(MESSAGE_FEED_DSN, channel=TAKEOVER_CHANNEL, reconnect_delay=0.5)
+                elif os.getenv("TAKEOVER_CACHE", "").lower() == "local":
+                    feed = LocalChangeFeed()
+                else:
+                    return None
+                cache = TakeoverCache()
+                feed.subscribe(cache.apply_change)
+                feed.start()
+                _takeover_feed = feed
+                if not MESSAGE_FEED_DSN:
+                    from api.utils.coordination import get_coordinator, ChangeFeedRelay
+
+                    coordinator = get_coordinator()
+                    if coordinator.shared:
+                        _takeover_feed = ChangeFeedRelay(feed, TAKEOVER_CHANNEL, coordinator)
+                _takeover = cache
+
+    return _takeover
+
+
+def publish_takeover(lead_id: str, phone: Optional[str], enabled: bool) -> None:
+    """
+    Apply a toggle in this worker immediately. Other workers receive it from the
+    lead_takeover trigger once the update commits (or from the coordinator).
+    """
+    if get_takeover_cache() is None:
+        return
+    _takeover_feed.publish({"id": str(lead_id), "phone": phone, "enabled": enabled})
+
+
+def load_takeover_state_in_background() -> None:
+    """Load the manual-mode set at startup without delaying it."""
+    cache = get_takeover_cache()
+    if cache is not None and not cache.complete:
+        cache.load_in_background()
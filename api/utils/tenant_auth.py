@@ -0,0 +1,76 @@
+"""
+Tenant authentication for the API: callers present a tenant API key in X-API-Key
+(as issued for the CRM inbound webhook, see lead_import.resolve_api_key) and every
+read is scoped to that key's tenant. Resolved keys are cached for
+API_KEY_CACHE_SECONDS so paging and ETag revalidation don't each cost a lookup
+(a revoked key stops working within that window).
+"""
+
+import os
+import threading
+import time
+from typing import Optional, Dict, Tuple, Callable
+
+from fastapi import Header, HTTPException
+from starlette.concurrency import run_in_threadpool
+
+from api.utils.lead_import import resolve_api_key
+
+
+API_KEY_CACHE_SECONDS = float(os.getenv("API_KEY_CACHE_SECONDS", "60"))
+API_KEY_CACHE_MAX = 10000
+
+
+class ApiKeyCache:
+    """Short-lived key -> tenant_id cache in front of the api_keys lookup (unknown keys are not cached)."""
+
+    def __init__(self, resolver: Callable[[Optional[str]], Optional[str]] = resolve_api_key,
+                 ttl: float = API_KEY_CACHE_SECONDS, clock: Callable[[], float] = time.monotonic):
+        self.resolver = resolver
+        self.ttl = ttl
+        self.clock = clock
+        self._tenants: Dict[str, Tuple[str, float]] = {}
+        self._lock = threading.Lock()
+
+    def resolve(self, api_key: Optional[str]) -> Optional[str]:
+        if not api_key:
+            return None
+        now = self.clock()
+        with self._lock:
+            cached = self._tenants.get(api_key)
+        if cached and cached[1] > now:
+            return cached[0]
+
+        tenant_id = self.resolver(api_key)
+        if tenant_id:
+            with self._lock:
+                if len(self._tenants) >= API_KEY_CACHE_MAX:
+                    self._tenants.clear()
+                self._tenants[api_key] = (tenant_id, now + self.ttl)
+        return tenant_id
+
+
+_cache: Optional[ApiKeyCache] = None
+
+
+def get_api_key_cache() -> ApiKeyCache:
+    global _cache
+    if _cache is None:
+        _cache = ApiKeyCache()
+    return _cache
+
+
+async def require_tenant(x_api_key: Optional[str] = Header(None)) -> str:
+    """
+    FastAPI dependency: the tenant owning the request's X-API-Key.
+
+    Returns:
+        str: tenant_id
+
+    Raises:
+        HTTPException: 401 for a missing or unknown key
+    """
+    tenant_id = await run_in_threadpool(get_api_key_cache().resolve, x_api_key)
+    if not tenant_id:
+        raise HTTPException(status_code=401, detail="Invalid API key")
+    return tenant_id
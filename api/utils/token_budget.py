@@ -0,0 +1,230 @@
+"""
+Token budgeting for prompt construction.
+Measures prompt segments with a local tokenizer approximation and trims the
+lowest-priority segments so every Gemini call fits the tenant's input budget.
+"""
+
+import math
+import os
+import re
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, replace
+from typing import Optional, Dict, List, Tuple, Any
+from dotenv import load_dotenv
+
+load_dotenv()
+
+# Input token budgets per tenant plan (tenants.plan, migration 001)
+PLAN_INPUT_BUDGETS = {
+    "starter": 2000,
+    "pro": 4000,
+    "enterprise": 8000,
+}
+
+# Reply length caps per tenant plan
+PLAN_OUTPUT_TOKENS = {
+    "starter": 300,
+    "pro": 500,
+    "enterprise": 800,
+}
+
+DEFAULT_INPUT_BUDGET = int(os.getenv("PROMPT_TOKEN_BUDGET", "4000"))
+DEFAULT_OUTPUT_TOKENS = int(os.getenv("MAX_OUTPUT_TOKENS", "500"))
+
+# Segments trimmed below this size are dropped entirely
+MIN_USEFUL_TOKENS = 20
+
+# Reserved for the "[... N lines omitted ...]" marker added to trimmed segments
+OMISSION_MARKER_TOKENS = 12
+
+_PIECE_RE = re.compile(r"[A-Za-z]+|\d+|\s+|[^\sA-Za-z\d]")
+
+# Per-request token usage accumulator (set by track_usage)
+_usage: ContextVar[Optional[Dict[str, int]]] = ContextVar("token_usage", default=None)
+
+
+@dataclass(frozen=True)
+class PromptSegment:
+    """
+    One named part of a prompt.
+
+    priority: Higher survives longer when the prompt is over budget
+    required: Never trimmed (persona, latest message)
+    trim: 'drop' removes the whole segment, 'tail' keeps the last lines
+          (conversation history), 'head' keeps the first lines (reference text)
+    """
+    name: str
+    text: str
+    priority: int
+    required: bool = False
+    trim: str = "drop"
+
+
+def estimate_tokens(text: str) -> int:
+    """
+    Approximate SentencePiece token count without calling the API.
+    Words cost one token per ~4 letters, digits one per ~3, every symbol,
+    emoji or other non-ASCII character one token; whitespace is free.
+
+    Args:
+        text: Text to measure
+
+    Returns:
+        int: Estimated token count
+    """
+    if not text:
+        return 0
+
+    tokens = 0
+    for piece in _PIECE_RE.findall(text):
+        first = piece[0]
+        if first.isspace():
+            continue
+        if first.isdigit():
+            tokens += math.ceil(len(piece) / 3)
+        elif first.isalpha() and first.isascii():
+            tokens += math.ceil(len(piece) / 4)
+        else:
+            tokens += 1
+    return tokens
+
+
+def get_plan_budget(plan: Optional[str] = None) -> Tuple[int, int]:
+    """
+    Resolve the (input, output) token budget for a tenant plan.
+
+    Args:
+        plan: Tenant plan name (starter/pro/enterprise) or None
+
+    Returns:
+        tuple: (max input tokens, max output tokens)
+    """
+    key = (plan or "").lower()
+    return (
+        PLAN_INPUT_BUDGETS.get(key, DEFAULT_INPUT_BUDGET),
+        PLAN_OUTPUT_TOKENS.get(key, DEFAULT_OUTPUT_TOKENS),
+    )
+
+
+def _trim_lines(text: str, target_tokens: int, keep: str) -> str:
+    """Keep whole lines from the head or tail of text until target_tokens is reached."""
+    lines = text.split("\n")
+    ordered = lines if keep == "head" else list(reversed(lines))
+
+    kept: List[str] = []
+    used = OMISSION_MARKER_TOKENS
+    for line in ordered:
+        cost = estimate_tokens(line) + 1
+        if used + cost > target_tokens:
+            break
+        kept.append(line)
+        used += cost
+
+    omitted = len(lines) - len(kept)
+    if omitted <= 0:
+        return text
+
+    if keep == "head":
+        return "\n".join(kept + [f"[... {omitted} more lines omitted ...]"])
+    return "\n".join([f"[... {omitted} earlier lines omitted ...]"] + list(reversed(kept)))
+
+
+def fit_segments(segments: List[PromptSegment], budget: int) -> Tuple[List[PromptSegment], Dict[str, Any]]:
+    """
+    Trim or drop the lowest-priority segments until the total fits the budget.
+    Segment order is preserved so the prompt layout does not change.
+
+    Args:
+        segments: Prompt segments in prompt order
+        budget: Maximum total input tokens
+
+    Returns:
+        tuple: (fitted segments, breakdown dict with per-segment tokens and totals)
+    """
+    fitted = list(segments)
+    costs = [estimate_tokens(segment.text) for segment in fitted]
+    trimmed: List[str] = []
+
+    original_total = total = sum(costs)
+    candidates = sorted(
+        (i for i, segment in enumerate(fitted) if not segment.required),
+        key=lambda i: fitted[i].priority
+    )
+
+    for i in candidates:
+        if total <= budget:
+            break
+        segment = fitted[i]
+        if not costs[i]:
+            continue
+
+        overflow = total - budget
+        target = costs[i] - overflow
+        if segment.trim in ("head", "tail") and target >= MIN_USEFUL_TOKENS:
+            new_text = _trim_lines(segment.text, target, segment.trim)
+        else:
+            new_text = ""
+
+        new_cost = estimate_tokens(new_text)
+        fitted[i] = replace(segment, text=new_text)
+        total += new_cost - costs[i]
+        costs[i] = new_cost
+        trimmed.append(segment.name)
+
+    breakdown = {
+        "budget": budget,
+        "total": total,
+        "original_total": original_total,
+        "segments": dict((segment.name, cost) for segment, cost in zip(fitted, costs)),
+        "trimmed": trimmed,
+        "over_budget": total > budget,
+    }
+    return fitted, breakdown
+
+
+def build_prompt(segments: List[PromptSegment], budget: int, label: str = "prompt") -> Tuple[str, Dict[str, Any]]:
+    """
+    Fit segments to the budget, join them and log the token breakdown.
+
+    Args:
+        segments: Prompt segments in prompt order
+        budget: Maximum total input tokens
+        label: Name used in the log line
+
+    Returns:
+        tuple: (prompt text, breakdown dict)
+    """
+    fitted, breakdown = fit_segments(segments, budget)
+    prompt = "\n\n".join(segment.text for segment in fitted if segment.text)
+
+    parts = " ".join(f"{name}={cost}" for name, cost in breakdown["segments"].items())
+    note = f" trimmed={','.join(breakdown['trimmed'])}" if breakdown["trimmed"] else ""
+    print(f"🧮 {label} tokens: {breakdown['total']}/{budget} ({parts}){note}")
+
+    return prompt, breakdown
+
+
+@contextmanager
+def track_usage():
+    """
+    Accumulate estimated token usage for every model call made in this context.
+
+    Yields:
+        dict: input_tokens, output_tokens and calls, updated in place
+    """
+    usage = {"input_tokens": 0, "output_tokens": 0, "calls": 0}
+    token = _usage.set(usage)
+    try:
+        yield usage
+    finally:
+        _usage.reset(token)
+
+
+def record_usage(input_tokens: int, output_tokens: int) -> None:
+    """Add one model call's estimated tokens to the active track_usage() scope, if any."""
+    usage = _usage.get()
+    if usage is not None:
+        usage["input_tokens"] += input_tokens
+        usage["output_tokens"] += output_tokens
+        usage["calls"] += 1
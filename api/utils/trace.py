@@ -0,0 +1,324 @@
+"""
+Webhook trace recorder and deterministic replay.
+When WEBHOOK_TRACE_DIR is set, each inbound message is recorded as one compact JSONL
+line: input, every store read/write and model prompt/output (in call order) with
+timings, and the pipeline result. Replay feeds a trace back through
+process_inbound_message with stubbed persistence and models, reporting any divergence
+(different calls, prompts or output) and the pipeline's own CPU time.
+
+Usage:
+    python -m api.utils.trace replay traces/trace-20250101.jsonl
+    python -m api.utils.trace replay traces/trace-20250101.jsonl --trace-id <id> --output report.json
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any, Callable, Iterator
+
+from api.utils.model_router import ModelUnavailableError
+
+
+TRACE_DIR = os.getenv("WEBHOOK_TRACE_DIR")
+TRACE_SAMPLE_RATE = float(os.getenv("WEBHOOK_TRACE_SAMPLE_RATE", "1.0"))
+TRACE_VERSION = 1
+
+_write_lock = threading.Lock()
+
+
+class TraceDivergence(Exception):
+    """Raised when replay reaches a call the trace does not contain."""
+    pass
+
+
+class MessageTrace:
+    """Calls and timings recorded for one inbound message."""
+
+    def __init__(self, phone: str, message: str, priority: str):
+        self.trace_id = str(uuid.uuid4())
+        self.recorded_at = datetime.now(timezone.utc).isoformat()
+        self.input = {"phone": phone, "message": message, "priority": priority}
+        self.calls: List[Dict[str, Any]] = []
+
+    def call(self, kind: str, name: str, args: List[Any], fn: Callable[[], Any]) -> Any:
+        """Run fn and record its arguments, result (or error) and duration."""
+        entry = {"kind": kind, "name": name, "args": args}
+        started = time.perf_counter()
+        try:
+            result = fn()
+            entry["result"] = result
+            return result
+        except Exception as e:
+            entry["error"] = str(e)
+            raise
+        finally:
+            entry["ms"] = round((time.perf_counter() - started) * 1000, 3)
+            self.calls.append(entry)
+
+    def to_dict(self, output: Optional[Dict[str, Any]], error: Optional[str], total_ms: float) -> Dict[str, Any]:
+        return {
+            "v": TRACE_VERSION,
+            "trace_id": self.trace_id,
+            "recorded_at": self.recorded_at,
+            "input": self.input,
+            "calls": self.calls,
+            "output": output,
+            "error": error,
+            "total_ms": round(total_ms, 3),
+        }
+
+
+class RecordingStore:
+    """Proxy over a lead store that records every method call into a trace."""
+
+    def __init__(self, store: Any, trace: MessageTrace):
+        self._store = store
+        self._trace = trace
+
+    def __getattr__(self, name: str) -> Any:
+        attr = getattr(self._store, name)
+        if not callable(attr):
+            return attr
+
+        def _recorded(*args, **kwargs):
+            return self._trace.call("store", name, [list(args), kwargs], lambda: attr(*args, **kwargs))
+
+        return _recorded
+
+
+class RecordingRouter:
+    """Proxy over a ModelRouter that records prompts and outputs into a trace."""
+
+    def __init__(self, router: Any, trace: MessageTrace):
+        self._router = router
+        self._trace = trace
+
+    def generate(self, tier: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None, priority: str = "live") -> str:
+        return self._trace.call(
+            "model", tier, [prompt, generation_config],
+            lambda: self._router.generate(tier, prompt, generation_config, priority=priority)
+        )
+
+    def __getattr__(self, name: str) -> Any:
+        return getattr(self._router, name)
+
+
+def tracing_enabled() -> bool:
+    """True if traces should be recorded for this message (directory set and sampled in)."""
+    return bool(TRACE_DIR) and random.random() < TRACE_SAMPLE_RATE
+
+
+def trace_path(day: Optional[datetime] = None) -> str:
+    """Daily trace file under WEBHOOK_TRACE_DIR."""
+    day = day or datetime.now(timezone.utc)
+    return os.path.join(TRACE_DIR or ".", f"trace-{day:%Y%m%d}.jsonl")
+
+
+def write_trace(record: Dict[str, Any], path: Optional[str] = None) -> None:
+    """Append one trace as a compact JSONL line."""
+    path = path or trace_path()
+    line = json.dumps(record, separators=(",", ":"), ensure_ascii=False, default=str)
+    with _write_lock:
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        with open(path, "a", encoding="utf-8") as handle:
+            handle.write(line + "\n")
+
+
+def record_trace(
+    pipeline: Callable[..., Dict[str, Any]],
+    phone: str,
+    incoming_message: str,
+    store: Any,
+    agent: Any,
+    priority: str = "live",
+    path: Optional[str] = None
+) -> Dict[str, Any]:
+    """
+    Run the pipeline with recording proxies and append the trace.
+    Trace write failures are logged and never affect the reply.
+
+    Args:
+        pipeline: process_inbound_message
+        phone: Lead's phone number
+        incoming_message: Message content
+        store: Lead store to wrap (lead_manager in production)
+        agent: GeminiSalesAgent whose router is wrapped
+        priority: Rate limiter priority
+        path: Optional trace file (defaults to the daily file)
+
+    Returns:
+        dict: The pipeline result
+    """
+    from api.utils.gemini_client import GeminiSalesAgent
+
+    trace = MessageTrace(phone, incoming_message, priority)
+    traced_agent = GeminiSalesAgent(router=RecordingRouter(agent.router, trace))
+    started = time.perf_counter()
+    output, error = None, None
+    try:
+        output = pipeline(phone, incoming_message, store=RecordingStore(store, trace), agent=traced_agent, priority=priority)
+        return output
+    except Exception as e:
+        error = str(e)
+        raise
+    finally:
+        try:
+            write_trace(trace.to_dict(output, error, (time.perf_counter() - started) * 1000), path)
+        except Exception as e:
+            print(f"Error writing webhook trace: {e}")
+
+
+class _TraceCursor:
+    """Hands out recorded calls in order and collects divergences."""
+
+    def __init__(self, calls: List[Dict[str, Any]]):
+        self.calls = calls
+        self.position = 0
+        self.divergences: List[Dict[str, Any]] = []
+
+    def next(self, kind: str, name: str, args: List[Any]) -> Dict[str, Any]:
+        if self.position >= len(self.calls):
+            raise TraceDivergence(f"Unexpected {kind} call {name} after {len(self.calls)} recorded calls")
+        entry = self.calls[self.position]
+        if entry["kind"] != kind or entry["name"] != name:
+            raise TraceDivergence(
+                f"Call {self.position}: expected {entry['kind']}.{entry['name']}, got {kind}.{name}"
+            )
+        # Round-trip through JSON so tuples/lists compare like the recorded form
+        replayed = json.loads(json.dumps(args, default=str))
+        if replayed != entry["args"]:
+            self.divergences.append({
+                "call": self.position,
+                "kind": kind,
+                "name": name,
+                "recorded": entry["args"],
+                "replayed": replayed,
+            })
+        self.position += 1
+        return entry
+
+
+class ReplayStore:
+    """Lead store stub answering from a trace."""
+
+    def __init__(self, cursor: _TraceCursor):
+        self._cursor = cursor
+
+    def __getattr__(self, name: str) -> Any:
+        def _replayed(*args, **kwargs):
+            entry = self._cursor.next("store", name, [list(args), kwargs])
+            if "error" in entry:
+                raise RuntimeError(entry["error"])
+            return entry.get("result")
+
+        return _replayed
+
+
+class ReplayRouter:
+    """ModelRouter stub answering from a trace."""
+
+    def __init__(self, cursor: _TraceCursor):
+        self._cursor = cursor
+
+    def generate(self, tier: str, prompt: str, generation_config: Optional[Dict[str, Any]] = None, priority: str = "live") -> str:
+        entry = self._cursor.next("model", tier, [prompt, generation_config])
+        if "error" in entry:
+            raise ModelUnavailableError(entry["error"])
+        return entry["result"]
+
+
+def load_traces(path: str) -> Iterator[Dict[str, Any]]:
+    """Yield traces from a JSONL file."""
+    with open(path, "r", encoding="utf-8") as handle:
+        for line in handle:
+            if line.strip():
+                yield json.loads(line)
+
+
+def replay_trace(trace: Dict[str, Any]) -> Dict[str, Any]:
+    """
+    Replay one trace through the current pipeline with stubbed store and models.
+
+    Args:
+        trace: A recorded trace dict
+
+    Returns:
+        dict: trace_id, matches, output_matches, divergences, unconsumed calls,
+              recorded/replayed output and pipeline CPU time (total minus recorded I/O)
+    """
+    from api.webhook import process_inbound_message
+    from api.utils.gemini_client import GeminiSalesAgent
+
+    cursor = _TraceCursor(trace["calls"])
+    agent = GeminiSalesAgent(router=ReplayRouter(cursor))
+    inputs = trace["input"]
+
+    started = time.perf_counter()
+    output, error = None, None
+    try:
+        output = process_inbound_message(
+            inputs["phone"], inputs["message"], store=ReplayStore(cursor), agent=agent, priority=inputs["priority"]
+        )
+        output = json.loads(json.dumps(output, default=str))
+    except Exception as e:
+        error = f"{type(e).__name__}: {e}"
+    replayed_ms = (time.perf_counter() - started) * 1000
+
+    recorded_io_ms = sum(call.get("ms", 0) for call in trace["calls"])
+    output_matches = error is None and output == trace.get("output")
+    unconsumed = len(trace["calls"]) - cursor.position
+
+    return {
+        "trace_id": trace["trace_id"],
+        "matches": output_matches and not cursor.divergences and unconsumed == 0,
+        "output_matches": output_matches,
+        "divergences": cursor.divergences,
+        "unconsumed_calls": unconsumed,
+        "error": error,
+        "recorded_output": trace.get("output"),
+        "replayed_output": output,
+        "recorded_pipeline_ms": round(trace["total_ms"] - recorded_io_ms, 3),
+        "replayed_pipeline_ms": round(replayed_ms, 3),
+        "recorded_io_ms": round(recorded_io_ms, 3),
+    }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Replay recorded webhook traces.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+    replay_parser = subparsers.add_parser("replay", help="Replay traces against the current code")
+    replay_parser.add_argument("path", help="Trace JSONL file")
+    replay_parser.add_argument("--trace-id", default=None)
+    replay_parser.add_argument("--output", default=None, help="Write the full report as JSON")
+    args = parser.parse_args()
+
+    reports = []
+    for trace in load_traces(args.path):
+        if args.trace_id and trace["trace_id"] != args.trace_id:
+            continue
+        report = replay_trace(trace)
+        reports.append(report)
+        marker = "✅" if report["matches"] else "❌"
+        print(
+            f"{marker} {report['trace_id']} pipeline {report['recorded_pipeline_ms']:.1f}ms → "
+            f"{report['replayed_pipeline_ms']:.1f}ms, {len(report['divergences'])} divergence(s)"
+            + (f", error: {report['error']}" if report["error"] else "")
+        )
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as handle:
+            json.dump(reports, handle, indent=2, ensure_ascii=False)
+
+    mismatched = sum(not r["matches"] for r in reports)
+    print(f"Replayed {len(reports)} trace(s), {mismatched} mismatched")
+    sys.exit(1 if mismatched else 0)
+
+
+if __name__ == "__main__":
+    main()
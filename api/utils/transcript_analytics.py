@@ -0,0 +1,525 @@
+"""
+Vectorized transcript analytics.
+messages and leads are exported in chunks (one streamed query each) into a snapshot
+of dictionary-encoded NumPy columns (raw binary + manifest.json, read back as
+memmaps), then every report is computed with array operations over the whole
+history:
+
+- status funnel and status transition matrix, with each inbound message's status
+  context replayed through the webhook's transition table
+- objection conversion: overall, by the status the objection was raised at, and by
+  the turn it was raised on (conversion = lead is Booked now)
+- reply-latency distributions (lead replying to us, and us replying to the lead)
+
+Usage:
+    python -m api.utils.transcript_analytics --export
+    python -m api.utils.transcript_analytics --report [--tenant-id <uuid>]
+    python -m api.utils.transcript_analytics --synthetic 2000000   # timing without a database
+"""
+
+import argparse
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Optional, Dict, List, Any
+
+from api.utils.lead_manager import VALID_STATUSES
+from api.utils.lead_state_machine import (
+    INTENTS,
+    OBJECTIONS,
+    SENTIMENTS,
+    STOP_KEYWORDS,
+    BOOKING_KEYWORDS,
+    normalize_event,
+    transition_codes,
+)
+
+
+SNAPSHOT_DIR = os.getenv("ANALYTICS_SNAPSHOT_DIR") or os.path.join(tempfile.gettempdir(), "transcript-analytics")
+SNAPSHOT_TTL = float(os.getenv("ANALYTICS_SNAPSHOT_TTL", "3600"))
+# An on-demand refresh exports every tenant's history, so one is honoured at most this often
+REFRESH_MIN_AGE = float(os.getenv("ANALYTICS_REFRESH_MIN_SECONDS", "300"))
+EXPORT_CHUNK = int(os.getenv("ANALYTICS_EXPORT_CHUNK", "100000"))
+
+SENDERS = ["lead", "bot", "human"]
+
+MESSAGE_COLUMNS = {
+    "lead": "int32",       # index into the leads snapshot
+    "sender": "int8",      # SENDERS
+    "ts": "int64",         # epoch seconds
+    "intent": "int8",      # INTENTS (keyword overrides applied at export)
+    "objection": "int8",   # OBJECTIONS
+    "sentiment": "int8",   # SENTIMENTS
+}
+LEAD_COLUMNS = {
+    "status": "int8",      # VALID_STATUSES
+    "tenant": "int16",     # index into manifest tenants (-1 none)
+    "created": "int64",    # epoch seconds
+}
+
+# Lower edges of the turn buckets (turn = nth inbound message of the lead)
+TURN_BUCKETS = [1, 2, 3, 4, 6, 11, 21]
+# Lower edges of the latency buckets, in minutes
+LATENCY_BUCKETS = [0, 1, 5, 15, 60, 360, 1440]
+
+
+def _bucket_labels(edges: List[int], unit: str = "") -> List[str]:
+    labels = []
+    for i, low in enumerate(edges):
+        high = edges[i + 1] - 1 if i + 1 < len(edges) else None
+        if unit:
+            high = edges[i + 1] if i + 1 < len(edges) else None
+            labels.append(f"{low}-{high}{unit}" if high is not None else f"{low}{unit}+")
+        else:
+            labels.append(str(low) if high == low else (f"{low}-{high}" if high is not None else f"{low}+"))
+    return labels
+
+
+class _ColumnWriter:
+    """Append fixed-dtype column chunks to raw files in a snapshot directory."""
+
+    def __init__(self, path: str, columns: Dict[str, str]):
+        self.path = path
+        self.columns = columns
+        self.rows = 0
+        self._files = {name: open(os.path.join(path, f"{name}.bin"), "wb") for name in columns}
+
+    def append(self, chunk: Dict[str, Any]) -> None:
+        import numpy as np
+
+        lengths = set()
+        for name, dtype in self.columns.items():
+            array = np.asarray(chunk[name], dtype=dtype)
+            array.tofile(self._files[name])
+            lengths.add(len(array))
+        assert len(lengths) == 1, "column chunks must have equal lengths"
+        self.rows += lengths.pop()
+
+    def close(self) -> None:
+        for f in self._files.values():
+            f.close()
+
+
+def _open_columns(path: str, columns: Dict[str, str], rows: int) -> Dict[str, Any]:
+    import numpy as np
+
+    return {
+        name: (
+            np.memmap(os.path.join(path, f"{name}.bin"), dtype=dtype, mode="r", shape=(rows,))
+            if rows else np.empty(0, dtype=dtype)
+        )
+        for name, dtype in columns.items()
+    }
+
+
+class Snapshot:
+    """A loaded export: memmapped message and lead columns plus the manifest."""
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, "manifest.json")) as f:
+            self.manifest = json.load(f)
+        self.path = path
+        self.messages = _open_columns(os.path.join(path, "messages"), MESSAGE_COLUMNS, self.manifest["messages"])
+        self.leads = _open_columns(os.path.join(path, "leads"), LEAD_COLUMNS, self.manifest["leads"])
+
+    @property
+    def exported_at(self) -> float:
+        return self.manifest["exported_at"]
+
+    def tenant_code(self, tenant_id: Optional[str]) -> Optional[int]:
+        if tenant_id is None:
+            return None
+        tenants = self.manifest["tenants"]
+        return tenants.index(tenant_id) if tenant_id in tenants else -2
+
+
+def _effective_intent_sql() -> str:
+    """The webhook's keyword overrides of the model intent (classify_event), in SQL."""
+    stop_words = ", ".join(f"'{word}'" for word in STOP_KEYWORDS)
+    booking = " OR ".join(f"content ILIKE '%{word}%'" for word in BOOKING_KEYWORDS)
+    return (
+        "CASE "
+        f"WHEN upper(btrim(content)) IN ({stop_words}) THEN 'stop' "
+        f"WHEN {booking} THEN 'booking' "
+        "WHEN btrim(content) ~ '^[0-9]+$' THEN 'slot_selection' "
+        "WHEN analysis->>'intent' IN ('booking', 'slot_selection') THEN 'interested' "
+        "ELSE analysis->>'intent' END"
+    )
+
+
+def export_snapshot(path: Optional[str] = None, chunk_size: int = EXPORT_CHUNK) -> str:
+    """
+    Export leads and messages into a new snapshot directory (streamed, chunk by chunk).
+
+    Args:
+        path: Snapshot directory (default: a timestamped directory under SNAPSHOT_DIR)
+        chunk_size: Rows fetched and encoded per chunk
+
+    Returns:
+        str: Snapshot directory
+    """
+    from sqlalchemy import text
+    from api.utils.supabase_client import get_sqlalchemy_engine
+
+    started = time.time()
+    path = path or os.path.join(SNAPSHOT_DIR, datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%S"))
+    os.makedirs(os.path.join(path, "leads"), exist_ok=True)
+    os.makedirs(os.path.join(path, "messages"), exist_ok=True)
+
+    status_codes = {name: i for i, name in enumerate(VALID_STATUSES)}
+    sender_codes = {name: i for i, name in enumerate(SENDERS)}
+    intent_codes = {name: i for i, name in enumerate(INTENTS)}
+    objection_codes = {name: i for i, name in enumerate(OBJECTIONS)}
+    sentiment_codes = {name: i for i, name in enumerate(SENTIMENTS)}
+    lead_index: Dict[str, int] = {}
+    tenants: Dict[str, int] = {}
+    event_codes: Dict[tuple, tuple] = {}
+
+    engine = get_sqlalchemy_engine()
+    lead_writer = _ColumnWriter(os.path.join(path, "leads"), LEAD_COLUMNS)
+    message_writer = _ColumnWriter(os.path.join(path, "messages"), MESSAGE_COLUMNS)
+    try:
+        with engine.connect() as conn:
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                text("SELECT id, status, tenant_id, extract(epoch FROM created_at)::bigint AS created FROM leads")
+            )
+            for rows in result.partitions():
+                chunk = {"status": [], "tenant": [], "created": []}
+                for row in rows:
+                    lead_index[str(row.id)] = len(lead_index)
+                    chunk["status"].append(status_codes.get(row.status, 0))
+                    tenant = str(row.tenant_id) if row.tenant_id else None
+                    chunk["tenant"].append(tenants.setdefault(tenant, len(tenants)) if tenant else -1)
+                    chunk["created"].append(row.created or 0)
+                lead_writer.append(chunk)
+
+            result = conn.execution_options(stream_results=True, yield_per=chunk_size).execute(
+                text(
+                    "SELECT lead_id, sender_type, extract(epoch FROM timestamp)::bigint AS ts, "
+                    f"{_effective_intent_sql()} AS intent, analysis->>'objection_type' AS objection, "
+                    "COALESCE(analysis->>'sentiment', lower(sentiment_label)) AS sentiment "
+                    "FROM messages"
+                )
+            )
+            for rows in result.partitions():
+                chunk = {name: [] for name in MESSAGE_COLUMNS}
+                for row in rows:
+                    lead = lead_index.get(str(row.lead_id))
+                    if lead is None:
+                        continue  # Lead created after the leads pass
+                    key = (row.intent, row.objection, row.sentiment)
+                    codes = event_codes.get(key)
+                    if codes is None:
+                        intent, objection, sentiment = normalize_event(*key)
+                        codes = event_codes[key] = (
+                            intent_codes[intent], objection_codes[objection], sentiment_codes[sentiment]
+                        )
+                    chunk["lead"].append(lead)
+                    chunk["sender"].append(sender_codes.get(row.sender_type, 1))
+                    chunk["ts"].append(row.ts or 0)
+                    chunk["intent"].append(codes[0])
+                    chunk["objection"].append(codes[1])
+                    chunk["sentiment"].append(codes[2])
+                message_writer.append(chunk)
+    finally:
+        lead_writer.close()
+        message_writer.close()
+
+    manifest = {
+        "exported_at": started,
+        "seconds": round(time.time() - started, 2),
+        "leads": lead_writer.rows,
+        "messages": message_writer.rows,
+        "tenants": sorted(tenants, key=tenants.get),
+        "vocabularies": {
+            "statuses": VALID_STATUSES, "senders": SENDERS, "intents": INTENTS,
+            "objections": OBJECTIONS, "sentiments": SENTIMENTS,
+        },
+    }
+    with open(os.path.join(path, "manifest.json"), "w") as f:
+        json.dump(manifest, f)
+    print(f"📊 Transcript snapshot: {manifest['leads']} leads, {manifest['messages']} messages in {manifest['seconds']}s")
+    return path
+
+
+def _complete_snapshots(root: str) -> List[str]:
+    if not os.path.isdir(root):
+        return []
+    return sorted(name for name in os.listdir(root) if os.path.exists(os.path.join(root, name, "manifest.json")))
+
+
+def latest_snapshot(root: str = SNAPSHOT_DIR) -> Optional[Snapshot]:
+    complete = _complete_snapshots(root)
+    return Snapshot(os.path.join(root, complete[-1])) if complete else None
+
+
+def prune_snapshots(root: str = SNAPSHOT_DIR, keep: int = 2) -> None:
+    """Delete all but the newest keep snapshots (the previous one may still be memmapped)."""
+    for name in _complete_snapshots(root)[:-keep]:
+        shutil.rmtree(os.path.join(root, name), ignore_errors=True)
+
+
+def _percentiles(values: Any) -> Dict[str, Optional[float]]:
+    import numpy as np
+
+    if not len(values):
+        return {"p50": None, "p90": None, "p99": None}
+    p50, p90, p99 = np.percentile(values, [50, 90, 99])
+    return {"p50": round(float(p50), 2), "p90": round(float(p90), 2), "p99": round(float(p99), 2)}
+
+
+def _latency_distribution(minutes: Any) -> Dict[str, Any]:
+    import numpy as np
+
+    buckets = np.bincount(np.searchsorted(LATENCY_BUCKETS, minutes, side="right") - 1, minlength=len(LATENCY_BUCKETS))
+    return {
+        "count": int(len(minutes)),
+        "minutes": _percentiles(minutes),
+        "histogram": dict(zip(_bucket_labels(LATENCY_BUCKETS, "m"), buckets.tolist())),
+    }
+
+
+def _rate(numerator: Any, denominator: Any) -> List[Optional[float]]:
+    return [round(n / d, 4) if d else None for n, d in zip(numerator.tolist(), denominator.tolist())]
+
+
+def analyze(messages: Dict[str, Any], leads: Dict[str, Any], tenant: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Compute every report over column arrays (a Snapshot's, or synthetic ones).
+
+    Args:
+        messages: MESSAGE_COLUMNS arrays (any order)
+        leads: LEAD_COLUMNS arrays, indexed by messages["lead"]
+        tenant: Optional tenant code to restrict to
+
+    Returns:
+        dict: funnel, transitions, objections and latency reports
+    """
+    import numpy as np
+
+    n_status = len(VALID_STATUSES)
+    booked = VALID_STATUSES.index("Booked")
+    lead_status = np.asarray(leads["status"], dtype=np.int64)
+
+    lead_ids = np.asarray(messages["lead"])
+    if tenant is not None:
+        keep = np.asarray(leads["tenant"])[lead_ids] == tenant
+        lead_mask = np.asarray(leads["tenant"]) == tenant
+    else:
+        keep = slice(None)
+        lead_mask = np.ones(len(lead_status), dtype=bool)
+
+    # Chronological order within each lead
+    lead_ids = lead_ids[keep]
+    ts = np.asarray(messages["ts"])[keep]
+    order = np.lexsort((ts, lead_ids))
+    lead_ids, ts = lead_ids[order], ts[order]
+    sender = np.asarray(messages["sender"])[keep][order]
+    intent = np.asarray(messages["intent"])[keep][order].astype(np.int64)
+    objection = np.asarray(messages["objection"])[keep][order].astype(np.int64)
+    sentiment = np.asarray(messages["sentiment"])[keep][order].astype(np.int64)
+
+    n = len(lead_ids)
+    new_lead = np.ones(n, dtype=bool)
+    new_lead[1:] = lead_ids[1:] != lead_ids[:-1]
+    is_inbound = sender == SENDERS.index("lead")
+
+    # Turn of each inbound message within its lead (1-based)
+    inbound_cum = np.cumsum(is_inbound)
+    group_start = np.maximum.accumulate(np.where(new_lead, np.arange(n), 0))
+    turn = inbound_cum - inbound_cum[group_start] + is_inbound[group_start]
+
+    # Replay statuses: step k advances every lead by its k-th inbound message
+    inbound = np.nonzero(is_inbound)[0]
+    next_codes = transition_codes()
+    slot_selection, unknown = INTENTS.index("slot_selection"), INTENTS.index("unknown")
+    booking_offered = VALID_STATUSES.index("Booking_Offered")
+    status_before = np.zeros(len(inbound), dtype=np.int64)
+    status_after = np.zeros(len(inbound), dtype=np.int64)
+    state = np.zeros(len(lead_status), dtype=np.int64)
+    reached = np.zeros((len(lead_status), n_status), dtype=bool)
+    reached[np.unique(lead_ids), 0] = True
+    by_turn = np.argsort(turn[inbound], kind="stable")
+    bounds = np.searchsorted(turn[inbound][by_turn], np.arange(1, int(turn[inbound].max(initial=0)) + 2))
+    for step in range(len(bounds) - 1):
+        events = by_turn[bounds[step]:bounds[step + 1]]
+        rows = inbound[events]
+        leads_now = lead_ids[rows]
+        current = state[leads_now]
+        # Digit-only replies are slot selections only when slots were offered
+        step_intent = np.where((intent[rows] == slot_selection) & (current != booking_offered), unknown, intent[rows])
+        status_before[events] = current
+        state[leads_now] = next_codes[current, step_intent, objection[rows], sentiment[rows]]
+        status_after[events] = state[leads_now]
+        reached[leads_now, state[leads_now]] = True
+
+    # Funnel: leads that ever reached each status (replayed or actual current status)
+    active = np.zeros(len(lead_status), dtype=bool)
+    active[lead_ids] = True
+    reached[np.nonzero(lead_mask)[0], lead_status[lead_mask]] = True
+    funnel = reached[lead_mask].sum(axis=0)
+    transitions = np.bincount(status_before * n_status + status_after, minlength=n_status * n_status)
+    transitions = transitions.reshape(n_status, n_status)
+
+    # Objection conversion (leads counted once per objection type, at its first occurrence)
+    converted = lead_status == booked
+    raised = inbound[objection[inbound] != OBJECTIONS.index("none")]
+    raised_pos = np.nonzero(objection[inbound] != OBJECTIONS.index("none"))[0]
+    first = np.unique(lead_ids[raised] * len(OBJECTIONS) + objection[raised], return_index=True)[1]
+    first_rows, first_pos = raised[first], raised_pos[first]
+    obj = objection[first_rows]
+    obj_leads = lead_ids[first_rows]
+    obj_converted = converted[obj_leads]
+    obj_status = status_before[first_pos]
+    obj_turn = np.searchsorted(TURN_BUCKETS, turn[first_rows], side="right") - 1
+
+    n_obj, n_turn = len(OBJECTIONS), len(TURN_BUCKETS)
+    raised_by = np.bincount(obj, minlength=n_obj)
+    converted_by = np.bincount(obj, weights=obj_converted, minlength=n_obj)
+    raised_status = np.bincount(obj * n_status + obj_status, minlength=n_obj * n_status).reshape(n_obj, n_status)
+    converted_status = np.bincount(
+        obj * n_status + obj_status, weights=obj_converted, minlength=n_obj * n_status
+    ).reshape(n_obj, n_status)
+    raised_turn = np.bincount(obj * n_turn + obj_turn, minlength=n_obj * n_turn).reshape(n_obj, n_turn)
+    converted_turn = np.bincount(
+        obj * n_turn + obj_turn, weights=obj_converted, minlength=n_obj * n_turn
+    ).reshape(n_obj, n_turn)
+
+    # Reply latency: consecutive messages of the same lead from different sides
+    same_lead = ~new_lead[1:]
+    gap_minutes = (ts[1:] - ts[:-1]) / 60.0
+    lead_replies = same_lead & is_inbound[1:] & ~is_inbound[:-1]
+    our_replies = same_lead & ~is_inbound[1:] & is_inbound[:-1]
+
+    turn_labels = _bucket_labels(TURN_BUCKETS)
+    objections = {}
+    for k, name in enumerate(OBJECTIONS):
+        if name == "none" or not raised_by[k]:
+            continue
+        objections[name] = {
+            "leads": int(raised_by[k]),
+            "converted": int(converted_by[k]),
+            "conversion_rate": round(converted_by[k] / raised_by[k], 4),
+            "by_status": {
+                status: {"leads": int(raised_status[k, s]), "conversion_rate": _rate(converted_status[k, s:s + 1], raised_status[k, s:s + 1])[0]}
+                for s, status in enumerate(VALID_STATUSES) if raised_status[k, s]
+            },
+            "by_turn": {
+                label: {"leads": int(raised_turn[k, t]), "conversion_rate": _rate(converted_turn[k, t:t + 1], raised_turn[k, t:t + 1])[0]}
+                for t, label in enumerate(turn_labels) if raised_turn[k, t]
+            },
+        }
+
+    total_leads = int(lead_mask.sum())
+    return {
+        "leads": total_leads,
+        "leads_with_messages": int(active[lead_mask].sum()),
+        "messages": int(n),
+        "inbound_messages": int(len(inbound)),
+        "funnel": {
+            status: {"leads": int(funnel[s]), "rate": round(funnel[s] / total_leads, 4) if total_leads else None}
+            for s, status in enumerate(VALID_STATUSES)
+        },
+        "current_status": dict(zip(VALID_STATUSES, np.bincount(lead_status[lead_mask], minlength=n_status).tolist())),
+        "transitions": {
+            "statuses": VALID_STATUSES,
+            "counts": transitions.tolist(),
+            "probabilities": np.round(
+                transitions / np.maximum(transitions.sum(axis=1, keepdims=True), 1), 4
+            ).tolist(),
+        },
+        "objections": objections,
+        "latency": {
+            "lead_reply": _latency_distribution(gap_minutes[lead_replies]),
+            "our_reply": _latency_distribution(gap_minutes[our_replies]),
+        },
+    }
+
+
+def synthetic_columns(leads: int, messages: int, seed: int = 7) -> tuple:
+    """Random but plausible columns for timing analyze() without a database."""
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    lead_cols = {
+        "status": rng.integers(0, len(VALID_STATUSES), leads).astype(np.int8),
+        "tenant": rng.integers(0, 5, leads).astype(np.int16),
+        "created": np.full(leads, 1_700_000_000, dtype=np.int64),
+    }
+    lead = rng.integers(0, leads, messages).astype(np.int32)
+    message_cols = {
+        "lead": lead,
+        "sender": rng.choice([0, 1], messages, p=[0.5, 0.5]).astype(np.int8),
+        "ts": (1_700_000_000 + rng.integers(0, 90 * 86400, messages)).astype(np.int64),
+        "intent": rng.integers(0, len(INTENTS), messages).astype(np.int8),
+        "objection": rng.choice(len(OBJECTIONS), messages, p=[0.7] + [0.3 / (len(OBJECTIONS) - 1)] * (len(OBJECTIONS) - 1)).astype(np.int8),
+        "sentiment": rng.integers(0, len(SENTIMENTS), messages).astype(np.int8),
+    }
+    return message_cols, lead_cols
+
+
+# Report cache: one result per (snapshot, tenant)
+_reports: Dict[tuple, Dict[str, Any]] = {}
+_export_lock = threading.Lock()
+
+
+def get_transcript_report(tenant_id: Optional[str] = None, refresh: bool = False, max_age: float = SNAPSHOT_TTL) -> Dict[str, Any]:
+    """
+    Report for the latest snapshot, exporting a new one if it is missing or stale.
+
+    Args:
+        tenant_id: Optional tenant filter
+        refresh: Export anew unless the snapshot is younger than ANALYTICS_REFRESH_MIN_SECONDS
+        max_age: Snapshot age (seconds) that triggers a new export
+
+    Returns:
+        dict: analyze() output plus snapshot metadata
+    """
+    if refresh:
+        max_age = min(max_age, REFRESH_MIN_AGE)
+    snapshot = latest_snapshot()
+    if snapshot is None or time.time() - snapshot.exported_at > max_age:
+        with _export_lock:
+            snapshot = latest_snapshot()
+            if snapshot is None or time.time() - snapshot.exported_at > max_age:
+                snapshot = Snapshot(export_snapshot())
+                _reports.clear()
+                prune_snapshots()
+
+    key = (snapshot.path, tenant_id)
+    if key not in _reports:
+        started = time.perf_counter()
+        report = analyze(snapshot.messages, snapshot.leads, snapshot.tenant_code(tenant_id))
+        report["snapshot"] = {
+            "exported_at": datetime.fromtimestamp(snapshot.exported_at, timezone.utc).isoformat(),
+            "compute_seconds": round(time.perf_counter() - started, 3),
+        }
+        _reports[key] = report
+    return _reports[key]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Transcript analytics over conversation history")
+    parser.add_argument("--export", action="store_true", help="Export a new snapshot")
+    parser.add_argument("--report", action="store_true", help="Print the report for the latest snapshot")
+    parser.add_argument("--tenant-id", default=None)
+    parser.add_argument("--synthetic", type=int, default=0, help="Time analyze() on N synthetic messages")
+    args = parser.parse_args()
+
+    if args.synthetic:
+        messages, leads = synthetic_columns(max(args.synthetic // 20, 1), args.synthetic)
+        started = time.perf_counter()
+        report = analyze(messages, leads)
+        elapsed = time.perf_counter() - started
+        print(json.dumps({"messages": args.synthetic, "leads": len(leads["status"]), "seconds": round(elapsed, 2),
+                          "objections": list(report["objections"]), "lead_reply": report["latency"]["lead_reply"]["minutes"]}, indent=2))
+    elif args.export:
+        print(export_snapshot())
+    elif args.report:
+        print(json.dumps(get_transcript_report(args.tenant_id), indent=2))
+    else:
+        parser.print_help()
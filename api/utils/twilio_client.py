@@ -0,0 +1,353 @@
+"""
+Twilio send layer for outbound WhatsApp messages (manual takeover replies,
+shoot reminders, the outbound queue).
+Every send runs on one asyncio loop per process: a semaphore bounds concurrent
+requests, a token bucket per sender number keeps within its WhatsApp throughput
+(TWILIO_SENDER_MPS), and 429 / 5xx responses and connection failures (where the
+request never left) are retried with jittered exponential backoff (honouring
+Retry-After); a message is never re-sent after its POST may have reached Twilio. Each message asks Twilio for status
+callbacks at TWILIO_STATUS_CALLBACK_URL, recorded by /api/twilio/status
+(migration 037). TWILIO_API_BASE points the layer at a fake server
+(scripts/fake_twilio.py).
+"""
+
+import asyncio
+import os
+import random
+import threading
+import time
+from typing import Optional, Dict, List, Any, Tuple
+from dotenv import load_dotenv
+
+from api.utils.coordination import worker_count
+
+load_dotenv()
+
+TWILIO_PHONE = os.getenv("TWILIO_PHONE_NUMBER")
+TWILIO_API_BASE = os.getenv("TWILIO_API_BASE", "https://api.twilio.com").rstrip("/")
+TWILIO_STATUS_CALLBACK_URL = os.getenv("TWILIO_STATUS_CALLBACK_URL")
+
+SEND_CONCURRENCY = int(os.getenv("TWILIO_SEND_CONCURRENCY", "16"))
+# Messages/second per sender number (Twilio WhatsApp senders default to 80 MPS),
+# split evenly between the workers (WEB_CONCURRENCY)
+SENDER_MPS = float(os.getenv("TWILIO_SENDER_MPS", "80")) / worker_count()
+MAX_ATTEMPTS = int(os.getenv("TWILIO_SEND_MAX_ATTEMPTS", "4"))
+RETRY_BASE_SECONDS = float(os.getenv("TWILIO_RETRY_BASE_SECONDS", "0.5"))
+RETRY_MAX_SECONDS = float(os.getenv("TWILIO_RETRY_MAX_SECONDS", "20"))
+REQUEST_TIMEOUT = 15.0
+
+# Delivery states in lifecycle order; a late callback never moves a message backwards
+STATUS_RANK = {
+    "accepted": 0, "scheduled": 0, "queued": 0, "sending": 1, "sent": 2,
+    "delivered": 3, "read": 4, "undelivered": 5, "failed": 5, "canceled": 5,
+}
+
+class TwilioSendError(Exception):
+    """A send that failed permanently, or ran out of retries."""
+
+    def __init__(self, message: str, status: Optional[int] = None, code: Optional[int] = None, retryable: bool = False):
+        super().__init__(message)
+        self.status = status
+        self.code = code
+        self.retryable = retryable
+
+
+class SenderRateLimiter:
+    """Async token bucket for one sender number (burst of 100 ms, so no second exceeds the rate by more than 10%)."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate / 10)
+        self._tokens = self.burst
+        self._refilled_at = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self) -> None:
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self._tokens = min(self.burst, self._tokens + (now - self._refilled_at) * self.rate)
+                self._refilled_at = now
+                if self._tokens >= 1.0:
+                    self._tokens -= 1.0
+                    return
+                await asyncio.sleep((1.0 - self._tokens) / self.rate)
+
+
+def _retry_delay(attempt: int, retry_after: Optional[str], rng: random.Random) -> float:
+    """Full-jitter exponential backoff, never shorter than Retry-After."""
+    delay = rng.uniform(0, min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2 ** (attempt - 1)))
+    if retry_after:
+        try:
+            delay = max(delay, float(retry_after))
+        except ValueError:
+            pass
+    return delay
+
+
+class TwilioSender:
+    """Bounded, rate-limited, retrying client for the Messages API (one per event loop)."""
+
+    def __init__(
+        self,
+        account_sid: Optional[str] = None,
+        auth_token: Optional[str] = None,
+        from_number: Optional[str] = None,
+        api_base: str = TWILIO_API_BASE,
+        concurrency: int = SEND_CONCURRENCY,
+        sender_mps: float = SENDER_MPS,
+        max_attempts: int = MAX_ATTEMPTS,
+        status_callback: Optional[str] = TWILIO_STATUS_CALLBACK_URL,
+        rng: Optional[random.Random] = None
+    ):
+        """
+        Args:
+            account_sid: Twilio account (default TWILIO_ACCOUNT_SID)
+            auth_token: Twilio auth token (default TWILIO_AUTH_TOKEN)
+            from_number: Default sender number (default TWILIO_PHONE_NUMBER)
+            api_base: Twilio REST base URL (a fake server in tests)
+            concurrency: Maximum in-flight requests
+            sender_mps: Messages/second per sender number
+            max_attempts: Attempts per message, including the first
+            status_callback: URL Twilio posts delivery status updates to
+            rng: Random source for retry jitter
+        """
+        import httpx
+
+        self.account_sid = account_sid or os.getenv("TWILIO_ACCOUNT_SID")
+        self.auth_token = auth_token or os.getenv("TWILIO_AUTH_TOKEN")
+        self.from_number = from_number or TWILIO_PHONE
+        self.api_base = api_base
+        self.url = f"{api_base}/2010-04-01/Accounts/{self.account_sid}/Messages.json"
+        self.sender_mps = sender_mps
+        self.max_attempts = max_attempts
+        self.status_callback = status_callback
+        self.rng = rng or random.Random()
+        self._client = httpx.AsyncClient(
+            timeout=REQUEST_TIMEOUT,
+            limits=httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency),
+        )
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._limiters: Dict[str, SenderRateLimiter] = {}
+        self.counters = {"sent": 0, "failed": 0, "retries": 0, "throttled": 0, "server_errors": 0, "network_errors": 0}
+
+    def _limiter(self, sender: str) -> SenderRateLimiter:
+        limiter = self._limiters.get(sender)
+        if limiter is None:
+            limiter = self._limiters[sender] = SenderRateLimiter(self.sender_mps)
+        return limiter
+
+    async def send(self, phone: str, body: str, from_number: Optional[str] = None) -> str:
+        """
+        Send one WhatsApp message.
+
+        Args:
+            phone: Recipient's E.164 number
+            body: Message text
+            from_number: Sender number (default: the business number)
+
+        Returns:
+            str: Twilio message SID
+
+        Raises:
+            TwilioSendError: On a permanent error (bad number, auth, ...) or when retries run out
+        """
+        import httpx
+
+        sender = from_number or self.from_number
+        data = {"To": f"whatsapp:{phone}", "From": f"whatsapp:{sender}", "Body": body}
+        if self.status_callback:
+            data["StatusCallback"] = self.status_callback
+
+        error: Optional[TwilioSendError] = None
+        for attempt in range(1, self.max_attempts + 1):
+            if attempt > 1:
+                self.counters["retries"] += 1
+            await self._limiter(sender).acquire()
+            retry_after = None
+            try:
+                async with self._semaphore:
+                    response = await self._client.post(self.url, data=data, auth=(self.account_sid, self.auth_token))
+            except (httpx.ConnectError, httpx.ConnectTimeout, httpx.PoolTimeout) as e:
+                # The request never reached Twilio, so sending it again cannot duplicate the message
+                self.counters["network_errors"] += 1
+                error = TwilioSendError(f"Twilio request failed: {e!r}", retryable=True)
+            except httpx.TransportError as e:
+                # The POST may have been accepted (read timeout, dropped connection); a retry could send twice
+                self.counters["network_errors"] += 1
+                error = TwilioSendError(f"Twilio request failed after sending: {e!r}")
+                break
+            else:
+                if response.status_code < 300:
+                    self.counters["sent"] += 1
+                    return response.json()["sid"]
+                try:
+                    payload = response.json()
+                except ValueError:
+                    payload = {}
+                retryable = response.status_code == 429 or response.status_code >= 500
+                error = TwilioSendError(
+                    f"Twilio {response.status_code}: {payload.get('message') or response.text[:200]}",
+                    status=response.status_code, code=payload.get("code"), retryable=retryable,
+                )
+                if not retryable:
+                    break
+                self.counters["throttled" if response.status_code == 429 else "server_errors"] += 1
+                retry_after = response.headers.get("retry-after")
+            if attempt < self.max_attempts:
+                await asyncio.sleep(_retry_delay(attempt, retry_after, self.rng))
+        self.counters["failed"] += 1
+        raise error
+
+    async def send_many(self, messages: List[Tuple[str, str]]) -> List[Dict[str, Any]]:
+        """
+        Send a batch concurrently (within the concurrency and rate limits).
+
+        Returns:
+            list: {"sid", "error"} per message, in input order
+        """
+        results = await asyncio.gather(*(self.send(phone, body) for phone, body in messages), return_exceptions=True)
+        return [
+            {"sid": None, "error": str(r)} if isinstance(r, Exception) else {"sid": r, "error": None}
+            for r in results
+        ]
+
+    async def warm(self) -> None:
+        """Open a pooled connection to the API (an account lookup; nothing is sent)."""
+        if not self.account_sid or not self.auth_token:
+            raise TwilioSendError("TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN are not set")
+        response = await self._client.get(
+            f"{self.api_base}/2010-04-01/Accounts/{self.account_sid}.json", auth=(self.account_sid, self.auth_token)
+        )
+        if response.status_code >= 400:
+            raise TwilioSendError(f"Twilio {response.status_code} on warm-up", status=response.status_code)
+
+    async def close(self) -> None:
+        await self._client.aclose()
+
+    def stats(self) -> Dict[str, Any]:
+        return {"senders": len(self._limiters), "sender_mps": self.sender_mps, **self.counters}
+
+
+# One loop thread owns the sender, so limits are shared by every caller in the process
+_sender: Optional[TwilioSender] = None
+_loop: Optional[asyncio.AbstractEventLoop] = None
+_sender_lock = threading.Lock()
+
+
+def _get_sender_loop() -> Tuple[TwilioSender, asyncio.AbstractEventLoop]:
+    global _sender, _loop
+    if _sender is None:
+        with _sender_lock:
+            if _sender is None:
+                loop = asyncio.new_event_loop()
+                threading.Thread(target=loop.run_forever, name="twilio-sender", daemon=True).start()
+
+                async def _create() -> TwilioSender:
+                    return TwilioSender()
+
+                _sender = asyncio.run_coroutine_threadsafe(_create(), loop).result()
+                _loop = loop
+    return _sender, _loop
+
+
+def send_whatsapp(phone: str, body: str) -> str:
+    """
+    Send a WhatsApp message from the business number (blocking; for worker threads).
+
+    Args:
+        phone: Lead's E.164 number
+        body: Message text
+
+    Returns:
+        str: Twilio message SID
+
+    Raises:
+        TwilioSendError: If the message could not be sent
+    """
+    sender, loop = _get_sender_loop()
+    return asyncio.run_coroutine_threadsafe(sender.send(phone, body), loop).result()
+
+
+def warm_twilio_sender(connect: bool = False) -> None:
+    """Start the sender loop and client ahead of the first send (optionally opening a connection)."""
+    sender, loop = _get_sender_loop()
+    if connect:
+        asyncio.run_coroutine_threadsafe(sender.warm(), loop).result(REQUEST_TIMEOUT)
+
+
+def sender_stats() -> Dict[str, Any]:
+    return _sender.stats() if _sender is not None else {}
+
+
+class PostgresStatusStore:
+    """twilio_message_status access via SQLAlchemy."""
+
+    def record(self, update: Dict[str, Any]) -> None:
+        from sqlalchemy import text
+        from api.utils.supabase_client import get_sqlalchemy_engine
+
+        with get_sqlalchemy_engine().begin() as conn:
+            conn.execute(
+                text(
+                    "INSERT INTO twilio_message_status "
+                    "(message_sid, status, status_rank, error_code, error_message, recipient, updated_at) "
+                    "VALUES (:sid, :status, :rank, :error_code, :error_message, :recipient, now()) "
+                    "ON CONFLICT (message_sid) DO UPDATE SET status = EXCLUDED.status, "
+                    "status_rank = EXCLUDED.status_rank, "
+                    "error_code = COALESCE(EXCLUDED.error_code, twilio_message_status.error_code), "
+                    "error_message = COALESCE(EXCLUDED.error_message, twilio_message_status.error_message), "
+                    "updated_at = now() "
+                    "WHERE twilio_message_status.status_rank <= EXCLUDED.status_rank"
+                ),
+                update,
+            )
+
+
+class MemoryStatusStore:
+    """In-memory delivery states (TWILIO_STATUS_STORE=memory, for the fake-server run)."""
+
+    def __init__(self):
+        self.statuses: Dict[str, Dict[str, Any]] = {}
+        self._lock = threading.Lock()
+
+    def record(self, update: Dict[str, Any]) -> None:
+        with self._lock:
+            current = self.statuses.get(update["sid"])
+            if current is None or current["rank"] <= update["rank"]:
+                self.statuses[update["sid"]] = dict(update)
+
+
+_status_store: Optional[Any] = None
+
+
+def get_status_store() -> Any:
+    global _status_store
+    if _status_store is None:
+        _status_store = MemoryStatusStore() if os.getenv("TWILIO_STATUS_STORE") == "memory" else PostgresStatusStore()
+    return _status_store
+
+
+def record_message_status(
+    sid: str,
+    status: str,
+    error_code: Optional[str] = None,
+    error_message: Optional[str] = None,
+    recipient: Optional[str] = None
+) -> bool:
+    """
+    Record a delivery status callback (out-of-order callbacks never regress a state).
+
+    Returns:
+        bool: False for an unknown status value
+    """
+    status = (status or "").lower()
+    if status not in STATUS_RANK:
+        return False
+    if recipient and recipient.startswith("whatsapp:"):
+        recipient = recipient[9:]
+    get_status_store().record({
+        "sid": sid, "status": status, "rank": STATUS_RANK[status],
+        "error_code": error_code or None, "error_message": error_message or None, "recipient": recipient,
+    })
+    return True
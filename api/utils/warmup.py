@@ -0,0 +1,139 @@
+"""
+Startup warm-up: build the Supabase, database, Gemini and Twilio clients (and
+open their connections) before traffic arrives, so the first webhook after a
+redeploy doesn't pay for imports, client construction and TLS handshakes.
+Steps run concurrently in the background once the lifespan starts; /api/ready
+answers 503 until they have all finished (Railway's healthcheckPath), then 200
+with per-step timings. A failed step only means that client is built lazily on
+first use, as before.
+"""
+
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Optional, Dict, Any, Callable
+
+
+WARMUP_TIMEOUT_SECONDS = float(os.getenv("STARTUP_WARMUP_TIMEOUT_SECONDS", "30"))
+# Open connections as well as building clients (STARTUP_WARMUP_CONNECT=0 skips network calls)
+WARMUP_CONNECT = os.getenv("STARTUP_WARMUP_CONNECT", "1") != "0"
+
+
+def _warm_supabase(connect: bool) -> None:
+    from api.utils.supabase_client import get_supabase_client
+
+    client = get_supabase_client()
+    if connect:
+        client.table("tenants").select("id").limit(1).execute()
+
+
+def _warm_database(connect: bool) -> None:
+    from api.utils.supabase_client import get_sqlalchemy_engine
+
+    engine = get_sqlalchemy_engine()
+    if connect:
+        from sqlalchemy import text
+
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+
+def _warm_gemini(connect: bool) -> None:
+    from api.utils.gemini_client import get_gemini_agent
+
+    get_gemini_agent().router.warm(connect=connect)
+
+
+def _warm_twilio(connect: bool) -> None:
+    from api.utils.twilio_client import warm_twilio_sender
+
+    warm_twilio_sender(connect=connect)
+
+
+DEFAULT_STEPS: Dict[str, Callable[[bool], None]] = {
+    "supabase": _warm_supabase,
+    "database": _warm_database,
+    "gemini": _warm_gemini,
+    "twilio": _warm_twilio,
+}
+
+
+class Warmup:
+    """Runs the warm-up steps concurrently and records how each went."""
+
+    def __init__(self, steps: Optional[Dict[str, Callable[[bool], None]]] = None, connect: bool = WARMUP_CONNECT,
+                 timeout: float = WARMUP_TIMEOUT_SECONDS):
+        """
+        Args:
+            steps: Step name -> callable(connect)
+            connect: Passed to each step (open connections, not just build clients)
+            timeout: Seconds to wait for all steps before reporting ready anyway
+        """
+        self.steps = steps if steps is not None else DEFAULT_STEPS
+        self.connect = connect
+        self.timeout = timeout
+        self.results: Dict[str, Dict[str, Any]] = {}
+        self.started_at: Optional[float] = None
+        self.seconds: Optional[float] = None
+        self.ready = threading.Event()
+
+    def _run_step(self, name: str, step: Callable[[bool], None]) -> None:
+        started = time.perf_counter()
+        try:
+            step(self.connect)
+            self.results[name] = {"ok": True, "seconds": round(time.perf_counter() - started, 3)}
+        except Exception as e:
+            self.results[name] = {"ok": False, "seconds": round(time.perf_counter() - started, 3), "error": str(e)}
+            print(f"Warm-up step '{name}' failed (built on first use instead): {e}")
+
+    def run(self) -> Dict[str, Any]:
+        """
+        Run every step and mark the process ready.
+
+        Returns:
+            dict: status()
+        """
+        self.started_at = time.perf_counter()
+        executor = ThreadPoolExecutor(max_workers=max(1, len(self.steps)), thread_name_prefix="warmup")
+        futures = {name: executor.submit(self._run_step, name, step) for name, step in self.steps.items()}
+        wait(futures.values(), timeout=self.timeout)
+        executor.shutdown(wait=False)
+        for name, future in futures.items():
+            if not future.done():
+                self.results[name] = {"ok": False, "seconds": self.timeout, "error": "timed out"}
+        self.seconds = round(time.perf_counter() - self.started_at, 3)
+        self.ready.set()
+        failed = [name for name, result in self.results.items() if not result["ok"]]
+        print(f"🔥 Warm-up finished in {self.seconds}s" + (f" (failed: {', '.join(failed)})" if failed else ""))
+        return self.status()
+
+    def start_in_background(self) -> None:
+        threading.Thread(target=self.run, name="startup-warmup", daemon=True).start()
+
+    def status(self) -> Dict[str, Any]:
+        return {
+            "ready": self.ready.is_set(),
+            "seconds": self.seconds,
+            "steps": dict(self.results),
+        }
+
+
+# Singleton
+_warmup: Optional[Warmup] = None
+
+
+def get_warmup() -> Warmup:
+    global _warmup
+    if _warmup is None:
+        _warmup = Warmup()
+    return _warmup
+
+
+def start_warmup() -> None:
+    """Kick off the warm-up without delaying startup (STARTUP_WARMUP=0 disables it and reports ready at once)."""
+    warmup = get_warmup()
+    if os.getenv("STARTUP_WARMUP", "1") == "0":
+        warmup.ready.set()
+        return
+    warmup.start_in_background()
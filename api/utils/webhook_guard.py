@@ -0,0 +1,399 @@
+"""
+Cheap admission checks for Twilio webhooks, run before any database or model call.
+- X-Twilio-Signature validation: HMAC-SHA1 of the public URL plus the sorted POST
+  params, keyed by the auth token of the tenant's Twilio account. Tokens are loaded
+  from the tenants table into memory (keyed by account SID and WhatsApp number),
+  so validating a request costs one HMAC and no I/O.
+- Per-IP token buckets that shed floods, and per-number buckets that keep a
+  bursting sender away from Gemini (the webhook still stores those messages).
+- A bounded set of recent MessageSids, so a replayed (validly signed) request is
+  answered without being processed twice.
+Handlers run on the event loop, so the buckets and the replay set need no locks.
+"""
+
+import base64
+import hashlib
+import hmac
+import os
+import re
+import threading
+import time
+from collections import Counter
+from typing import Optional, Dict, List, Any, Iterable, Tuple
+from urllib.parse import urlsplit, urlunsplit
+
+
+VALIDATE_SIGNATURES = os.getenv("TWILIO_VALIDATE_SIGNATURES", "1") != "0"
+# Public base URL Twilio is configured with (e.g. https://your-app.up.railway.app);
+# unset means it is rebuilt from the proxy's X-Forwarded-Proto / Host headers
+WEBHOOK_PUBLIC_URL = os.getenv("WEBHOOK_PUBLIC_URL", "").rstrip("/")
+SIGNING_KEY_REFRESH_SECONDS = float(os.getenv("TWILIO_SIGNING_KEY_REFRESH_SECONDS", "300"))
+# Minimum gap between reloads triggered by requests for an unknown account / number
+SIGNING_KEY_MISS_REFRESH_SECONDS = float(os.getenv("TWILIO_SIGNING_KEY_MISS_REFRESH_SECONDS", "30"))
+# Proxies in front of the app that append to X-Forwarded-For (Railway's edge: 1).
+# The client address is the entry the outermost of them appended; 0 ignores the header
+WEBHOOK_TRUSTED_PROXY_HOPS = int(os.getenv("WEBHOOK_TRUSTED_PROXY_HOPS", "1"))
+WEBHOOK_IP_RATE = float(os.getenv("WEBHOOK_IP_RATE", "20"))
+WEBHOOK_IP_BURST = float(os.getenv("WEBHOOK_IP_BURST", "100"))
+WEBHOOK_NUMBER_RATE = float(os.getenv("WEBHOOK_NUMBER_RATE", "0.2"))
+WEBHOOK_NUMBER_BURST = float(os.getenv("WEBHOOK_NUMBER_BURST", "6"))
+WEBHOOK_REPLAY_WINDOW_SECONDS = float(os.getenv("WEBHOOK_REPLAY_WINDOW_SECONDS", "86400"))
+WEBHOOK_REPLAY_MAX_SIDS = int(os.getenv("WEBHOOK_REPLAY_MAX_SIDS", "200000"))
+
+# admit() outcomes
+ADMITTED = "admitted"
+IP_LIMITED = "ip_limited"
+BAD_SIGNATURE = "bad_signature"
+REPLAYED = "replayed"
+NUMBER_LIMITED = "number_limited"
+
+_NON_DIGITS = re.compile(r"\D")
+
+
+def _number_key(value: Optional[str]) -> str:
+    """Digits of a phone number ('whatsapp:+44 7700...' -> '447700...')."""
+    return _NON_DIGITS.sub("", value or "")
+
+
+def signing_mac(auth_token: str) -> "hmac.HMAC":
+    """An HMAC-SHA1 keyed with the auth token; copied per request so the key setup is paid once."""
+    return hmac.new(auth_token.encode(), digestmod=hashlib.sha1)
+
+
+def compute_signature(mac: "hmac.HMAC", url: str, params: Iterable[Tuple[str, str]]) -> str:
+    """
+    Twilio's request signature: base64(HMAC-SHA1(url + name1 + value1 + name2 + value2 ...))
+    with params sorted by name (then value).
+
+    Args:
+        mac: Keyed prototype from signing_mac()
+        url: Full URL Twilio requested, including the query string
+        params: POST params as (name, value) pairs
+
+    Returns:
+        str: Expected X-Twilio-Signature
+    """
+    mac = mac.copy()
+    mac.update((url + "".join(map("".join, sorted(set(params))))).encode())
+    return base64.b64encode(mac.digest()).decode()
+
+
+def _port_variant(url: str) -> Optional[str]:
+    """The same URL with the default port added (or removed); Twilio may sign either form."""
+    parts = urlsplit(url)
+    default_port = {"https": 443, "http": 80}.get(parts.scheme)
+    if default_port is None or parts.hostname is None:
+        return None
+    if parts.port is None:
+        netloc = f"{parts.netloc}:{default_port}"
+    elif parts.port == default_port:
+        netloc = parts.netloc.rsplit(":", 1)[0]
+    else:
+        return None
+    return urlunsplit((parts.scheme, netloc, parts.path, parts.query, parts.fragment))
+
+
+def request_url(request: Any, public_url: str = WEBHOOK_PUBLIC_URL) -> str:
+    """
+    The URL Twilio signed. Behind Railway's proxy the app sees http:// and an internal
+    host, so the public base (or the forwarded scheme / host) replaces them.
+    """
+    url = request.url
+    path = url.path + (f"?{url.query}" if url.query else "")
+    if public_url:
+        return public_url + path
+    headers = request.headers
+    scheme = headers.get("x-forwarded-proto", url.scheme).split(",")[0].strip()
+    host = headers.get("x-forwarded-host") or headers.get("host") or url.netloc
+    return f"{scheme}://{host}{path}"
+
+
+def client_ip(request: Any, trusted_hops: int = WEBHOOK_TRUSTED_PROXY_HOPS) -> str:
+    """
+    Caller's address for the per-IP limit. Entries left of the ones our proxies
+    appended are whatever the caller sent, so they are never used.
+    """
+    forwarded = request.headers.get("x-forwarded-for") if trusted_hops > 0 else None
+    if forwarded:
+        hops = [hop.strip() for hop in forwarded.split(",") if hop.strip()]
+        if hops:
+            return hops[-min(trusted_hops, len(hops))]
+    return request.client.host if request.client else ""
+
+
+def _load_tenant_tokens() -> List[Dict[str, Any]]:
+    from api.utils.supabase_client import get_supabase_client
+
+    response = (
+        get_supabase_client()
+        .table("tenants")
+        .select("id, twilio_sid, twilio_auth_token, twilio_phone")
+        .not_.is_("twilio_auth_token", "null")
+        .execute()
+    )
+    return response.data or []
+
+
+class SigningKeys:
+    """
+    Auth tokens by Twilio account SID and by WhatsApp number, loaded from the tenants
+    table. TWILIO_ACCOUNT_SID / TWILIO_AUTH_TOKEN cover the platform's own account
+    (and tenants without their own credentials).
+    """
+
+    def __init__(self, loader: Any = _load_tenant_tokens, default_token: Optional[str] = None,
+                 default_sid: Optional[str] = None, refresh_seconds: float = SIGNING_KEY_REFRESH_SECONDS,
+                 miss_refresh_seconds: float = SIGNING_KEY_MISS_REFRESH_SECONDS):
+        """
+        Args:
+            loader: Returns tenants rows with twilio_sid, twilio_auth_token, twilio_phone
+            default_token: Fallback auth token (default TWILIO_AUTH_TOKEN)
+            default_sid: Account SID of the fallback token (default TWILIO_ACCOUNT_SID)
+            refresh_seconds: Reload interval, so rotated tokens are picked up
+            miss_refresh_seconds: Minimum gap between reloads caused by unknown keys
+        """
+        self.loader = loader
+        default_token = default_token if default_token is not None else os.getenv("TWILIO_AUTH_TOKEN")
+        self.default = signing_mac(default_token) if default_token else None
+        self.default_sid = default_sid if default_sid is not None else os.getenv("TWILIO_ACCOUNT_SID", "")
+        self.refresh_seconds = refresh_seconds
+        self.miss_refresh_seconds = miss_refresh_seconds
+        self._keys: Dict[str, "hmac.HMAC"] = {}
+        self.loaded_at: Optional[float] = None
+        self._attempted_at = 0.0
+        self._refreshing = threading.Lock()
+
+    def refresh(self) -> int:
+        """
+        Reload tokens from the tenants table.
+
+        Returns:
+            int: Tenants with a token
+        """
+        self._attempted_at = time.monotonic()
+        keys: Dict[str, "hmac.HMAC"] = {}
+        rows = self.loader()
+        for row in rows:
+            mac = signing_mac(row["twilio_auth_token"])
+            if row.get("twilio_sid"):
+                keys[row["twilio_sid"]] = mac
+            number = _number_key(row.get("twilio_phone"))
+            if number:
+                keys[number] = mac
+        self._keys = keys
+        self.loaded_at = time.monotonic()
+        return len(rows)
+
+    def _refresh_in_background(self) -> None:
+        if not self._refreshing.acquire(blocking=False):
+            return
+
+        def _run():
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f"Twilio signing key refresh failed (keeping the cached keys): {e}")
+            finally:
+                self._refreshing.release()
+
+        threading.Thread(target=_run, name="twilio-signing-keys", daemon=True).start()
+
+    def get(self, account_sid: Optional[str], *numbers: Optional[str]) -> Optional["hmac.HMAC"]:
+        """
+        The keyed MAC for a request, by AccountSid, then by the numbers it involves.
+        Never blocks: stale or missing entries trigger a background reload.
+
+        Returns:
+            hmac.HMAC: Prototype for compute_signature(), or None if no token is known
+        """
+        now = time.monotonic()
+        mac = self._keys.get(account_sid) if account_sid else None
+        for number in numbers:
+            if mac is not None:
+                break
+            mac = self._keys.get(_number_key(number))
+        if mac is None:
+            if now - self._attempted_at >= self.miss_refresh_seconds:
+                self._refresh_in_background()
+            if not account_sid or account_sid == self.default_sid or not self._keys:
+                mac = self.default
+        elif self.loaded_at is not None and now - self.loaded_at >= self.refresh_seconds:
+            self._refresh_in_background()
+        return mac
+
+
+class TokenBuckets:
+    """Token bucket per key (IP or phone number), pruned of idle keys when it grows past max_keys."""
+
+    def __init__(self, rate: float, burst: float, max_keys: int = 50000):
+        self.rate = rate
+        self.burst = burst
+        self.max_keys = max_keys
+        # key -> [tokens, updated_at]
+        self._buckets: Dict[str, List[float]] = {}
+
+    def allow(self, key: str, now: Optional[float] = None) -> bool:
+        if self.rate <= 0:
+            return True
+        now = time.monotonic() if now is None else now
+        bucket = self._buckets.get(key)
+        if bucket is None:
+            if len(self._buckets) >= self.max_keys:
+                self._prune(now)
+            self._buckets[key] = [self.burst - 1, now]
+            return True
+        tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+        bucket[1] = now
+        if tokens < 1:
+            bucket[0] = tokens
+            return False
+        bucket[0] = tokens - 1
+        return True
+
+    def _prune(self, now: float) -> None:
+        """Drop buckets that have refilled (they'd start full again anyway)."""
+        refill = self.burst / self.rate
+        self._buckets = {key: b for key, b in self._buckets.items() if now - b[1] < refill}
+        if len(self._buckets) >= self.max_keys:
+            self._buckets.clear()
+
+    def __len__(self) -> int:
+        return len(self._buckets)
+
+
+class RecentSids:
+    """MessageSids seen in the last window_seconds (at most max_sids, oldest evicted first)."""
+
+    def __init__(self, window_seconds: float = WEBHOOK_REPLAY_WINDOW_SECONDS, max_sids: int = WEBHOOK_REPLAY_MAX_SIDS):
+        self.window_seconds = window_seconds
+        self.max_sids = max_sids
+        # sid -> seen_at, in insertion (= time) order
+        self._seen: Dict[str, float] = {}
+
+    def seen(self, sid: str, now: Optional[float] = None) -> bool:
+        """Record sid; True if it was already seen inside the window."""
+        now = time.monotonic() if now is None else now
+        seen_at = self._seen.get(sid)
+        if seen_at is not None and now - seen_at < self.window_seconds:
+            return True
+        self._seen.pop(sid, None)
+        self._seen[sid] = now
+        if len(self._seen) > self.max_sids:
+            for oldest in list(self._seen)[: len(self._seen) - self.max_sids]:
+                del self._seen[oldest]
+        else:
+            oldest = next(iter(self._seen))
+            if now - self._seen[oldest] >= self.window_seconds:
+                del self._seen[oldest]
+        return False
+
+    def __len__(self) -> int:
+        return len(self._seen)
+
+
+class WebhookGuard:
+    """Signature, rate and replay checks for inbound Twilio requests."""
+
+    def __init__(self, keys: SigningKeys, validate: bool = VALIDATE_SIGNATURES,
+                 ip_limits: Optional[TokenBuckets] = None, number_limits: Optional[TokenBuckets] = None,
+                 replays: Optional[RecentSids] = None):
+        """
+        Args:
+            keys: Auth token cache
+            validate: Check X-Twilio-Signature (TWILIO_VALIDATE_SIGNATURES=0 turns it off for local testing)
+            ip_limits: Per-IP buckets (WEBHOOK_IP_RATE / _BURST)
+            number_limits: Per-sender buckets (WEBHOOK_NUMBER_RATE / _BURST)
+            replays: Recently processed MessageSids
+        """
+        self.keys = keys
+        self.validate = validate
+        self.ip_limits = ip_limits if ip_limits is not None else TokenBuckets(WEBHOOK_IP_RATE, WEBHOOK_IP_BURST)
+        self.number_limits = number_limits if number_limits is not None else TokenBuckets(WEBHOOK_NUMBER_RATE, WEBHOOK_NUMBER_BURST)
+        self.replays = replays if replays is not None else RecentSids()
+        self.counts: Counter = Counter()
+
+    def verify(self, url: str, params: List[Tuple[str, str]], signature: Optional[str]) -> bool:
+        """
+        Check X-Twilio-Signature.
+
+        Args:
+            url: URL Twilio requested (see request_url())
+            params: POST params as (name, value) pairs
+            signature: X-Twilio-Signature header
+
+        Returns:
+            bool: True if the signature matches (or validation is off)
+        """
+        if not self.validate:
+            return True
+        if not signature:
+            return False
+        fields = dict(params)
+        mac = self.keys.get(fields.get("AccountSid"), fields.get("To"), fields.get("From"))
+        if mac is None:
+            return False
+        if hmac.compare_digest(compute_signature(mac, url, params), signature):
+            return True
+        variant = _port_variant(url)
+        return variant is not None and hmac.compare_digest(compute_signature(mac, variant, params), signature)
+
+    def admit(self, ip: str, url: str, params: List[Tuple[str, str]], signature: Optional[str]) -> str:
+        """
+        Decide whether an inbound message reaches the pipeline. Cheapest checks first:
+        per-IP rate, signature, replayed MessageSid, per-sender rate.
+
+        Returns:
+            str: ADMITTED, or the reason it was shed
+        """
+        now = time.monotonic()
+        if not self.ip_limits.allow(ip, now):
+            outcome = IP_LIMITED
+        elif not self.verify(url, params, signature):
+            outcome = BAD_SIGNATURE
+        else:
+            fields = dict(params)
+            sid = fields.get("MessageSid")
+            if sid and self.replays.seen(sid, now):
+                outcome = REPLAYED
+            elif not self.number_limits.allow(_number_key(fields.get("From")), now):
+                outcome = NUMBER_LIMITED
+            else:
+                outcome = ADMITTED
+        self.counts[outcome] += 1
+        return outcome
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "validate_signatures": self.validate,
+            "outcomes": dict(self.counts),
+            "tracked_ips": len(self.ip_limits),
+            "tracked_numbers": len(self.number_limits),
+            "recent_sids": len(self.replays),
+            "signing_keys": len(self.keys._keys),
+        }
+
+
+# Singleton
+_guard: Optional[WebhookGuard] = None
+_guard_lock = threading.Lock()
+
+
+def get_webhook_guard() -> WebhookGuard:
+    global _guard
+    if _guard is None:
+        with _guard_lock:
+            if _guard is None:
+                _guard = WebhookGuard(SigningKeys())
+    return _guard
+
+
+def load_signing_keys() -> None:
+    """Load tenant auth tokens at startup so the first webhook needs no lookup."""
+    guard = get_webhook_guard()
+    if not guard.validate:
+        print("⚠️ Twilio signature validation is off (TWILIO_VALIDATE_SIGNATURES=0)")
+        return
+    try:
+        print(f"🔐 Loaded Twilio signing keys for {guard.keys.refresh()} tenants")
+    except Exception as e:
+        print(f"Twilio signing key load failed (using TWILIO_AUTH_TOKEN until a reload succeeds): {e}")
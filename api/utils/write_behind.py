@@ -0,0 +1,362 @@
+"""
+Write-behind persistence for messages.
+save_message appends rows to an in-memory log (optionally mirrored to an fsync'd
+local WAL file) and returns immediately; a single flusher thread writes them to
+`messages` in multi-row upserts every few ms or every N rows. Rows carry client-side
+ids and strictly increasing timestamps, and are flushed FIFO by one thread, so
+per-lead order is preserved. drain() (called from the FastAPI lifespan) flushes
+everything before shutdown; unacknowledged WAL rows are re-queued on startup.
+With several workers (WEB_CONCURRENCY) each one locks its own WAL slot
+(<MESSAGE_WAL_PATH>.<n>), so a restarted worker recovers its predecessor's rows.
+"""
+
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from collections import deque
+from datetime import datetime, timedelta, timezone
+from typing import Optional, Dict, List, Any, Callable
+
+
+WRITE_BEHIND_ENABLED = os.getenv("MESSAGE_WRITE_BEHIND", "1") != "0"
+FLUSH_INTERVAL_MS = float(os.getenv("MESSAGE_FLUSH_INTERVAL_MS", "10"))
+FLUSH_BATCH_SIZE = int(os.getenv("MESSAGE_FLUSH_BATCH_SIZE", "100"))
+# Optional crash-safety log (e.g. /data/messages.wal on a persistent volume)
+WAL_PATH = os.getenv("MESSAGE_WAL_PATH")
+WAL_FSYNC = os.getenv("MESSAGE_WAL_FSYNC", "1") != "0"
+MAX_RETRY_DELAY = 5.0
+# Consecutive failures of a batch before its rows are retried one by one, and
+# rows that still fail (while others succeed) are moved to the dead-letter file
+MAX_FLUSH_FAILURES = int(os.getenv("MESSAGE_FLUSH_MAX_FAILURES", "3"))
+DEAD_LETTER_KEEP = 1000
+
+
+class WriteBehindBuffer:
+    """
+    FIFO of pending rows flushed in batches by a background thread.
+    Failed batches stay at the head of the queue and are retried with backoff;
+    after MAX_FLUSH_FAILURES the rows are tried one at a time, and rows the
+    database keeps rejecting while the others go through are dead-lettered
+    (<wal>.dead, and dead_letters) so one bad row cannot stall every insert.
+    """
+
+    def __init__(
+        self,
+        flush_fn: Callable[[List[Dict[str, Any]]], None],
+        batch_size: int = FLUSH_BATCH_SIZE,
+        flush_interval: float = FLUSH_INTERVAL_MS / 1000,
+        wal_path: Optional[str] = None,
+        fsync: bool = WAL_FSYNC
+    ):
+        """
+        Args:
+            flush_fn: Writes a batch of rows (must be idempotent on row id)
+            batch_size: Maximum rows per flush
+            flush_interval: Seconds to wait for more rows before flushing a partial batch
+            wal_path: Optional local WAL file
+            fsync: fsync the WAL after each append
+        """
+        self.flush_fn = flush_fn
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.wal_path = wal_path
+        self.fsync = fsync
+
+        self._pending: deque = deque()
+        self._pending_ids: Dict[str, Dict[str, Any]] = {}
+        self._condition = threading.Condition()
+        self._last_timestamp = datetime.min.replace(tzinfo=timezone.utc)
+        self._wal = None
+        self._stopping = False
+        self._thread: Optional[threading.Thread] = None
+
+        self.flushed_rows = 0
+        self.flushed_batches = 0
+        self.failed_flushes = 0
+        self.dead_lettered_rows = 0
+        self.dead_letters: deque = deque(maxlen=DEAD_LETTER_KEEP)
+
+        if wal_path:
+            self._recover_wal()
+
+    def start(self) -> None:
+        with self._condition:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="message-writer", daemon=True)
+                self._thread.start()
+
+    def submit(self, row: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Queue a row for insertion and return it with id and timestamp filled in.
+        """
+        with self._condition:
+            if self._stopping:
+                raise RuntimeError("Write-behind buffer is draining")
+            row = dict(row)
+            row.setdefault("id", str(uuid.uuid4()))
+            if not row.get("timestamp"):
+                row["timestamp"] = self._next_timestamp().isoformat()
+            self._append_wal({"op": "put", "row": row})
+            self._pending.append(row)
+            self._pending_ids[row["id"]] = row
+            # Wake an idle flusher for the first row (it then waits flush_interval for more),
+            # and a waiting one as soon as a full batch is ready
+            if len(self._pending) == 1 or len(self._pending) >= self.batch_size:
+                self._condition.notify_all()
+            self.start()
+        return row
+
+    def is_pending(self, row_id: str) -> bool:
+        with self._condition:
+            return row_id in self._pending_ids
+
+    def pending_for(self, lead_id: str) -> List[Dict[str, Any]]:
+        """Unflushed rows for a lead, oldest first (for read-your-writes)."""
+        with self._condition:
+            return [row for row in self._pending if row.get("lead_id") == lead_id]
+
+    def flush_barrier(self, timeout: float = 5.0) -> bool:
+        """
+        Wait until every row submitted so far has been flushed (rows submitted
+        meanwhile are not waited for). Used before handing a lead to another worker.
+
+        Returns:
+            bool: True if they were flushed within the timeout
+        """
+        deadline = time.monotonic() + timeout
+        with self._condition:
+            target = self.flushed_rows + self.dead_lettered_rows + len(self._pending)
+            self._condition.notify_all()  # Flush a partial batch now rather than after flush_interval
+            while self.flushed_rows + self.dead_lettered_rows < target:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self._condition.wait(remaining)
+        return True
+
+    def drain(self, timeout: float = 10.0) -> bool:
+        """
+        Stop accepting rows and flush everything queued.
+
+        Returns:
+            bool: True if the queue was fully flushed within the timeout
+        """
+        with self._condition:
+            self._stopping = True
+            self._condition.notify_all()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        else:
+            self._flush_all(deadline=time.monotonic() + timeout)
+        with self._condition:
+            drained = not self._pending
+        if drained and self._wal is not None:
+            self._wal.close()
+            self._wal = None
+            os.remove(self.wal_path)
+        return drained
+
+    def stats(self) -> Dict[str, Any]:
+        with self._condition:
+            return {
+                "pending": len(self._pending),
+                "flushed_rows": self.flushed_rows,
+                "flushed_batches": self.flushed_batches,
+                "failed_flushes": self.failed_flushes,
+                "dead_lettered_rows": self.dead_lettered_rows,
+                "wal": self.wal_path,
+            }
+
+    def _next_timestamp(self) -> datetime:
+        # Strictly increasing so batched rows keep their submission order
+        now = datetime.now(timezone.utc)
+        if now <= self._last_timestamp:
+            now = self._last_timestamp + timedelta(microseconds=1)
+        self._last_timestamp = now
+        return now
+
+    def _append_wal(self, record: Dict[str, Any]) -> None:
+        if not self.wal_path:
+            return
+        if self._wal is None:
+            self._wal = open(self.wal_path, "a", encoding="utf-8")
+        self._wal.write(json.dumps(record, separators=(",", ":"), default=str) + "\n")
+        self._wal.flush()
+        if self.fsync:
+            os.fsync(self._wal.fileno())
+
+    def _recover_wal(self) -> None:
+        """Re-queue rows written to the WAL but never acknowledged."""
+        if not os.path.exists(self.wal_path):
+            return
+        rows: Dict[str, Dict[str, Any]] = {}
+        with open(self.wal_path, "r", encoding="utf-8") as handle:
+            for line in handle:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break  # Torn final write
+                if record["op"] == "put":
+                    rows[record["row"]["id"]] = record["row"]
+                else:
+                    for row_id in record["ids"]:
+                        rows.pop(row_id, None)
+        os.remove(self.wal_path)
+        for row in rows.values():
+            self._append_wal({"op": "put", "row": row})
+            self._pending.append(row)
+            self._pending_ids[row["id"]] = row
+        if rows:
+            print(f"♻️ Recovered {len(rows)} unflushed messages from {self.wal_path}")
+            self.start()
+
+    def _run(self) -> None:
+        retry_delay = self.flush_interval
+        failures = 0
+        while True:
+            with self._condition:
+                if not self._pending and not self._stopping:
+                    self._condition.wait()
+                if not self._pending and self._stopping:
+                    return
+                # Give a partial batch a moment to fill up
+                if len(self._pending) < self.batch_size and not self._stopping:
+                    self._condition.wait(self.flush_interval)
+                batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+
+            if self._flush(batch):
+                retry_delay = self.flush_interval
+                failures = 0
+            else:
+                failures += 1
+                if failures >= MAX_FLUSH_FAILURES and len(batch) > 1 and self._isolate(batch):
+                    retry_delay = self.flush_interval
+                    failures = 0
+                    continue
+                if self._stopping and retry_delay >= MAX_RETRY_DELAY:
+                    print(f"⚠️ Giving up flushing {len(self._pending)} messages during shutdown")
+                    return
+                time.sleep(retry_delay)
+                retry_delay = min(retry_delay * 2 or 0.01, MAX_RETRY_DELAY)
+
+    def _flush_all(self, deadline: float) -> None:
+        while time.monotonic() < deadline:
+            with self._condition:
+                batch = [self._pending[i] for i in range(min(self.batch_size, len(self._pending)))]
+            if not batch or not self._flush(batch):
+                return
+
+    def _flush(self, batch: List[Dict[str, Any]]) -> bool:
+        try:
+            self.flush_fn(batch)
+        except Exception as e:
+            self.failed_flushes += 1
+            print(f"Error flushing {len(batch)} messages: {e}")
+            return False
+        with self._condition:
+            self.flushed_rows += self._remove(batch)
+            self.flushed_batches += 1
+            self._condition.notify_all()
+        return True
+
+    def _isolate(self, batch: List[Dict[str, Any]]) -> bool:
+        """
+        Flush a repeatedly failing batch row by row, dead-lettering the rows that fail.
+
+        Returns:
+            bool: False if no row went through (an outage, not a bad row: keep retrying)
+        """
+        failed = [row for row in batch if not self._flush([row])]
+        if len(failed) == len(batch):
+            return False
+        if failed:
+            self._dead_letter(failed)
+        return True
+
+    def _dead_letter(self, rows: List[Dict[str, Any]]) -> None:
+        if self.wal_path:
+            with open(f"{self.wal_path}.dead", "a", encoding="utf-8") as handle:
+                for row in rows:
+                    handle.write(json.dumps(row, separators=(",", ":"), default=str) + "\n")
+        with self._condition:
+            self.dead_letters.extend(rows)
+            self.dead_lettered_rows += self._remove(rows)
+            self._condition.notify_all()
+        print(f"☠️ Dead-lettered {len(rows)} messages the database keeps rejecting: {[row['id'] for row in rows]}")
+
+    def _remove(self, rows: List[Dict[str, Any]]) -> int:
+        """Drop acknowledged rows from the queue by id (call with _condition held); returns how many were pending."""
+        ids = {row["id"] for row in rows if row["id"] in self._pending_ids}
+        for row_id in ids:
+            del self._pending_ids[row_id]
+        remaining = len(ids)
+        # Usually the batch is the head of the queue
+        while remaining and self._pending and self._pending[0]["id"] in ids:
+            self._pending.popleft()
+            remaining -= 1
+        if remaining:
+            self._pending = deque(row for row in self._pending if row["id"] not in ids)
+        self._append_wal({"op": "ack", "ids": list(ids)})
+        if not self._pending and self._wal is not None:
+            # Everything acknowledged: start a fresh WAL
+            self._wal.truncate(0)
+        return len(ids)
+
+
+def insert_messages(rows: List[Dict[str, Any]]) -> None:
+    """Multi-row insert into messages; re-sent rows (same id) are ignored."""
+    from api.utils.supabase_client import get_supabase_client
+
+    get_supabase_client().table("messages").upsert(rows, on_conflict="id", ignore_duplicates=True).execute()
+
+
+def claim_wal_slot(path: str, workers: int) -> str:
+    """
+    Pick this worker's WAL file: path itself for one worker, else the first
+    <path>.<n> whose lock file no live worker holds (the lock is kept for the
+    process lifetime and released by the OS when it exits).
+    """
+    if workers <= 1:
+        return path
+    for slot in range(workers * 2):
+        handle = open(f"{path}.{slot}.lock", "a")
+        try:
+            fcntl.flock(handle, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            handle.close()
+            continue
+        _wal_slot_locks.append(handle)
+        return f"{path}.{slot}"
+    raise RuntimeError(f"No free WAL slot for {path} ({workers} workers)")
+
+
+# Singleton instance
+_buffer: Optional[WriteBehindBuffer] = None
+_wal_slot_locks: List[Any] = []
+
+
+def get_write_buffer() -> Optional[WriteBehindBuffer]:
+    """
+    Get the process-wide message write buffer (None when MESSAGE_WRITE_BEHIND=0,
+    e.g. on serverless hosts that freeze the process after the response).
+    """
+    global _buffer
+
+    if _buffer is None and WRITE_BEHIND_ENABLED:
+        from api.utils.coordination import worker_count
+
+        wal_path = claim_wal_slot(WAL_PATH, worker_count()) if WAL_PATH else None
+        _buffer = WriteBehindBuffer(insert_messages, wal_path=wal_path)
+
+    return _buffer
+
+
+def drain_write_buffer(timeout: float = 10.0) -> None:
+    """Flush pending messages on shutdown (FastAPI lifespan)."""
+    if _buffer is not None:
+        stats = _buffer.stats()
+        drained = _buffer.drain(timeout)
+        print(f"💾 Write-behind drained ({stats['pending']} pending): {'ok' if drained else 'INCOMPLETE'}")
@@ -3,33 +3,189 @@ Enhanced FastAPI webhook endpoint for Twilio WhatsApp integration.
 Handles incoming messages with manual takeover support and enhanced status workflow.
 """
 
-from fastapi import APIRouter, Form, Response
+from fastapi import APIRouter, Form, Request, Response
 from fastapi.responses import PlainTextResponse
+from starlette.concurrency import run_in_threadpool
 from twilio.twiml.messaging_response import MessagingResponse
 import os
+from typing import Optional, Dict, Any
 from dotenv import load_dotenv
 
-from api.utils.supabase_client import get_supabase_client
-from api.utils.gemini_client import get_gemini_agent
-from api.utils.lead_manager import (
-    get_or_create_lead,
-    save_message,
-    get_messages,
-    get_messages_with_retry,
-    verify_message_saved,
-    update_lead_name,
-    update_lead_status,
-    is_lead_in_manual_mode
+from api.utils import lead_manager
+from api.utils.gemini_client import GeminiSalesAgent, get_gemini_agent
+from api.utils.sales_prompts import get_compliance_message, get_calendar_slots
+from api.utils.lead_state_machine import STOP_KEYWORDS, classify_event, transition
+from api.utils.lead_scoring import update_features, compute_score, reply_latency_minutes
+from api.utils.trace import tracing_enabled, record_trace
+from api.utils.webhook_guard import (
+    get_webhook_guard, request_url, client_ip, ADMITTED, IP_LIMITED, BAD_SIGNATURE, NUMBER_LIMITED,
+    WEBHOOK_REPLAY_WINDOW_SECONDS
 )
-from api.utils.sales_prompts import get_compliance_message
+from api.utils.coordination import get_coordinator
 
 load_dotenv()
 
 router = APIRouter()
 
+OPT_OUT_REPLY = "You've been removed from our list. Thanks for your time! 👋"
+
+
+def process_inbound_message(
+    phone: str,
+    incoming_message: str,
+    store: Any = lead_manager,
+    agent: Optional[GeminiSalesAgent] = None,
+    priority: str = "live",
+    reply: bool = True
+) -> Dict[str, Any]:
+    """
+    Run one inbound message through the conversation pipeline.
+    Shared by the Twilio webhook and the offline simulator.
+    
+    Args:
+        phone: Lead's phone number in E.164 format
+        incoming_message: Message content
+        store: Lead/message persistence (lead_manager, or an in-memory stand-in)
+        agent: Sales agent (defaults to the process-wide Gemini agent)
+        priority: Rate limiter priority for model calls
+        reply: False stores the message without calling the model (sender over its rate limit);
+            STOP and manual mode are still handled
+        
+    Returns:
+        dict: response (None if no reply should be sent), status, previous_status, action
+    """
+    # Get or create lead
+    lead = store.get_or_create_lead(phone)
+    lead_name = lead.get("name")
+    current_status = lead.get("status", "New")
+    result = {"response": None, "status": current_status, "previous_status": current_status, "action": None}
+    
+    # SAFETY CHECK: Skip processing for test leads UNLESS whatsapp_mode is enabled
+    if lead.get("is_test", False) and not lead.get("whatsapp_mode", False):
+        print(f"⚠️ Test lead detected: {phone}. Skipping Twilio response to prevent messaging costs.")
+        result["action"] = "skip_test_lead"
+        return result
+    
+    # Check for STOP command
+    if incoming_message.upper() in STOP_KEYWORDS:
+        store.save_message(phone, "lead", incoming_message)
+        decision = transition(current_status, "stop")
+        store.update_lead_status(phone, decision.next_status, previous=current_status)
+        response_text = OPT_OUT_REPLY
+        store.save_message(phone, "bot", response_text)
+        result.update(response=response_text, status=decision.next_status, action=decision.action)
+        return result
+    
+    # Check if lead is in manual mode (human takeover)
+    if store.is_lead_in_manual_mode(phone):
+        store.save_message(phone, "lead", incoming_message)
+        print(f"Lead {phone} is in manual mode. Skipping AI response.")
+        # Don't send automatic response - human agent will respond via dashboard
+        result["action"] = "manual_mode"
+        return result
+    
+    # Sender is bursting past WEBHOOK_NUMBER_RATE: keep the message, skip the model
+    if not reply:
+        store.save_message(phone, "lead", incoming_message)
+        print(f"Lead {phone} is over its message rate. Saved without an AI response.")
+        result["action"] = "rate_limited"
+        return result
+    
+    # Get AI agent and the tenant's token budget plan
+    agent = agent or get_gemini_agent()
+    plan = store.get_tenant_plan(lead.get("tenant_id"))
+    
+    # Analyze message (thinking step)
+    analysis = agent.analyze_message(incoming_message, current_status, priority=priority)
+    
+    print(f"Message analysis: {analysis}")
+    
+    # Save incoming message with its analysis (one insert) and verify it was saved
+    message_id = store.save_message(phone, "lead", incoming_message, analysis=analysis)
+    if message_id:
+        store.verify_message_saved(lead["id"], message_id)
+    
+    # Get conversation history for context with retry logic
+    # (the store waits out commit latency unless the history is cached)
+    message_history = store.get_messages_with_retry(phone, limit=10)
+    
+    # Extract and save name if detected
+    if analysis.get("name") and not lead_name:
+        lead_name = analysis["name"]
+        store.update_lead_name(phone, lead_name)
+        print(f"Detected name: {lead_name}")
+    
+    # Look up the transition for this message (status x intent x objection x sentiment)
+    slots = get_calendar_slots(5)
+    intent, objection, sentiment = classify_event(incoming_message, analysis, current_status, len(slots))
+    decision = transition(current_status, intent, objection, sentiment)
+    new_status = decision.next_status
+    
+    suggested_status = analysis.get("suggested_status")
+    if suggested_status and suggested_status != new_status:
+        print(f"Model suggested {suggested_status}, transition table chose {new_status}")
+    
+    if decision.changed:
+        store.update_lead_status(phone, new_status, previous=current_status)
+    
+    # Incremental priority score from this message's features (no model call)
+    score_features = update_features(
+        lead.get("score_features"), sentiment, objection, intent, reply_latency_minutes(message_history)
+    )
+    store.update_lead_score(lead["id"], compute_score(score_features, new_status), score_features)
+    
+    if decision.action == "opt_out":
+        # The model read an opt-out ("please stop texting me"): acknowledge it, no AI reply
+        response_text = OPT_OUT_REPLY
+    elif decision.action == "offer_slots":
+        response_text = agent.handle_booking_request(lead_name)
+    elif decision.action == "confirm_slot":
+        response_text = agent.confirm_booking(slots[int(incoming_message.strip()) - 1], lead_name)
+    else:
+        response_text = agent.generate_response(
+            incoming_message, message_history, lead_name, new_status, analysis, plan=plan, priority=priority
+        )
+    
+    # Save bot response to history
+    store.save_message(phone, "bot", response_text)
+    
+    print(f"Sending response: {response_text}")
+    print(f"Lead status: {current_status} → {new_status}")
+    
+    result.update(response=response_text, status=new_status, action=decision.action)
+    return result
+
+
+def process_in_order(phone: str, incoming_message: str, message_sid: str, reply: bool = True) -> Optional[Dict[str, Any]]:
+    """
+    Run process_inbound_message under the lead's lock, so a lead's messages are
+    handled one at a time in arrival order whichever worker receives them.
+    
+    Args:
+        phone: Lead's phone number in E.164 format
+        incoming_message: Message content
+        message_sid: Twilio message identifier
+        reply: False saves the message without a model call (see process_inbound_message)
+        
+    Returns:
+        dict: process_inbound_message result, or None if another worker already took this MessageSid
+    """
+    coordinator = get_coordinator()
+    # The guard's replay set is per worker; a Twilio retry can land on another one
+    if coordinator.shared and not coordinator.claim(f"sid:{message_sid}", WEBHOOK_REPLAY_WINDOW_SECONDS):
+        print(f"Webhook {message_sid} already handled by another worker")
+        return None
+    
+    with lead_manager.lead_lock(phone):
+        # Optionally record a replayable trace (WEBHOOK_TRACE_DIR) of answered messages
+        if reply and tracing_enabled():
+            return record_trace(process_inbound_message, phone, incoming_message, lead_manager, get_gemini_agent())
+        return process_inbound_message(phone, incoming_message, reply=reply)
+
 
 @router.post("/api/webhook")
 async def twilio_webhook(
+    request: Request,
     From: str = Form(...),
     Body: str = Form(...),
     MessageSid: str = Form(...)
@@ -37,15 +193,30 @@ async def twilio_webhook(
     """
     Enhanced Twilio WhatsApp webhook endpoint with manual takeover support.
     Receives incoming WhatsApp messages, processes with AI (if not in manual mode), and returns response.
+    Requests are admitted (rate limits, X-Twilio-Signature, replayed MessageSid) before any I/O.
     
     Args:
+        request: Raw request (all signed form params, headers, client address)
         From: Sender's phone number (whatsapp:+E.164 format, prefix stripped before storage)
         Body: Message content
         MessageSid: Twilio message identifier
         
     Returns:
-        TwiML response for Twilio
+        TwiML response for Twilio (403 for a bad signature, 429 for a flooding IP)
     """
+    form = await request.form()  # Already parsed for the Form fields above
+    outcome = get_webhook_guard().admit(
+        client_ip(request), request_url(request), form.multi_items(), request.headers.get("x-twilio-signature")
+    )
+    if outcome not in (ADMITTED, NUMBER_LIMITED):
+        print(f"Webhook {MessageSid} from {From} shed: {outcome}")
+        if outcome == BAD_SIGNATURE:
+            return Response(status_code=403)
+        if outcome == IP_LIMITED:
+            return Response(status_code=429)
+        # Replays get an empty reply so Twilio doesn't retry
+        return Response(content=str(MessagingResponse()), media_type="application/xml")
+    
     try:
         # Normalize phone number — strip whatsapp: prefix for clean E.164 storage
         phone = From.strip().replace("whatsapp:", "")
@@ -53,119 +224,16 @@ async def twilio_webhook(
         
         print(f"Received WhatsApp from {phone}: {incoming_message}")
         
-        # Get or create lead
-        lead = get_or_create_lead(phone)
-        lead_name = lead.get("name")
-        current_status = lead.get("status", "New")
-        
-        # SAFETY CHECK: Skip processing for test leads UNLESS whatsapp_mode is enabled
-        if lead.get("is_test", False) and not lead.get("whatsapp_mode", False):
-            print(f"⚠️ Test lead detected: {phone}. Skipping Twilio response to prevent messaging costs.")
-            twiml = MessagingResponse()
-            return Response(content=str(twiml), media_type="application/xml")
-        
-        # Save incoming message to history and verify it was saved
-        message_id = save_message(phone, "lead", incoming_message)
-        if message_id:
-            verify_message_saved(lead["id"], message_id)
-        
-        # Check for STOP command
-        if incoming_message.upper() in ["STOP", "STOPALL", "UNSUBSCRIBE", "CANCEL", "END", "QUIT"]:
-            update_lead_status(phone, "Human_Required")
-            response_text = "You've been removed from our list. Thanks for your time! 👋"
-            save_message(phone, "bot", response_text)
-            
-            # Return TwiML response
-            twiml = MessagingResponse()
-            twiml.message(response_text)
-            return Response(content=str(twiml), media_type="application/xml")
-        
-        # Check if lead is in manual mode (human takeover)
-        if is_lead_in_manual_mode(phone):
-            print(f"Lead {phone} is in manual mode. Skipping AI response.")
-            # Don't send automatic response - human agent will respond via dashboard
-            twiml = MessagingResponse()
-            return Response(content=str(twiml), media_type="application/xml")
-        
-        # Get conversation history for context with retry logic
-        # Add small delay to ensure Supabase has committed the insert
-        import time
-        time.sleep(0.5)
-        message_history = get_messages_with_retry(phone, limit=10)
-        
-        # Get AI agent
-        agent = get_gemini_agent()
-        
-        # Analyze message (thinking step)
-        analysis = agent.analyze_message(incoming_message, current_status)
-        
-        print(f"Message analysis: {analysis}")
-        
-        # Extract and save name if detected
-        if analysis.get("name") and not lead_name:
-            lead_name = analysis["name"]
-            update_lead_name(phone, lead_name)
-            print(f"Detected name: {lead_name}")
+        # Off the event loop: the lead's lock may be held by another request.
+        # A sender over its rate is still stored (and STOP honoured), just not answered by the model
+        result = await run_in_threadpool(
+            process_in_order, phone, incoming_message, MessageSid, outcome != NUMBER_LIMITED
+        )
         
-        # Handle status transitions based on analysis
-        new_status = current_status
-        
-        # Distance objection detected
-        if analysis.get("objection_type") == "distance":
-            new_status = "Objection_Distance"
-            update_lead_status(phone, new_status)
-        
-        # Complex objection or negative sentiment - escalate to human
-        elif analysis.get("sentiment") == "negative" and analysis.get("objection_type") not in ["none", "distance"]:
-            new_status = "Human_Required"
-            update_lead_status(phone, new_status)
-        
-        # Positive progression
-        elif current_status == "New" and analysis.get("sentiment") == "positive":
-            new_status = "Qualifying"
-            update_lead_status(phone, new_status)
-        
-        # Handle booking intent
-        if "book" in incoming_message.lower() or "slot" in incoming_message.lower() or "appointment" in incoming_message.lower():
-            response_text = agent.handle_booking_request(lead_name)
-            new_status = "Booking_Offered"
-            update_lead_status(phone, new_status)
-        
-        # Handle slot selection (number response)
-        elif incoming_message.strip().isdigit() and current_status == "Booking_Offered":
-            slot_number = int(incoming_message.strip())
-            if 1 <= slot_number <= 5:
-                from api.utils.sales_prompts import get_calendar_slots
-                slots = get_calendar_slots(5)
-                if slot_number <= len(slots):
-                    selected_slot = slots[slot_number - 1]
-                    response_text = agent.confirm_booking(selected_slot, lead_name)
-                    new_status = "Booked"
-                    update_lead_status(phone, new_status)
-                else:
-                    response_text = agent.generate_response(
-                        incoming_message, message_history, lead_name, new_status, analysis
-                    )
-            else:
-                response_text = agent.generate_response(
-                    incoming_message, message_history, lead_name, new_status, analysis
-                )
-        
-        # Generate AI response
-        else:
-            response_text = agent.generate_response(
-                incoming_message, message_history, lead_name, new_status, analysis
-            )
-        
-        # Save bot response to history
-        save_message(phone, "bot", response_text)
-        
-        print(f"Sending response: {response_text}")
-        print(f"Lead status: {current_status} → {new_status}")
-        
-        # Create TwiML response
+        # Create TwiML response (empty when no reply should be sent)
         twiml = MessagingResponse()
-        twiml.message(response_text)
+        if result and result["response"]:
+            twiml.message(result["response"])
         
         return Response(content=str(twiml), media_type="application/xml")
     
@@ -204,3 +272,18 @@ async def test_connection():
         }
     except Exception as e:
         return {"error": str(e)}
+
+
+@router.get("/api/metrics/models")
+async def model_metrics():
+    """
+    Model routing and rate limiter metrics: per-model latency/error rates,
+    breaker states, adaptive rate, in-flight calls and queue depth by priority.
+    """
+    return get_gemini_agent().router.stats()
+
+
+@router.get("/api/metrics/webhook")
+async def webhook_metrics():
+    """Webhook admission outcomes (admitted, bad signatures, replays, rate-limited IPs and numbers)."""
+    return get_webhook_guard().stats()
@@ -9,8 +9,7 @@ const genAI = new GoogleGenerativeAI(process.env.GEMINI_API_KEY!);
 
 export const dynamic = 'force-dynamic';
 
-// Time Window Configuration (Server Time UTC)
-// Assuming UK Business Hours (London is UTC+0/1)
+// Time Window Configuration (Europe/London local time)
 // 11 AM - 2 PM (Lunch)
 // 7 PM - 9 PM (Evening)
 const ALLOWED_WINDOWS = [
@@ -31,11 +30,11 @@ export async function GET(req: Request) {
 
         // 1. Check Time Window
         const now = new Date();
-        const currentHour = now.getUTCHours() + 1; // Approx London time (adjust logic as needed)
+        const currentHour = parseInt(
+            new Intl.DateTimeFormat('en-GB', { timeZone: 'Europe/London', hour: '2-digit', hour12: false }).format(now)
+        ) % 24; // London wall-clock hour (GMT/BST)
 
-        // Simple check: Is it roughly lunch or evening? 
-        // Note: For production, use exact timezone handling.
-        console.log(`[Follow-up Engine] Current Hour (UTC+1 estimated): ${currentHour}`);
+        console.log(`[Follow-up Engine] Current Hour (Europe/London): ${currentHour}`);
 
         const isAllowed = ALLOWED_WINDOWS.some(w => currentHour >= w.start && currentHour < w.end);
 
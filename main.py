@@ -1,16 +1,56 @@
 """
 Unified FastAPI application for Railway deployment.
-Combines webhook, manual message, and takeover endpoints with CORS support.
+Combines webhook, manual message, takeover, dashboard read and analytics endpoints with CORS support.
 """
 
 import os
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
+from fastapi.responses import JSONResponse
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.middleware.gzip import GZipMiddleware
 from dotenv import load_dotenv
 
 load_dotenv()
 
-app = FastAPI(title="WhatsApp Sales Bot", version="3.0.0")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """
+    Load shared resources once per process before serving requests; drain writes on shutdown.
+    Client warm-up runs alongside (see /api/ready); heavy libraries are imported there, not at module load.
+    """
+    from api.utils.warmup import start_warmup
+    from api.utils.knowledge_base import get_knowledge_base
+    from api.utils.write_behind import get_write_buffer, drain_write_buffer
+    from api.utils.lead_directory import warm_lead_directory_in_background
+    from api.utils.takeover import load_takeover_state_in_background
+    from api.utils.reminders import start_reminder_dispatcher, stop_reminder_dispatcher
+    from api.utils.lead_codes import get_lead_code_allocator
+    from api.utils.lead_stats import start_lead_stats, stop_lead_stats
+    from api.utils.outbound import start_outbound_dispatcher, stop_outbound_dispatcher
+    from api.utils.webhook_guard import load_signing_keys
+    from api.utils.coordination import get_coordinator, stop_coordinator
+    start_warmup()
+    get_coordinator()  # Shared locks / claims / events between workers (COORDINATION_URL)
+    get_knowledge_base()
+    load_signing_keys()
+    get_lead_code_allocator().prefetch()
+    warm_lead_directory_in_background()
+    load_takeover_state_in_background()
+    get_write_buffer()  # Re-queues any rows left in the WAL by a crash
+    start_reminder_dispatcher()
+    start_lead_stats()
+    start_outbound_dispatcher()
+    yield
+    stop_outbound_dispatcher()
+    stop_lead_stats()
+    stop_reminder_dispatcher()
+    drain_write_buffer()
+    stop_coordinator()
+
+
+app = FastAPI(title="WhatsApp Sales Bot", version="3.0.0", lifespan=lifespan)
 
 # CORS — allow Vercel dashboard to call Railway backend
 ALLOWED_ORIGINS = [
@@ -28,19 +68,40 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
+# Compress larger JSON responses (dashboard pages); small TwiML replies pass through
+app.add_middleware(GZipMiddleware, minimum_size=1000)
+
 # Import and register route handlers
 from api.webhook import router as webhook_router
 from api.manual_message import router as manual_message_router
 from api.toggle_takeover import router as toggle_takeover_router
+from api.leads import router as leads_router
+from api.events import router as events_router
+from api.analytics import router as analytics_router
+from api.twilio_status import router as twilio_status_router
 
 app.include_router(webhook_router)
 app.include_router(manual_message_router)
 app.include_router(toggle_takeover_router)
+app.include_router(leads_router)
+app.include_router(events_router)
+app.include_router(analytics_router)
+app.include_router(twilio_status_router)
 
 
 @app.get("/")
 async def root():
     """Health check endpoint."""
     return {"status": "ok", "service": "WhatsApp Sales Bot", "version": "3.0.0"}
+
+
+@app.get("/api/ready")
+async def ready():
+    """Readiness check: 503 until the startup warm-up has built the clients, then per-step timings."""
+    from api.utils.warmup import get_warmup
+
+    status = get_warmup().status()
+    return JSONResponse(status, status_code=200 if status["ready"] else 503)
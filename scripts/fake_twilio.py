@@ -0,0 +1,172 @@
+"""
+Local fake of the Twilio Messages API, and an end-to-end run of the send layer against it.
+The fake answers POST /2010-04-01/Accounts/{sid}/Messages.json like Twilio (201 with a
+message SID). It injects 429s (with Retry-After), 5xx errors and rejected numbers, and
+posts signed sent / delivered status callbacks in random order to the StatusCallback URL.
+
+The default run starts the fake and the FastAPI app in-process, with delivery states
+kept in memory (TWILIO_STATUS_STORE=memory). It then sends N messages through
+TwilioSender and reports retries, failures, the peak per-sender rate the fake observed,
+and the final delivery state of every message.
+
+Usage:
+    python scripts/fake_twilio.py --messages 2000 --mps 80 --throttle-rate 0.05 --error-rate 0.05
+    python scripts/fake_twilio.py --serve --port 8788    # just the fake (set TWILIO_API_BASE=http://127.0.0.1:8788)
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import sys
+import threading
+import time
+import uuid
+from collections import Counter, defaultdict
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("TWILIO_STATUS_STORE", "memory")
+os.environ.setdefault("TWILIO_AUTH_TOKEN", "token")  # Callbacks are signed with it, like Twilio does
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+
+def create_fake_twilio(throttle_rate: float = 0.05, error_rate: float = 0.05, invalid_rate: float = 0.0,
+                       undelivered_rate: float = 0.02, seed: int = 7) -> FastAPI:
+    rng = random.Random(seed)
+    app = FastAPI(title="Fake Twilio")
+    app.state.counts = Counter()
+    app.state.sends_by_second = defaultdict(Counter)
+    app.state.callbacks = Counter()
+    app.state.client = None
+
+    from api.utils.webhook_guard import compute_signature, signing_mac
+
+    mac = signing_mac(os.environ["TWILIO_AUTH_TOKEN"])
+
+    async def post_callbacks(url: str, account_sid: str, sid: str, to: str) -> None:
+        final = "undelivered" if rng.random() < undelivered_rate else "delivered"
+        updates = ["sent", final]
+        if rng.random() < 0.3:
+            updates.reverse()  # Twilio doesn't guarantee callback order
+        if app.state.client is None:
+            app.state.client = httpx.AsyncClient(timeout=10)
+        for status in updates:
+            await asyncio.sleep(rng.uniform(0.01, 0.2))
+            form = {"AccountSid": account_sid, "MessageSid": sid, "MessageStatus": status, "To": to}
+            if status == "undelivered":
+                form["ErrorCode"] = "63016"
+            signature = compute_signature(mac, url, form.items())
+            try:
+                response = await app.state.client.post(url, data=form, headers={"X-Twilio-Signature": signature})
+                app.state.callbacks[f"{status}:{response.status_code}"] += 1
+            except httpx.HTTPError:
+                app.state.callbacks["error"] += 1
+
+    @app.post("/2010-04-01/Accounts/{account_sid}/Messages.json")
+    async def create_message(account_sid: str, request: Request):
+        form = await request.form()
+        if not request.headers.get("authorization", "").startswith("Basic "):
+            return JSONResponse({"code": 20003, "message": "Authenticate"}, status_code=401)
+        roll = rng.random()
+        if roll < throttle_rate:
+            app.state.counts["429"] += 1
+            return JSONResponse({"code": 20429, "message": "Too Many Requests"}, status_code=429, headers={"Retry-After": "1"})
+        if roll < throttle_rate + error_rate:
+            app.state.counts["503"] += 1
+            return JSONResponse({"code": 20500, "message": "Service Unavailable"}, status_code=503)
+        to = form.get("To", "")
+        if roll < throttle_rate + error_rate + invalid_rate or not to.startswith("whatsapp:+"):
+            app.state.counts["400"] += 1
+            return JSONResponse({"code": 21211, "message": f"The 'To' number {to} is not a valid phone number."}, status_code=400)
+
+        sender = form.get("From", "")
+        app.state.sends_by_second[sender][int(time.monotonic())] += 1
+        app.state.counts["201"] += 1
+        sid = "SM" + uuid.uuid4().hex
+        if form.get("StatusCallback"):
+            asyncio.create_task(post_callbacks(form["StatusCallback"], account_sid, sid, to))
+        return JSONResponse({"sid": sid, "status": "queued", "to": to, "from": sender, "body": form.get("Body")}, status_code=201)
+
+    @app.get("/stats")
+    async def stats():
+        return {
+            "responses": dict(app.state.counts),
+            "callbacks": dict(app.state.callbacks),
+            "peak_per_second": {s: max(c.values()) for s, c in app.state.sends_by_second.items()},
+        }
+
+    return app
+
+
+def start_server(app, port: int) -> uvicorn.Server:
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def run(messages: int, mps: float, concurrency: int, fake_port: int, app_port: int, invalid: int) -> dict:
+    from api.utils.twilio_client import TwilioSender, get_status_store
+
+    sender = TwilioSender(
+        account_sid="ACfake", auth_token="token", from_number="+14155238886",
+        api_base=f"http://127.0.0.1:{fake_port}", concurrency=concurrency, sender_mps=mps,
+        status_callback=f"http://127.0.0.1:{app_port}/api/twilio/status",
+    )
+    batch = [(f"+4477009{i:05d}", f"Message {i}") for i in range(messages)]
+    batch[:invalid] = [("not-a-number", "Message") for _ in range(invalid)]
+    started = time.perf_counter()
+    results = await sender.send_many(batch)
+    elapsed = time.perf_counter() - started
+
+    sids = {r["sid"] for r in results if r["sid"]}
+    store = get_status_store()
+    deadline = time.monotonic() + 10
+    while time.monotonic() < deadline and sum(1 for s in sids if store.statuses.get(s, {}).get("rank", 0) >= 3) < len(sids):
+        await asyncio.sleep(0.1)
+    await asyncio.sleep(0.5)  # Let late (out-of-order) callbacks land
+    async with httpx.AsyncClient() as client:
+        fake_stats = (await client.get(f"http://127.0.0.1:{fake_port}/stats")).json()
+    await sender.close()
+
+    final = Counter(store.statuses[s]["status"] if s in store.statuses else "missing" for s in sids)
+    return {
+        "messages": messages,
+        "seconds": round(elapsed, 2),
+        "sent": len(sids),
+        "failed": sum(1 for r in results if r["error"]),
+        "sender": sender.stats(),
+        "configured_mps": mps,
+        "fake": fake_stats,
+        "final_status": dict(final),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Fake Twilio Messages API")
+    parser.add_argument("--serve", action="store_true", help="Only run the fake server")
+    parser.add_argument("--port", type=int, default=8788)
+    parser.add_argument("--app-port", type=int, default=8789)
+    parser.add_argument("--messages", type=int, default=2000)
+    parser.add_argument("--mps", type=float, default=80)
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--throttle-rate", type=float, default=0.05)
+    parser.add_argument("--error-rate", type=float, default=0.05)
+    parser.add_argument("--invalid", type=int, default=5, help="Messages to unroutable numbers (permanent errors)")
+    args = parser.parse_args()
+
+    fake = create_fake_twilio(throttle_rate=args.throttle_rate, error_rate=args.error_rate)
+    if args.serve:
+        uvicorn.run(fake, host="127.0.0.1", port=args.port)
+    else:
+        from main import app
+
+        start_server(fake, args.port)
+        start_server(app, args.app_port)
+        print(json.dumps(asyncio.run(run(args.messages, args.mps, args.concurrency, args.port, args.app_port, args.invalid)), indent=2))
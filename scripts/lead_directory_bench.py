@@ -0,0 +1,84 @@
+"""
+Memory and lookup benchmark for the in-process lead directory.
+Builds N synthetic leads (realistic ids, phones, codes, a few tenants, scoring state)
+and reports bytes per lead and lookup latency.
+
+Usage:
+    python scripts/lead_directory_bench.py --leads 1000000
+"""
+
+import argparse
+import gc
+import os
+import random
+import sys
+import time
+import tracemalloc
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.utils.lead_directory import LeadDirectory
+from api.utils.lead_manager import VALID_STATUSES
+
+
+def synthetic_rows(count: int, seed: int = 1):
+    rng = random.Random(seed)
+    tenants = [str(uuid.UUID(int=rng.getrandbits(128))) for _ in range(20)]
+    for i in range(count):
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "phone": f"+447{700000000 + i:09d}",
+            "lead_code": f"#{''.join(rng.choices('ABCDEFGHJKLMNPQRSTUVWXYZ', k=3))}{rng.randint(0, 999):03d}",
+            "name": rng.choice([None, "Jess", "Alex", "Sam", "Priya", "Tom"]),
+            "status": rng.choice(VALID_STATUSES),
+            "is_manual_mode": rng.random() < 0.02,
+            "is_test": False,
+            "whatsapp_mode": False,
+            "tenant_id": rng.choice(tenants),
+            "priority_score": rng.randint(0, 100),
+            "score_features": None if rng.random() < 0.5 else {
+                "v": 1, "sentiment": rng.random(), "inbound": rng.randint(1, 20),
+                "latency_min": rng.random() * 60, "objection": rng.random(), "intent": rng.random(),
+            },
+        }
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Lead directory memory/lookup benchmark")
+    parser.add_argument("--leads", type=int, default=1_000_000)
+    parser.add_argument("--lookups", type=int, default=1_000_000)
+    args = parser.parse_args()
+
+    directory = LeadDirectory()
+    gc.collect()
+    tracemalloc.start()
+    started = time.perf_counter()
+    directory.load(synthetic_rows(args.leads))
+    load_s = time.perf_counter() - started
+    gc.collect()
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    phones = [f"+447{700000000 + random.randrange(args.leads):09d}" for _ in range(args.lookups)]
+    get = directory.get
+    started = time.perf_counter()
+    for phone in phones:
+        get(phone)
+    lookup_ns = (time.perf_counter() - started) / args.lookups * 1e9
+
+    record = directory.get(phones[0])
+    started = time.perf_counter()
+    for _ in range(args.lookups):
+        record.is_manual_mode
+    attr_ns = (time.perf_counter() - started) / args.lookups * 1e9
+
+    print(f"leads:            {len(directory):,}")
+    print(f"load:             {load_s:.2f}s")
+    print(f"memory:           {current / 1e6:.1f} MB ({current / len(directory):.0f} bytes/lead)")
+    print(f"lookup by phone:  {lookup_ns:.0f} ns")
+    print(f"flag read:        {attr_ns:.0f} ns")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+Throughput benchmark for the bulk lead import path.
+Generates N synthetic CRM rows (mixed phone formats, a few invalid and duplicate
+rows), streams them through LineSplitter + LeadImport in 64 KB chunks and reports
+rows per second. Without --database the batch insert is a no-op sink, so only the
+parse/normalize path is measured; with --database rows go to the configured
+Supabase project (the numbers then include the unnest upserts).
+
+Usage:
+    python scripts/lead_import_bench.py --rows 100000 --format csv
+    python scripts/lead_import_bench.py --rows 100000 --database --tenant-id <uuid>
+"""
+
+import argparse
+import csv
+import io
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from api.utils.lead_import import LeadImport, LineSplitter
+
+
+def synthetic_body(rows: int, fmt: str, seed: int = 1) -> bytes:
+    rng = random.Random(seed)
+    records = []
+    for i in range(rows):
+        national = f"7{700000000 + i:09d}"
+        phone = rng.choice([f"+44{national}", f"0{national[:4]} {national[4:]}", f"0044-{national}", f"whatsapp:+44{national}"])
+        if rng.random() < 0.005:
+            phone = "not a number"
+        elif rng.random() < 0.005 and records:
+            phone = records[-1]["phone"]
+        records.append({
+            "name": rng.choice(["Jess Smith", "Alex", "Sam Patel", "", "Priya"]),
+            "phone": phone,
+            "email": f"lead{i}@example.com",
+            "source": rng.choice(["Instagram Ad", "Facebook Lead Form", "Referral"]),
+            "notes": rng.choice(["", "Interested in headshots", "Asked about pricing"]),
+        })
+
+    if fmt == "ndjson":
+        return "\n".join(json.dumps(r) for r in records).encode("utf-8")
+    out = io.StringIO()
+    writer = csv.DictWriter(out, fieldnames=list(records[0]))
+    writer.writeheader()
+    writer.writerows(records)
+    return out.getvalue().encode("utf-8")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="Bulk lead import benchmark")
+    parser.add_argument("--rows", type=int, default=100000)
+    parser.add_argument("--format", choices=["ndjson", "csv"], default="ndjson")
+    parser.add_argument("--chunk", type=int, default=65536)
+    parser.add_argument("--database", action="store_true", help="Insert into the configured database")
+    parser.add_argument("--tenant-id", default="00000000-0000-0000-0000-000000000000")
+    args = parser.parse_args()
+
+    body = synthetic_body(args.rows, args.format)
+    sink = None if args.database else (
+        lambda tenant_id, rows, on_conflict: {row["phone"]: ("", "", True) for row in rows}
+    )
+    job = LeadImport(args.tenant_id, fmt=args.format, insert=sink)
+    splitter = LineSplitter()
+
+    started = time.perf_counter()
+    for offset in range(0, len(body), args.chunk):
+        for line in splitter.feed(body[offset:offset + args.chunk]):
+            job.feed_line(line)
+            if job.ready():
+                job.flush()
+    for line in splitter.close():
+        job.feed_line(line)
+    job.finish()
+    job.flush()
+    elapsed = time.perf_counter() - started
+
+    summary = job.summary()
+    print(json.dumps({
+        "rows": args.rows,
+        "format": args.format,
+        "body_mb": round(len(body) / 1e6, 1),
+        "database": args.database,
+        "seconds": round(elapsed, 2),
+        "rows_per_second": int(args.rows / elapsed),
+        "counts": {k: summary[k] for k in ("rows", "inserted", "updated", "existing", "invalid", "failed")},
+        "sample_errors": summary["errors"][:3],
+    }, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,286 @@
+"""
+Multi-worker throughput and correctness benchmark.
+Serves a webhook-shaped app (this module's `app`: signature check, MessageSid claim,
+per-lead lock, process_inbound_message with the in-memory store and fake agent)
+under `uvicorn --workers N` for each N, drives it with signed Twilio-style posts
+from several load-generator processes (re-sending a share of MessageSids to other
+connections), and reports throughput, scaling efficiency against one worker, and
+from every worker's journal: MessageSids processed more than once, overlapping
+processing of one lead, and messages processed out of lock-request order.
+The store is per worker (standing in for the database); the coordinator is real.
+
+Usage:
+    python scripts/multiworker_bench.py --workers 1,2,4 --seconds 10
+    python scripts/multiworker_bench.py --workers 1,2 --coordination sqlite --model-latency 0.02
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+
+import httpx
+from fastapi import FastAPI, Request, Response
+from starlette.concurrency import run_in_threadpool
+
+from api.utils.webhook_guard import (
+    SigningKeys, TokenBuckets, RecentSids, WebhookGuard, compute_signature, signing_mac, ADMITTED
+)
+
+URL = "http://bench.local/webhook"
+ACCOUNT_SID = "AC" + "0" * 32
+AUTH_TOKEN = "bench-auth-token"
+TWILIO_NUMBER = "whatsapp:+442000000000"
+
+app = FastAPI()
+_state = {}
+
+
+def _worker_state() -> dict:
+    """Per-worker singletons, built on the first request."""
+    if not _state:
+        from api.utils.memory_store import InMemoryLeadStore
+        from api.utils.simulator import build_fake_agent
+
+        keys = SigningKeys(loader=lambda: [], default_token=AUTH_TOKEN, default_sid=ACCOUNT_SID)
+        _state["guard"] = WebhookGuard(keys, validate=True, ip_limits=TokenBuckets(0, 0),
+                                       number_limits=TokenBuckets(0, 0), replays=RecentSids())
+        _state["store"] = InMemoryLeadStore()
+        _state["agent"] = build_fake_agent(latency=float(os.getenv("BENCH_MODEL_LATENCY", "0")))
+        _state["journal"] = open(os.path.join(os.environ["BENCH_JOURNAL_DIR"], f"journal.{os.getpid()}"), "a")
+    return _state
+
+
+def _handle(phone: str, body: str, message_sid: str) -> str:
+    """The webhook's process_in_order, against the bench store and agent, journaling each message."""
+    from api.utils import lead_manager
+    from api.utils.coordination import get_coordinator
+    from api.webhook import process_inbound_message
+
+    state = _worker_state()
+    coordinator = get_coordinator()
+    if coordinator.shared and not coordinator.claim(f"sid:{message_sid}", 3600):
+        return "duplicate"
+    requested = time.time()
+    with lead_manager.lead_lock(phone) as grant:
+        started = time.time()
+        result = process_inbound_message(phone, body, store=state["store"], agent=state["agent"])
+        finished = time.time()
+    state["journal"].write(json.dumps({
+        "sid": message_sid, "phone": phone, "requested": requested, "started": started,
+        "finished": finished, "handoff": grant.handoff, "pid": os.getpid(),
+    }) + "\n")
+    state["journal"].flush()
+    return result["action"] or "reply"
+
+
+@app.post("/webhook")
+async def bench_webhook(request: Request):
+    form = await request.form()
+    params = form.multi_items()
+    outcome = _worker_state()["guard"].admit("bench", URL, params, request.headers.get("x-twilio-signature"))
+    if outcome != ADMITTED:
+        return Response(status_code=200 if outcome == "replayed" else 403)
+    fields = dict(params)
+    action = await run_in_threadpool(_handle, fields["From"].replace("whatsapp:", ""), fields["Body"], fields["MessageSid"])
+    return Response(content=action, media_type="text/plain")
+
+
+@app.get("/ready")
+async def bench_ready():
+    return {"pid": os.getpid()}
+
+
+def _signed_post(phone: str, body: str, sid: str) -> tuple:
+    params = [("AccountSid", ACCOUNT_SID), ("Body", body), ("From", f"whatsapp:{phone}"),
+              ("MessageSid", sid), ("To", TWILIO_NUMBER)]
+    return params, compute_signature(signing_mac(AUTH_TOKEN), URL, params)
+
+
+def _generate_load(port: int, seconds: float, concurrency: int, leads: int, duplicate_rate: float,
+                   seed: int, results: "multiprocessing.Queue") -> None:
+    rng = random.Random(seed)
+    phones = [f"+4477{n:08d}" for n in range(leads)]
+    bodies = ["Hi, is this still available?", "How much does it cost?", "What should I wear?", "Yes please"]
+    counts = defaultdict(int)
+    latencies = []
+
+    async def run():
+        limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+        async with httpx.AsyncClient(base_url=f"http://127.0.0.1:{port}", limits=limits, timeout=60) as client:
+            deadline = time.perf_counter() + seconds
+            sequence = 0
+
+            async def loop(task: int):
+                nonlocal sequence
+                while time.perf_counter() < deadline:
+                    sequence += 1
+                    sid = f"SM{seed:04d}{sequence:012d}"
+                    params, signature = _signed_post(rng.choice(phones), rng.choice(bodies), sid)
+                    sends = 2 if rng.random() < duplicate_rate else 1
+                    for _ in range(sends):
+                        started = time.perf_counter()
+                        response = await client.post("/webhook", data=dict(params),
+                                                     headers={"X-Twilio-Signature": signature})
+                        latencies.append(time.perf_counter() - started)
+                        counts[response.text or str(response.status_code)] += 1
+                    counts["sent_unique"] += 1
+                    counts["sent_duplicates"] += sends - 1
+
+            await asyncio.gather(*(loop(task) for task in range(concurrency)))
+
+    asyncio.run(run())
+    results.put({"counts": dict(counts), "latencies": latencies})
+
+
+def _read_journal(journal_dir: str) -> list:
+    entries = []
+    for name in os.listdir(journal_dir):
+        if name.startswith("journal."):
+            with open(os.path.join(journal_dir, name)) as handle:
+                entries.extend(json.loads(line) for line in handle if line.strip())
+    return entries
+
+
+def check_journal(entries: list, tolerance: float = 0.002) -> dict:
+    """
+    Returns:
+        dict: processed, workers, duplicate_sids, overlapping (one lead in two places at once),
+            order_inversions (requested > tolerance earlier but processed later), handoffs
+    """
+    by_sid = defaultdict(int)
+    by_lead = defaultdict(list)
+    for entry in entries:
+        by_sid[entry["sid"]] += 1
+        by_lead[entry["phone"]].append(entry)
+    overlapping = inversions = 0
+    for items in by_lead.values():
+        items.sort(key=lambda entry: entry["started"])
+        for previous, current in zip(items, items[1:]):
+            if current["started"] < previous["finished"]:
+                overlapping += 1
+        latest_request = 0.0
+        for entry in items:
+            if entry["requested"] < latest_request - tolerance:
+                inversions += 1
+            latest_request = max(latest_request, entry["requested"])
+    return {
+        "processed": len(entries),
+        "workers_seen": len({entry["pid"] for entry in entries}),
+        "duplicate_sids": sum(1 for count in by_sid.values() if count > 1),
+        "overlapping": overlapping,
+        "order_inversions": inversions,
+        "handoffs": sum(1 for entry in entries if entry["handoff"]),
+    }
+
+
+def run_workers(workers: int, args, port: int) -> dict:
+    work_dir = tempfile.mkdtemp(prefix=f"multiworker-{workers}-")
+    env = dict(os.environ, PYTHONPATH=ROOT, WEB_CONCURRENCY=str(workers), BENCH_JOURNAL_DIR=work_dir,
+               BENCH_MODEL_LATENCY=str(args.model_latency), MESSAGE_WRITE_BEHIND="0")
+    if args.coordination == "sqlite" or (args.coordination == "auto" and workers > 1):
+        env["COORDINATION_URL"] = f"sqlite:///{os.path.join(work_dir, 'coordination.db')}"
+    elif args.coordination != "auto":
+        env["COORDINATION_URL"] = args.coordination
+    else:
+        env["COORDINATION_URL"] = "memory://"
+    server = subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "multiworker_bench:app", "--app-dir", os.path.join(ROOT, "scripts"),
+         "--host", "127.0.0.1", "--port", str(port), "--workers", str(workers), "--log-level", "warning"],
+        env=env, cwd=ROOT, stdout=subprocess.DEVNULL,  # The pipeline prints per message
+    )
+    try:
+        deadline = time.monotonic() + 60
+        while True:
+            try:
+                if httpx.get(f"http://127.0.0.1:{port}/ready", timeout=1).status_code == 200:
+                    break
+            except httpx.HTTPError:
+                pass
+            if time.monotonic() > deadline or server.poll() is not None:
+                raise SystemExit(f"Server with {workers} workers did not start")
+            time.sleep(0.2)
+
+        results = multiprocessing.Queue()
+        generators = [
+            multiprocessing.Process(target=_generate_load, args=(
+                port, args.seconds, args.concurrency, args.leads, args.duplicate_rate, seed, results))
+            for seed in range(args.generators)
+        ]
+        started = time.perf_counter()
+        for generator in generators:
+            generator.start()
+        reports = [results.get() for _ in generators]
+        elapsed = time.perf_counter() - started
+        for generator in generators:
+            generator.join()
+    finally:
+        server.terminate()
+        server.wait(30)
+
+    counts = defaultdict(int)
+    latencies = []
+    for report in reports:
+        for key, value in report["counts"].items():
+            counts[key] += value
+        latencies.extend(report["latencies"])
+    latencies.sort()
+    requests = len(latencies)
+    journal = check_journal(_read_journal(work_dir))
+    shutil.rmtree(work_dir, ignore_errors=True)
+    return {
+        "workers": workers,
+        "coordination": env["COORDINATION_URL"].split(":")[0],
+        "requests": requests,
+        "rps": round(requests / elapsed, 1),
+        "p50_ms": round(latencies[requests // 2] * 1000, 2) if requests else None,
+        "p99_ms": round(latencies[int(requests * 0.99)] * 1000, 2) if requests else None,
+        "sent_unique": counts["sent_unique"],
+        "sent_duplicates": counts["sent_duplicates"],
+        # Each unique MessageSid processed exactly once, however many times it was posted
+        "lost": counts["sent_unique"] - journal["processed"] + journal["duplicate_sids"],
+        **journal,
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Multi-worker throughput and shared-state correctness benchmark")
+    parser.add_argument("--workers", default=",".join(str(n) for n in range(1, (os.cpu_count() or 1) + 1)),
+                        help="Comma-separated worker counts (default: 1..cpu_count)")
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--generators", type=int, default=2, help="Load generator processes")
+    parser.add_argument("--concurrency", type=int, default=32, help="In-flight requests per generator")
+    parser.add_argument("--leads", type=int, default=200, help="Distinct leads (fewer = more lock contention)")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05, help="Share of MessageSids posted twice")
+    parser.add_argument("--model-latency", type=float, default=0.0, help="Seconds per fake model call")
+    parser.add_argument("--coordination", default="auto",
+                        help="auto (memory for 1 worker, sqlite otherwise), sqlite, or a COORDINATION_URL")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    print(f"cpu_count={os.cpu_count()}, {args.generators} generators x {args.concurrency} in flight, "
+          f"{args.leads} leads, {args.seconds}s per run")
+    rows = []
+    for workers in [int(n) for n in args.workers.split(",")]:
+        row = run_workers(workers, args, args.port)
+        row["efficiency"] = round(row["rps"] / (rows[0]["rps"] * workers / rows[0]["workers"]), 2) if rows else 1.0
+        rows.append(row)
+        if not args.json:
+            print(f"{workers:>2} workers ({row['coordination']}): {row['rps']:>8} req/s  efficiency {row['efficiency']:.2f}  "
+                  f"p50 {row['p50_ms']} ms  p99 {row['p99_ms']} ms  | duplicates processed {row['duplicate_sids']}, "
+                  f"lost {row['lost']}, overlapping {row['overlapping']}, out of order {row['order_inversions']}, "
+                  f"handoffs {row['handoffs']} ({row['workers_seen']} workers served)")
+    if args.json:
+        print(json.dumps(rows, indent=2))
@@ -0,0 +1,132 @@
+"""
+Load test for the /api/stream SSE endpoint.
+Starts the FastAPI app in-process, connects N concurrent dashboard viewers, publishes
+events through the broker and reports delivery latency, missed events and resyncs.
+Viewers authenticate with a test API key resolved in-process (no api_keys lookup).
+A few deliberately slow viewers exercise the bounded-queue backpressure path.
+
+Usage:
+    python scripts/sse_load_test.py --viewers 500 --events 200 --rate 100 --slow 5
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import threading
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+import uvicorn
+
+API_KEY = "load-test-key"
+TENANT_ID = "load-test"
+
+
+def start_server(port: int) -> uvicorn.Server:
+    from main import app
+    from api.utils import tenant_auth
+
+    tenant_auth._cache = tenant_auth.ApiKeyCache(resolver={API_KEY: TENANT_ID}.get)
+
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return server
+
+
+async def viewer(client: httpx.AsyncClient, url: str, stats: dict, ready: asyncio.Event, total: int, slow: bool):
+    latencies, received, resyncs = [], 0, 0
+    async with client.stream("GET", url, headers={"X-API-Key": API_KEY}) as response:
+        stats["connected"] += 1
+        if stats["connected"] == stats["viewers"]:
+            ready.set()
+        async for line in response.aiter_lines():
+            if line.startswith("event: resync"):
+                resyncs += 1
+            if not line.startswith("data: "):
+                continue
+            event = json.loads(line[6:])
+            if event.get("type") != "message":
+                continue
+            latencies.append((time.perf_counter() - event["sent_at"]) * 1000)
+            received += 1
+            if slow:
+                await asyncio.sleep(0.05)
+            if event["seq"] == total - 1:
+                break
+    stats["slow_latencies" if slow else "latencies"].extend(latencies)
+    stats["received"].append(received)
+    stats["resyncs"] += resyncs
+
+
+async def run(args) -> None:
+    from api.utils.event_stream import get_event_broker
+
+    server = start_server(args.port)
+    url = f"http://127.0.0.1:{args.port}/api/stream"
+    stats = {"viewers": args.viewers, "connected": 0, "latencies": [], "slow_latencies": [], "received": [], "resyncs": 0}
+    ready = asyncio.Event()
+
+    limits = httpx.Limits(max_connections=args.viewers + 10, max_keepalive_connections=args.viewers + 10)
+    async with httpx.AsyncClient(timeout=None, limits=limits) as client:
+        started = time.perf_counter()
+        tasks = [
+            asyncio.create_task(viewer(client, url, stats, ready, args.events, slow=i < args.slow))
+            for i in range(args.viewers)
+        ]
+        await asyncio.wait_for(ready.wait(), timeout=60)
+        connect_s = time.perf_counter() - started
+
+        broker = get_event_broker()
+        interval = 1.0 / args.rate
+        for seq in range(args.events):
+            broker.publish({
+                "type": "message", "tenant_id": TENANT_ID, "lead_id": f"lead-{seq % 50}",
+                "content": "x" * 80, "seq": seq, "sent_at": time.perf_counter(),
+            })
+            await asyncio.sleep(interval)
+
+        # Slow viewers may have resynced past the final event; give them a bounded wait
+        await asyncio.wait(tasks, timeout=10)
+        for task in tasks:
+            task.cancel()
+
+    latencies = sorted(stats["latencies"])
+    print(json.dumps({
+        "viewers": args.viewers,
+        "slow_viewers": args.slow,
+        "connect_all_s": round(connect_s, 2),
+        "events": args.events,
+        "deliveries": len(latencies) + len(stats["slow_latencies"]),
+        "complete_viewers": sum(1 for r in stats["received"] if r == args.events),
+        "resyncs": stats["resyncs"],
+        # Latency percentiles cover the normal-speed viewers only
+        "latency_ms": {
+            "p50": round(statistics.median(latencies), 2) if latencies else None,
+            "p95": round(latencies[int(0.95 * (len(latencies) - 1))], 2) if latencies else None,
+            "p99": round(latencies[int(0.99 * (len(latencies) - 1))], 2) if latencies else None,
+        },
+        "broker": get_event_broker().stats(),
+    }, indent=2))
+    server.should_exit = True
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="SSE fan-out load test")
+    parser.add_argument("--viewers", type=int, default=300)
+    parser.add_argument("--events", type=int, default=200)
+    parser.add_argument("--rate", type=float, default=100.0, help="Events per second")
+    parser.add_argument("--slow", type=int, default=5, help="Viewers that read slowly")
+    parser.add_argument("--port", type=int, default=8765)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    main()
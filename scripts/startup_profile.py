@@ -0,0 +1,134 @@
+"""
+Cold-start profile of the FastAPI app.
+Runs `python -X importtime -c "import main"` in a fresh interpreter and breaks the
+import time down by top-level package and by our own api.* modules, then (in another
+fresh interpreter) times the lifespan startup and the client warm-up behind /api/ready.
+
+Usage:
+    python scripts/startup_profile.py --top 15
+    python scripts/startup_profile.py --module api.webhook      # profile one import instead of main
+    python scripts/startup_profile.py --no-lifespan --json
+"""
+
+import argparse
+import json
+import os
+import subprocess
+import sys
+from collections import defaultdict
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+LIFESPAN_PROBE = """
+import asyncio, json, time
+started = time.perf_counter()
+import main
+imported = time.perf_counter()
+
+async def probe():
+    from api.utils.warmup import get_warmup
+    async with main.app.router.lifespan_context(main.app):
+        serving = time.perf_counter()
+        await asyncio.to_thread(get_warmup().ready.wait, 120)
+        ready = time.perf_counter()
+    return serving, ready, get_warmup().status()
+
+serving, ready, status = asyncio.run(probe())
+print("@@" + json.dumps({
+    "import_main_s": round(imported - started, 3),
+    "lifespan_startup_s": round(serving - imported, 3),
+    "ready_s": round(ready - started, 3),
+    "warmup": status,
+}))
+"""
+
+
+def _env() -> dict:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = ROOT + os.pathsep + env.get("PYTHONPATH", "")
+    return env
+
+
+def import_profile(module: str) -> list:
+    """
+    Returns:
+        list: (self_us, cumulative_us, depth, module) per imported module, in import order
+    """
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT, env=_env(), capture_output=True, text=True,
+    )
+    if result.returncode != 0:
+        raise SystemExit(f"import {module} failed:\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        depth = (len(name) - len(name.lstrip(" "))) // 2
+        rows.append((int(self_us), int(cumulative_us), depth, name.strip()))
+    return rows
+
+
+def summarize(rows: list, module: str, top: int) -> dict:
+    by_package = defaultdict(int)
+    ours = {}
+    for self_us, _, _, name in rows:
+        root = name.split(".")[0]
+        if root == "api":
+            ours[name] = self_us
+            by_package[".".join(name.split(".")[:2])] += self_us
+        else:
+            by_package[root] += self_us
+    total = next((cumulative for _, cumulative, _, name in rows if name == module), sum(r[0] for r in rows))
+    ms = lambda us: round(us / 1000, 1)
+    return {
+        "module": module,
+        "total_ms": ms(total),
+        "modules_imported": len(rows),
+        "packages_ms": {name: ms(us) for name, us in sorted(by_package.items(), key=lambda kv: -kv[1])[:top]},
+        "api_modules_ms": {name: ms(us) for name, us in sorted(ours.items(), key=lambda kv: -kv[1])[:top]},
+        "heaviest_imports_ms": {
+            name: ms(cumulative)
+            for _, cumulative, _, name in sorted(rows, key=lambda r: -r[1])[:top] if name != module
+        },
+    }
+
+
+def lifespan_profile() -> dict:
+    result = subprocess.run([sys.executable, "-c", LIFESPAN_PROBE], cwd=ROOT, env=_env(), capture_output=True, text=True)
+    for line in result.stdout.splitlines():
+        if line.startswith("@@"):
+            return json.loads(line[2:])
+    raise SystemExit(f"Lifespan probe failed:\n{result.stderr[-2000:]}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Cold-start import and warm-up profile")
+    parser.add_argument("--module", default="main", help="Module to import (default: main)")
+    parser.add_argument("--top", type=int, default=15)
+    parser.add_argument("--no-lifespan", action="store_true", help="Skip the lifespan / warm-up timing")
+    parser.add_argument("--json", action="store_true")
+    args = parser.parse_args()
+
+    report = {"imports": summarize(import_profile(args.module), args.module, args.top)}
+    if not args.no_lifespan and args.module == "main":
+        report["startup"] = lifespan_profile()
+
+    if args.json:
+        print(json.dumps(report, indent=2))
+    else:
+        imports = report["imports"]
+        print(f"import {imports['module']}: {imports['total_ms']} ms ({imports['modules_imported']} modules)")
+        for title, key in (("By package (self time)", "packages_ms"), ("api.* modules (self time)", "api_modules_ms"),
+                           ("Heaviest imports (cumulative)", "heaviest_imports_ms")):
+            print(f"\n{title}:")
+            for name, value in imports[key].items():
+                print(f"  {value:>8} ms  {name}")
+        if "startup" in report:
+            startup = report["startup"]
+            print(f"\nimport main {startup['import_main_s']}s, lifespan startup {startup['lifespan_startup_s']}s, "
+                  f"ready after {startup['ready_s']}s")
+            for name, step in startup["warmup"]["steps"].items():
+                print(f"  {name:>10}: {'ok' if step['ok'] else 'failed'} in {step['seconds']}s"
+                      + (f" ({step['error'][:80]})" if not step["ok"] else ""))
@@ -0,0 +1,139 @@
+"""
+Overhead of the webhook admission checks (api/utils/webhook_guard.py).
+Builds realistic Twilio WhatsApp webhook params for a few tenants, checks our
+signatures against the twilio library's RequestValidator, then times:
+signature validation alone, the full admit() path for legitimate traffic, and
+shedding of a forged-signature flood and a single-number burst.
+
+Usage:
+    python scripts/webhook_guard_bench.py --requests 100000 --tenants 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from twilio.request_validator import RequestValidator
+
+from api.utils.webhook_guard import (
+    RecentSids, SigningKeys, TokenBuckets, WebhookGuard, compute_signature, signing_mac
+)
+
+URL = "https://your-app.up.railway.app/api/webhook"
+
+
+def synthetic_tenants(count: int, rng: random.Random):
+    return [
+        {
+            "id": str(uuid.UUID(int=rng.getrandbits(128))),
+            "twilio_sid": "AC" + uuid.UUID(int=rng.getrandbits(128)).hex,
+            "twilio_auth_token": uuid.UUID(int=rng.getrandbits(128)).hex,
+            "twilio_phone": f"+4420{rng.randint(10000000, 99999999)}",
+        }
+        for _ in range(count)
+    ]
+
+
+def webhook_params(tenant, rng: random.Random, i: int):
+    """The fields Twilio posts for an inbound WhatsApp message."""
+    return [
+        ("SmsMessageSid", f"SM{i:032x}"),
+        ("NumMedia", "0"),
+        ("ProfileName", rng.choice(["Jess", "Alex", "Sam", "Priya"])),
+        ("MessageType", "text"),
+        ("SmsSid", f"SM{i:032x}"),
+        ("WaId", f"4477{i % 10**8:08d}"),
+        ("SmsStatus", "received"),
+        ("Body", rng.choice(["Hi, is this still available?", "Yes please", "2", "How much does it cost?"])),
+        ("To", f"whatsapp:{tenant['twilio_phone']}"),
+        ("NumSegments", "1"),
+        ("ReferralNumMedia", "0"),
+        ("MessageSid", f"SM{i:032x}"),
+        ("AccountSid", tenant["twilio_sid"]),
+        ("From", f"whatsapp:+4477{i % 10**8:08d}"),
+        ("ApiVersion", "2010-04-01"),
+    ]
+
+
+def per_request_us(fn, items) -> float:
+    started = time.perf_counter()
+    for item in items:
+        fn(*item)
+    return (time.perf_counter() - started) / len(items) * 1e6
+
+
+def run(requests: int, tenant_count: int, seed: int = 3) -> dict:
+    rng = random.Random(seed)
+    tenants = synthetic_tenants(tenant_count, rng)
+    keys = SigningKeys(loader=lambda: tenants, default_token="", default_sid="")
+    keys.refresh()
+
+    signed = []
+    for i in range(requests):
+        tenant = rng.choice(tenants)
+        params = webhook_params(tenant, rng, i)
+        signed.append((URL, params, compute_signature(signing_mac(tenant["twilio_auth_token"]), URL, params)))
+
+    # Same signatures as the reference implementation
+    for url, params, signature in signed[:200]:
+        token = next(t["twilio_auth_token"] for t in tenants if t["twilio_sid"] == dict(params)["AccountSid"])
+        assert RequestValidator(token).validate(url, dict(params), signature)
+
+    unlimited = dict(ip_limits=TokenBuckets(0, 0), number_limits=TokenBuckets(0, 0))
+    guard = WebhookGuard(keys, validate=True, replays=RecentSids(), **unlimited)
+    verify_us = per_request_us(guard.verify, signed)
+    assert all(guard.verify(*item) for item in signed[:1000])
+
+    reference = {t["twilio_sid"]: RequestValidator(t["twilio_auth_token"]) for t in tenants}
+    reference_us = per_request_us(
+        lambda url, params, signature: reference[dict(params)["AccountSid"]].validate(url, dict(params), signature),
+        signed[: max(1, requests // 10)],
+    )
+
+    # Legitimate traffic at full speed: per-IP limits off (a tight loop would trip them), per-number on
+    guard = WebhookGuard(keys, validate=True, ip_limits=TokenBuckets(0, 0), replays=RecentSids())
+    ips = [f"54.{rng.randint(0, 255)}.{rng.randint(0, 255)}.{rng.randint(0, 255)}" for _ in range(32)]  # Twilio's egress range
+    admitted = Counter()
+    admit_us = per_request_us(lambda *item: admitted.update([guard.admit(rng.choice(ips), *item)]), signed)
+    replay_us = per_request_us(lambda *item: admitted.update([guard.admit(rng.choice(ips), *item)]), signed[:10000])
+
+    forged = [(url, params, "bm90IGEgc2lnbmF0dXJl") for url, params, _ in signed[:20000]]
+    flood_guard = WebhookGuard(keys, validate=True, replays=RecentSids())
+    flood = Counter()
+    flood_us = per_request_us(lambda *item: flood.update([flood_guard.admit("203.0.113.9", *item)]), forged)
+
+    burst_guard = WebhookGuard(keys, validate=True, replays=RecentSids())
+    burst = Counter()
+    tenant = tenants[0]
+    for i in range(50):
+        params = webhook_params(tenant, rng, 0)
+        params[-4] = ("MessageSid", f"SMburst{i}")
+        burst.update([burst_guard.admit(ips[0], URL, params, compute_signature(signing_mac(tenant["twilio_auth_token"]), URL, params))])
+
+    return {
+        "requests": requests,
+        "tenants": tenant_count,
+        "verify_us": round(verify_us, 2),
+        "twilio_request_validator_us": round(reference_us, 2),
+        "admit_us": round(admit_us, 2),
+        "replayed_admit_us": round(replay_us, 2),
+        "forged_flood_us": round(flood_us, 2),
+        "outcomes": dict(admitted),
+        "forged_flood_outcomes": dict(flood),
+        "single_number_burst_outcomes": dict(burst),
+    }
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Webhook admission check benchmark")
+    parser.add_argument("--requests", type=int, default=100000)
+    parser.add_argument("--tenants", type=int, default=50)
+    args = parser.parse_args()
+    for key, value in run(args.requests, args.tenants).items():
+        print(f"{key:>30}: {value}")
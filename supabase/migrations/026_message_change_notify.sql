@@ -0,0 +1,39 @@
+-- Notify API instances of message changes so their in-process history caches stay fresh
+-- Channel: message_changes (consumed by api/utils/message_cache.py)
+-- pg_notify payloads are limited to 8000 bytes; long contents are sent without the row
+-- and the listener invalidates the lead instead.
+CREATE OR REPLACE FUNCTION notify_message_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_data messages%ROWTYPE;
+    payload JSONB;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        row_data := OLD;
+    ELSE
+        row_data := NEW;
+    END IF;
+
+    payload := jsonb_build_object(
+        'op', TG_OP,
+        'id', row_data.id,
+        'lead_id', row_data.lead_id
+    );
+
+    IF TG_OP = 'INSERT' AND octet_length(row_data.content) <= 6000 THEN
+        payload := payload || jsonb_build_object(
+            'sender_type', row_data.sender_type,
+            'content', row_data.content,
+            'timestamp', row_data.timestamp
+        );
+    END IF;
+
+    PERFORM pg_notify('message_changes', payload::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS messages_notify_change ON messages;
+CREATE TRIGGER messages_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON messages
+    FOR EACH ROW EXECUTE FUNCTION notify_message_change();
@@ -0,0 +1,10 @@
+-- Keyset pagination indexes for the Python dashboard APIs (/api/leads, /api/leads/{id}/messages)
+-- Sort expressions must match api/utils/lead_queries.py exactly for the planner to use them.
+CREATE INDEX IF NOT EXISTS leads_keyset_idx ON leads (
+    status,
+    COALESCE(priority_score, 0) DESC,
+    COALESCE(last_contacted_at, '1970-01-01 00:00:00+00'::timestamptz) DESC,
+    id DESC
+);
+
+CREATE INDEX IF NOT EXISTS messages_lead_keyset_idx ON messages (lead_id, timestamp, id);
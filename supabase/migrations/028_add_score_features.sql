@@ -0,0 +1,5 @@
+-- Incremental priority scoring state (maintained by api/utils/lead_scoring.py)
+ALTER TABLE public.leads
+ADD COLUMN IF NOT EXISTS score_features JSONB DEFAULT '{}'::jsonb;
+
+COMMENT ON COLUMN public.leads.score_features IS 'Scoring state: sentiment EWMA, inbound count, reply latency EWMA, decayed objection/intent terms';
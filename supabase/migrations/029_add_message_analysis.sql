@@ -0,0 +1,9 @@
+-- Persist analyze_message output with each inbound message (written in the same insert)
+ALTER TABLE public.messages
+ADD COLUMN IF NOT EXISTS analysis JSONB;
+
+COMMENT ON COLUMN public.messages.analysis IS 'Inbound message analysis: intent, objection_type, sentiment, suggested_status';
+
+-- Backfill job (api/utils/sentiment.py) pages through unscored lead messages
+CREATE INDEX IF NOT EXISTS messages_unscored_idx ON public.messages (id)
+    WHERE sender_type = 'lead' AND sentiment_score IS NULL;
@@ -0,0 +1,36 @@
+-- Notify API instances of lead changes so their in-process lead directories stay coherent
+-- Channel: lead_changes (consumed by api/utils/lead_directory.py)
+-- Payload carries only the directory columns
+CREATE OR REPLACE FUNCTION notify_lead_change()
+RETURNS TRIGGER AS $$
+DECLARE
+    row_data leads%ROWTYPE;
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        PERFORM pg_notify('lead_changes', jsonb_build_object('op', TG_OP, 'id', OLD.id)::text);
+        RETURN NULL;
+    END IF;
+
+    row_data := NEW;
+    PERFORM pg_notify('lead_changes', jsonb_build_object(
+        'op', TG_OP,
+        'id', row_data.id,
+        'phone', row_data.phone,
+        'lead_code', row_data.lead_code,
+        'name', row_data.name,
+        'status', row_data.status,
+        'is_manual_mode', row_data.is_manual_mode,
+        'is_test', row_data.is_test,
+        'whatsapp_mode', row_data.whatsapp_mode,
+        'tenant_id', row_data.tenant_id,
+        'priority_score', row_data.priority_score,
+        'score_features', row_data.score_features
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS leads_notify_change ON leads;
+CREATE TRIGGER leads_notify_change
+    AFTER INSERT OR UPDATE OR DELETE ON leads
+    FOR EACH ROW EXECUTE FUNCTION notify_lead_change();
@@ -0,0 +1,40 @@
+-- Fan out takeover toggles to every API worker's takeover cache
+-- Channel: lead_takeover (consumed by api/utils/takeover.py)
+-- Fires only when is_manual_mode actually changes, so the channel stays quiet
+CREATE OR REPLACE FUNCTION notify_lead_takeover()
+RETURNS TRIGGER AS $$
+BEGIN
+    IF TG_OP = 'DELETE' THEN
+        IF OLD.is_manual_mode THEN
+            PERFORM pg_notify('lead_takeover', jsonb_build_object(
+                'id', OLD.id, 'phone', OLD.phone, 'enabled', false
+            )::text);
+        END IF;
+        RETURN NULL;
+    END IF;
+
+    IF TG_OP = 'INSERT' AND NOT COALESCE(NEW.is_manual_mode, false) THEN
+        RETURN NULL;
+    END IF;
+
+    PERFORM pg_notify('lead_takeover', jsonb_build_object(
+        'id', NEW.id, 'phone', NEW.phone, 'enabled', COALESCE(NEW.is_manual_mode, false)
+    )::text);
+    RETURN NULL;
+END;
+$$ LANGUAGE plpgsql;
+
+DROP TRIGGER IF EXISTS leads_notify_takeover ON leads;
+CREATE TRIGGER leads_notify_takeover
+    AFTER INSERT OR DELETE ON leads
+    FOR EACH ROW EXECUTE FUNCTION notify_lead_takeover();
+
+DROP TRIGGER IF EXISTS leads_notify_takeover_update ON leads;
+CREATE TRIGGER leads_notify_takeover_update
+    AFTER UPDATE OF is_manual_mode, phone ON leads
+    FOR EACH ROW
+    WHEN (OLD.is_manual_mode IS DISTINCT FROM NEW.is_manual_mode OR OLD.phone IS DISTINCT FROM NEW.phone)
+    EXECUTE FUNCTION notify_lead_takeover();
+
+-- Startup load: SELECT id, phone FROM leads WHERE is_manual_mode
+CREATE INDEX IF NOT EXISTS idx_leads_manual_mode ON leads (id) WHERE is_manual_mode;
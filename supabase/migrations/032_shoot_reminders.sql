@@ -0,0 +1,21 @@
+-- Shoot reminder delivery markers (api/utils/reminders.py)
+-- One row per (lead, reminder, shoot date): inserted before sending, so a reminder
+-- is sent at most once across instances; a rescheduled shoot gets fresh reminders
+CREATE TABLE IF NOT EXISTS shoot_reminders (
+    lead_id UUID NOT NULL REFERENCES leads(id) ON DELETE CASCADE,
+    kind TEXT NOT NULL CHECK (kind IN ('48h', '24h', '2h')),
+    shoot_date TIMESTAMPTZ NOT NULL,
+    status TEXT NOT NULL DEFAULT 'claimed' CHECK (status IN ('claimed', 'sent', 'failed')),
+    message_sid TEXT,
+    error TEXT,
+    claimed_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    sent_at TIMESTAMPTZ,
+    PRIMARY KEY (lead_id, kind, shoot_date)
+);
+
+-- Dispatcher reload: booked leads with a shoot inside the next ~48 hours
+CREATE INDEX IF NOT EXISTS idx_leads_booked_shoot_date
+    ON leads (shoot_date)
+    WHERE status = 'Booked' AND shoot_date IS NOT NULL;
+
+ALTER TABLE shoot_reminders ENABLE ROW LEVEL SECURITY;
@@ -0,0 +1,9 @@
+-- Sequence behind collision-free lead codes (api/utils/lead_codes.py)
+-- Values 0..17575999 map one-to-one onto #AAA000..#ZZZ999; NO CYCLE so an
+-- exhausted code space fails loudly instead of reissuing codes
+CREATE SEQUENCE IF NOT EXISTS lead_code_seq
+    AS BIGINT
+    MINVALUE 0
+    MAXVALUE 17575999
+    START WITH 0
+    NO CYCLE;
@@ -0,0 +1,11 @@
+-- Reserve a block of lead_code_seq values in one call (api/utils/lead_codes.py).
+-- Each API process keeps the block in memory and maps values to #AAA000 codes
+-- with a Feistel permutation, so lead creation never collides or retries
+CREATE OR REPLACE FUNCTION reserve_lead_codes(block_size INT)
+RETURNS BIGINT[] AS $$
+    SELECT array_agg(nextval('lead_code_seq'))
+    FROM generate_series(1, LEAST(GREATEST(block_size, 1), 10000));
+$$ LANGUAGE sql VOLATILE;
+
+-- Only the backend reserves codes
+REVOKE EXECUTE ON FUNCTION reserve_lead_codes(INT) FROM PUBLIC, anon;
@@ -0,0 +1,18 @@
+-- Incrementally maintained dashboard counters (api/utils/lead_stats.py)
+-- Rows are (tenant, metric) pairs: 'status:<Status>' lead counts and 'booked:<YYYY-MM-DD>'
+-- bookings per day; workers add their deltas and the table is periodically rebuilt from leads
+CREATE TABLE IF NOT EXISTS lead_stats (
+    tenant_key TEXT NOT NULL,  -- tenant UUID as text, '' for leads without a tenant
+    metric TEXT NOT NULL,
+    value BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (tenant_key, metric)
+);
+
+-- When the lead last became Booked (source of "bookings today" on reconcile)
+ALTER TABLE leads
+ADD COLUMN IF NOT EXISTS booked_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN leads.booked_at IS 'When the lead last moved to Booked';
+
+ALTER TABLE lead_stats ENABLE ROW LEVEL SECURITY;
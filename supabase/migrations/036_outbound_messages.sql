@@ -0,0 +1,27 @@
+-- Outbound messages held for tenant quiet hours (api/utils/outbound.py)
+-- Released after not_before by whichever worker claims them first (FOR UPDATE SKIP LOCKED)
+CREATE TABLE IF NOT EXISTS outbound_messages (
+    id BIGSERIAL PRIMARY KEY,
+    lead_id UUID REFERENCES leads(id) ON DELETE CASCADE,
+    tenant_id UUID,
+    phone TEXT NOT NULL,
+    body TEXT NOT NULL,
+    sender_type TEXT NOT NULL DEFAULT 'bot' CHECK (sender_type IN ('bot', 'human')),
+    kind TEXT NOT NULL DEFAULT 'message',
+    not_before TIMESTAMPTZ NOT NULL,
+    deadline TIMESTAMPTZ,
+    status TEXT NOT NULL DEFAULT 'queued' CHECK (status IN ('queued', 'sending', 'sent', 'expired', 'failed')),
+    attempts INTEGER NOT NULL DEFAULT 0,
+    message_sid TEXT,
+    error TEXT,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    claimed_at TIMESTAMPTZ,
+    sent_at TIMESTAMPTZ
+);
+
+-- Release loop: due rows in release order (plus stuck sends)
+CREATE INDEX IF NOT EXISTS idx_outbound_messages_due
+    ON outbound_messages (not_before, id)
+    WHERE status IN ('queued', 'sending');
+
+ALTER TABLE outbound_messages ENABLE ROW LEVEL SECURITY;
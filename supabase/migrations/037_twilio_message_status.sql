@@ -0,0 +1,17 @@
+-- Latest delivery state per outbound Twilio message (api/twilio_status.py)
+-- status_rank orders the lifecycle so out-of-order callbacks never regress a message
+CREATE TABLE IF NOT EXISTS twilio_message_status (
+    message_sid TEXT PRIMARY KEY,
+    status TEXT NOT NULL,
+    status_rank SMALLINT NOT NULL,
+    error_code TEXT,
+    error_message TEXT,
+    recipient TEXT,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+-- Dashboard: failed / undelivered messages per recipient
+CREATE INDEX IF NOT EXISTS idx_twilio_message_status_recipient
+    ON twilio_message_status (recipient, updated_at DESC);
+
+ALTER TABLE twilio_message_status ENABLE ROW LEVEL SECURITY;
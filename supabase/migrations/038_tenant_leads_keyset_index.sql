@@ -0,0 +1,12 @@
+-- /api/leads is always scoped to the caller's tenant (X-API-Key), so lead pages are
+-- served by one range scan of an index led by tenant_id.
+-- Sort expressions must match api/utils/lead_queries.py exactly for the planner to use them.
+DROP INDEX IF EXISTS leads_keyset_idx;
+
+CREATE INDEX IF NOT EXISTS leads_tenant_keyset_idx ON leads (
+    tenant_id,
+    status,
+    COALESCE(priority_score, 0) DESC,
+    COALESCE(last_contacted_at, '1970-01-01 00:00:00+00'::timestamptz) DESC,
+    id DESC
+);
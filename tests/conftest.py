@@ -0,0 +1,6 @@
+"""Shared pytest setup: import the backend as `api.*` from the repository root."""
+
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
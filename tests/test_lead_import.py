@@ -0,0 +1,67 @@
+"""LeadImport CSV parsing: quoted fields may span lines (RFC 4180)."""
+
+import pytest
+
+from api.utils.lead_import import LeadImport, LineSplitter, MAX_CSV_RECORD_BYTES
+
+
+def _import(body, chunk=7):
+    inserted = []
+
+    def insert(tenant_id, rows, on_conflict):
+        inserted.extend(rows)
+        return {row["phone"]: (f"id-{row['phone']}", "LC", True) for row in rows}
+
+    job = LeadImport("tenant-a", fmt="csv", insert=insert)
+    splitter = LineSplitter()
+    data = body.encode("utf-8")
+    for offset in range(0, len(data), chunk):
+        for line in splitter.feed(data[offset:offset + chunk]):
+            job.feed_line(line)
+    for line in splitter.close():
+        job.feed_line(line)
+    job.finish()
+    job.flush()
+    return job, inserted
+
+
+@pytest.fixture(autouse=True)
+def no_directory(monkeypatch):
+    from api.utils import lead_directory, lead_stats
+
+    monkeypatch.setattr(lead_directory, "get_lead_directory", lambda: None)
+    monkeypatch.setattr(lead_stats, "get_lead_stats", lambda: type("Stats", (), {"record_created": lambda *a, **k: None})())
+
+
+def test_quoted_field_spanning_lines_is_one_record():
+    body = (
+        'phone,name,notes\r\n'
+        '+447700900001,"Sam Lee","Prefers mornings.\r\nSaid ""call after 10"""\r\n'
+        '+447700900002,Alex,plain\r\n'
+    )
+    job, inserted = _import(body)
+
+    assert job.counts["invalid"] == 0, job.errors
+    assert [row["phone"] for row in inserted] == ["+447700900001", "+447700900002"]
+    assert inserted[0]["metadata"]["notes"] == 'Prefers mornings.\nSaid "call after 10"'
+
+
+def test_errors_report_the_line_a_record_starts_on():
+    body = 'phone,name,notes\n+447700900001,Sam,"two\nlines"\nnot-a-phone,Bad,x\n'
+    job, _ = _import(body)
+
+    assert [error["line"] for error in job.errors] == [4]
+
+
+def test_unterminated_quote_is_rejected_not_swallowed():
+    body = 'phone,name,notes\n+447700900001,Sam,"never closed\n+447700900002,Alex,x\n'
+    job, inserted = _import(body)
+
+    assert inserted == []
+    assert job.errors == [{"line": 2, "error": "unterminated quoted field"}]
+
+    runaway = 'phone,notes\n+447700900001,"' + "x" * (MAX_CSV_RECORD_BYTES // 10) + "\n" + ("y" * 20 + "\n") * 4000
+    runaway += "+447700900003,ok\n"
+    job, inserted = _import(runaway, chunk=4096)
+    assert [row["phone"] for row in inserted] == ["+447700900003"]
+    assert job.errors[0]["error"] == "unterminated quoted field"
@@ -0,0 +1,139 @@
+"""lead_manager against a fake Supabase client (no directory, cache or write buffer unless a test adds one)."""
+
+import pytest
+
+from api.utils import lead_manager
+
+
+class FakeQuery:
+    def __init__(self, client, table):
+        self.client = client
+        self.table = table
+        self.op = None
+        self.filters = []
+
+    def select(self, columns):
+        self.op = ("select", columns)
+        return self
+
+    def update(self, fields):
+        self.op = ("update", fields)
+        return self
+
+    def eq(self, column, value):
+        self.filters.append((column, value))
+        return self
+
+    def order(self, *args, **kwargs):
+        return self
+
+    def limit(self, n):
+        return self
+
+    def execute(self):
+        self.client.calls.append((self.table, self.op[0], self.op[1], tuple(self.filters)))
+        return type("Response", (), {"data": self.client.results.get((self.table, self.op[0]), [])})()
+
+
+class FakeSupabase:
+    def __init__(self):
+        self.calls = []
+        self.results = {}
+
+    def table(self, name):
+        return FakeQuery(self, name)
+
+
+class FakeStats:
+    def __init__(self):
+        self.transitions = []
+
+    def record_transition(self, tenant_id, previous, status, is_test=False):
+        self.transitions.append((tenant_id, previous, status))
+
+
+@pytest.fixture
+def supabase(monkeypatch):
+    client = FakeSupabase()
+    stats = FakeStats()
+    client.stats = stats
+    monkeypatch.setattr(lead_manager, "get_supabase_client", lambda: client)
+    monkeypatch.setattr(lead_manager, "get_lead_directory", lambda: None)
+    monkeypatch.setattr(lead_manager, "get_history_cache", lambda: None)
+    monkeypatch.setattr(lead_manager, "get_write_buffer", lambda: None)
+    monkeypatch.setattr(lead_manager, "get_lead_stats", lambda: stats)
+    monkeypatch.setattr(lead_manager, "publish_event", lambda event: None)
+    return client
+
+
+def test_status_update_uses_the_callers_previous_status(supabase):
+    supabase.results[("leads", "update")] = [{"id": "lead-1", "tenant_id": "t1", "is_test": False}]
+
+    assert lead_manager.update_lead_status("+447700900001", "Booked", previous="Booking_Offered")
+
+    assert [call[1] for call in supabase.calls] == ["update"]
+    assert "booked_at" in supabase.calls[0][2]
+    assert supabase.stats.transitions == [("t1", "Booking_Offered", "Booked")]
+
+
+def test_status_update_looks_up_the_previous_status_when_not_given(supabase):
+    supabase.results[("leads", "select")] = [{"status": "Booked"}]
+    supabase.results[("leads", "update")] = [{"id": "lead-1", "tenant_id": "t1", "is_test": False}]
+
+    assert lead_manager.update_lead_status("+447700900001", "Booked")
+
+    assert [call[1] for call in supabase.calls] == ["select", "update"]
+    assert "booked_at" not in supabase.calls[1][2]
+    assert supabase.stats.transitions == [("t1", "Booked", "Booked")]
+
+
+def test_history_merges_buffered_rows_by_time_not_string(supabase, monkeypatch):
+    class Buffer:
+        def pending_for(self, lead_id):
+            return [{"id": "m3", "sender_type": "bot", "content": "third", "timestamp": "2026-01-01T10:00:02.500000+00:00"}]
+
+    monkeypatch.setattr(lead_manager, "get_or_create_lead", lambda phone: {"id": "lead-1"})
+    monkeypatch.setattr(lead_manager, "get_write_buffer", lambda: Buffer())
+    # Newest first, as the query returns them; PostgREST trims fractional zeros and may use 'Z'
+    supabase.results[("messages", "select")] = [
+        {"id": "m4", "sender_type": "lead", "content": "fourth", "timestamp": "2026-01-01T10:00:03Z"},
+        {"id": "m2", "sender_type": "lead", "content": "second", "timestamp": "2026-01-01T10:00:02Z"},
+        {"id": "m1", "sender_type": "bot", "content": "first", "timestamp": "2026-01-01T10:00:01.25+00:00"},
+    ]
+
+    messages = lead_manager.get_messages("+447700900001", limit=10)
+
+    assert [m["content"] for m in messages] == ["first", "second", "third", "fourth"]
+
+
+def test_empty_complete_takeover_set_answers_without_the_database(supabase, monkeypatch):
+    from api.utils.takeover import TakeoverCache
+
+    takeover = TakeoverCache()
+    takeover.complete = True
+    monkeypatch.setattr(lead_manager, "get_takeover_cache", lambda: takeover)
+
+    assert lead_manager.is_lead_in_manual_mode("+447700900001") is False
+    assert supabase.calls == []
+
+    takeover.set("lead-1", "+447700900001", True)
+    assert lead_manager.is_lead_in_manual_mode("+447700900001") is True
+    assert supabase.calls == []
+
+
+def test_empty_lead_directory_is_filled_and_then_answers(supabase, monkeypatch):
+    from api.utils.lead_directory import LeadDirectory
+
+    directory = LeadDirectory()
+    monkeypatch.setattr(lead_manager, "get_lead_directory", lambda: directory)
+    supabase.results[("leads", "select")] = [
+        {"id": "lead-1", "phone": "+447700900001", "status": "Qualifying", "is_manual_mode": False}
+    ]
+
+    assert lead_manager.get_or_create_lead("+447700900001")["id"] == "lead-1"
+    assert len(directory) == 1
+    calls = len(supabase.calls)
+    assert lead_manager.get_or_create_lead("+447700900001")["status"] == "Qualifying"
+    assert lead_manager.update_lead_status("+447700900001", "Booked") is True
+    assert [call[1] for call in supabase.calls[calls:]] == ["update"]
+    assert directory.get("+447700900001").status == "Booked"
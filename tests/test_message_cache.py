@@ -0,0 +1,28 @@
+"""MessageHistoryCache keeps each lead's history in time order whatever the timestamp format."""
+
+from api.utils.message_cache import MessageHistoryCache
+
+
+def _contents(cache, lead_id):
+    return [m["content"] for m in cache.get(lead_id, 10)]
+
+
+def test_append_orders_by_time_across_timestamp_formats():
+    cache = MessageHistoryCache(capacity=10)
+    cache.prime("lead-1", [{"id": "m1", "content": "first", "timestamp": "2026-01-01T10:00:02Z"}])
+
+    cache.append("lead-1", {"id": "m2", "content": "reply", "timestamp": "2026-01-01T10:00:02.500000+00:00"})
+    assert _contents(cache, "lead-1") == ["first", "reply"]
+
+    # A late-arriving earlier message goes back in its place
+    cache.append("lead-1", {"id": "m0", "content": "earlier", "timestamp": "2026-01-01T10:00:01.9+00:00"})
+    assert _contents(cache, "lead-1") == ["earlier", "first", "reply"]
+
+
+def test_append_is_idempotent_by_id():
+    cache = MessageHistoryCache(capacity=10)
+    cache.prime("lead-1", [])
+    message = {"id": "m1", "content": "hi", "timestamp": "2026-01-01T10:00:00Z"}
+    cache.append("lead-1", message)
+    cache.append("lead-1", message)
+    assert _contents(cache, "lead-1") == ["hi"]
@@ -0,0 +1,138 @@
+"""ModelRouter and CircuitBreaker against FakeModel backends (slow, failing, healthy)."""
+
+import time
+
+import pytest
+
+from api.utils.model_router import CircuitBreaker, FakeModel, ModelRouter, ModelUnavailableError
+from api.utils.rate_limiter import AdaptiveRateLimiter
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def _router(models, tiers=None, timeouts=None, hedge_delays=None, breaker_factory=None):
+    return ModelRouter(
+        tiers=tiers or {"reply": list(models)},
+        model_factory=lambda name: models[name],
+        timeouts=timeouts or {"reply": 2.0},
+        hedge_delays=hedge_delays or {"reply": 0.05},
+        breaker_factory=breaker_factory,
+        limiter=AdaptiveRateLimiter(rate=1e6, burst=10 ** 6, max_concurrency=10 ** 6, max_rate=1e6),
+        max_workers=8,
+    )
+
+
+def _trip(breaker, calls=5):
+    for _ in range(calls):
+        breaker.record(False)
+
+
+def test_breaker_opens_half_opens_and_closes():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=5, cooldown=30, clock=clock)
+    _trip(breaker)
+    assert breaker.state == "open" and not breaker.allow()
+
+    clock.now += 30
+    assert breaker.state == "half_open"
+    assert breaker.available()
+    assert breaker.allow()            # the single probe
+    assert not breaker.available() and not breaker.allow()
+    breaker.record(True)
+    assert breaker.state == "closed" and breaker.allow()
+
+
+def test_failed_probe_reopens_for_another_cooldown():
+    clock = FakeClock()
+    breaker = CircuitBreaker(min_calls=5, cooldown=30, clock=clock)
+    _trip(breaker)
+    clock.now += 30
+    assert breaker.allow()
+    breaker.record(False)
+    assert breaker.state == "open"
+    clock.now += 30
+    assert breaker.allow()
+
+
+def test_unused_fallback_keeps_its_probe():
+    """A half-open fallback that is never called must not stay half-open forever."""
+    clock = FakeClock()
+    models = {"primary": FakeModel("primary", reply="from primary"), "fallback": FakeModel("fallback", reply="from fallback")}
+    router = _router(models, breaker_factory=lambda: CircuitBreaker(min_calls=5, cooldown=30, clock=clock))
+    _trip(router.breaker("fallback"))
+    clock.now += 30
+
+    for _ in range(5):
+        assert router.generate("reply", "hi") == "from primary"
+    assert models["fallback"].calls == 0
+    assert router.breaker("fallback").available()
+
+    # Once the primary trips, the fallback gets its probe and closes on success
+    _trip(router.breaker("primary"))
+    assert router.generate("reply", "hi") == "from fallback"
+    assert router.breaker("fallback").state == "closed"
+
+
+def test_probe_released_when_call_never_starts():
+    breaker = CircuitBreaker(min_calls=1, cooldown=0)
+    breaker.record(False)
+    assert breaker.allow()
+    breaker.release()
+    assert breaker.available()
+
+
+def test_slow_primary_is_hedged_to_backup():
+    models = {"slow": FakeModel("slow", latency=0.5, reply="slow"), "fast": FakeModel("fast", latency=0.0, reply="fast")}
+    router = _router(models, hedge_delays={"reply": 0.05})
+
+    started = time.monotonic()
+    assert router.generate("reply", "hi") == "fast"
+    assert time.monotonic() - started < 0.4
+    assert router.hedges_fired == 1
+
+
+def test_failing_primary_falls_back():
+    models = {"broken": FakeModel("broken", failure_rate=1.0), "ok": FakeModel("ok", reply="ok")}
+    router = _router(models)
+
+    assert router.generate("reply", "hi") == "ok"
+    assert models["broken"].calls == 1
+
+
+def test_tier_deadline_raises_when_every_model_is_too_slow():
+    models = {"a": FakeModel("a", latency=1.0), "b": FakeModel("b", latency=1.0)}
+    router = _router(models, timeouts={"reply": 0.2}, hedge_delays={"reply": 0.05})
+
+    started = time.monotonic()
+    with pytest.raises(ModelUnavailableError, match="timed out"):
+        router.generate("reply", "hi")
+    assert time.monotonic() - started < 0.6
+
+
+def test_open_primary_downgrades_tier_and_recovers():
+    clock = FakeClock()
+    models = {"primary": FakeModel("primary", reply="primary"), "fallback": FakeModel("fallback", reply="fallback")}
+    router = _router(models, breaker_factory=lambda: CircuitBreaker(min_calls=5, cooldown=30, clock=clock))
+    _trip(router.breaker("primary"))
+
+    assert router.generate("reply", "hi") == "fallback"
+    assert router.downgrades == 1
+
+    clock.now += 30
+    assert router.generate("reply", "hi") == "primary"     # probe succeeds
+    assert router.breaker("primary").state == "closed"
+
+
+def test_last_resort_model_is_called_even_when_every_breaker_is_open():
+    models = {"a": FakeModel("a", reply="a"), "b": FakeModel("b", reply="b")}
+    router = _router(models)
+    _trip(router.breaker("a"))
+    _trip(router.breaker("b"))
+
+    assert router.generate("reply", "hi") == "b"
@@ -0,0 +1,129 @@
+"""Shoot reminders on a fake clock: each sent once, only inside its window, failures retried, dead claims taken over."""
+
+from datetime import timedelta
+
+import pytest
+
+from api.utils.reminders import (
+    CLAIM_TIMEOUT,
+    REMINDER_MESSAGES,
+    FakeClock,
+    MemoryReminderStore,
+    ReminderDispatcher,
+    reminder_windows,
+    render_reminder,
+    simulate,
+)
+
+PHONE = "+447700900001"
+
+
+def _lead(clock, hours_ahead, lead_id="lead-1", phone=PHONE):
+    return {"id": lead_id, "phone": phone, "name": "Sam Lee", "status": "Booked",
+            "shoot_date": clock.now() + timedelta(hours=hours_ahead)}
+
+
+class Sends:
+    """Records (phone, kind, sent_at); fails the first `failures` calls."""
+
+    def __init__(self, clock, failures=0):
+        self.clock = clock
+        self.failures = failures
+        self.sent = []
+
+    def __call__(self, phone, body):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError("Twilio 503")
+        kind = next(k for k in REMINDER_MESSAGES if render_reminder(k, {"name": "Sam Lee"}) == body)
+        self.sent.append((phone, kind, self.clock.now()))
+        return f"SM{len(self.sent)}"
+
+
+def _run(dispatcher, clock, hours, step=300):
+    for _ in range(int(hours * 3600 / step)):
+        dispatcher.reload()
+        dispatcher.run_pending()
+        clock.advance(step)
+
+
+def test_each_reminder_is_sent_once_inside_its_window():
+    clock = FakeClock()
+    lead = _lead(clock, 50)
+    store = MemoryReminderStore([lead])
+    send = Sends(clock)
+    _run(ReminderDispatcher(store, send, clock=clock, verbose=False), clock, hours=52)
+
+    assert [kind for _, kind, _ in send.sent] == ["48h", "24h", "2h"]
+    windows = {kind: (fire_at, expires_at) for kind, fire_at, expires_at in reminder_windows(lead["shoot_date"])}
+    for _, kind, sent_at in send.sent:
+        fire_at, expires_at = windows[kind]
+        assert fire_at <= sent_at < expires_at
+
+
+def test_instances_sharing_a_store_send_each_reminder_once():
+    clock = FakeClock()
+    store = MemoryReminderStore([_lead(clock, 30, lead_id=f"lead-{i}", phone=f"+44770090{i:04d}") for i in range(20)])
+    send = Sends(clock)
+    first = ReminderDispatcher(store, send, clock=clock, verbose=False)
+    second = ReminderDispatcher(store, send, clock=clock, verbose=False)
+    for _ in range(int(32 * 3600 / 300)):
+        for dispatcher in (first, second):
+            dispatcher.reload()
+            dispatcher.run_pending()
+        clock.advance(300)
+
+    assert len(send.sent) == len({(phone, kind) for phone, kind, _ in send.sent}) == 60
+
+
+def test_late_booking_skips_reminders_whose_window_has_passed():
+    clock = FakeClock()
+    store = MemoryReminderStore([_lead(clock, 3)])
+    send = Sends(clock)
+    _run(ReminderDispatcher(store, send, clock=clock, verbose=False), clock, hours=4)
+
+    assert [kind for _, kind, _ in send.sent] == ["24h", "2h"]
+
+
+def test_failed_send_is_retried_on_the_next_reload():
+    clock = FakeClock()
+    store = MemoryReminderStore([_lead(clock, 23)])
+    send = Sends(clock, failures=1)
+    dispatcher = ReminderDispatcher(store, send, clock=clock, verbose=False)
+
+    dispatcher.reload()
+    assert dispatcher.run_pending() == {"sent": 0, "failed": 1}
+    assert send.sent == []
+    clock.advance(300)
+    dispatcher.reload()
+    assert dispatcher.run_pending() == {"sent": 1, "failed": 0}
+    assert [kind for _, kind, _ in send.sent] == ["24h"]
+
+
+def test_claim_of_a_dead_instance_is_taken_over_after_the_timeout():
+    clock = FakeClock()
+    lead = _lead(clock, 23)
+    store = MemoryReminderStore([lead])
+    due = [{"lead": store.leads["lead-1"], "kind": "24h", "shoot_date": lead["shoot_date"]}]
+    # Claimed, then the instance died before sending or releasing
+    assert store.claim(due, clock.now(), clock.now() - CLAIM_TIMEOUT) == {("lead-1", "24h")}
+
+    send = Sends(clock)
+    dispatcher = ReminderDispatcher(store, send, clock=clock, verbose=False)
+    dispatcher.reload()
+    dispatcher.run_pending()
+    assert send.sent == []
+
+    clock.advance(CLAIM_TIMEOUT.total_seconds() + 1)
+    dispatcher.reload()
+    dispatcher.run_pending()
+    assert [kind for _, kind, _ in send.sent] == ["24h"]
+    assert store.markers[("lead-1", "24h", lead["shoot_date"])]["status"] == "sent"
+
+
+@pytest.mark.parametrize("failure_rate", [0.0, 0.2])
+def test_simulation_has_no_duplicates_or_out_of_window_sends(failure_rate):
+    result = simulate(leads=60, days=3, failure_rate=failure_rate)
+    assert result["duplicates"] == 0
+    assert result["out_of_window"] == 0
+    assert result["delivered"] == result["sent_markers"] > 0
@@ -0,0 +1,131 @@
+"""Tenant API keys on the dashboard read API: no key, no data; a key sees only its tenant."""
+
+import asyncio
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.analytics as analytics
+import api.events as events
+import api.leads as leads
+from api.utils import tenant_auth
+from api.utils.tenant_auth import ApiKeyCache
+
+KEYS = {"key-tenant-a": "tenant-a", "key-tenant-b": "tenant-b"}
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def client(monkeypatch):
+    calls = []
+
+    def off_the_event_loop():
+        # The queries block on the database, so they must run in the threadpool
+        with pytest.raises(RuntimeError):
+            asyncio.get_running_loop()
+
+    def list_leads(columns, limit, cursor, status, tenant_id, include_test):
+        off_the_event_loop()
+        calls.append(("leads", tenant_id))
+        return [{"id": f"lead-of-{tenant_id}"}], None
+
+    def list_messages(lead_id, columns, limit, cursor, newest_first=True, tenant_id=None):
+        off_the_event_loop()
+        calls.append(("messages", lead_id, tenant_id))
+        return [], None
+
+    monkeypatch.setattr(tenant_auth, "_cache", ApiKeyCache(resolver=KEYS.get))
+    monkeypatch.setattr(leads, "list_leads", list_leads)
+    monkeypatch.setattr(leads, "list_messages", list_messages)
+    app = FastAPI()
+    app.include_router(leads.router)
+    with TestClient(app) as test_client:
+        test_client.calls = calls
+        yield test_client
+
+
+@pytest.mark.parametrize("path", ["/api/leads", "/api/leads/lead-1/messages"])
+@pytest.mark.parametrize("headers", [{}, {"X-API-Key": "not-a-key"}])
+def test_reads_require_a_tenant_key(client, path, headers):
+    assert client.get(path, headers=headers).status_code == 401
+    assert client.calls == []
+
+
+def test_leads_are_scoped_to_the_key_tenant(client):
+    response = client.get("/api/leads?tenant_id=tenant-b", headers={"X-API-Key": "key-tenant-a"})
+    assert response.status_code == 200
+    assert response.json()["leads"] == [{"id": "lead-of-tenant-a"}]
+    assert client.calls == [("leads", "tenant-a")]
+
+
+def test_messages_are_scoped_to_the_key_tenant(client):
+    response = client.get("/api/leads/lead-1/messages", headers={"X-API-Key": "key-tenant-b"})
+    assert response.status_code == 200
+    assert client.calls == [("messages", "lead-1", "tenant-b")]
+
+
+def test_resolved_keys_are_cached_until_the_ttl():
+    lookups = []
+    clock = FakeClock()
+
+    def resolver(key):
+        lookups.append(key)
+        return KEYS.get(key)
+
+    cache = ApiKeyCache(resolver=resolver, ttl=60, clock=clock)
+    assert cache.resolve("key-tenant-a") == "tenant-a"
+    assert cache.resolve("key-tenant-a") == "tenant-a"
+    assert cache.resolve("unknown") is None
+    assert cache.resolve("unknown") is None
+    assert cache.resolve(None) is None
+    assert lookups == ["key-tenant-a", "unknown", "unknown"]
+
+    clock.now += 61
+    assert cache.resolve("key-tenant-a") == "tenant-a"
+    assert lookups[-1] == "key-tenant-a" and len(lookups) == 4
+
+
+def test_stream_requires_a_key_and_pins_the_tenant(monkeypatch):
+    subscriptions = []
+
+    class FakeBroker:
+        def subscribe(self, tenant_id=None, lead_id=None):
+            subscriptions.append((tenant_id, lead_id))
+            return None
+
+    monkeypatch.setattr(tenant_auth, "_cache", ApiKeyCache(resolver=KEYS.get))
+    monkeypatch.setattr(events, "get_event_broker", lambda: FakeBroker())
+    app = FastAPI()
+    app.include_router(events.router)
+    with TestClient(app) as client:
+        assert client.get("/api/stream?tenant_id=tenant-a").status_code == 401
+    assert subscriptions == []
+
+    # The response body streams forever; the subscription is taken before it starts
+    tenant_id = asyncio.run(tenant_auth.require_tenant("key-tenant-b"))
+    asyncio.run(events.stream_events(None, lead_id="lead-1", tenant_id=tenant_id))
+    assert subscriptions == [("tenant-b", "lead-1")]
+
+
+def test_stats_require_a_key_and_cover_only_its_tenant(monkeypatch):
+    class FakeStats:
+        def snapshot(self, tenant_id=None):
+            return {"tenant_id": tenant_id}
+
+    monkeypatch.setattr(tenant_auth, "_cache", ApiKeyCache(resolver=KEYS.get))
+    monkeypatch.setattr(analytics, "get_lead_stats", lambda: FakeStats())
+    app = FastAPI()
+    app.include_router(analytics.router)
+    with TestClient(app) as client:
+        assert client.get("/api/stats").status_code == 401
+        response = client.get("/api/stats?tenant_id=tenant-b", headers={"X-API-Key": "key-tenant-a"})
+    assert response.status_code == 200
+    assert response.json() == {"tenant_id": "tenant-a"}
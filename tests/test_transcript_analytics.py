@@ -0,0 +1,82 @@
+"""Transcript analytics endpoint: tenant-scoped, and refresh=true can't force back-to-back full exports."""
+
+import time
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.analytics as analytics
+from api.utils import tenant_auth, transcript_analytics
+from api.utils.tenant_auth import ApiKeyCache
+
+
+class FakeSnapshot:
+    def __init__(self, path):
+        self.path = path
+        self.exported_at = time.time()
+        self.messages = self.leads = {}
+
+    def tenant_code(self, tenant_id):
+        return tenant_id
+
+
+class ExportList(list):
+    """Snapshot paths in export order, plus the loaded snapshots by path."""
+
+
+@pytest.fixture
+def exports(monkeypatch):
+    """Replace the export with an in-memory snapshot list; returns the list of exports made."""
+    made = ExportList()
+
+    def export_snapshot():
+        made.append(f"snapshot-{len(made)}")
+        return made[-1]
+
+    snapshots = {}
+
+    def snapshot(path):
+        snapshots[path] = FakeSnapshot(path)
+        return snapshots[path]
+
+    monkeypatch.setattr(transcript_analytics, "export_snapshot", export_snapshot)
+    monkeypatch.setattr(transcript_analytics, "Snapshot", snapshot)
+    monkeypatch.setattr(transcript_analytics, "latest_snapshot", lambda: snapshots[made[-1]] if made else None)
+    monkeypatch.setattr(transcript_analytics, "prune_snapshots", lambda: None)
+    monkeypatch.setattr(transcript_analytics, "analyze", lambda messages, leads, tenant: {"tenant": tenant})
+    monkeypatch.setattr(transcript_analytics, "_reports", {})
+    made.snapshots = snapshots
+    return made
+
+
+@pytest.fixture
+def client(monkeypatch, exports):
+    monkeypatch.setattr(tenant_auth, "_cache", ApiKeyCache(resolver={"key-tenant-a": "tenant-a"}.get))
+    app = FastAPI()
+    app.include_router(analytics.router)
+    with TestClient(app) as test_client:
+        yield test_client
+
+
+def test_requires_a_tenant_key(client, exports):
+    assert client.get("/api/analytics/transcripts?refresh=true").status_code == 401
+    assert exports == []
+
+
+def test_report_is_scoped_to_the_key_tenant(client):
+    response = client.get("/api/analytics/transcripts?tenant_id=tenant-b", headers={"X-API-Key": "key-tenant-a"})
+    assert response.status_code == 200
+    assert response.json()["tenant"] == "tenant-a"
+
+
+def test_refresh_exports_at_most_once_per_min_age(client, exports, monkeypatch):
+    monkeypatch.setattr(transcript_analytics, "REFRESH_MIN_AGE", 300.0)
+    headers = {"X-API-Key": "key-tenant-a"}
+    for _ in range(5):
+        assert client.get("/api/analytics/transcripts?refresh=true", headers=headers).status_code == 200
+    assert exports == ["snapshot-0"]
+
+    exports.snapshots["snapshot-0"].exported_at -= 301
+    client.get("/api/analytics/transcripts?refresh=true", headers=headers)
+    assert exports == ["snapshot-0", "snapshot-1"]
@@ -0,0 +1,108 @@
+"""TwilioSender retries against an httpx.MockTransport standing in for the Messages API."""
+
+import asyncio
+
+import httpx
+import pytest
+
+from api.utils import twilio_client
+from api.utils.twilio_client import TwilioSendError, TwilioSender
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(twilio_client, "_retry_delay", lambda attempt, retry_after, rng: 0.0)
+
+
+def _send(responses, max_attempts=4):
+    """Send one message; each POST takes the next response (or raises it). Returns (result, posts, sender)."""
+    posts = []
+
+    def handler(request):
+        posts.append(request)
+        step = responses[min(len(posts), len(responses)) - 1]
+        if isinstance(step, Exception):
+            raise step
+        return step
+
+    async def run():
+        sender = TwilioSender(
+            account_sid="AC123", auth_token="token", from_number="+15550000000",
+            api_base="https://twilio.test", sender_mps=1000.0, max_attempts=max_attempts, status_callback=None,
+        )
+        await sender.close()
+        sender._client = httpx.AsyncClient(transport=httpx.MockTransport(handler))
+        try:
+            return await sender.send("+15551234567", "Hi"), sender
+        except TwilioSendError as e:
+            return e, sender
+        finally:
+            await sender.close()
+
+    result, sender = asyncio.run(run())
+    return result, posts, sender
+
+
+def _created(sid="SM1"):
+    return httpx.Response(201, json={"sid": sid})
+
+
+def test_send_returns_sid():
+    sid, posts, sender = _send([_created("SM42")])
+    assert sid == "SM42"
+    assert len(posts) == 1
+    assert b"To=whatsapp%3A%2B15551234567" in posts[0].content
+    assert sender.counters["sent"] == 1
+
+
+def test_throttled_and_server_errors_are_retried():
+    sid, posts, sender = _send([
+        httpx.Response(429, json={"code": 20429, "message": "Too Many Requests"}, headers={"Retry-After": "1"}),
+        httpx.Response(503, text="unavailable"),
+        _created(),
+    ])
+    assert sid == "SM1"
+    assert len(posts) == 3
+    assert sender.counters["throttled"] == 1
+    assert sender.counters["server_errors"] == 1
+    assert sender.counters["retries"] == 2
+
+
+@pytest.mark.parametrize("error", [
+    httpx.ConnectError("refused"),
+    httpx.ConnectTimeout("connect timed out"),
+    httpx.PoolTimeout("no free connection"),
+])
+def test_errors_before_the_request_left_are_retried(error):
+    sid, posts, sender = _send([error, _created()])
+    assert sid == "SM1"
+    assert len(posts) == 2
+    assert sender.counters["network_errors"] == 1
+
+
+@pytest.mark.parametrize("error", [
+    httpx.ReadTimeout("read timed out"),
+    httpx.RemoteProtocolError("server disconnected"),
+    httpx.ReadError("connection reset"),
+])
+def test_errors_after_the_request_was_sent_are_not_retried(error):
+    result, posts, sender = _send([error, _created()])
+    assert isinstance(result, TwilioSendError)
+    assert not result.retryable
+    assert len(posts) == 1
+    assert sender.counters["failed"] == 1
+
+
+def test_permanent_error_is_not_retried():
+    result, posts, _ = _send([httpx.Response(400, json={"code": 21211, "message": "Invalid 'To' Phone Number"})])
+    assert isinstance(result, TwilioSendError)
+    assert (result.status, result.code, result.retryable) == (400, 21211, False)
+    assert len(posts) == 1
+
+
+def test_retries_run_out():
+    result, posts, sender = _send([httpx.Response(500, text="boom")], max_attempts=3)
+    assert isinstance(result, TwilioSendError)
+    assert result.status == 500 and result.retryable
+    assert len(posts) == 3
+    assert sender.counters["failed"] == 1
@@ -0,0 +1,116 @@
+"""Twilio webhook: senders over their rate are stored (not answered), never dropped."""
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+import api.webhook as webhook
+from api.utils.memory_store import InMemoryLeadStore
+from api.utils.simulator import build_fake_agent
+from api.utils.webhook_guard import (
+    RecentSids, SigningKeys, TokenBuckets, WebhookGuard, compute_signature, signing_mac
+)
+
+AUTH_TOKEN = "test-auth-token"
+ACCOUNT_SID = "AC" + "1" * 32
+URL = "http://testserver/api/webhook"
+PHONE = "+447700900123"
+
+
+@pytest.fixture
+def client(monkeypatch):
+    store = InMemoryLeadStore()
+    agent = build_fake_agent(latency=0)
+    guard = WebhookGuard(
+        SigningKeys(loader=lambda: [], default_token=AUTH_TOKEN, default_sid=ACCOUNT_SID),
+        validate=True, ip_limits=TokenBuckets(0, 0), number_limits=TokenBuckets(0.2, 6), replays=RecentSids(),
+    )
+    real_pipeline = webhook.process_inbound_message
+    monkeypatch.setattr(webhook, "get_webhook_guard", lambda: guard)
+    monkeypatch.setattr(webhook, "tracing_enabled", lambda: False)
+    monkeypatch.setattr(webhook, "process_inbound_message",
+                        lambda phone, message, **kwargs: real_pipeline(phone, message, store=store, agent=agent, **kwargs))
+    app = FastAPI()
+    app.include_router(webhook.router)
+    with TestClient(app) as test_client:
+        test_client.store = store
+        yield test_client
+
+
+def _post(client, body, sid):
+    params = [("AccountSid", ACCOUNT_SID), ("Body", body), ("From", f"whatsapp:{PHONE}"),
+              ("MessageSid", sid), ("To", "whatsapp:+442000000000")]
+    signature = compute_signature(signing_mac(AUTH_TOKEN), URL, params)
+    return client.post("/api/webhook", data=dict(params), headers={"X-Twilio-Signature": signature})
+
+
+def _history(client):
+    lead = client.store.leads[PHONE]
+    return client.store.messages[lead["id"]]
+
+
+def test_burst_past_number_limit_is_stored_without_replies(client):
+    responses = [_post(client, f"message {i}", f"SM{i:032d}") for i in range(10)]
+
+    assert all(response.status_code == 200 for response in responses)
+    answered = ["<Message>" in response.text for response in responses]
+    assert answered == [True] * 6 + [False] * 4
+    history = _history(client)
+    assert [m["content"] for m in history if m["sender_type"] == "lead"] == [f"message {i}" for i in range(10)]
+    assert sum(1 for m in history if m["sender_type"] == "bot") == 6
+
+
+def test_stop_is_honoured_while_rate_limited(client):
+    for i in range(6):
+        _post(client, f"message {i}", f"SM{i:032d}")
+    response = _post(client, "STOP", "SM" + "9" * 32)
+
+    assert "removed from our list" in response.text
+    assert client.store.leads[PHONE]["status"] == "Human_Required"
+
+
+def test_replayed_sid_is_not_stored_twice(client):
+    _post(client, "hello", "SM" + "1" * 32)
+    _post(client, "hello", "SM" + "1" * 32)
+
+    assert [m["content"] for m in _history(client) if m["sender_type"] == "lead"] == ["hello"]
+
+
+class _Request:
+    def __init__(self, forwarded=None, peer="10.0.0.5"):
+        self.headers = {"x-forwarded-for": forwarded} if forwarded is not None else {}
+        self.client = type("Client", (), {"host": peer})()
+
+
+def test_client_ip_uses_the_hop_our_proxy_appended():
+    from api.utils.webhook_guard import client_ip
+
+    # Caller-supplied entries on the left are ignored
+    assert client_ip(_Request("6.6.6.6, 7.7.7.7, 54.1.2.3"), trusted_hops=1) == "54.1.2.3"
+    assert client_ip(_Request("6.6.6.6, 54.1.2.3, 10.1.1.1"), trusted_hops=2) == "54.1.2.3"
+    assert client_ip(_Request("54.1.2.3"), trusted_hops=2) == "54.1.2.3"
+    assert client_ip(_Request("6.6.6.6"), trusted_hops=0) == "10.0.0.5"
+    assert client_ip(_Request(), trusted_hops=1) == "10.0.0.5"
+
+
+def test_model_classified_opt_out_gets_the_removal_reply_without_a_model_reply():
+    class OptOutAgent:
+        def __init__(self):
+            self.generated = 0
+
+        def analyze_message(self, message, status, priority=None):
+            return {"intent": "stop", "objection_type": "none", "sentiment": "negative"}
+
+        def generate_response(self, *args, **kwargs):
+            self.generated += 1
+            return "Sure! Before you go, have you seen our offer?"
+
+    store = InMemoryLeadStore()
+    agent = OptOutAgent()
+    result = webhook.process_inbound_message(PHONE, "please stop texting me", store=store, agent=agent)
+
+    assert agent.generated == 0
+    assert result["response"] == webhook.OPT_OUT_REPLY
+    assert result["action"] == "opt_out"
+    assert store.leads[PHONE]["status"] == "Human_Required"
+    assert store.messages[store.leads[PHONE]["id"]][-1]["content"] == webhook.OPT_OUT_REPLY